@@ -1,4 +1,4 @@
-import { ActionRequest, ActionResponse, ChatMessage, GameState, Item, NPCInteraction, Player, RoomInfo } from '@/types/game';
+import { ActionRequest, ActionResponse, ActionStreamEvent, ChatMessage, GameState, Item, NPCInteraction, Player, RoomInfo } from '@/types/game';
 import { AuthResponse, RegisterRequest, LoginRequest, RegisterResponse, User, UsernameAvailability } from '@/types/auth';
 import useGameStore from '@/store/gameStore';
 
@@ -102,6 +102,39 @@ class APIService {
         }
     }
 
+    // Parsed events of an SSE action stream
+    private async *readEventStream(response: Response): AsyncGenerator<ActionStreamEvent> {
+        const reader = response.body?.getReader();
+        if (!reader) {
+            throw new Error('No response body');
+        }
+
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop() || '';
+
+            for (const line of lines) {
+                if (line.startsWith('data: ')) {
+                    const dataStr = line.slice(6);
+                    if (dataStr.trim() === '') continue;
+
+                    try {
+                        yield JSON.parse(dataStr);
+                    } catch (error) {
+                        console.error('[API] Failed to parse stream data:', dataStr, error);
+                    }
+                }
+            }
+        }
+    }
+
     // Action processing with streaming
     async processActionStream(
         action: ActionRequest,
@@ -133,307 +166,283 @@ class APIService {
                 }
             }
 
-            const token = this.getAuthToken();
-            const headers: HeadersInit = {
-                'Content-Type': 'application/json',
-                'Accept': 'text/event-stream',
-            };
-
-            // Check if current user is anonymous - same logic as main request method
-            const isAnonymous = store.user?.is_anonymous || false;
-
-            // Debug logging for stream requests
-            console.log('[API] Stream request debug:', {
-                endpoint: '/action/stream',
-                hasToken: !!token,
-                userId: store.user?.id,
-                isAnonymous,
-                willSendAuth: !!token
-            });
+            // Prefer the socket, which authenticated once when it connected; the SSE endpoint is the fallback
+            const socketService = (await import('./websocket')).default;
+            let events = socketService.streamAction(action);
+            if (!events) {
+                const token = this.getAuthToken();
+                const headers: HeadersInit = {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
+                };
 
-            // Add auth header if token exists
-            if (token) {
-                (headers as Record<string, string>)['Authorization'] = `Bearer ${token}`;
-            }
+                // Check if current user is anonymous - same logic as main request method
+                const isAnonymous = store.user?.is_anonymous || false;
+
+                // Debug logging for stream requests
+                console.log('[API] Stream request debug:', {
+                    endpoint: '/action/stream',
+                    hasToken: !!token,
+                    userId: store.user?.id,
+                    isAnonymous,
+                    willSendAuth: !!token
+                });
+
+                // Add auth header if token exists
+                if (token) {
+                    (headers as Record<string, string>)['Authorization'] = `Bearer ${token}`;
+                }
 
-            // For streaming, we need to make a direct call but through our proxy
-            const response = await fetch('/api/game/action/stream', {
-                method: 'POST',
-                headers,
-                body: JSON.stringify(action),
-            });
+                // For streaming, we need to make a direct call but through our proxy
+                const response = await fetch('/api/game/action/stream', {
+                    method: 'POST',
+                    headers,
+                    body: JSON.stringify(action),
+                });
 
-            if (!response.ok) {
-                const errorText = await response.text();
-                console.error('[API] Stream error response:', errorText);
+                if (!response.ok) {
+                    const errorText = await response.text();
+                    console.error('[API] Stream error response:', errorText);
                 
-                // Clear movement loading state on error
-                if (isMovement) {
-                    store.setIsMovementLoading(false);
-                }
+                    // Clear movement loading state on error
+                    if (isMovement) {
+                        store.setIsMovementLoading(false);
+                    }
                 
-                if (response.status === 404) {
-                    // Room not found - try to recover
-                    const player = store.player;
-                    if (player && player.current_room) {
-                        console.log('[API] Room error detected. Attempting to reconnect to current room:', player.current_room);
-                        const websocketService = (await import('./websocket')).default;
+                    if (response.status === 404) {
+                        // Room not found - try to recover
+                        const player = store.player;
+                        if (player && player.current_room) {
+                            console.log('[API] Room error detected. Attempting to reconnect to current room:', player.current_room);
+                            const websocketService = (await import('./websocket')).default;
+
+                            // First try to get the current room info
+                            try {
+                                const roomInfo = await this.getRoomInfo(player.current_room);
+                                store.setCurrentRoom(roomInfo.room);
+                                store.setNPCs(roomInfo.npcs);
+                                store.setPlayersInRoom(roomInfo.players);
+
+                                // Reconnect WebSocket to current room
+                                websocketService.setNextRoom(player.current_room);
+                                websocketService.disconnect();
+                                websocketService.connect(player.current_room, player.id);
 
-                        // First try to get the current room info
-                        try {
-                            const roomInfo = await this.getRoomInfo(player.current_room);
-                            store.setCurrentRoom(roomInfo.room);
-                            store.setNPCs(roomInfo.npcs);
-                            store.setPlayersInRoom(roomInfo.players);
-
-                            // Reconnect WebSocket to current room
-                            websocketService.setNextRoom(player.current_room);
-                            websocketService.disconnect();
-                            websocketService.connect(player.current_room, player.id);
-
-                            onError('Room transition failed. Staying in current room.');
-                        } catch (roomError) {
-                            console.error('[API] Failed to recover room state:', roomError);
-                            onError('Failed to recover room state. Please refresh the page.');
+                                onError('Room transition failed. Staying in current room.');
+                            } catch (roomError) {
+                                console.error('[API] Failed to recover room state:', roomError);
+                                onError('Failed to recover room state. Please refresh the page.');
+                            }
+                            return;
                         }
-                        return;
                     }
+                    onError(errorText);
+                    return;
                 }
-                onError(errorText);
-                return;
-            }
 
-            const reader = response.body?.getReader();
-            if (!reader) {
-                throw new Error('No response body');
+                events = this.readEventStream(response);
             }
 
-            const decoder = new TextDecoder();
-            let buffer = '';
             let firstChunkTime: number | null = null;
             let chunkCount = 0;
 
-            while (true) {
-                const { done, value } = await reader.read();
-                const chunkReceived = performance.now();
-                
-                if (done) break;
-
+            for await (const data of events) {
                 if (firstChunkTime === null) {
-                    firstChunkTime = chunkReceived;
+                    firstChunkTime = performance.now();
                     console.log(`⏱️ [TIMING] First chunk: ${(firstChunkTime - requestStart).toFixed(0)}ms`);
                 }
 
-                buffer += decoder.decode(value, { stream: true });
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        const dataStr = line.slice(6);
-                        if (dataStr.trim() === '') continue;
-
-                        let data;
-                        try {
-                            data = JSON.parse(dataStr);
-                        } catch (error) {
-                            console.error('[API] Failed to parse stream data:', dataStr, error);
-                            continue;
-                        }
+                chunkCount++;
 
-                        chunkCount++;
-
-                        if (data.error) {
-                            console.error('[API] Stream error:', data.error);
+                if (data.error) {
+                    console.error('[API] Stream error:', data.error);
                             
-                            // Clear movement loading state on error
-                            if (isMovement) {
-                                store.setIsMovementLoading(false);
-                            }
+                    // Clear movement loading state on error
+                    if (isMovement) {
+                        store.setIsMovementLoading(false);
+                    }
                             
-                            // Graceful user-facing message
-                            onError("That didn't go through. Please try again.");
+                    // Graceful user-facing message
+                    onError("That didn't go through. Please try again.");
                             
-                            if (typeof data.error === 'string' && data.error.includes('Room not found')) {
-                                const player = store.player;
-                                if (player && player.current_room) {
-                                    console.log('[API] Room error detected. Attempting to reconnect to current room:', player.current_room);
-                                    const websocketService = (await import('./websocket')).default;
-
-                                    // First try to get the current room info
-                                    try {
-                                        const roomInfo = await this.getRoomInfo(player.current_room);
-                                        store.setCurrentRoom(roomInfo.room);
-                                        store.setNPCs(roomInfo.npcs);
-                                        store.setPlayersInRoom(roomInfo.players);
-
-                                        // Reconnect WebSocket to current room
-                                        websocketService.setNextRoom(player.current_room);
-                                        websocketService.disconnect();
-                                        websocketService.connect(player.current_room, player.id);
-
-                                        onError('Room transition failed. Staying in current room.');
-                                    } catch (roomError) {
-                                        console.error('[API] Failed to recover room state:', roomError);
-                                        onError('Failed to recover room state. Please refresh the page.');
-                                    }
-                                    return;
-                                }
+                    if (typeof data.error === 'string' && data.error.includes('Room not found')) {
+                        const player = store.player;
+                        if (player && player.current_room) {
+                            console.log('[API] Room error detected. Attempting to reconnect to current room:', player.current_room);
+                            const websocketService = (await import('./websocket')).default;
+
+                            // First try to get the current room info
+                            try {
+                                const roomInfo = await this.getRoomInfo(player.current_room);
+                                store.setCurrentRoom(roomInfo.room);
+                                store.setNPCs(roomInfo.npcs);
+                                store.setPlayersInRoom(roomInfo.players);
+
+                                // Reconnect WebSocket to current room
+                                websocketService.setNextRoom(player.current_room);
+                                websocketService.disconnect();
+                                websocketService.connect(player.current_room, player.id);
+
+                                onError('Room transition failed. Staying in current room.');
+                            } catch (roomError) {
+                                console.error('[API] Failed to recover room state:', roomError);
+                                onError('Failed to recover room state. Please refresh the page.');
                             }
-                            onError(data.error);
                             return;
                         }
-                        if (data.type === 'chunk') {
-                            onChunk(data.content);
-                        } else if (data.type === 'room_update') {
-                            // OPTIMIZATION: Handle room updates immediately for instant UI updates
-
-                            // Process room updates immediately
-                            if (data.updates) {
-                                // Handle player updates (position, inventory, etc.)
-                                if (data.updates.player && store.player) {
-                                    // CRITICAL: Preserve health and inventory when merging player updates
-                                    // to prevent stale data from overwriting fresh state (e.g., after death/respawn, during movement)
-                                    const currentHealth = store.player.health;
-                                    const currentInventory = store.player.inventory;
-
-                                    const updatedPlayer = {
-                                        ...store.player,
-                                        ...data.updates.player,
-                                        // Preserve current health if set (prevents overwrites from stale data)
-                                        health: currentHealth !== undefined ? currentHealth : data.updates.player.health,
-                                        // Preserve current inventory if incoming update doesn't include it (prevents inventory loss during movement/other updates)
-                                        inventory: data.updates.player.inventory !== undefined ? data.updates.player.inventory : currentInventory
-                                    };
-                                    store.setPlayer(updatedPlayer);
-                                    console.log('[API] Room update: Updated player state with health and inventory safeguard', {
-                                        currentHealth,
-                                        incomingHealth: data.updates.player.health,
-                                        finalHealth: updatedPlayer.health,
-                                        hasIncomingInventory: data.updates.player.inventory !== undefined,
-                                        inventoryCount: updatedPlayer.inventory?.length || 0
-                                    });
-                                }
-
-                                // Handle room changes
-                                if (data.updates.room) {
-                                    const oldRoomId = (window as unknown as Record<string, string>).__attemptedMovementFromRoom;
-                                    const newRoomId = data.updates.room.id;
-
-                                    // Check if movement succeeded or failed
-                                    if (oldRoomId && newRoomId === oldRoomId) {
-                                        // Movement failed - still in same room
-                                        console.log('[API] Movement failed - still in same room');
-                                        store.setMovementFailed(true);
-                                        store.setIsAttemptingMovement(false);
-                                        store.setShowMovementAnimation(false);
-
-                                        // Clear failed state after animation
-                                        setTimeout(() => {
-                                            store.setMovementFailed(false);
-                                        }, 600);
-                                    } else if (oldRoomId) {
-                                        // Movement succeeded - new room
-                                        console.log('[API] Movement succeeded - new room');
-                                        store.setIsAttemptingMovement(false);
-                                        store.setShowMovementAnimation(false);
-                                        store.setMovementFailed(false);
-                                    }
-
-                                    store.setCurrentRoom(data.updates.room);
-                                    console.log('[API] Room update: Updated room', data.updates.room);
-                                }
-
-                                // Handle inventory updates
-                                if (data.updates.inventory) {
-                                    console.log('[API] Room update: Updated inventory', data.updates.inventory);
-                                }
-                            }
-                        } else if (data.type === 'final') {
-                            const finalTime = performance.now();
-                            const totalTime = finalTime - requestStart;
-                            console.log(`⏱️ [TIMING] Complete: ${totalTime.toFixed(0)}ms (${chunkCount} chunks)`);
-
-                            // Clear movement animation states
-                            store.setIsAttemptingMovement(false);
-                            store.setShowMovementAnimation(false);
-
-                            // Guard against malformed updates by ensuring object shape
-                            if (data.updates && typeof data.updates !== 'object') {
-                                console.warn('[API] Malformed updates payload; prompting retry');
-                                onError("That didn't go through. Please try again.");
-                                return;
-                            }
-                            console.log('[API] Final stream data:', data);
-
-                            // Handle room generation status
-                            if (data.updates?.room_generation) {
-                                const roomGen = data.updates.room_generation;
-                                console.log('[API] Room generation status:', roomGen);
-
-                                if (roomGen.is_generating) {
-                                    console.log('[API] Room is being generated, showing loading spinner');
-                                    store.setIsRoomGenerating(true);
-                                } else {
-                                    console.log('[API] Room is ready, hiding loading spinner');
-                                    store.setIsRoomGenerating(false);
-                                }
-                            }
+                    }
+                    onError(data.error);
+                    return;
+                }
+                if (data.type === 'chunk') {
+                    onChunk(data.content);
+                } else if (data.type === 'room_update') {
+                    // OPTIMIZATION: Handle room updates immediately for instant UI updates
+
+                    // Process room updates immediately
+                    if (data.updates) {
+                        // Handle player updates (position, inventory, etc.)
+                        if (data.updates.player && store.player) {
+                            // CRITICAL: Preserve health and inventory when merging player updates
+                            // to prevent stale data from overwriting fresh state (e.g., after death/respawn, during movement)
+                            const currentHealth = store.player.health;
+                            const currentInventory = store.player.inventory;
+
+                            const updatedPlayer = {
+                                ...store.player,
+                                ...data.updates.player,
+                                // Preserve current health if set (prevents overwrites from stale data)
+                                health: currentHealth !== undefined ? currentHealth : data.updates.player.health,
+                                // Preserve current inventory if incoming update doesn't include it (prevents inventory loss during movement/other updates)
+                                inventory: data.updates.player.inventory !== undefined ? data.updates.player.inventory : currentInventory
+                            };
+                            store.setPlayer(updatedPlayer);
+                            console.log('[API] Room update: Updated player state with health and inventory safeguard', {
+                                currentHealth,
+                                incomingHealth: data.updates.player.health,
+                                finalHealth: updatedPlayer.health,
+                                hasIncomingInventory: data.updates.player.inventory !== undefined,
+                                inventoryCount: updatedPlayer.inventory?.length || 0
+                            });
+                        }
 
-                            // Upsert any newly created item from updates to populate inventory UI
-                            if (data.updates?.new_item) {
-                                console.log('[API] Processing new_item update:', data.updates.new_item);
-                                const store = useGameStore.getState();
-                                store.upsertItems([data.updates.new_item]);
-                                console.log('[API] Item added to store, current itemsById:', Object.keys(store.itemsById));
+                        // Handle room changes
+                        if (data.updates.room) {
+                            const oldRoomId = (window as unknown as Record<string, string>).__attemptedMovementFromRoom;
+                            const newRoomId = data.updates.room.id;
+
+                            // Check if movement succeeded or failed
+                            if (oldRoomId && newRoomId === oldRoomId) {
+                                // Movement failed - still in same room
+                                console.log('[API] Movement failed - still in same room');
+                                store.setMovementFailed(true);
+                                store.setIsAttemptingMovement(false);
+                                store.setShowMovementAnimation(false);
+
+                                // Clear failed state after animation
+                                setTimeout(() => {
+                                    store.setMovementFailed(false);
+                                }, 600);
+                            } else if (oldRoomId) {
+                                // Movement succeeded - new room
+                                console.log('[API] Movement succeeded - new room');
+                                store.setIsAttemptingMovement(false);
+                                store.setShowMovementAnimation(false);
+                                store.setMovementFailed(false);
                             }
 
-                            // Handle room change
-                            if (data.updates?.player?.current_room) {
-                                const newRoomId = data.updates.player.current_room;
-                                console.log('[API] Player moved to new room:', newRoomId);
-
-                                // First update game state
-                                onFinal({
-                                    success: true,
-                                    message: data.content,
-                                    updates: data.updates || {}
-                                });
-
-                                // Then update WebSocket's roomId and reconnect
-                                const websocketService = (await import('./websocket')).default;
-                                websocketService.setNextRoom(newRoomId);
-                                websocketService.disconnect();
-                                websocketService.connect(newRoomId, action.player_id);
-                            } else {
-                                onFinal({
-                                    success: true,
-                                    message: data.content,
-                                    updates: data.updates || {}
-                                });
-                            }
-                        } else if (data.type === 'quest_complete') {
-                            // Handle quest completion as a special message (toast + chat log)
-                            console.log('[API] Quest completed:', data);
-
-                            // Add quest completion as a special message type
-                            const store = useGameStore.getState();
-                            if (store.player && store.currentRoom) {
-                                store.addMessage({
-                                    player_id: 'system',
-                                    room_id: store.currentRoom.id,
-                                    message: data.content,
-                                    message_type: 'quest_completion',
-                                    timestamp: new Date().toISOString(),
-                                    quest_data: data.quest_data
-                                });
-                            }
-                        } else if (data.type === 'quest_storyline') {
-                            // Accumulate quest storyline chunks (sent in pieces for typewriter effect)
-                            console.log('[API] Quest storyline chunk:', data.message);
-                            questStorylineChunks.push(data.message);
+                            store.setCurrentRoom(data.updates.room);
+                            console.log('[API] Room update: Updated room', data.updates.room);
                         }
+
+                        // Handle inventory updates
+                        if (data.updates.inventory) {
+                            console.log('[API] Room update: Updated inventory', data.updates.inventory);
+                        }
+                    }
+                } else if (data.type === 'final') {
+                    const finalTime = performance.now();
+                    const totalTime = finalTime - requestStart;
+                    console.log(`⏱️ [TIMING] Complete: ${totalTime.toFixed(0)}ms (${chunkCount} chunks)`);
+
+                    // Clear movement animation states
+                    store.setIsAttemptingMovement(false);
+                    store.setShowMovementAnimation(false);
+
+                    // Guard against malformed updates by ensuring object shape
+                    if (data.updates && typeof data.updates !== 'object') {
+                        console.warn('[API] Malformed updates payload; prompting retry');
+                        onError("That didn't go through. Please try again.");
+                        return;
+                    }
+                    console.log('[API] Final stream data:', data);
+
+                    // Handle room generation status
+                    if (data.updates?.room_generation) {
+                        const roomGen = data.updates.room_generation;
+                        console.log('[API] Room generation status:', roomGen);
+
+                        if (roomGen.is_generating) {
+                            console.log('[API] Room is being generated, showing loading spinner');
+                            store.setIsRoomGenerating(true);
+                        } else {
+                            console.log('[API] Room is ready, hiding loading spinner');
+                            store.setIsRoomGenerating(false);
+                        }
+                    }
+
+                    // Upsert any newly created item from updates to populate inventory UI
+                    if (data.updates?.new_item) {
+                        console.log('[API] Processing new_item update:', data.updates.new_item);
+                        const store = useGameStore.getState();
+                        store.upsertItems([data.updates.new_item]);
+                        console.log('[API] Item added to store, current itemsById:', Object.keys(store.itemsById));
                     }
+
+                    // Handle room change
+                    if (data.updates?.player?.current_room) {
+                        const newRoomId = data.updates.player.current_room;
+                        console.log('[API] Player moved to new room:', newRoomId);
+
+                        // First update game state
+                        onFinal({
+                            success: true,
+                            message: data.content,
+                            updates: data.updates || {}
+                        });
+
+                        // Then update WebSocket's roomId and reconnect
+                        const websocketService = (await import('./websocket')).default;
+                        websocketService.setNextRoom(newRoomId);
+                        websocketService.disconnect();
+                        websocketService.connect(newRoomId, action.player_id);
+                    } else {
+                        onFinal({
+                            success: true,
+                            message: data.content,
+                            updates: data.updates || {}
+                        });
+                    }
+                } else if (data.type === 'quest_complete') {
+                    // Handle quest completion as a special message (toast + chat log)
+                    console.log('[API] Quest completed:', data);
+
+                    // Add quest completion as a special message type
+                    const store = useGameStore.getState();
+                    if (store.player && store.currentRoom) {
+                        store.addMessage({
+                            player_id: 'system',
+                            room_id: store.currentRoom.id,
+                            message: data.content,
+                            message_type: 'quest_completion',
+                            timestamp: new Date().toISOString(),
+                            quest_data: data.quest_data
+                        });
+                    }
+                } else if (data.type === 'quest_storyline') {
+                    // Accumulate quest storyline chunks (sent in pieces for typewriter effect)
+                    console.log('[API] Quest storyline chunk:', data.message);
+                    questStorylineChunks.push(data.message);
                 }
             }
 
@@ -786,6 +795,10 @@ class APIService {
         return this.getAuthToken() !== null;
     }
 
+    getToken(): string | null {
+        return this.getAuthToken();
+    }
+
     // ===============================
     // Guest Mode Methods
     // ===============================
@@ -1,7 +1,37 @@
 import useGameStore, { DUEL_MAX_HEALTH } from '@/store/gameStore';
-import { ChatMessage, Player, Room, NPC, Monster } from '@/types/game';
+import { ActionRequest, ActionStreamEvent, ChatMessage, Player, Room, NPC, Monster, RoomPatchOperation } from '@/types/game';
 import apiService from './api';
 
+// Room states kept for versioned sync; reconnecting to one of these rooms only fetches the changes
+const MAX_SYNCED_ROOMS = 20;
+// An action streamed over the socket that goes this long without an event is given up on
+const ACTION_EVENT_TIMEOUT_MS = 60000;
+// Close code for a room that moved to another game server; the socket reconnects to its new owner
+const ROOM_MOVED_CLOSE_CODE = 4010;
+const ROOM_MOVED_RECONNECT_DELAY_MS = 250;
+
+function applyRoomPatch(room: Room, patch: RoomPatchOperation[]): Room {
+    let document: unknown = room;
+    for (const operation of patch) {
+        if (operation.path === '') {
+            document = operation.value;
+            continue;
+        }
+        const keys = operation.path.split('/').slice(1).map(key => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+        let target = document as Record<string, unknown>;
+        for (const key of keys.slice(0, -1)) {
+            target = target[key] as Record<string, unknown>;
+        }
+        const last = keys[keys.length - 1];
+        if (operation.op === 'remove') {
+            delete target[last];
+        } else {
+            target[last] = operation.value;
+        }
+    }
+    return document as Room;
+}
+
 class WebSocketService {
     private socket: WebSocket | null = null;
     private roomId: string | null = null;
@@ -11,6 +41,10 @@ class WebSocketService {
     private isReconnecting: boolean = false;
     private playerListUpdateTimeout: NodeJS.Timeout | null = null;
     private heartbeatInterval: NodeJS.Timeout | null = null;
+    private syncedRooms: Map<string, { version: number; room: Room }> = new Map();
+    // Set once the server accepts this socket's token; actions then stream over it instead of SSE
+    private actionsAvailable: boolean = false;
+    private actionStreams: Map<string, (event: ActionStreamEvent | null) => void> = new Map();
 
     setNextRoom(roomId: string) {
         console.log('[WebSocket] Setting next room:', roomId);
@@ -48,13 +82,21 @@ class WebSocketService {
                 return 'Bad gateway';
             case 1015:
                 return 'TLS handshake failed';
+            case ROOM_MOVED_CLOSE_CODE:
+                return 'Room moved to another server';
             default:
                 return `Connection closed with code ${code}`;
         }
     }
 
     private get url(): string {
-        return `${process.env.NEXT_PUBLIC_API_URL?.replace('http', 'ws')}/ws/${this.roomId}/${this.playerId}`;
+        return this.buildUrl(this.roomId, this.playerId);
+    }
+
+    private buildUrl(roomId: string | null, playerId: string | null): string {
+        // The room version we hold (0 if none) lets the server answer with a patch instead of the full room
+        const roomVersion = (roomId && this.syncedRooms.get(roomId)?.version) || 0;
+        return `${process.env.NEXT_PUBLIC_API_URL?.replace('http', 'ws')}/ws/${roomId}/${playerId}?room_version=${roomVersion}`;
     }
 
     connect(roomId: string, playerId: string) {
@@ -81,7 +123,7 @@ class WebSocketService {
         this.roomId = roomId;
         this.playerId = playerId;
 
-        const wsUrl = `${process.env.NEXT_PUBLIC_API_URL?.replace('http', 'ws')}/ws/${roomId}/${playerId}`;
+        const wsUrl = this.buildUrl(roomId, playerId);
         console.log('[WebSocket] Attempting connection to:', wsUrl);
 
         try {
@@ -109,6 +151,8 @@ class WebSocketService {
             this.socket.close();
             this.socket = null;
         }
+        // Actions already streaming keep going: their remaining events follow the player to the next socket
+        this.actionsAvailable = false;
         this.roomId = null;
         this.playerId = null;
         this.pendingRoomUpdate = null;
@@ -159,6 +203,12 @@ class WebSocketService {
             useGameStore.getState().setIsConnected(true);
             useGameStore.getState().setError(null);
 
+            // Authenticate once for the whole connection
+            const token = apiService.getToken();
+            if (token) {
+                this.socket?.send(JSON.stringify({ type: 'auth', token }));
+            }
+
             // Start heartbeat
             this.startHeartbeat();
 
@@ -180,6 +230,19 @@ class WebSocketService {
             };
             console.log('[WebSocket] Connection closed:', closeInfo);
 
+            if (event.code === ROOM_MOVED_CLOSE_CODE && event.target === this.socket && this.roomId && this.playerId) {
+                // Not an error: reconnect, and the router sends us to the server that owns the room now
+                const roomId = this.roomId;
+                const playerId = this.playerId;
+                useGameStore.getState().setIsConnected(false);
+                setTimeout(() => {
+                    if (this.roomId === roomId && this.playerId === playerId) {
+                        this.connect(roomId, playerId);
+                    }
+                }, ROOM_MOVED_RECONNECT_DELAY_MS);
+                return;
+            }
+
             // Provide more helpful error messages based on close code
             if (!event.wasClean) {
                 const errorMessage = this.getCloseCodeMessage(event.code);
@@ -236,6 +299,17 @@ class WebSocketService {
                 case 'pong':
                     console.log('[WebSocket] Received heartbeat pong');
                     break;
+                case 'auth_ok':
+                case 'auth_error':
+                    this.actionsAvailable = type === 'auth_ok' && !!data.actions;
+                    console.log('[WebSocket] Socket authentication:', { type, actionsAvailable: this.actionsAvailable });
+                    break;
+                case 'action_event':
+                    this.actionStreams.get(data.request_id)?.(data.event);
+                    break;
+                case 'action_done':
+                    this.actionStreams.get(data.request_id)?.(null);
+                    break;
                 case 'chat':
                     this.handleChatMessage(data);
                     break;
@@ -284,10 +358,17 @@ class WebSocketService {
                         roomId: data.room?.id,
                         title: data.room?.title,
                         hasImage: !!data.room?.image_url,
-                        imageStatus: data.room?.image_status
+                        imageStatus: data.room?.image_status,
+                        version: data.version
                     });
+                    if (typeof data.version === 'number' && data.room?.id) {
+                        this.rememberRoomState(data.room.id, data.version, data.room);
+                    }
                     this.handleRoomUpdate(data.room);
                     break;
+                case 'room_patch':
+                    this.handleRoomPatch(data);
+                    break;
                 case 'player_update':
                     this.handlePlayerUpdate(data.player);
                     break;
@@ -1057,6 +1138,101 @@ class WebSocketService {
 
 
 
+    /**
+     * Stream an action's events over this socket, or return null if the socket can't take
+     * actions (not open or not authenticated) and the caller should use the SSE endpoint.
+     */
+    streamAction(action: ActionRequest): AsyncGenerator<ActionStreamEvent> | null {
+        // Acting while a quest storyline is still arriving: have the server send the rest now
+        if (this.questStorylineTimer) {
+            this.fastForward('quest_storyline');
+        }
+        if (!this.socket || this.socket.readyState !== WebSocket.OPEN || !this.actionsAvailable) {
+            return null;
+        }
+
+        const requestId = crypto.randomUUID();
+        const events: (ActionStreamEvent | null)[] = [];
+        let wake: (() => void) | null = null;
+        this.actionStreams.set(requestId, (event) => {
+            events.push(event);
+            wake?.();
+            wake = null;
+        });
+        this.socket.send(JSON.stringify({
+            type: 'action',
+            request_id: requestId,
+            action: action.action,
+            room_id: action.room_id,
+            target: action.target
+        }));
+
+        const streams = this.actionStreams;
+        return (async function* () {
+            try {
+                while (true) {
+                    if (events.length === 0) {
+                        const arrived = await new Promise<boolean>((resolve) => {
+                            const timer = setTimeout(() => resolve(false), ACTION_EVENT_TIMEOUT_MS);
+                            wake = () => {
+                                clearTimeout(timer);
+                                resolve(true);
+                            };
+                        });
+                        if (!arrived) {
+                            yield { error: 'Action timed out' };
+                            return;
+                        }
+                    }
+                    const event = events.shift();
+                    if (!event) {
+                        return;
+                    }
+                    yield event;
+                }
+            } finally {
+                streams.delete(requestId);
+            }
+        })();
+    }
+
+    private rememberRoomState(roomId: string, version: number, room: Room) {
+        // Re-insert so the map stays in least recently synced order
+        this.syncedRooms.delete(roomId);
+        this.syncedRooms.set(roomId, { version, room: structuredClone(room) });
+        if (this.syncedRooms.size > MAX_SYNCED_ROOMS) {
+            const oldest = this.syncedRooms.keys().next().value;
+            if (oldest) {
+                this.syncedRooms.delete(oldest);
+            }
+        }
+    }
+
+    private handleRoomPatch(data: { room_id: string; base_version: number; version: number; patch: RoomPatchOperation[] }) {
+        const held = this.syncedRooms.get(data.room_id);
+        console.log('[WebSocket] Received room patch:', {
+            roomId: data.room_id,
+            baseVersion: data.base_version,
+            version: data.version,
+            operations: data.patch.length,
+            heldVersion: held?.version
+        });
+
+        if (!held || held.version !== data.base_version) {
+            // Out of sync: forget the room and reconnect so the server sends a full snapshot
+            console.warn('[WebSocket] Room patch does not apply to the held room state, resyncing');
+            this.syncedRooms.delete(data.room_id);
+            if (this.roomId && this.playerId) {
+                this.connect(this.roomId, this.playerId);
+            }
+            return;
+        }
+
+        const room = applyRoomPatch(structuredClone(held.room), data.patch);
+        this.rememberRoomState(data.room_id, data.version, room);
+        this.handleRoomUpdate(room);
+    }
+
     private handleRoomUpdate(room: Room) {
         const store = useGameStore.getState();
         console.log('[WebSocket] Received room update:', {
@@ -1309,6 +1485,15 @@ class WebSocketService {
         this.socket.send(JSON.stringify(chatMessage));
     }
 
+    /**
+     * Ask the server to send the rest of a scheduled sequence (e.g. 'quest_storyline') without
+     * its typewriter delay; with no name, every pending sequence on this socket is sped up.
+     */
+    fastForward(schedule?: string) {
+        if (!this.socket || this.socket.readyState !== WebSocket.OPEN) return;
+        this.socket.send(JSON.stringify({ type: 'fast_forward', schedule }));
+    }
+
     sendDuelChallenge(targetPlayerId: string) {
         if (!this.socket || !this.roomId || !this.playerId) {
             console.error('[WebSocket] Cannot send duel challenge - missing required data');
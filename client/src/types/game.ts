@@ -44,6 +44,13 @@ export interface Room {
     model_3d_status?: 'none' | 'pending' | 'generating' | 'ready' | 'error';
 }
 
+// One JSON patch (RFC 6902) operation from a room_patch message
+export interface RoomPatchOperation {
+    op: 'add' | 'remove' | 'replace';
+    path: string;
+    value?: unknown;
+}
+
 export interface Player {
     id: string;
     user_id: string;
@@ -73,6 +80,10 @@ export interface ActionRequest {
     target?: string;
 }
 
+// One event of an action stream (chunk, room_update, final, quest events), over SSE or the WebSocket
+// eslint-disable-next-line @typescript-eslint/no-explicit-any
+export type ActionStreamEvent = Record<string, any>;
+
 export interface ActionResponse {
     success: boolean;
     message: string;
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Requeue rooms left with image_status or model_3d_status "pending"/"generating"
+and no job behind them (e.g. after a restart), or requeue dead jobs by id.
+"""
+
+import sys
+import os
+import argparse
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.database import redis_client
+from app.job_queue import job_queue, DEAD_KEY
+from app.job_worker import requeue_stuck_rooms
+
+
+def list_dead_jobs():
+    job_ids = redis_client.zrange(DEAD_KEY, 0, -1)
+    if not job_ids:
+        print("No dead jobs")
+        return
+    print(f"\n=== Dead Jobs ({len(job_ids)}) ===\n")
+    for job_id in job_ids:
+        job = job_queue.get_status(job_id.decode('utf-8') if isinstance(job_id, bytes) else job_id)
+        if job:
+            print(f"{job['id']}  {job['kind']:<22} room={job['payload'].get('room_id')}  attempts={job['attempts']}  error={job['last_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Requeue stuck room image and 3D generation work')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Only list stuck rooms, do not enqueue anything')
+    parser.add_argument('--job', type=str,
+                       help='Requeue a single dead or stuck job by id')
+    parser.add_argument('--dead', action='store_true',
+                       help='List dead jobs')
+
+    args = parser.parse_args()
+
+    if args.dead:
+        list_dead_jobs()
+        return
+
+    if args.job:
+        if job_queue.requeue(args.job):
+            print(f"✅ Requeued job {args.job}")
+        else:
+            print(f"❌ Could not requeue job {args.job}")
+            sys.exit(1)
+        return
+
+    stuck = requeue_stuck_rooms(redis_client, dry_run=args.dry_run)
+    if not stuck:
+        print("✅ No stuck rooms found")
+        return
+    for entry in stuck:
+        suffix = f" -> {entry['job_id']}" if entry.get('job_id') else ""
+        print(f"{entry['room_id']}: {entry['kind']} (status {entry['status']}){suffix}")
+    verb = "Would requeue" if args.dry_run else "Requeued"
+    print(f"\n{verb} {len(stuck)} job(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,35 @@
-from openai import AsyncOpenAI
-from typing import Dict, List, Optional, Tuple, AsyncGenerator, Union
+from typing import Any, Dict, List, Optional, Tuple, Type, AsyncGenerator, Union
 import json
+import time
 from datetime import datetime
 from .config import settings
-from .models import Room, NPC, Player, GameState
+from pydantic import BaseModel
+from .models import (
+    Room, NPC, Player, GameState,
+    RoomDescriptionOutput, BiomeOutput, WorldSeedOutput, NPCInteractionOutput
+)
 import asyncio
 import logging
 from .logger import setup_logging
 import replicate
 import os
 from .image_storage import upload_image_to_supabase
+from .llm_scheduler import llm_scheduler
+from .context_builder import action_context_builder, count_tokens
+from .prompt_metrics import prompt_cache_metrics
+from .response_cache import response_cache
+from .llm_provider import create_llm_client
+from .structured_output import StructuredOutputError, parse_structured, response_format_for, structured_output_metrics
 
 # Configure logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client with native timeout support
-# The SDK handles timeout gracefully with proper defaults
-client = AsyncOpenAI(
-    api_key=settings.OPENAI_API_KEY,
-    timeout=60.0,  # 60 second timeout for all requests
-    max_retries=2  # SDK will retry failed requests up to 2 times
-)
+# Initialize the chat client for the configured provider (OpenAI by default)
+client = create_llm_client()
+
+# Chat model used for every text completion
+LLM_MODEL = "gpt-4.1-nano-2025-04-14"
 
 # Set up Replicate API token
 if settings.REPLICATE_API_TOKEN:
@@ -71,86 +79,305 @@ WORLD_CONFIG = {
     ]
 }
 
+# Static prompt prefixes, compiled once at import. Per-request data always goes
+# after these so the provider-side prompt cache can reuse the shared prefix.
+ROOM_DESCRIPTION_JSON_TEMPLATE = '''
+{
+    "title": "A short, evocative title",
+    "description": "A concise, creative, atmospheric description with randomly generated elements, including any buildings, structures, or other elements that fit the biome. (1-2 sentences max)",
+    "image_prompt": "A detailed prompt for image generation of this new room based on the context, surrounding rooms, structures in the room, biome, monsters, etc. It's important that it generally fits in with the biome. Be creative and make the room feel alive and immersive and fun and visually stunning. (3-4 sentences)"
+}
+'''
+
+ROOM_DESCRIPTION_SYSTEM_PROMPT = f"""You are a concise writer for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}. Always return clean JSON without comments. Focus only on essential details and remove all fluff. Avoid {", ".join(WORLD_CONFIG['avoid_themes'])} elements.
+
+Generate a concise room description and detailed image prompt for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']} from the context and style given by the user.
+
+CRITICAL: Keep descriptions to 1-2 sentences maximum. Focus only on the most important visual and atmospheric details. Remove all fluff and unnecessary elaboration.
+
+Return a JSON object with these exact fields:
+{ROOM_DESCRIPTION_JSON_TEMPLATE}"""
+
+NPC_INTERACTION_JSON_TEMPLATE = '''
+{
+    "response": "The NPC's engaging response (1-2 sentences). Be chatty, add personality, and make dialogue feel natural and immersive with direct quotes.",
+    "memory": "A brief memory to store about this interaction"
+}
+'''
+
+NPC_INTERACTION_SYSTEM_PROMPT = f"""You are an NPC in a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}. The user message describes who you are: your name, dialogue style, knowledge areas, backstory and mood. Be chatty and engaging! Use 1-2 punchy sentences to bring your personality to life. Include direct dialogue in quotes, character actions, and personality details. Make conversations feel natural and immersive. Stay in character and let your unique personality shine through. Always return clean JSON without any comments.
+
+IMPORTANT:
+- Be conversational and engaging - NPCs should feel alive and have personality!
+- Include actual dialogue in quotes when appropriate
+- Add personality flourishes, reactions, and character details
+- Reference previous conversation if relevant (see the conversation history in the request)
+
+DIALOGUE GUIDELINES:
+- Keep responses to 1-2 sentences but make them count!
+- Include direct speech in quotes (e.g., "Well now," she says with a grin, "...")
+- Add character actions and reactions (e.g., *adjusts their spectacles*, *leans in closer*)
+- Let the NPC's personality shine through their word choice and manner
+- Make conversations feel natural and immersive, not robotic
+- NPCs can ask questions back, express opinions, or share brief insights
+- Remember what was said earlier in the conversation and reference it naturally
+
+Return a JSON object with this exact structure:
+{NPC_INTERACTION_JSON_TEMPLATE}"""
+
+STREAM_ACTION_JSON_TEMPLATE = '''
+{
+    "updates": {
+        "player": {
+            "direction": "optional, possible values: north, south, east, west, up, down",
+            "inventory": ["item1", "item2"],
+            "memory_log": ["memory entry"]
+        },
+        "monster_interaction": {
+            "monster_id": "optional id of the target monster (if multiple present)",
+            "message": "the player's spoken message directed at the monster"
+        },
+        "combat": {
+            "monster_id": "optional id of the target monster (if multiple present)",
+            "action": "short natural-language summary of the intended attack"
+        },
+        "npcs": [
+            {
+                "id": "npc_id",
+                "name": "NPC Name",
+                "dialogue_history": [],
+                "memory_log": []
+            }
+        ],
+        "item_award": {
+            "type": "room_item",
+            "item_name": "EXACT name of the room item to award (must match room items list exactly)"
+        }
+    }
+}
+'''
+
+STREAM_ACTION_SYSTEM_PROMPT = "\n".join([
+    f"You are the game master of a multiplayer AI-powered {WORLD_CONFIG['game_type']} world. Keep all responses to exactly 1 short sentence. Be extremely concise and direct - focus only on the immediate action result. Remove all fluff and extra description. Be generous with item generation - when players grab/take anything, turn it into an item. Make the world feel alive and fun.",
+    "",
+    "BASIC MOVE VALIDATION:",
+    "- If the player attempts an action requiring equipment they don't have, explain why it fails",
+    "- Basic physical actions (punch, kick, dodge, block, etc.) are always valid",
+    "- Equipment-based actions (slash, shoot, cast spells) require appropriate items in the player's inventory",
+    "- If unsure about equipment requirements, err on the side of allowing the action",
+    "- Keep validation explanations brief and helpful",
+    "",
+    "CRITICAL RULES FOR CONCISE RESPONSES:",
+    "1. Keep narrative responses to 2-4 sentences maximum",
+    "2. Focus only on the most important details of what happens",
+    "3. Remove all fluff, unnecessary elaboration, and flowery language",
+    "4. For movement: Describe only the essential transition and arrival",
+    "5. For actions: Focus on the immediate result and key details only",
+    "6. You handle ONLY narrative responses and simple state changes",
+    "",
+    "MOVEMENT INTENT POLICY (CRITICAL):",
+    " If the player clearly intends to move in a direction (north/south/east/west/up/down):",
+    "  - Set updates.player.direction to one of: north, south, east, west, up, down.",
+    "  - Keep narrative concise and focused on the movement/arrival; do not include extra exposition.",
+    "  - Do NOT modify room state directly; the server handles movement and room updates.",
+    "",
+    "NPC DIALOGUE GUIDELINES:",
+    " If the player clearly speaks to an NPC (e.g., greets them, asks them something, tries to converse):",
+    "  - Describe the player's attempt to communicate with the NPC in your narrative response",
+    "  - The NPC will respond with 1-2 punchy, engaging sentences based on their personality and knowledge",
+    "  - NPCs are chatty and personable - they have opinions and unique ways of speaking",
+    "  - NPCs will include direct dialogue in quotes and show character through their responses",
+    "  - Players can ask NPCs about quests, local knowledge, or just chat - NPCs will respond enthusiastically",
+    "  - Example: player says 'talk to the merchant' → 'You approach the merchant, who looks up from their wares with a welcoming smile'",
+    "",
+    f"{WORLD_CONFIG['creature_term'].upper()} DIALOGUE GUIDELINES:",
+    f" If the player clearly speaks to a {WORLD_CONFIG['creature_term'][:-1]} (e.g., addresses it, asks it something, tries to converse):",
+    "  - Set updates.monster_interaction with the player's spoken message and the target monster_id (if multiple present).",
+    "  - Enemies should talk back to player with intelligence according to their data",
+    f"  - For rooms with exactly one {WORLD_CONFIG['creature_term'][:-1]}, you may omit monster_id; the server will resolve it.",
+    f"  - Keep the narrative response concise; the server will produce the {WORLD_CONFIG['creature_term'][:-1]}'s actual reply.",
+    "",
+    "COMBAT INTENT POLICY (CRITICAL):",
+    f" If the player clearly intends to fight/attack/engage a {WORLD_CONFIG['creature_term'][:-1]}:",
+    f"  - Set updates.combat with the target monster_id (omit if exactly one {WORLD_CONFIG['creature_term'][:-1]} present) and a short action summary.",
+    "  - Do NOT simulate the duel outcome here; the server will initiate combat and handle resolution.",
+    "  - Keep the narrative to the immediate pre-fight moment (no long analyses).",
+    "",
+    "ITEM COMBINATION POLICY (CRITICAL):",
+    " If the player clearly intends to craft/combine 2 or more items:",
+    "  - Set updates.item_combination with the item_ids array and optional combination_description.",
+    "  - The server will handle the actual item combination and creation.",
+    "  - Keep the narrative focused on the crafting process and intent.",
+    "",
+    "ITEM AVAILABILITY AND REWARD POLICY (CRITICAL):",
+    "- Use context.item_availability to understand what items are available in this room:",
+    "  * has_three_star_item: true/false - room has a special rare item",
+    "  * two_star_items_available: number - how many normal items remain",
+    "  * one_star_items_always_available: always true - basic junk items",
+    "- Players can always grab basic environmental objects (rocks, sticks, etc.) for 1-star items",
+    "",
+    "- **OBSERVATION ACTIONS** (look, examine, search, etc.):",
+    "  * Think about how broad the players search is. Are they getting a general survey of the land? Are they investigating a specific point of interest? The amount of information you reveal will depend on this",
+    "  * NPCs, monsters, and items exist in the room, but do not reference them directly as 'NPCs' or 'items'",
+    "  * The rooms are big, the player cannot see everything at once. If the player doesn't specify a specific search, assume they are searching broadly and just give them an overview of the area. Do not give details like specific items and medium - small sized creatures in broad searches, only give those details in specific searches",
+    "  * For NPCs: ALWAYS mention them in broad searches since they are people standing in the room. Describe them naturally by their appearance/activity",
+    "  * For example if they just say look around, describe the room very broadly, like what the scenery looks like, any NPCs present, and maybe some big monsters in the room",
+    "  * Do not give precise details for broad inspection, instead give points of interest for the player to specifically search",
+    "  * Compare the size of details to size of search. A broad search would reveal overall description of the land, NPCs present, and maybe some big creatures standing out. A specific search would reveal specific items and smaller creatures to the player",
+    "  * Use the chat logs, make sure that the player eventually knows about all of the NPCs, items and monsters",
+    "  * For example: player says 'look around' -> 'You see large trees and mountains in the back. A grizzled merchant stands near a wooden cart, sorting through wares. A large dragon is flying around to your left'",
+    "  * For example: player says 'investigate the trees' -> 'You see a rusty sword leaning against the tree. You also spot a small animal watching you from the distance'",
+    "  * Describe the room based off the biome and room name",
+    "  * DESCRIBE the specific room items NOT by their actual names and instead JUST their descriptions",
+    "  * DO NOT say 'no items besides the one listed' or reference game data",
+    "  * DO NOT directly refer to items as items or NPCs as NPCs, integrate them naturally into the scene. keep the immersion",
+    "  * Do NOT include item_award for observation actions",
+    "  * ONLY reward items if the player explicitly tries to grab them",
+    "  * DO NOT LIST OUT ALL OF THE ITEMS AND / OR MONSTERS IN THE ROOM"
+    "",
+    "- **UNIFIED ITEM AWARD SYSTEM - CRITICAL INSTRUCTIONS:**",
+    "  * ANALYZE player intent to determine what item they want",
+    "  * If player says 'grab sword' and there's only one sword-type item → award that room item",
+    "  * If player says 'take the crystal' and there's a 'Crystal Shard' → award that room item",
+    "  * If player says 'grab a rock' → generate a basic environmental item",
+    "  * Use your intelligence to match player intent to available room items",
+    "",
+    "- **TO AWARD A ROOM ITEM (CRITICAL - MUST DO THIS):**",
+    "  * When player grabs a room item, you MUST include item_award in your JSON",
+    "  * Set updates.item_award.type to \"room_item\"",
+    "  * Set updates.item_award.item_name to the EXACT name from the room items list",
+    "  * Example: if room has '★★★ Sword of Blossoming Dawn' and player says 'grab sword'",
+    "  * Set: \"item_award\": {\"type\": \"room_item\", \"item_name\": \"Sword of Blossoming Dawn\"}",
+    "  * WITHOUT this, the player will NOT receive the item!",
+    "",
+    "- **TO GENERATE A BASIC ENVIRONMENTAL ITEM:**",
+    "  * When player grabs basic environmental objects (rock, stick, branch, leaf, etc.)",
+    "  * AND verigiy if the object is reasonable to find in the current environment. If it isn't then do not award the player the item",
+    "  * Set updates.item_award.type to \"generate_item\"",
+    "  * Optionally set updates.item_award.rarity to 1 (defaults to 1 if not specified)",
+    "  * Example: player says 'grab a rock'",
+    "  * Set: \"item_award\": {\"type\": \"generate_item\", \"rarity\": 1}",
+    "",
+    "- **IF ITEM DOESN'T EXIST:**",
+    "  * Tell player the item is not there",
+    "  * Do NOT include item_award in updates",
+    "  * Example: 'grab golden crown' but no crown → 'You don't see any golden crown here'",
+    "",
+    "UNIFIED ITEM AWARD SYSTEM:",
+    "- **For room items**: {\"type\": \"room_item\", \"item_name\": \"Exact Item Name\"}",
+    "- **For generated items**: {\"type\": \"generate_item\", \"rarity\": 1}",
+    "- **For no item**: Don't include item_award at all",
+    "- Focus on analyzing player intent and matching to available room items",
+    "- Be intelligent about matching: 'sword' could match 'Blade of Storms', 'crystal' could match 'Crystal Shard'",
+    "- CRITICAL: Match player descriptions to item descriptions, not just names!",
+    "- Example: 'dark pendant' should match 'Cinderthorn Amulet' because it's described as 'dark, ash-encrusted pendant'",
+    "",
+    "CRITICAL JSON RULES:",
+    "- item_award.type must be either \"room_item\" or \"generate_item\"",
+    "- All JSON must be valid and properly formatted",
+    "- Do not include any comments or extra text in the JSON",
+    "- Only include the updates object if there are actual updates to make",
+    "",
+    "IMPORTANT: Your response MUST follow this EXACT format:",
+    "1. First, write a concise narrative response (1-2 sentences max).",
+    "2. Then, add TWO newlines.",
+    "3. Finally, provide a JSON object with this exact structure:",
+    STREAM_ACTION_JSON_TEMPLATE,
+    "",
+    "**CRITICAL: ALWAYS include the reward_item field in your JSON response!**",
+    "**CRITICAL: Room items → item_award.item_name + deserves_item=false!**",
+    "**CRITICAL: Basic environmental items → deserves_item=true (no item_award)!**",
+    "",
+    "Only include fields in updates that need to be changed. The updates object is optional.",
+    "Do not include any comments in the JSON.",
+    "",
+    "CRITICAL - NEVER DO THIS:",
+    "❌ BAD: 'You see no new items besides the one already listed in the room'",
+    "❌ BAD: 'There are no additional items besides what's listed'", 
+    "❌ BAD: 'No items besides the item already in the room'",
+    "❌ BAD: Describing items that aren't in the room items list (like 'a small pouch')",
+    "❌ BAD: Making up items that don't exist in the room",
+    "❌ BAD: {\"item_award\": {\"item_name\": \"Item\"}} ← MISSING type field!",
+    "❌ BAD: {\"item_award\": {\"type\": \"wrong_type\"}} ← type must be room_item or generate_item!",
+    "✅ GOOD: Only describe the exact items from the ROOM ITEMS list in the request",
+    "✅ GOOD: {\"item_award\": {\"type\": \"room_item\", \"item_name\": \"Item Name\"}}",
+    "✅ GOOD: {\"item_award\": {\"type\": \"generate_item\", \"rarity\": 1}}",
+    "",
+    "FINAL REMINDERS:",
+    "- **Room items**: Use {\"type\": \"room_item\", \"item_name\": \"Exact Name\"}",
+    "- **Basic environmental items**: Use {\"type\": \"generate_item\", \"rarity\": 1}",
+    "- **Non-existent items**: Tell player it's not there, no item_award",
+    "- **Always describe items by their actual names, never reference game data**"
+])
+
 class AIHandler:
     @staticmethod
     async def generate_room_description(
         context: Dict[str, any],
-        style: str = None
+        style: str = None,
+        background: bool = False
     ) -> Tuple[str, str, str]:
         """Generate a room title and description"""
         if style is None:
             style = f"{WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']}"
 
-        json_template = '''
-{
-    "title": "A short, evocative title",
-    "description": "A concise, creative, atmospheric description with randomly generated elements, including any buildings, structures, or other elements that fit the biome. (1-2 sentences max)",
-    "image_prompt": "A detailed prompt for image generation of this new room based on the context, surrounding rooms, structures in the room, biome, monsters, etc. It's important that it generally fits in with the biome. Be creative and make the room feel alive and immersive and fun and visually stunning. (3-4 sentences)"
-}
-'''
         # Check if monsters will be present in the room
         monsters_info = ""
         monster_count = context.get("monster_count", 0)
         if monster_count > 0:
             monsters_info = f"\nMonsters: {monster_count} {WORLD_CONFIG['creature_term']} will inhabit this area. Show them as exactly {monster_count} hidden shadowy and non-descript {WORLD_CONFIG['creature_term']}. Don't make them look like human figures."
 
-        avoid_themes_str = ", ".join(WORLD_CONFIG['avoid_themes'])
-
-        prompt = f"""Generate a concise room description and detailed image prompt for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}.
-        Context: {json.dumps(context)}
-        Style: {style}
-        {monsters_info}
-
-        CRITICAL: Keep descriptions to 1-2 sentences maximum. Focus only on the most important visual and atmospheric details. Remove all fluff and unnecessary elaboration.
-
-        Return a JSON object with these exact fields:
-        {json_template}
-        """
+        prompt = f"""Context: {json.dumps(context)}
+Style: {style}{monsters_info}
+"""
 
         logger.debug(f"[Room Description] Sending prompt to OpenAI: {prompt}")
         try:
-            response = await client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",
-                messages=[
-                    {"role": "system", "content": f"You are a concise writer for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}. Always return clean JSON without comments. Focus only on essential details and remove all fluff. Avoid {avoid_themes_str} elements."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
+            result = await AIHandler.generate_structured(
+                prompt,
+                RoomDescriptionOutput,
+                call_site="generate_room_description",
+                system_prompt=ROOM_DESCRIPTION_SYSTEM_PROMPT,
+                background=background
             )
-
-            content = response.choices[0].message.content
-            logger.debug(f"[Room Description] Received response from OpenAI: {content}")
-
-            # Retry mechanism for JSON parsing
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    result = json.loads(content)
-                    return result["title"], result["description"], result["image_prompt"]
-                except json.JSONDecodeError as e:
-                    logger.warning(f"[Room Description] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        # Final attempt failed, raise the error
-                        logger.error(f"[Room Description] All {max_retries} attempts failed, raising error")
-                        raise
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
-                except Exception as e:
-                    logger.error(f"[Room Description] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        # Final attempt failed, raise the error
-                        logger.error(f"[Room Description] All {max_retries} attempts failed due to unexpected error, raising error")
-                        raise
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
+            logger.debug(f"[Room Description] Received response from OpenAI: {result}")
+            return result["title"], result["description"], result["image_prompt"]
         except Exception as e:
             logger.error(f"[Room Description] Error generating room description: {str(e)}")
             raise
 
+    @staticmethod
+    async def patch_room_for_continuity(
+        bundle: Dict[str, Any],
+        previous_room: Optional[Dict[str, Any]],
+        direction: Optional[str]
+    ) -> Tuple[str, str, str]:
+        """Lightly rewrite a pooled room so it follows on from the room the player came from"""
+        if not previous_room or not direction:
+            return bundle["title"], bundle["description"], bundle["image_prompt"]
+
+        # A pre-generated image already matches the pooled prompt, so keep the prompt as-is
+        keep_image_prompt = bool(bundle.get("image_url"))
+        prompt = f"""The player travels {direction} from "{previous_room.get('title', '')}": {previous_room.get('description', '')}
+They arrive in this already written room:
+{json.dumps({"title": bundle["title"], "description": bundle["description"], "image_prompt": bundle["image_prompt"]})}
+Minimally edit the title and description so the transition from the previous room feels natural. Keep the same place, features and creature count.{" Return the image_prompt unchanged." if keep_image_prompt else " Adjust the image_prompt only if the description changes what is visible."}
+"""
+        try:
+            result = await AIHandler.generate_structured(
+                prompt,
+                RoomDescriptionOutput,
+                call_site="room_pool_patch",
+                system_prompt=ROOM_DESCRIPTION_SYSTEM_PROMPT,
+                temperature=0.4
+            )
+        except Exception as e:
+            logger.warning(f"[Room Pool] Continuity patch failed, using pooled room as-is: {str(e)}")
+            return bundle["title"], bundle["description"], bundle["image_prompt"]
+
+        image_prompt = bundle["image_prompt"] if keep_image_prompt else result["image_prompt"]
+        return result["title"], result["description"], image_prompt
+
     @staticmethod
     async def generate_room_image(prompt: str, room_id: Optional[str] = None) -> str:
         """Generate an image for a room using the configured provider and upload to Supabase"""
@@ -268,6 +495,38 @@ class AIHandler:
                     # Last attempt failed
                     raise
 
+    @staticmethod
+    async def generate_room_image_variation(prompt: str, source_url: str, room_id: str) -> str:
+        """Redraw an existing room image towards a new prompt (img2img) and upload it to Supabase"""
+        if not settings.IMAGE_GENERATION_ENABLED or settings.IMAGE_PROVIDER != "replicate":
+            # Only Replicate offers a cheap img2img model; the room keeps the reused image
+            return ""
+
+        try:
+            os.environ["REPLICATE_API_TOKEN"] = settings.REPLICATE_API_TOKEN
+            enhanced_prompt = f"A detailed, {WORLD_CONFIG['visual_style']}, high quality, {WORLD_CONFIG['architecture_style']}: {prompt}"
+            output = await asyncio.to_thread(
+                replicate.run,
+                settings.IMAGE_VARIATION_MODEL,
+                input={
+                    "prompt": enhanced_prompt,
+                    "image": source_url,
+                    "prompt_strength": settings.IMAGE_VARIATION_STRENGTH,
+                    "output_format": "png",
+                    "go_fast": True
+                }
+            )
+            if isinstance(output, list):
+                output = output[0] if output else None
+            if not output:
+                raise ValueError("No image URL received from Replicate")
+            temp_url = output.url if hasattr(output, 'url') else str(output)
+            logger.info(f"[Replicate] Generated image variation for room {room_id}: {temp_url}")
+            return await upload_image_to_supabase(temp_url, room_id) or temp_url
+        except Exception as e:
+            logger.error(f"[Replicate] Error generating image variation for room {room_id}: {str(e)}")
+            return ""
+
     @staticmethod
     async def _generate_image_openai(prompt: str) -> str:
         """Generate an image using OpenAI DALL-E"""
@@ -318,41 +577,27 @@ class AIHandler:
         chat_history: Optional[List[Dict[str, any]]] = None
     ) -> AsyncGenerator[Union[str, Dict[str, any]], None]:
         """Process a player's action using the LLM with streaming"""
-        # Load actual room items for AI context
+        # Load actual room items for AI context (cached per room while its item list is unchanged)
         room_items = []
-        logger.info(f"[AI Context] Room has {len(room.items)} items: {room.items}")
+        logger.debug(f"[AI Context] Room has {len(room.items)} items: {room.items}")
         if room.items:
             from .hybrid_database import HybridDatabase as Database
-            db = Database()
-            for item_id in room.items:
+            for item_data in await action_context_builder.load_room_items(room, Database()):
+                # Filter out quest items not assigned to this player
                 try:
-                    item_data = await db.get_item(item_id)
-                    if item_data:
-                        # Filter out quest items not assigned to this player
-                        try:
-                            props = (item_data.get('properties') or {})
-                            quest_flag = props.get('quest_item')
-                            is_quest_item = quest_flag in ['True', 'true', True]
-                            spawned_for = props.get('spawned_for_player_id')
-                            if is_quest_item and spawned_for and spawned_for != player.id:
-                                logger.info(f"[AI Context] Skipping quest item not for player: {item_data.get('name', 'Unknown')} (owner {spawned_for}, player {player.id})")
-                                continue
-                        except Exception:
-                            pass
-
-                        logger.info(f"[AI Context] Loaded room item: {item_data.get('name', 'Unknown')} (ID: {item_id})")
-                        room_items.append(item_data)
-                    else:
-                        logger.warning(f"[AI Context] Room item {item_id} not found in database!")
-                except Exception as e:
-                    logger.warning(f"[AI Context] Failed to load room item {item_id}: {str(e)}")
+                    props = (item_data.get('properties') or {})
+                    quest_flag = props.get('quest_item')
+                    is_quest_item = quest_flag in ['True', 'true', True]
+                    spawned_for = props.get('spawned_for_player_id')
+                    if is_quest_item and spawned_for and spawned_for != player.id:
+                        logger.debug(f"[AI Context] Skipping quest item not for player: {item_data.get('name', 'Unknown')} (owner {spawned_for}, player {player.id})")
+                        continue
+                except Exception:
+                    pass
+                room_items.append(item_data)
         
         logger.info(f"[AI Context] Final room_items for AI: {[item.get('name', 'Unknown') for item in room_items]}")
         
-        # Debug: Log the full room items data
-        for item in room_items:
-            logger.info(f"[AI Context] Room item details: {item}")
-        
         # Calculate item availability dynamically from actual room items
         has_three_star = any(item.get('rarity') == 3 for item in room_items)
         two_star_count = sum(1 for item in room_items if item.get('rarity') == 2)
@@ -363,76 +608,26 @@ class AIHandler:
             "one_star_items_always_available": True
         }
         
-        # Debug: Log the full context being sent to AI
-        logger.info(f"[AI Context] Sending context to AI with {len(room_items)} room items")
-        
-        context = {
-            "player": player.dict(),
-            "room": room.dict(),
-            "game_state": game_state.dict(),
-            "npcs": [npc.dict() for npc in npcs],
-            "monsters": monsters or [],
-            "room_items": room_items,  # Include actual room items
-            "action": action,
-            "timestamp": datetime.utcnow().isoformat(),
-            "item_availability": item_availability
-        }
+        # Project only the fields the game master needs and fit them in the token budget
+        context, context_tokens = action_context_builder.build(
+            action=action,
+            player=player,
+            room=room,
+            game_state=game_state,
+            npcs=npcs,
+            monsters=monsters,
+            room_items=room_items,
+            item_availability=item_availability,
+            chat_history=chat_history
+        )
 
-        # Include recent player messages (last 20 messages, newest first) for continuity
-        if chat_history:
-            try:
-                safe_chat = []
-                for m in chat_history[:20]:
-                    # Sanitize and keep only relevant fields
-                    safe_chat.append({
-                        "player_id": m.get("player_id"),
-                        "message_type": m.get("message_type"),
-                        "message": m.get("message"),
-                        "timestamp": m.get("timestamp")
-                    })
-                context["recent_chat"] = safe_chat
-            except Exception as e:
-                logger.warning(f"[Stream Action] Failed to include recent chat: {str(e)}")
-
-        json_template = '''
-{
-    "response": "Copy of the narrative response above",
-    "updates": {
-        "player": {
-            "direction": "optional, possible values: north, south, east, west, up, down",
-            "inventory": ["item1", "item2"],
-            "memory_log": ["memory entry"]
-        },
-        "monster_interaction": {
-            "monster_id": "optional id of the target monster (if multiple present)",
-            "message": "the player's spoken message directed at the monster"
-        },
-        "combat": {
-            "monster_id": "optional id of the target monster (if multiple present)",
-            "action": "short natural-language summary of the intended attack"
-        },
-        "npcs": [
-            {
-                "id": "npc_id",
-                "name": "NPC Name",
-                "dialogue_history": [],
-                "memory_log": []
-            }
-        ],
-        "item_award": {
-            "type": "room_item",
-            "item_name": "EXACT name of the room item to award (must match room items list exactly)"
-        }
-    }
-}
-'''
 
         # Build the prompt without nested f-strings to avoid syntax errors
         prompt_parts = [
             f"Process this player action in a multiplayer AI-powered {WORLD_CONFIG['game_type']} world.",
             f"Context: {json.dumps(context)}",
             "",
-            "Use the last 20 player messages in context.recent_chat (newest first) for continuity. Only reference them if relevant to the current action; do not restate them verbatim. The current state of the player and the room is provided in the context too.",
+            "Use the recent player messages in context.recent_chat (newest first) for continuity. Only reference them if relevant to the current action; do not restate them verbatim. The current state of the player and the room is provided in the context too.",
             "",
         ]
 
@@ -469,65 +664,17 @@ class AIHandler:
                 prompt_parts.append(creature_desc)
         
         prompt_parts.extend([
-            "",
-            "BASIC MOVE VALIDATION:",
-            "- If the player attempts an action requiring equipment they don't have, explain why it fails",
-            "- Basic physical actions (punch, kick, dodge, block, etc.) are always valid",
-            "- Equipment-based actions (slash, shoot, cast spells) require appropriate items in the player's inventory",
-            "- If unsure about equipment requirements, err on the side of allowing the action",
-            "- Keep validation explanations brief and helpful",
-            "",
-            "CRITICAL RULES FOR CONCISE RESPONSES:",
-            "1. Keep narrative responses to 2-4 sentences maximum",
-            "2. Focus only on the most important details of what happens",
-            "3. Remove all fluff, unnecessary elaboration, and flowery language",
-            "4. For movement: Describe only the essential transition and arrival",
-            "5. For actions: Focus on the immediate result and key details only",
-            "6. You handle ONLY narrative responses and simple state changes",
-            "",
-            "MOVEMENT INTENT POLICY (CRITICAL):",
-            " If the player clearly intends to move in a direction (north/south/east/west/up/down):",
-            "  - Set updates.player.direction to one of: north, south, east, west, up, down.",
-            "  - Keep narrative concise and focused on the movement/arrival; do not include extra exposition.",
-            "  - Do NOT modify room state directly; the server handles movement and room updates.",
-            "",
-            "NPC DIALOGUE GUIDELINES:",
-            " If the player clearly speaks to an NPC (e.g., greets them, asks them something, tries to converse):",
-            "  - Describe the player's attempt to communicate with the NPC in your narrative response",
-            "  - The NPC will respond with 1-2 punchy, engaging sentences based on their personality and knowledge",
-            "  - NPCs are chatty and personable - they have opinions and unique ways of speaking",
-            "  - NPCs will include direct dialogue in quotes and show character through their responses",
-            "  - Players can ask NPCs about quests, local knowledge, or just chat - NPCs will respond enthusiastically",
-            "  - Example: player says 'talk to the merchant' → 'You approach the merchant, who looks up from their wares with a welcoming smile'",
-            "",
-            f"{WORLD_CONFIG['creature_term'].upper()} DIALOGUE GUIDELINES:",
-            f" If the player clearly speaks to a {WORLD_CONFIG['creature_term'][:-1]} (e.g., addresses it, asks it something, tries to converse):",
-            "  - Set updates.monster_interaction with the player's spoken message and the target monster_id (if multiple present).",
-            "  - Enemies should talk back to player with intelligence according to their data",
-            f"  - For rooms with exactly one {WORLD_CONFIG['creature_term'][:-1]}, you may omit monster_id; the server will resolve it.",
-            f"  - Keep the narrative response concise; the server will produce the {WORLD_CONFIG['creature_term'][:-1]}'s actual reply.",
-            "",
-            "COMBAT INTENT POLICY (CRITICAL):",
-            f" If the player clearly intends to fight/attack/engage a {WORLD_CONFIG['creature_term'][:-1]}:",
-            f"  - Set updates.combat with the target monster_id (omit if exactly one {WORLD_CONFIG['creature_term'][:-1]} present) and a short action summary.",
-            "  - Do NOT simulate the duel outcome here; the server will initiate combat and handle resolution.",
-            "  - Keep the narrative to the immediate pre-fight moment (no long analyses).",
-            "",
-            "ITEM COMBINATION POLICY (CRITICAL):",
-            " If the player clearly intends to craft/combine 2 or more items:",
-            "  - Set updates.item_combination with the item_ids array and optional combination_description.",
-            "  - The server will handle the actual item combination and creation.",
-            "  - Keep the narrative focused on the crafting process and intent.",
             "",
             "ROOM ITEMS:",
             "- The following items are available in this room:",
         ])
         
         # Add actual room items to the prompt
-        if context.get("room_items"):
-            for item in context["room_items"]:
+        # (the projected context omits item descriptions, so read them from the loaded documents)
+        if room_items:
+            for item in room_items:
                 rarity_stars = "★" * item.get('rarity', 1) + "☆" * (4 - item.get('rarity', 1))
-                prompt_parts.append(f"  * {rarity_stars} {item['name']}: {item['description']}")
+                prompt_parts.append(f"  * {rarity_stars} {item.get('name', 'Unknown')}: {item.get('description', '')}")
             prompt_parts.append("")
             prompt_parts.append("NOTE: These items exist in the room. Describe them naturally when relevant to the player's action.")
         else:
@@ -535,124 +682,26 @@ class AIHandler:
             prompt_parts.append("")
             prompt_parts.append("NOTE: This room has no pre-existing items. Only describe basic environmental objects when relevant.")
         
-        prompt_parts.extend([
-            "ITEM AVAILABILITY AND REWARD POLICY (CRITICAL):",
-            "- Use context.item_availability to understand what items are available in this room:",
-            "  * has_three_star_item: true/false - room has a special rare item",
-            "  * two_star_items_available: number - how many normal items remain",
-            "  * one_star_items_always_available: always true - basic junk items",
-            "- Players can always grab basic environmental objects (rocks, sticks, etc.) for 1-star items",
-            "",
-            "- **OBSERVATION ACTIONS** (look, examine, search, etc.):",
-            "  * Think about how broad the players search is. Are they getting a general survey of the land? Are they investigating a specific point of interest? The amount of information you reveal will depend on this",
-            "  * NPCs, monsters, and items exist in the room, but do not reference them directly as 'NPCs' or 'items'",
-            "  * The rooms are big, the player cannot see everything at once. If the player doesn't specify a specific search, assume they are searching broadly and just give them an overview of the area. Do not give details like specific items and medium - small sized creatures in broad searches, only give those details in specific searches",
-            "  * For NPCs: ALWAYS mention them in broad searches since they are people standing in the room. Describe them naturally by their appearance/activity",
-            "  * For example if they just say look around, describe the room very broadly, like what the scenery looks like, any NPCs present, and maybe some big monsters in the room",
-            "  * Do not give precise details for broad inspection, instead give points of interest for the player to specifically search",
-            "  * Compare the size of details to size of search. A broad search would reveal overall description of the land, NPCs present, and maybe some big creatures standing out. A specific search would reveal specific items and smaller creatures to the player",
-            "  * Use the chat logs, make sure that the player eventually knows about all of the NPCs, items and monsters",
-            "  * For example: player says 'look around' -> 'You see large trees and mountains in the back. A grizzled merchant stands near a wooden cart, sorting through wares. A large dragon is flying around to your left'",
-            "  * For example: player says 'investigate the trees' -> 'You see a rusty sword leaning against the tree. You also spot a small animal watching you from the distance'",
-            "  * Describe the room based off the biome and room name",
-            "  * DESCRIBE the specific room items NOT by their actual names and instead JUST their descriptions",
-            "  * DO NOT say 'no items besides the one listed' or reference game data",
-            "  * DO NOT directly refer to items as items or NPCs as NPCs, integrate them naturally into the scene. keep the immersion",
-            "  * Do NOT include item_award for observation actions",
-            "  * ONLY reward items if the player explicitly tries to grab them",
-            "  * DO NOT LIST OUT ALL OF THE ITEMS AND / OR MONSTERS IN THE ROOM"
-            "",
-            "- **UNIFIED ITEM AWARD SYSTEM - CRITICAL INSTRUCTIONS:**",
-            "  * ANALYZE player intent to determine what item they want",
-            "  * If player says 'grab sword' and there's only one sword-type item → award that room item",
-            "  * If player says 'take the crystal' and there's a 'Crystal Shard' → award that room item",
-            "  * If player says 'grab a rock' → generate a basic environmental item",
-            "  * Use your intelligence to match player intent to available room items",
-            "",
-            "- **TO AWARD A ROOM ITEM (CRITICAL - MUST DO THIS):**",
-            "  * When player grabs a room item, you MUST include item_award in your JSON",
-            "  * Set updates.item_award.type to \"room_item\"",
-            "  * Set updates.item_award.item_name to the EXACT name from the room items list",
-            "  * Example: if room has '★★★ Sword of Blossoming Dawn' and player says 'grab sword'",
-            "  * Set: \"item_award\": {\"type\": \"room_item\", \"item_name\": \"Sword of Blossoming Dawn\"}",
-            "  * WITHOUT this, the player will NOT receive the item!",
-            "",
-            "- **TO GENERATE A BASIC ENVIRONMENTAL ITEM:**",
-            "  * When player grabs basic environmental objects (rock, stick, branch, leaf, etc.)",
-            "  * AND verigiy if the object is reasonable to find in the current environment. If it isn't then do not award the player the item",
-            "  * Set updates.item_award.type to \"generate_item\"",
-            "  * Optionally set updates.item_award.rarity to 1 (defaults to 1 if not specified)",
-            "  * Example: player says 'grab a rock'",
-            "  * Set: \"item_award\": {\"type\": \"generate_item\", \"rarity\": 1}",
-            "",
-            "- **IF ITEM DOESN'T EXIST:**",
-            "  * Tell player the item is not there",
-            "  * Do NOT include item_award in updates",
-            "  * Example: 'grab golden crown' but no crown → 'You don't see any golden crown here'",
-            "",
-            "UNIFIED ITEM AWARD SYSTEM:",
-            "- **For room items**: {\"type\": \"room_item\", \"item_name\": \"Exact Item Name\"}",
-            "- **For generated items**: {\"type\": \"generate_item\", \"rarity\": 1}",
-            "- **For no item**: Don't include item_award at all",
-            "- Focus on analyzing player intent and matching to available room items",
-            "- Be intelligent about matching: 'sword' could match 'Blade of Storms', 'crystal' could match 'Crystal Shard'",
-            "- CRITICAL: Match player descriptions to item descriptions, not just names!",
-            "- Example: 'dark pendant' should match 'Cinderthorn Amulet' because it's described as 'dark, ash-encrusted pendant'",
-            "",
-            "CRITICAL JSON RULES:",
-            "- item_award.type must be either \"room_item\" or \"generate_item\"",
-            "- All JSON must be valid and properly formatted",
-            "- Do not include any comments or extra text in the JSON",
-            "- Only include the updates object if there are actual updates to make",
-            "",
-            "IMPORTANT: Your response MUST follow this EXACT format:",
-            "1. First, write a concise narrative response (1-2 sentences max).",
-            "2. Then, add TWO newlines.",
-            "3. Finally, provide a JSON object with this exact structure:",
-            json_template,
-            "",
-            "**CRITICAL: ALWAYS include the reward_item field in your JSON response!**",
-            "**CRITICAL: Room items → item_award.item_name + deserves_item=false!**",
-            "**CRITICAL: Basic environmental items → deserves_item=true (no item_award)!**",
-            "",
-            "Only include fields in updates that need to be changed. The updates object is optional.",
-            "Do not include any comments in the JSON.",
-            "",
-            "CRITICAL - NEVER DO THIS:",
-            "❌ BAD: 'You see no new items besides the one already listed in the room'",
-            "❌ BAD: 'There are no additional items besides what's listed'", 
-            "❌ BAD: 'No items besides the item already in the room'",
-            "❌ BAD: Describing items that aren't in the room items list (like 'a small pouch')",
-            "❌ BAD: Making up items that don't exist in the room",
-            "❌ BAD: {\"item_award\": {\"item_name\": \"Item\"}} ← MISSING type field!",
-            "❌ BAD: {\"item_award\": {\"type\": \"wrong_type\"}} ← type must be room_item or generate_item!",
-            "✅ GOOD: Only describe the exact items from the room items list above",
-            "✅ GOOD: {\"item_award\": {\"type\": \"room_item\", \"item_name\": \"Item Name\"}}",
-            "✅ GOOD: {\"item_award\": {\"type\": \"generate_item\", \"rarity\": 1}}",
-            "",
-            "FINAL REMINDERS:",
-            "- **Room items**: Use {\"type\": \"room_item\", \"item_name\": \"Exact Name\"}",
-            "- **Basic environmental items**: Use {\"type\": \"generate_item\", \"rarity\": 1}",
-            "- **Non-existent items**: Tell player it's not there, no item_award",
-            "- **Always describe items by their actual names, never reference game data**"
-        ])
-        
         prompt = "\n".join(prompt_parts)
+        prompt_tokens = count_tokens(prompt)
+        action_context_builder.record_prompt_tokens(prompt_tokens)
+        logger.info(f"[AI Context] Prompt tokens for action: {prompt_tokens} (context: {context_tokens})")
 
         logger.debug(f"[Stream Action] Sending prompt to OpenAI: {prompt}")
-        import time
         ai_request_start = time.time()
         try:
             logger.info(f"⏱️ [TIMING] AI request starting...")
-            stream = await client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",
-                messages=[
-                    {"role": "system", "content": f"You are the game master of a multiplayer AI-powered {WORLD_CONFIG['game_type']} world. Keep all responses to exactly 1 short sentence. Be extremely concise and direct - focus only on the immediate action result. Remove all fluff and extra description. Be generous with item generation - when players grab/take anything, turn it into an item. Make the world feel alive and fun."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                stream=True
-            )
+            async with llm_scheduler.slot("stream_action"):
+                stream = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": STREAM_ACTION_SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    stream=True,
+                    stream_options={"include_usage": True}  # Final chunk carries usage incl. cached tokens
+                )
 
             buffer = ""
             narrative = ""
@@ -661,8 +710,14 @@ class AIHandler:
             chunk_count = 0
             max_chunks = 1000  # Prevent infinite loops
             first_token_time = None
+            usage = None
 
             async for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    usage = chunk.usage
+                if json_yielded or not chunk.choices:
+                    # Drain the tail of the stream only to pick up the usage chunk
+                    continue
                 if first_token_time is None:
                     first_token_time = time.time()
                     logger.info(f"⏱️ [TIMING] First AI token received: {(first_token_time - ai_request_start)*1000:.2f}ms")
@@ -718,8 +773,8 @@ class AIHandler:
                         try:
                             # This will raise if not complete JSON yet
                             parsed = json.loads(buffer)
-                            if isinstance(parsed, dict) and "response" in parsed:
-                                # Replace response with the already streamed narrative
+                            if isinstance(parsed, dict):
+                                # The model no longer echoes the narrative in the JSON; attach the streamed one
                                 parsed["response"] = narrative.strip()
 
                                 # Set the type field for the main.py message storage logic
@@ -748,7 +803,7 @@ class AIHandler:
                                 # Then yield the final response for background processing
                                 yield parsed
                                 json_yielded = True  # Mark that we successfully yielded
-                                break
+                                continue
                         except json.JSONDecodeError as e:
                             # Not yet complete JSON - this is normal during streaming
                             logger.debug(f"[Stream] JSON not complete yet: {str(e)}")
@@ -758,6 +813,8 @@ class AIHandler:
                             logger.warning(f"[Stream] JSON parsing error: {str(e)}")
                             pass
 
+            prompt_cache_metrics.record("stream_action", usage, time.time() - ai_request_start)
+
             # After stream ends, if we still haven't parsed JSON, try to extract it
             # But ONLY if we didn't already yield successfully
             if not json_yielded and (not narrative_complete or (narrative_complete and buffer)):
@@ -775,11 +832,8 @@ class AIHandler:
                             json_start = buffer.index(json_match.group())
                             narrative = buffer[:json_start].strip()
 
-                            # Use the narrative from the response field if available, otherwise use extracted
-                            if "response" in parsed:
-                                parsed["response"] = narrative if narrative else parsed["response"]
-                            else:
-                                parsed["response"] = narrative
+                            # Use the extracted narrative (older prompts also echoed it in a response field)
+                            parsed["response"] = narrative if narrative else parsed.get("response", "")
 
                             parsed["type"] = "final"
                             logger.info(f"[Stream] Successfully extracted JSON via fallback")
@@ -866,12 +920,6 @@ class AIHandler:
             "timestamp": datetime.utcnow().isoformat()
         }
 
-        json_template = '''
-{
-    "response": "The NPC's engaging response (1-2 sentences). Be chatty, add personality, and make dialogue feel natural and immersive with direct quotes.",
-    "memory": "A brief memory to store about this interaction"
-}
-'''
 
         # Build recent chat history section
         chat_history_section = ""
@@ -882,7 +930,7 @@ class AIHandler:
                 chat_history_section += f"{role_label}: {chat_msg.get('content', '')}\n"
             chat_history_section += "\nUse this conversation history to maintain continuity and remember what you've discussed!\n"
 
-        prompt = f"""Process this player's interaction with an NPC in a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}.
+        prompt = f"""Process this player's interaction with an NPC.
 
 NPC PERSONALITY:
 - Name: {npc_name}
@@ -900,67 +948,24 @@ IMPORTANT:
 - Reference your backstory when appropriate: {npc_backstory}
 - If the player asks about quests or hints, you may subtly incorporate: {npc_quest_hint}
 - Speak according to your current mood: {npc_mood}
-- Be conversational and engaging - NPCs should feel alive and have personality!
-- Include actual dialogue in quotes when appropriate
-- Add personality flourishes, reactions, and character details
-- Reference previous conversation if relevant (see conversation history above)
 
 Context: {json.dumps(context)}
-
-DIALOGUE GUIDELINES:
-- Keep responses to 1-2 sentences but make them count!
-- Include direct speech in quotes (e.g., "Well now," she says with a grin, "...")
-- Add character actions and reactions (e.g., *adjusts their spectacles*, *leans in closer*)
-- Let the NPC's personality shine through their word choice and manner
-- Make conversations feel natural and immersive, not robotic
-- NPCs can ask questions back, express opinions, or share brief insights
-- Remember what was said earlier in the conversation and reference it naturally
-
-Return a JSON object with this exact structure:
-{json_template}
 """
 
-        response = await client.chat.completions.create(
-            model="gpt-4.1-nano-2025-04-14",
-            messages=[
-                {"role": "system", "content": f"You are {npc_name}, an NPC in a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}. Your dialogue style is: {npc_dialogue_style}. Your knowledge areas are: {npc_knowledge}. Be chatty and engaging! Use 1-2 punchy sentences to bring your personality to life. Include direct dialogue in quotes, character actions, and personality details. Make conversations feel natural and immersive. Stay in character and let your unique personality shine through. Always return clean JSON without any comments."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8
-        )
-
-        # Clean the response content to handle potential control characters
-        response_content = response.choices[0].message.content
-        
-        # Remove or replace problematic control characters
-        import re
-        cleaned_content = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', response_content)
-        
         try:
-            result = json.loads(cleaned_content)
-        except json.JSONDecodeError as e:
-            logger.error(f"[process_npc_interaction] JSON parsing failed: {str(e)}")
-            logger.error(f"[process_npc_interaction] Problematic content: {repr(cleaned_content)}")
-            
-            # Try to extract JSON from the response if it's embedded in other text
-            json_match = re.search(r'\{.*\}', cleaned_content, re.DOTALL)
-            if json_match:
-                try:
-                    result = json.loads(json_match.group())
-                    logger.info("[process_npc_interaction] Successfully extracted JSON from response")
-                except json.JSONDecodeError:
-                    logger.error("[process_npc_interaction] Failed to parse extracted JSON, using fallback")
-                    # Fallback response
-                    result = {
-                        "response": "I'm having trouble understanding right now. Could you try asking again?",
-                        "memory": "Player attempted interaction but response parsing failed."
-                    }
-            else:
-                logger.error("[process_npc_interaction] No JSON found in response, using fallback")
-                result = {
-                    "response": "I'm having trouble understanding right now. Could you try asking again?",
-                    "memory": "Player attempted interaction but no valid JSON response received."
-                }
+            result = await AIHandler.generate_structured(
+                prompt,
+                NPCInteractionOutput,
+                call_site="process_npc_interaction",
+                system_prompt=NPC_INTERACTION_SYSTEM_PROMPT,
+                temperature=0.8
+            )
+        except StructuredOutputError as e:
+            logger.error(f"[process_npc_interaction] No valid NPC response generated, using fallback: {str(e)}")
+            result = {
+                "response": "I'm having trouble understanding right now. Could you try asking again?",
+                "memory": "Player attempted interaction but no valid JSON response received."
+            }
         
         return result["response"], result["memory"]
 
@@ -989,138 +994,25 @@ Return a JSON object with this exact structure:
         {json_template}
         """
 
-        response = await client.chat.completions.create(
-            model="gpt-4.1-nano-2025-04-14",
-            messages=[
-                {"role": "system", "content": f"You are a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} world creator. Keep descriptions concise (1-2 sentences maximum). Focus only on essential details and remove all fluff. Avoid {avoid_themes_str} elements. Always return clean JSON without any comments."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
-
-        # Clean the response content to handle potential control characters
-        response_content = response.choices[0].message.content
-        
-        # Remove or replace problematic control characters
-        import re
-        import time
-        
-        # Log the raw content for debugging
-        logger.debug(f"[generate_world_seed] Raw response: {repr(response_content)}")
-        
-        # Retry mechanism for JSON parsing
-        max_retries = 3
-        result = None
-        
-        for attempt in range(max_retries):
-            try:
-                # First, try to parse the JSON as-is
-                result = json.loads(response_content)
-                logger.debug(f"[generate_world_seed] Successfully parsed JSON on attempt {attempt + 1}")
-                break  # Success, exit retry loop
-                
-            except json.JSONDecodeError as e:
-                logger.warning(f"[generate_world_seed] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                
-                if attempt == max_retries - 1:
-                    # Final attempt failed, use fallback
-                    logger.error(f"[generate_world_seed] All {max_retries} attempts failed, using fallback")
-                    result = {
-                        "world_seed": f"Fallback World {hash(str(time.time())) % 10000}",
-                        "main_quest_summary": "Explore this mysterious realm and uncover its secrets.",
-                        "starting_state": {
-                            "quest_stage": WORLD_CONFIG['starting_quest_stage'],
-                            "world_time": WORLD_CONFIG['starting_time'],
-                            "weather": WORLD_CONFIG['starting_weather']
-                        }
-                    }
-                    break
-                else:
-                    # Clean the content and try again
-                    # Remove control characters except for newlines, tabs, and carriage returns
-                    cleaned_content = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', response_content)
-                    
-                    # Fix escaped newlines that might be causing issues
-                    # Replace \\n with \n in the cleaned content
-                    cleaned_content = cleaned_content.replace('\\n', '\n')
-                    
-                    # Then properly escape newlines within string values
-                    cleaned_content = re.sub(r'(".*?)\n(.*?")', r'\1\\n\2', cleaned_content, flags=re.DOTALL)
-                    
-                    logger.debug(f"[generate_world_seed] Cleaned response (attempt {attempt + 1}): {repr(cleaned_content)}")
-                    
-                    try:
-                        result = json.loads(cleaned_content)
-                        logger.debug(f"[generate_world_seed] Successfully parsed JSON after cleaning on attempt {attempt + 1}")
-                        break  # Success, exit retry loop
-                    except json.JSONDecodeError as e2:
-                        logger.warning(f"[generate_world_seed] JSON parsing failed after cleaning on attempt {attempt + 1}: {str(e2)}")
-                        
-                        # Try to extract JSON from the response if it's embedded in other text
-                        json_match = re.search(r'\{.*\}', cleaned_content, re.DOTALL)
-                        if json_match:
-                            try:
-                                result = json.loads(json_match.group())
-                                logger.info(f"[generate_world_seed] Successfully extracted JSON from response on attempt {attempt + 1}")
-                                break  # Success, exit retry loop
-                            except json.JSONDecodeError:
-                                logger.warning(f"[generate_world_seed] Failed to parse extracted JSON on attempt {attempt + 1}")
-                                if attempt == max_retries - 1:
-                                    # Final attempt failed, use fallback
-                                    logger.error(f"[generate_world_seed] All {max_retries} attempts failed, using fallback")
-                                    result = {
-                                        "world_seed": f"Fallback World {hash(str(time.time())) % 10000}",
-                                        "main_quest_summary": "Explore this mysterious realm and uncover its secrets.",
-                                        "starting_state": {
-                                            "quest_stage": WORLD_CONFIG['starting_quest_stage'],
-                                            "world_time": WORLD_CONFIG['starting_time'],
-                                            "weather": WORLD_CONFIG['starting_weather']
-                                        }
-                                    }
-                                    break
-                                else:
-                                    # Wait a bit before retrying
-                                    await asyncio.sleep(0.5)
-                                    continue
-                        else:
-                            logger.warning(f"[generate_world_seed] No JSON found in response on attempt {attempt + 1}")
-                            if attempt == max_retries - 1:
-                                # Final attempt failed, use fallback
-                                logger.error(f"[generate_world_seed] All {max_retries} attempts failed, using fallback")
-                                result = {
-                                    "world_seed": f"Fallback World {hash(str(time.time())) % 10000}",
-                                    "main_quest_summary": "Explore this mysterious realm and uncover its secrets.",
-                                    "starting_state": {
-                                        "quest_stage": WORLD_CONFIG['starting_quest_stage'],
-                                        "world_time": WORLD_CONFIG['starting_time'],
-                                        "weather": WORLD_CONFIG['starting_weather']
-                                    }
-                                }
-                                break
-                            else:
-                                # Wait a bit before retrying
-                                await asyncio.sleep(0.5)
-                                continue
-                                
-            except Exception as e:
-                logger.error(f"[generate_world_seed] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries - 1:
-                    # Final attempt failed, use fallback
-                    logger.error(f"[generate_world_seed] All {max_retries} attempts failed due to unexpected error, using fallback")
-                    result = {
-                        "world_seed": f"Fallback World {hash(str(time.time())) % 10000}",
-                        "main_quest_summary": "Explore this mysterious realm and uncover its secrets.",
-                        "starting_state": {
-                            "quest_stage": WORLD_CONFIG['starting_quest_stage'],
-                            "world_time": WORLD_CONFIG['starting_time'],
-                            "weather": WORLD_CONFIG['starting_weather']
-                        }
-                    }
-                    break
-                else:
-                    # Wait a bit before retrying
-                    await asyncio.sleep(0.5)
-                    continue
+        try:
+            result = await AIHandler.generate_structured(
+                prompt,
+                WorldSeedOutput,
+                call_site="generate_world_seed",
+                system_prompt=f"You are a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} world creator. Keep descriptions concise (1-2 sentences maximum). Focus only on essential details and remove all fluff. Avoid {avoid_themes_str} elements. Always return clean JSON without any comments."
+            )
+            logger.debug(f"[generate_world_seed] Structured response: {result}")
+        except StructuredOutputError as e:
+            logger.error(f"[generate_world_seed] No valid world seed generated, using fallback: {str(e)}")
+            result = {
+                "world_seed": f"Fallback World {hash(str(time.time())) % 10000}",
+                "main_quest_summary": "Explore this mysterious realm and uncover its secrets.",
+                "starting_state": {
+                    "quest_stage": WORLD_CONFIG['starting_quest_stage'],
+                    "world_time": WORLD_CONFIG['starting_time'],
+                    "weather": WORLD_CONFIG['starting_weather']
+                }
+            }
 
         # Convert all values in starting_state to strings
         starting_state = {
@@ -1135,35 +1027,139 @@ Return a JSON object with this exact structure:
         )
 
     @staticmethod
-    async def generate_text(prompt: str) -> str:
-        """Generate text using OpenAI"""
+    async def generate_text(prompt: str, call_site: str = "generate_text", background: bool = False, cacheable: bool = False) -> str:
+        """Generate text using OpenAI
+
+        Args:
+            prompt: The user prompt
+            call_site: Name used for scheduler stats and the response cache TTL lookup
+            background: True for room population work that must not starve interactive calls
+            cacheable: Opt in to the response cache (only takes effect if call_site has a TTL)
+        """
+        system_prompt = "You are a helpful assistant. Keep responses concise (1-2 sentences maximum). Focus only on essential information and remove all fluff. Always return clean, valid responses."
+        temperature = 0.7
+        cache_key = None
+        if cacheable and response_cache.ttl_for(call_site) > 0:
+            cache_key = response_cache.make_key(prompt, LLM_MODEL, temperature, system_prompt)
+            cached = await response_cache.get(call_site, cache_key)
+            if cached is not None:
+                return cached
         try:
-            response = await client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant. Keep responses concise (1-2 sentences maximum). Focus only on essential information and remove all fluff. Always return clean, valid responses."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
-            )
-            return response.choices[0].message.content
+            request_start = time.time()
+            async with llm_scheduler.slot(call_site, background=background):
+                response = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=temperature
+                )
+            latency = time.time() - request_start
+            prompt_cache_metrics.record(call_site, getattr(response, 'usage', None), latency)
+            content = response.choices[0].message.content
+            if cache_key:
+                await response_cache.set(call_site, cache_key, content, latency)
+            return content
         except Exception as e:
             logger.error(f"[Generate Text] Error generating text: {str(e)}")
             raise
 
+    @staticmethod
+    async def generate_structured(
+        prompt: str,
+        output_model: Type[BaseModel],
+        call_site: str,
+        system_prompt: str = "You are a helpful assistant for a fantasy game. Keep text fields concise and always answer with JSON matching the requested schema.",
+        temperature: float = 0.7,
+        background: bool = False,
+        cacheable: bool = False
+    ) -> Dict[str, Any]:
+        """Generate JSON constrained to an output model's schema
+
+        Malformed responses are repaired locally first; only responses that cannot
+        be repaired or validated trigger a fresh generation.
+
+        Args:
+            prompt: The user prompt
+            output_model: Pydantic model the response must validate against
+            call_site: Name used for scheduler, structured output and cache stats
+            system_prompt: Static system prompt
+            temperature: Sampling temperature
+            background: True for room population work that must not starve interactive calls
+            cacheable: Opt in to the response cache (only takes effect if call_site has a TTL)
+
+        Raises:
+            StructuredOutputError: if no attempt produced a valid response
+        """
+        cache_key = None
+        if cacheable and response_cache.ttl_for(call_site) > 0:
+            cache_key = response_cache.make_key(prompt, LLM_MODEL, temperature, f"{system_prompt}\n{output_model.__name__}")
+            cached = await response_cache.get(call_site, cache_key)
+            if cached is not None:
+                return json.loads(cached)
+
+        max_attempts = max(1, settings.STRUCTURED_OUTPUT_MAX_ATTEMPTS)
+        last_error = None
+        for attempt in range(1, max_attempts + 1):
+            request_start = time.time()
+            async with llm_scheduler.slot(call_site, background=background):
+                response = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=temperature,
+                    response_format=response_format_for(output_model)
+                )
+            latency = time.time() - request_start
+            prompt_cache_metrics.record(call_site, getattr(response, 'usage', None), latency)
+            content = response.choices[0].message.content
+
+            try:
+                result, repaired = parse_structured(content, output_model)
+            except ValueError as e:
+                last_error = e
+                logger.warning(f"[Structured Output] {call_site} attempt {attempt}/{max_attempts} invalid, regenerating: {str(e)}")
+                continue
+
+            structured_output_metrics.record(call_site, attempt, True, repaired)
+            if cache_key:
+                await response_cache.set(call_site, cache_key, json.dumps(result), latency)
+            return result
+
+        structured_output_metrics.record(call_site, max_attempts, False)
+        raise StructuredOutputError(f"{call_site}: no valid {output_model.__name__} after {max_attempts} attempts ({last_error})")
+
     @staticmethod
     async def analyze_duel(prompt: str) -> str:
         """Analyze a duel between two players and determine the outcome"""
+        system_prompt = "You are a fantasy duel referee. Analyze the moves of two players and determine who wins. Be dramatic and engaging, but keep the analysis concise (2-3 sentences). Consider the effectiveness, creativity, and interaction of the moves. Always clearly state who wins."
+        temperature = 0.8
+        cache_key = None
+        if response_cache.ttl_for("analyze_duel") > 0:
+            cache_key = response_cache.make_key(prompt, LLM_MODEL, temperature, system_prompt)
+            cached = await response_cache.get("analyze_duel", cache_key)
+            if cached is not None:
+                return cached
         try:
-            response = await client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",
-                messages=[
-                    {"role": "system", "content": "You are a fantasy duel referee. Analyze the moves of two players and determine who wins. Be dramatic and engaging, but keep the analysis concise (2-3 sentences). Consider the effectiveness, creativity, and interaction of the moves. Always clearly state who wins."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8
-            )
-            return response.choices[0].message.content
+            request_start = time.time()
+            async with llm_scheduler.slot("analyze_duel"):
+                response = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=temperature
+                )
+            latency = time.time() - request_start
+            prompt_cache_metrics.record("analyze_duel", getattr(response, 'usage', None), latency)
+            content = response.choices[0].message.content
+            if cache_key:
+                await response_cache.set("analyze_duel", cache_key, content, latency)
+            return content
         except Exception as e:
             logger.error(f"[Analyze Duel] Error analyzing duel: {str(e)}")
             return "The duel ended in a draw due to an error in analysis."
@@ -1198,45 +1194,19 @@ You are inventing a biome for a new region of a {WORLD_CONFIG['setting_primary']
 Return a JSON object with these exact fields:
 {json_template}
 """
+        system_prompt = f"You are a worldbuilder for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}. Always return clean JSON without comments. Keep all content {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} (avoid {avoid_themes_str} elements). Biome names must be short and generic. Descriptions must be concise and evocative. Colors must be valid hex codes that visually represent the biome. Biomes must be visually and thematically distinct from neighbors, and must have a large impact on the image and name of all rooms within them."
         logger.debug(f"[Biome Generation] Sending biome chunk prompt to OpenAI: {prompt}")
         try:
-            response = await client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",
-                messages=[
-                    {"role": "system", "content": f"You are a worldbuilder for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}. Always return clean JSON without comments. Keep all content {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} (avoid {avoid_themes_str} elements). Biome names must be short and generic. Descriptions must be concise and evocative. Colors must be valid hex codes that visually represent the biome. Biomes must be visually and thematically distinct from neighbors, and must have a large impact on the image and name of all rooms within them."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
+            # Adjacent biomes are part of the prompt, so a cache hit only reuses a biome for the same neighbourhood
+            biome = await AIHandler.generate_structured(
+                prompt,
+                BiomeOutput,
+                call_site="generate_biome_chunk",
+                system_prompt=system_prompt,
+                cacheable=True
             )
-            content = response.choices[0].message.content
-            logger.debug(f"[Biome Generation] Received biome chunk response: {content}")
-            
-            # Retry mechanism for JSON parsing
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    result = json.loads(content)
-                    return {"name": result["name"], "description": result["description"], "color": result["color"]}
-                except json.JSONDecodeError as e:
-                    logger.warning(f"[Biome Generation] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        # Final attempt failed, raise the error
-                        logger.error(f"[Biome Generation] All {max_retries} attempts failed, raising error")
-                        raise
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
-                except Exception as e:
-                    logger.error(f"[Biome Generation] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        # Final attempt failed, raise the error
-                        logger.error(f"[Biome Generation] All {max_retries} attempts failed due to unexpected error, raising error")
-                        raise
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
+            logger.debug(f"[Biome Generation] Received biome chunk response: {biome}")
+            return biome
         except Exception as e:
             logger.error(f"[Biome Generation] Error generating biome chunk: {str(e)}")
             # Use fallback biomes from world config
@@ -0,0 +1,363 @@
+"""
+Shared transfer service for large generated assets.
+Room images and 3D models are streamed from their temporary provider URL into
+Supabase Storage over one pooled aiohttp session, in fixed-size chunks, so memory
+stays flat however large the file is and however many transfers run at once.
+FAL model archives are spooled to a temporary file (not memory) so the model can
+be streamed out of the ZIP. Transfers are bounded by a semaphore and report
+throughput for the debug endpoint.
+"""
+import asyncio
+import logging
+import ssl
+import tempfile
+import time
+import zipfile
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import aiohttp
+import certifi
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+ZIP_MAGIC = b'PK\x03\x04'
+MODEL_CONTENT_TYPES = {
+    'glb': 'model/gltf-binary',
+    'drc': 'application/octet-stream',
+    'ply': 'application/x-ply',
+    'zip': 'application/zip'
+}
+RECENT_TRANSFERS = 50
+
+
+class AssetTransferError(Exception):
+    """Raised when a source download or storage upload fails"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def image_extension(content_type: str) -> str:
+    """Storage file extension for an image content type"""
+    if "jpeg" in content_type or "jpg" in content_type:
+        return "jpg"
+    if "png" in content_type:
+        return "png"
+    return "webp"
+
+
+def select_model_member(names: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Pick the file to store from a FAL hunyuan_world archive.
+
+    Returns:
+        (member name, extension); member is None with extension 'zip' to store the whole archive
+        (PLY layers), or (None, None) if the archive has nothing usable
+    """
+    glb_files = [name for name in names if name.endswith('.glb')]
+    drc_files = [name for name in names if name.endswith('.drc')]
+    ply_files = [name for name in names if name.endswith('.ply')]
+    logger.info(f"[Asset Transfer] ZIP analysis - GLB: {glb_files}, DRC: {drc_files}, PLY: {len(ply_files)} files")
+
+    # Prefer Draco-compressed GLB if available (from export_drc=True)
+    if glb_files:
+        return glb_files[0], 'glb'
+    if drc_files:
+        # DRC is raw Draco - would need different viewer support
+        return drc_files[0], 'drc'
+    if ply_files:
+        # Fall back to full ZIP with PLY layers (for layered scene support)
+        return None, 'zip'
+    return None, None
+
+
+class AssetTransferService:
+    """Pooled, bounded, streaming downloads from provider URLs into Supabase Storage"""
+
+    def __init__(self, max_concurrency: int, chunk_size: int, supabase_url: str, service_key: str):
+        self.max_concurrency = max(1, max_concurrency)
+        self.chunk_size = max(1024, chunk_size)
+        self.storage_url = f"{supabase_url.rstrip('/')}/storage/v1" if supabase_url else ""
+        self.service_key = service_key
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._recent = deque(maxlen=RECENT_TRANSFERS)
+        self.metrics: Dict[str, Any] = {
+            'transfers': 0,
+            'failed': 0,
+            'active': 0,
+            'peak_active': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'seconds': 0.0
+        }
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use so it binds to the running loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency * 2,  # a download and an upload per transfer
+                ssl=ssl.create_default_context(cafile=certifi.where())
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def public_url(self, bucket: str, path: str, cache_bust: bool = True) -> str:
+        """Public URL of a stored object, with a cache-busting parameter unless the path is content-addressed"""
+        url = f"{self.storage_url}/object/public/{bucket}/{quote(path)}"
+        return f"{url}?v={int(time.time())}" if cache_bust else url
+
+    def storage_path(self, bucket: str, url: str) -> Optional[str]:
+        """Object path behind a public URL of `bucket`, or None for a URL outside this storage"""
+        prefix = f"{self.storage_url}/object/public/{bucket}/"
+        if not self.storage_url or not url or not url.startswith(prefix):
+            return None
+        return unquote(url[len(prefix):].split('?', 1)[0])
+
+    @asynccontextmanager
+    async def _transfer(self, label: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            stats = {'label': label, 'bytes_in': 0, 'bytes_out': 0}
+            started = time.time()
+            self.metrics['active'] += 1
+            self.metrics['peak_active'] = max(self.metrics['peak_active'], self.metrics['active'])
+            ok = False
+            try:
+                yield stats
+                ok = True
+            finally:
+                elapsed = time.time() - started
+                self.metrics['active'] -= 1
+                self.metrics['transfers' if ok else 'failed'] += 1
+                self.metrics['bytes_in'] += stats['bytes_in']
+                self.metrics['bytes_out'] += stats['bytes_out']
+                self.metrics['seconds'] += elapsed
+                self._recent.append({
+                    **stats,
+                    'ok': ok,
+                    'seconds': round(elapsed, 3),
+                    'mb_per_second': round(stats['bytes_out'] / elapsed / (1024 * 1024), 2) if elapsed > 0 else 0.0
+                })
+                logger.info(f"[Asset Transfer] {label} {'done' if ok else 'failed'}: "
+                            f"{stats['bytes_out'] / (1024 * 1024):.2f} MB stored in {elapsed:.2f}s")
+
+    @asynccontextmanager
+    async def _open_source(self, url: str, timeout: float):
+        session = await self.get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            if resp.status != 200:
+                # An expired provider URL will not come back; server errors might
+                raise AssetTransferError(f"download failed: HTTP {resp.status}", retryable=resp.status >= 500)
+            yield resp
+
+    @staticmethod
+    async def _counted(chunks: AsyncIterator[bytes], stats: Dict[str, Any], key: str) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            stats[key] += len(chunk)
+            yield chunk
+
+    @staticmethod
+    async def _prepend(first: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    async def _iter_file(self, fileobj: BinaryIO) -> AsyncIterator[bytes]:
+        # File reads (and ZIP decompression) happen in a thread to keep the loop free
+        while True:
+            chunk = await asyncio.to_thread(fileobj.read, self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    async def _upload(
+        self,
+        bucket: str,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        content_type: str,
+        stats: Dict[str, Any],
+        content_length: Optional[int] = None,
+        cache_control: Optional[str] = None,
+        timeout: float = 600,
+        cache_bust: bool = True
+    ) -> str:
+        if not self.storage_url or not self.service_key:
+            raise AssetTransferError("Supabase configuration missing", retryable=False)
+        headers = {
+            'Authorization': f"Bearer {self.service_key}",
+            'apikey': self.service_key,
+            'Content-Type': content_type,
+            'x-upsert': 'true'  # Overwrite if exists
+        }
+        if cache_control:
+            headers['Cache-Control'] = cache_control
+        if content_length is not None:
+            headers['Content-Length'] = str(content_length)
+
+        session = await self.get_session()
+        async with session.post(
+            f"{self.storage_url}/object/{bucket}/{quote(path)}",
+            data=self._counted(chunks, stats, 'bytes_out'),
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as resp:
+            if resp.status >= 300:
+                body = await resp.text()
+                raise AssetTransferError(f"upload of {path} failed: HTTP {resp.status} {body[:200]}", retryable=resp.status >= 500 or resp.status == 429)
+        return self.public_url(bucket, path, cache_bust)
+
+    async def fetch_bytes(self, url: str, label: str, max_bytes: int, timeout: float = 30) -> bytes:
+        """Download a small asset (e.g. a stored room image) into memory, refusing anything over `max_bytes`"""
+        async with self._transfer(label) as stats:
+            async with self._open_source(url, timeout) as resp:
+                chunks = []
+                async for chunk in self._counted(resp.content.iter_chunked(self.chunk_size), stats, 'bytes_in'):
+                    if stats['bytes_in'] > max_bytes:
+                        raise AssetTransferError(f"{url[:100]} is larger than {max_bytes} bytes", retryable=False)
+                    chunks.append(chunk)
+                return b"".join(chunks)
+
+    async def upload_bytes(
+        self,
+        bucket: str,
+        path: str,
+        data: bytes,
+        content_type: str,
+        label: str,
+        cache_control: Optional[str] = None,
+        cache_bust: bool = True,
+        timeout: float = 60
+    ) -> str:
+        """Upload an in-memory asset; returns its public URL"""
+
+        async def single_chunk():
+            yield data
+
+        async with self._transfer(label) as stats:
+            return await self._upload(
+                bucket, path, single_chunk(), content_type, stats, content_length=len(data),
+                cache_control=cache_control, timeout=timeout, cache_bust=cache_bust
+            )
+
+    async def copy_object(self, bucket: str, source_path: str, path: str, timeout: float = 30) -> str:
+        """Copy a stored object to `path` inside the storage, without downloading it; returns the copy's public URL"""
+        if not self.storage_url or not self.service_key:
+            raise AssetTransferError("Supabase configuration missing", retryable=False)
+        headers = {
+            'Authorization': f"Bearer {self.service_key}",
+            'apikey': self.service_key,
+            'x-upsert': 'true'  # Overwrite if exists
+        }
+        async with self._transfer(f"copy:{path}"):
+            session = await self.get_session()
+            async with session.post(
+                f"{self.storage_url}/object/copy",
+                json={'bucketId': bucket, 'sourceKey': source_path, 'destinationKey': path},
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as resp:
+                if resp.status >= 300:
+                    body = await resp.text()
+                    raise AssetTransferError(f"copy of {source_path} failed: HTTP {resp.status} {body[:200]}", retryable=resp.status >= 500 or resp.status == 429)
+        return self.public_url(bucket, path)
+
+    async def transfer_image(self, image_url: str, bucket: str, room_id: str, timeout: float = 30) -> str:
+        """Stream a generated image into `rooms/{room_id}.{ext}`; returns its public URL"""
+        async with self._transfer(f"image:{room_id}") as stats:
+            async with self._open_source(image_url, timeout) as resp:
+                content_type = resp.headers.get('Content-Type', 'image/webp')
+                chunks = self._counted(resp.content.iter_chunked(self.chunk_size), stats, 'bytes_in')
+                return await self._upload(
+                    bucket,
+                    f"rooms/{room_id}.{image_extension(content_type)}",
+                    chunks,
+                    content_type,
+                    stats,
+                    content_length=resp.content_length,
+                    cache_control="no-cache",  # Prevent server-side caching
+                    timeout=timeout
+                )
+
+    async def transfer_model(self, model_url: str, bucket: str, room_id: str, timeout: float = 600) -> str:
+        """
+        Stream a FAL 3D model into `models/{room_id}.{ext}`; returns its public URL.
+        ZIP archives are spooled to disk and the chosen model streamed out of them.
+        """
+        async with self._transfer(f"model:{room_id}") as stats:
+            async with self._open_source(model_url, timeout) as resp:
+                chunks = self._counted(resp.content.iter_chunked(self.chunk_size), stats, 'bytes_in')
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    raise AssetTransferError("downloaded model is empty", retryable=False)
+
+                if not (model_url.endswith('.zip') or first[:4] == ZIP_MAGIC):
+                    # Direct file (GLB or PLY)
+                    file_ext = 'glb' if model_url.endswith('.glb') else 'ply'
+                    return await self._upload(
+                        bucket, f"models/{room_id}.{file_ext}", self._prepend(first, chunks),
+                        MODEL_CONTENT_TYPES[file_ext], stats, content_length=resp.content_length, timeout=timeout
+                    )
+
+                with tempfile.TemporaryFile() as spool:
+                    async for chunk in self._prepend(first, chunks):
+                        await asyncio.to_thread(spool.write, chunk)
+
+                    try:
+                        archive = await asyncio.to_thread(zipfile.ZipFile, spool)
+                    except zipfile.BadZipFile as e:
+                        raise AssetTransferError(f"invalid ZIP file: {str(e)}", retryable=False)
+                    with archive:
+                        member, file_ext = select_model_member(archive.namelist())
+                        if file_ext is None:
+                            raise AssetTransferError("no supported 3D files found in ZIP", retryable=False)
+                        path = f"models/{room_id}.{file_ext}"
+                        if member is None:
+                            spool.seek(0)
+                            return await self._upload(
+                                bucket, path, self._iter_file(spool), MODEL_CONTENT_TYPES[file_ext], stats,
+                                content_length=stats['bytes_in'], timeout=timeout
+                            )
+                        logger.info(f"[Asset Transfer] Using {file_ext.upper()}: {member} "
+                                    f"({archive.getinfo(member).file_size / 1024 / 1024:.2f} MB)")
+                        with archive.open(member) as source:
+                            return await self._upload(
+                                bucket, path, self._iter_file(source), MODEL_CONTENT_TYPES[file_ext], stats,
+                                content_length=archive.getinfo(member).file_size, timeout=timeout
+                            )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Transfer counts, bytes moved and throughput"""
+        seconds = self.metrics['seconds']
+        return {
+            **self.metrics,
+            'seconds': round(seconds, 2),
+            'max_concurrency': self.max_concurrency,
+            'avg_mb_per_second': round(self.metrics['bytes_out'] / seconds / (1024 * 1024), 2) if seconds else 0.0,
+            'recent': list(self._recent)
+        }
+
+
+# Global transfer service; one connection pool for every image and model upload in this process
+asset_transfer = AssetTransferService(
+    settings.ASSET_TRANSFER_MAX_CONCURRENCY,
+    settings.ASSET_TRANSFER_CHUNK_SIZE,
+    settings.SUPABASE_URL,
+    settings.SUPABASE_SERVICE_ROLE_KEY
+)
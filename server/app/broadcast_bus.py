@@ -0,0 +1,232 @@
+"""
+Room broadcast bus.
+ConnectionManager hands every room broadcast and targeted send to the bus. The local
+bus only delivers to sockets held by this process. The Redis bus also publishes each
+message on a per-room (or per-player) channel and keeps one subscription per channel
+with a socket in this process, so players in the same room see each other across
+uvicorn workers and hosts. Job workers, which hold no sockets, publish through it too.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+ROOM_CHANNEL_PREFIX = "room_events:"
+PLAYER_CHANNEL_PREFIX = "player_events:"
+MAX_MESSAGES_PER_POLL = 500
+
+# (room_id, message, exclude_player, target_player) -> sockets delivered to.
+# room_id is None for personal messages to a player in whichever room they are in.
+Delivery = Callable[[Optional[str], Dict[str, Any], Optional[str], Optional[str]], Awaitable[int]]
+
+
+class LocalBroadcastBus:
+    """Delivers to sockets in this process only (single worker deployments)"""
+
+    def __init__(self):
+        self._deliver: Optional[Delivery] = None
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.metrics: Dict[str, int] = {
+            'published': 0,
+            'delivered': 0,
+            'remote_received': 0,
+            'publish_errors': 0
+        }
+
+    def set_delivery(self, deliver: Delivery) -> None:
+        self._deliver = deliver
+
+    async def _deliver_local(
+        self,
+        room_id: Optional[str],
+        message: Dict[str, Any],
+        exclude_player: Optional[str],
+        target_player: Optional[str]
+    ) -> int:
+        if self._deliver is None:
+            return 0
+        delivered = await self._deliver(room_id, message, exclude_player, target_player)
+        self.metrics['delivered'] += delivered
+        return delivered
+
+    async def publish(
+        self,
+        room_id: Optional[str],
+        message: Dict[str, Any],
+        exclude_player: Optional[str] = None,
+        target_player: Optional[str] = None
+    ) -> None:
+        """Send to everyone in `room_id` (except `exclude_player`), or only to `target_player`"""
+        self.metrics['published'] += 1
+        await self._deliver_local(room_id, message, exclude_player, target_player)
+
+    def join(self, room_id: str, player_id: str) -> None:
+        """A socket for `player_id` in `room_id` opened in this process"""
+
+    def leave(self, room_id: str, player_id: str) -> None:
+        """A socket for `player_id` in `room_id` closed in this process"""
+
+    async def run(self) -> None:
+        """Receive messages published by other processes (nothing to do locally)"""
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {'backend': 'local', 'origin': self.origin, **self.metrics}
+
+
+class RedisBroadcastBus(LocalBroadcastBus):
+    """Local delivery plus Redis pub/sub fan-out, one subscription per active room per process"""
+
+    def __init__(self, poll_timeout: float):
+        super().__init__()
+        self.poll_timeout = max(0.01, poll_timeout)
+        self._refs: Dict[str, int] = {}  # channel -> local sockets interested in it
+        # The pubsub connection is only touched by the listener thread; (un)subscribes are handed over here
+        self._pending: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self._pubsub = None
+
+    @staticmethod
+    def _redis():
+        from .database import redis_client
+        return redis_client
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    @staticmethod
+    def _channel(room_id: Optional[str], target_player: Optional[str]) -> str:
+        if room_id is None:
+            return f"{PLAYER_CHANNEL_PREFIX}{target_player}"
+        return f"{ROOM_CHANNEL_PREFIX}{room_id}"
+
+    def _retain(self, channel: str) -> None:
+        with self._lock:
+            self._refs[channel] = self._refs.get(channel, 0) + 1
+            if self._refs[channel] == 1:
+                self._pending.append(("subscribe", channel))
+
+    def _release(self, channel: str) -> None:
+        with self._lock:
+            if channel not in self._refs:
+                return
+            self._refs[channel] -= 1
+            if self._refs[channel] <= 0:
+                del self._refs[channel]
+                self._pending.append(("unsubscribe", channel))
+
+    def join(self, room_id: str, player_id: str) -> None:
+        self._retain(self._channel(room_id, None))
+        self._retain(self._channel(None, player_id))
+
+    def leave(self, room_id: str, player_id: str) -> None:
+        self._release(self._channel(room_id, None))
+        self._release(self._channel(None, player_id))
+
+    async def publish(
+        self,
+        room_id: Optional[str],
+        message: Dict[str, Any],
+        exclude_player: Optional[str] = None,
+        target_player: Optional[str] = None
+    ) -> None:
+        self.metrics['published'] += 1
+        delivered = await self._deliver_local(room_id, message, exclude_player, target_player)
+        if target_player and delivered:
+            # The player's socket is in this process
+            return
+        payload = json.dumps({
+            'origin': self.origin,
+            'room_id': room_id,
+            'message': message,
+            'exclude_player': exclude_player,
+            'target_player': target_player
+        }, default=str)
+        try:
+            self._redis().publish(self._channel(room_id, target_player), payload)
+        except Exception as e:
+            self.metrics['publish_errors'] += 1
+            logger.error(f"[Broadcast] Could not publish to {self._channel(room_id, target_player)}: {str(e)}")
+
+    def _poll(self) -> List[Dict[str, Any]]:
+        """Apply pending (un)subscribes and read waiting messages; runs in a thread"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for action, channel in pending:
+            getattr(self._pubsub, action)(channel)
+        if not self._pubsub.subscribed and not pending:
+            time.sleep(self.poll_timeout)
+            return []
+
+        messages = []
+        message = self._pubsub.get_message(timeout=self.poll_timeout)
+        while message and len(messages) < MAX_MESSAGES_PER_POLL:
+            messages.append(message)
+            message = self._pubsub.get_message(timeout=0.0)
+        if message:
+            messages.append(message)
+        return messages
+
+    async def run(self) -> None:
+        """Relay messages published by other processes to local sockets until cancelled"""
+        logger.info(f"[Broadcast] Redis bus listening as {self.origin}")
+        try:
+            while True:
+                if self._pubsub is None:
+                    self._pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                    with self._lock:
+                        # Resubscribe everything after a (re)connect
+                        self._pending = [("subscribe", channel) for channel in self._refs]
+                try:
+                    # The redis client is synchronous, so block in a thread rather than on the loop
+                    messages = await asyncio.to_thread(self._poll)
+                except Exception as e:
+                    logger.error(f"[Broadcast] Subscription error, reconnecting: {str(e)}")
+                    self._pubsub = None
+                    await asyncio.sleep(1.0)
+                    continue
+
+                for message in messages:
+                    try:
+                        event = json.loads(self._decode(message['data']))
+                        if event.get('origin') == self.origin:
+                            continue  # Already delivered locally when published
+                        self.metrics['remote_received'] += 1
+                        await self._deliver_local(
+                            event.get('room_id'), event['message'], event.get('exclude_player'), event.get('target_player')
+                        )
+                    except Exception as e:
+                        logger.error(f"[Broadcast] Error relaying message: {str(e)}")
+        finally:
+            if self._pubsub is not None:
+                self._pubsub.close()
+                self._pubsub = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            channels = len(self._refs)
+        return {'backend': 'redis', 'origin': self.origin, 'subscribed_channels': channels, **self.metrics}
+
+
+def create_broadcast_bus(backend: str) -> LocalBroadcastBus:
+    if backend == "redis":
+        return RedisBroadcastBus(settings.BROADCAST_POLL_TIMEOUT)
+    return LocalBroadcastBus()
+
+
+# Global bus; job workers hold no sockets, and with room affinity a player's rooms can be on
+# different workers, so both always need Redis fan-out
+broadcast_bus = create_broadcast_bus(
+    "redis" if settings.JOB_QUEUE_ENABLED or settings.ROOM_AFFINITY_ENABLED else settings.BROADCAST_BUS
+)
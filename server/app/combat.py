@@ -1,9 +1,9 @@
 from typing import Dict, List, Optional, Any
 import json
-import asyncio
 from datetime import datetime
 
 from .game_manager import GameManager
+from .models import CombatRoundOutput
 
 # Expose duel and monster combat shared state
 duel_moves: Dict[str, Dict[str, str]] = {}
@@ -243,85 +243,47 @@ Return JSON with:
 Make it dramatic, make it make sense, and make it fun!
 """
 
-    # Retry mechanism for JSON parsing
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = await game_manager.ai_handler.generate_text(prompt)
-            
-            # Debug logging for AI response
-            logger.info(f"[analyze_combat_and_create_narrative] AI raw response (attempt {attempt + 1}): {response}")
-            
-            # Try to parse JSON
-            result = json.loads(response)
-            
-            # Ensure we have all required fields with proper defaults
-            combat_result = {
-                'narrative': result.get('narrative', f"Round {current_round}: {player1_name} and {player2_name} engaged in combat."),
-                'player1_result': result.get('player1_result', {
-                    'reason': f'{player1_name} continues fighting'
-                }),
-                'player2_result': result.get('player2_result', {
-                    'reason': f'{player2_name} continues fighting'
-                }),
-                'player1_damage_dealt': int(result.get('player1_damage_dealt', 0) or 0),
-                'player2_damage_dealt': int(result.get('player2_damage_dealt', 0) or 0),
-                'player1_control_delta': int(result.get('player1_control_delta', 0) or 0),
-                'player2_control_delta': int(result.get('player2_control_delta', 0) or 0),
-                 'player1_intends_heal': bool(result.get('player1_intends_heal', False)),
-                 'player2_intends_heal': bool(result.get('player2_intends_heal', False)),
-            }
-            
-            # Clean up narrative formatting
-            narrative = combat_result['narrative'].strip()
-            if narrative.startswith('"') and narrative.endswith('"'):
-                narrative = narrative[1:-1]
-            combat_result['narrative'] = narrative
-            
-            logger.info(f"[analyze_combat_and_create_narrative] Generated narrative: {narrative}")
-            return combat_result
-            
-        except json.JSONDecodeError as e:
-            logger.warning(f"[analyze_combat_and_create_narrative] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-            if attempt == max_retries - 1:
-                # Final attempt failed, return fallback response
-                logger.error(f"[analyze_combat_and_create_narrative] All {max_retries} attempts failed, using fallback response")
-                return {
-                    'narrative': f"Round {current_round}: {player1_name} and {player2_name} engaged in combat, but the AI had trouble analyzing the outcome. Please try your move again.",
-                    'player1_result': {'reason': f'{player1_name} continues fighting'},
-                    'player2_result': {'reason': f'{player2_name} continues fighting'},
-                    'player1_damage_dealt': 0,
-                    'player2_damage_dealt': 0,
-                    'player1_control_delta': 0,
-                    'player2_control_delta': 0,
-                     'player1_intends_heal': False,
-                     'player2_intends_heal': False,
-                }
-            else:
-                # Wait a bit before retrying
-                await asyncio.sleep(0.5)
-                continue
-                
-        except Exception as e:
-            logger.error(f"[analyze_combat_and_create_narrative] Unexpected error on attempt {attempt + 1}: {str(e)}")
-            if attempt == max_retries - 1:
-                # Final attempt failed, return fallback response
-                logger.error(f"[analyze_combat_and_create_narrative] All {max_retries} attempts failed due to unexpected error, using fallback response")
-                return {
-                    'narrative': f"Round {current_round}: {player1_name} and {player2_name} engaged in combat, but the AI had trouble analyzing the outcome. Please try your move again.",
-                    'player1_result': {'reason': f'{player1_name} continues fighting'},
-                    'player2_result': {'reason': f'{player2_name} continues fighting'},
-                    'player1_damage_dealt': 0,
-                    'player2_damage_dealt': 0,
-                    'player1_control_delta': 0,
-                    'player2_control_delta': 0,
-                     'player1_intends_heal': False,
-                     'player2_intends_heal': False,
-                }
-            else:
-                # Wait a bit before retrying
-                await asyncio.sleep(0.5)
-                continue
+    try:
+        # Schema-constrained generation; malformed output is repaired or regenerated by the handler
+        result = await game_manager.ai_handler.generate_structured(prompt, CombatRoundOutput, call_site="combat_round")
+        
+        # Debug logging for AI response
+        logger.info(f"[analyze_combat_and_create_narrative] AI structured response: {result}")
+        
+        combat_result = {
+            'narrative': result['narrative'] or f"Round {current_round}: {player1_name} and {player2_name} engaged in combat.",
+            'player1_result': result['player1_result'],
+            'player2_result': result['player2_result'],
+            'player1_damage_dealt': result['player1_damage_dealt'],
+            'player2_damage_dealt': result['player2_damage_dealt'],
+            'player1_control_delta': result['player1_control_delta'],
+            'player2_control_delta': result['player2_control_delta'],
+            'player1_intends_heal': result['player1_intends_heal'],
+            'player2_intends_heal': result['player2_intends_heal'],
+        }
+        
+        # Clean up narrative formatting
+        narrative = combat_result['narrative'].strip()
+        if narrative.startswith('"') and narrative.endswith('"'):
+            narrative = narrative[1:-1]
+        combat_result['narrative'] = narrative
+        
+        logger.info(f"[analyze_combat_and_create_narrative] Generated narrative: {narrative}")
+        return combat_result
+        
+    except Exception as e:
+        logger.error(f"[analyze_combat_and_create_narrative] Combat analysis failed, using fallback response: {str(e)}")
+        return {
+            'narrative': f"Round {current_round}: {player1_name} and {player2_name} engaged in combat, but the AI had trouble analyzing the outcome. Please try your move again.",
+            'player1_result': {'reason': f'{player1_name} continues fighting'},
+            'player2_result': {'reason': f'{player2_name} continues fighting'},
+            'player1_damage_dealt': 0,
+            'player2_damage_dealt': 0,
+            'player1_control_delta': 0,
+            'player2_control_delta': 0,
+            'player1_intends_heal': False,
+            'player2_intends_heal': False,
+        }
 
 
 async def get_monster_max_vital(monster_data: dict) -> int:
@@ -768,16 +730,9 @@ async def send_duel_results(
 
                             # Broadcast updated room state so clients refresh monster list
                             try:
-                                from .models import Room
-                                room = Room(**room_data)
-                                room.players = await game_manager.db.get_room_players(room_id)
-                                room_dict = room.dict()
-                                for key, value in room_dict.items():
-                                    if isinstance(value, bytes):
-                                        room_dict[key] = value.decode('utf-8')
-                                await manager.broadcast_to_room(room_id, {
+                                await game_manager.broadcast_room_update(room_id, {
                                     "type": "room_update",
-                                    "room": room_dict
+                                    "room": room_data
                                 })
                             except Exception as e:
                                 logger.error(f"[Duel] Failed to broadcast updated room after monster defeat: {str(e)}")
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # API Keys and External Services
@@ -29,6 +29,125 @@ class Settings(BaseSettings):
     FAL_KEY: str = ""
     FAL_MODEL: str = "fal-ai/hunyuan_world/image-to-world"
     MODEL_3D_GENERATION_ENABLED: bool = True
+    MODEL_3D_POLL_BATCH_SIZE: int = 50  # Due FAL jobs polled per round
+    MODEL_3D_POLL_MIN_INTERVAL: float = 5.0  # Seconds before a new job's first poll
+    MODEL_3D_POLL_MAX_INTERVAL: float = 60.0  # Cap on the interval between polls of one job
+    MODEL_3D_POLL_BACKOFF: float = 1.5  # Interval growth per poll
+    MODEL_3D_POLL_TIMEOUT: float = 1200.0  # Seconds before a job still running is marked as an error
+    MODEL_3D_POLL_CONCURRENCY: int = 10  # FAL status requests in flight per round
+    MODEL_3D_UPLOAD_CONCURRENCY: int = 2  # Finished models downloaded/uploaded to storage at once
+
+    # LLM Provider
+    LLM_PROVIDER: str = "openai"  # "openai" or "fake" (local stand-in for load/latency testing)
+    LLM_FAKE_TOKENS_PER_SECOND: float = 80.0  # Fake provider output token rate
+    LLM_FAKE_TTFT_MS: float = 350.0  # Fake provider mean time to first token
+    LLM_FAKE_TTFT_JITTER_MS: float = 120.0  # Fake provider TTFT standard deviation
+
+    # LLM Scheduling
+    LLM_MAX_CONCURRENCY: int = 16  # Max concurrent LLM calls per process
+    LLM_BACKGROUND_MAX_CONCURRENCY: int = 12  # Share of slots usable by room population/preloads
+    MONSTER_BATCH_GENERATION: bool = True  # Generate all of a room's monsters from one prompt
+    ACTION_CONTEXT_TOKEN_BUDGET: int = 1500  # Max tokens for the stream_action context JSON
+    ACTION_CONTEXT_FRAGMENT_TTL: float = 30.0  # Seconds to reuse cached per-room context fragments
+    ACTION_CONTEXT_CACHED_ROOMS: int = 1024  # Max rooms with cached context fragments/items per process (LRU)
+    STRUCTURED_OUTPUT_MAX_ATTEMPTS: int = 2  # Generations per JSON call before giving up (repairs don't count)
+
+    # LLM Response Cache (non-interactive calls only)
+    LLM_RESPONSE_CACHE_ENABLED: bool = False
+    LLM_RESPONSE_CACHE_LRU_SIZE: int = 2048
+    LLM_RESPONSE_CACHE_TTLS: Dict[str, int] = {  # Seconds per call site; 0 or missing = not cached
+        "validate_action": 3600,
+        "item_supports_action": 86400,
+        "validation_rules": 604800,
+        "analyze_duel": 1800,
+        "generate_biome_chunk": 0
+    }
+
+    # Room Content Pool
+    ROOM_POOL_ENABLED: bool = False  # Claim pre-generated room bundles when exploring
+    ROOM_POOL_DEPTH: int = 3  # Ready bundles kept per biome
+    ROOM_POOL_PREGENERATE_IMAGES: bool = False  # Also generate the image while filling the pool
+    ROOM_POOL_IDLE_POLL_SECONDS: float = 2.0  # How often a refill re-checks for idle LLM capacity
+
+    # Speculative Preloading
+    PRELOAD_DEPTH: int = 2  # Rings ahead of the player to preload along the likely path
+    PRELOAD_BUDGET: int = 6  # Max rooms per plan; the 4 neighbours always count towards it
+    PRELOAD_MIN_PROBABILITY: float = 0.05  # Skip rooms beyond the first ring less likely than this
+    PRELOAD_HEADING_HISTORY: int = 6  # Recent steps used to predict the player's heading
+
+    # Background Generation Work Manager
+    GENERATION_MAX_WORKERS: int = 8  # Room preloads/image jobs running at once per process
+    GENERATION_MAX_QUEUE: int = 200  # Queued jobs before low priority speculative work is shed
+    GENERATION_MAX_QUEUED_PER_PLAYER: int = 12  # Queued jobs one player may hold
+    GENERATION_MAX_QUEUE_AGE: float = 120.0  # Seconds before queued speculative work is dropped
+
+    # Durable Job Queue (image and 3D work run by `python -m app.job_worker`)
+    JOB_QUEUE_ENABLED: bool = False  # Send room image/3D work to the Redis job queue instead of in-process tasks
+    JOB_WORKER_CONCURRENCY: int = 4  # Jobs each worker process runs at once
+    JOB_VISIBILITY_TIMEOUT: float = 120.0  # Seconds without a heartbeat before a running job is handed back
+    JOB_MAX_ATTEMPTS: int = 5  # Attempts before a job is marked dead
+    JOB_RETRY_BACKOFF_BASE: float = 5.0  # First retry delay in seconds, doubled per attempt
+    JOB_RETRY_BACKOFF_MAX: float = 300.0  # Cap on the retry delay
+    JOB_POLL_INTERVAL: float = 1.0  # Seconds an idle worker waits before checking for jobs again
+
+    # Asset Transfers (provider URL -> Supabase Storage)
+    ASSET_TRANSFER_MAX_CONCURRENCY: int = 4  # Image/model transfers streaming at once per process
+    ASSET_TRANSFER_CHUNK_SIZE: int = 262144  # Bytes per streamed chunk (256 KB)
+
+    # Room Image Derivatives
+    IMAGE_DERIVATIVES_ENABLED: bool = False  # Store resized thumb/mobile/desktop copies of room art
+    IMAGE_DERIVATIVE_WORKERS: int = 2  # Processes used for resizing/encoding
+    IMAGE_DERIVATIVE_FORMATS: str = "webp,avif"  # Encoded formats (AVIF needs Pillow 11.3+)
+    IMAGE_DERIVATIVE_QUALITY: int = 70  # Encoder quality for derivatives
+
+    # Room Image Reuse (MinHash index of image prompts per biome)
+    IMAGE_REUSE_MODE: str = "off"  # "off" (only count matches), "reuse", or "variation" (reuse, then queue an img2img variation)
+    IMAGE_REUSE_THRESHOLD: float = 0.6  # Estimated prompt similarity (Jaccard) needed to reuse an image
+    IMAGE_REUSE_RATIO: float = 0.5  # Share of matching prompts that reuse instead of generating fresh art
+    IMAGE_VARIATION_MODEL: str = "black-forest-labs/flux-dev"  # Replicate img2img model used for variations
+    IMAGE_VARIATION_STRENGTH: float = 0.6  # How far a variation may move away from the reused image (0-1)
+
+    # Expired Temporary Image Regeneration
+    IMAGE_REGEN_PER_MINUTE: int = 10  # Regenerations started per minute across all processes
+    IMAGE_REGEN_MARKER_TTL: int = 600  # Seconds a room stays marked in progress (also the retry cooldown after a failure)
+    IMAGE_REGEN_SWEEPER_ENABLED: bool = True  # Regenerate indexed temporary URLs before players reach the rooms
+    IMAGE_REGEN_SWEEP_INTERVAL: float = 30.0  # Seconds between sweeps of the temporary URL index
+    IMAGE_REGEN_SWEEP_BATCH: int = 20  # Oldest indexed rooms looked at per sweep
+
+    # WebSocket Broadcast Bus
+    BROADCAST_BUS: str = "local"  # "local" (one worker) or "redis" (fan out across workers/hosts; implied by JOB_QUEUE_ENABLED)
+    BROADCAST_POLL_TIMEOUT: float = 0.05  # Seconds the Redis subscriber waits for messages per poll
+
+    # WebSocket Outbound Queues
+    WS_OUTBOUND_QUEUE_SIZE: int = 256  # Messages buffered per socket before its overflow policy applies
+    WS_SEND_TIMEOUT: float = 10.0  # Seconds a single send may take before the socket is treated as dead
+    WS_OVERFLOW_POLICIES: Dict[str, str] = {"presence": "drop_oldest", "chat": "drop_oldest"}  # Message type -> policy when a queue is full
+    WS_OVERFLOW_DEFAULT_POLICY: str = "disconnect"  # Policy for every other type ("drop_oldest" or "disconnect")
+
+    # WebSocket Actions
+    WS_ACTIONS_ENABLED: bool = True  # Accept actions over authenticated sockets (POST /action/stream stays available)
+    WS_ACTION_RECONNECT_GRACE: float = 5.0  # Seconds an action's remaining events wait for the player's socket after a move
+    WS_TYPEWRITER_INTERVAL: float = 0.3  # Seconds between scheduled typewriter chunks (quest storylines) unless fast-forwarded
+
+    # Room State Sync
+    ROOM_STATE_PATCH_HISTORY: int = 20  # Patches kept per room for clients reconnecting with an older version
+    ROOM_STATE_TTL: int = 86400  # Seconds a room's snapshot and patches are kept after its last update
+
+    # Presence
+    PRESENCE_TTL: int = 90  # Seconds a player stays listed in a room without a heartbeat (clients ping every 30s)
+
+    # Narrative Streaming
+    STREAM_COALESCE_MS: float = 50.0  # Max age of buffered narrative text before it is sent (0 sends every delta)
+    STREAM_COALESCE_BYTES: int = 256  # Buffered narrative bytes that trigger a send
+    STREAM_COALESCE_ON_SENTENCE: bool = True  # Also send as soon as a sentence ends
+    STREAM_TIMING_SAMPLE_RATE: float = 0.05  # Fraction of actions whose stream timing is measured and logged
+
+    # Room Affinity (rooms owned by one API worker each; clients connect through `uvicorn app.router:app`)
+    ROOM_AFFINITY_ENABLED: bool = False  # Assign rooms to workers by consistent hashing (implies the Redis broadcast bus)
+    ROOM_AFFINITY_WORKER_URL: str = ""  # Internal base URL the router reaches this worker at; required with affinity, unique per worker
+    ROOM_AFFINITY_HEARTBEAT: float = 5.0  # Seconds between worker heartbeats and ring refreshes
+    ROOM_AFFINITY_WORKER_TTL: float = 15.0  # Seconds without a heartbeat before a worker's rooms move to the others
+    ROOM_AFFINITY_REPLICAS: int = 64  # Virtual nodes per worker on the hash ring
 
     # Server Settings
     HOST: str = "0.0.0.0"
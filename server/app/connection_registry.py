@@ -0,0 +1,93 @@
+"""
+Registry of the WebSocket connections held by this process.
+Connections are indexed by room (broadcasts) and by player (personal sends,
+disconnects), and last activity is kept in a heap with one entry per player, so
+expiring idle players only touches the ones that actually expired.
+"""
+import heapq
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from .outbound_queue import OutboundConnection
+
+
+class ConnectionRegistry:
+    """room -> player -> connection and player -> room -> connection, plus inactivity expiry"""
+
+    def __init__(self, inactivity_timeout: float):
+        self.inactivity_timeout = inactivity_timeout
+        self.rooms: Dict[str, Dict[str, OutboundConnection]] = {}
+        # Usually one room per player; two while a move's old socket is still closing
+        self.players: Dict[str, Dict[str, OutboundConnection]] = {}
+        self.last_seen: Dict[str, float] = {}
+        self._expiry: List[Tuple[float, str]] = []  # (last seen when scheduled, player_id)
+        self._scheduled: Set[str] = set()
+
+    def __len__(self) -> int:
+        return sum(len(connections) for connections in self.rooms.values())
+
+    def add(self, room_id: str, player_id: str, connection: OutboundConnection) -> Optional[OutboundConnection]:
+        """Register a connection; returns the one it replaced, if any"""
+        previous = self.rooms.setdefault(room_id, {}).get(player_id)
+        self.rooms[room_id][player_id] = connection
+        self.players.setdefault(player_id, {})[room_id] = connection
+        return previous
+
+    def remove(self, room_id: str, player_id: str, websocket: Optional[WebSocket] = None) -> Optional[OutboundConnection]:
+        """Unregister a connection; with `websocket`, only if it hasn't been replaced by a reconnect"""
+        connection = self.rooms.get(room_id, {}).get(player_id)
+        if connection is None or (websocket is not None and connection.websocket is not websocket):
+            return None
+        del self.rooms[room_id][player_id]
+        if not self.rooms[room_id]:
+            del self.rooms[room_id]
+        del self.players[player_id][room_id]
+        if not self.players[player_id]:
+            del self.players[player_id]
+        return connection
+
+    def get(self, room_id: str, player_id: str) -> Optional[OutboundConnection]:
+        return self.rooms.get(room_id, {}).get(player_id)
+
+    def in_room(self, room_id: str) -> Dict[str, OutboundConnection]:
+        return self.rooms.get(room_id, {})
+
+    def for_player(self, player_id: str) -> Dict[str, OutboundConnection]:
+        return self.players.get(player_id, {})
+
+    def touch(self, player_id: str, now: Optional[float] = None) -> None:
+        """Record activity; a player is only pushed on the heap again once its entry is popped"""
+        now = time.time() if now is None else now
+        self.last_seen[player_id] = now
+        if player_id not in self._scheduled:
+            self._scheduled.add(player_id)
+            heapq.heappush(self._expiry, (now, player_id))
+
+    def is_active(self, player_id: str, timeout_seconds: float, now: Optional[float] = None) -> bool:
+        if player_id not in self.last_seen:
+            return False
+        return ((time.time() if now is None else now) - self.last_seen[player_id]) < timeout_seconds
+
+    def expire(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """
+        Forget players idle for longer than the timeout and return the (room_id, player_id)
+        connections they still hold. Players active since their entry was scheduled are
+        rescheduled at their latest activity.
+        """
+        cutoff = (time.time() if now is None else now) - self.inactivity_timeout
+        expired = []
+        while self._expiry and self._expiry[0][0] <= cutoff:
+            _, player_id = heapq.heappop(self._expiry)
+            last_seen = self.last_seen.get(player_id)
+            if last_seen is not None and last_seen > cutoff:
+                heapq.heappush(self._expiry, (last_seen, player_id))
+                continue
+            self._scheduled.discard(player_id)
+            self.last_seen.pop(player_id, None)
+            expired.extend((room_id, player_id) for room_id in self.for_player(player_id))
+        return expired
+
+    def summary(self) -> Dict[str, int]:
+        return {room_id: len(connections) for room_id, connections in self.rooms.items()}
@@ -0,0 +1,263 @@
+"""
+Compact, token-budgeted context for the game master prompt in stream_action.
+Projects only the fields the game master needs, trims low-priority sections
+until the context fits the budget and caches per-room fragments between actions.
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count prompt tokens, falling back to a ~4 chars/token estimate without tiktoken"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+PLAYER_FIELDS = ['id', 'name', 'current_room', 'inventory', 'health', 'gold', 'active_quest_id', 'quest_progress', 'memory_log']
+ROOM_FIELDS = ['id', 'title', 'description', 'x', 'y', 'biome', 'connections', 'npcs', 'items', 'monsters', 'players']
+NPC_FIELDS = ['id', 'name', 'description', 'dialogue_history']
+MONSTER_FIELDS = ['id', 'name', 'description', 'aggressiveness', 'intelligence', 'size', 'special_effects', 'health', 'is_alive']
+ITEM_FIELDS = ['id', 'name', 'rarity', 'capabilities']
+CHAT_FIELDS = ['player_id', 'message_type', 'message', 'timestamp']
+
+# Default caps applied before budgeting
+MAX_MEMORY_LOG = 10
+MAX_DIALOGUE_HISTORY = 4
+MAX_RECENT_CHAT = 20
+
+
+def _project(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Keep only the listed fields that are present"""
+    return {field: data[field] for field in fields if field in data and data[field] is not None}
+
+
+class ActionContextBuilder:
+    """Builds the stream_action context within a token budget"""
+
+    def __init__(self, token_budget: int, fragment_ttl: float, max_rooms: int = 1024):
+        self.token_budget = token_budget
+        self.fragment_ttl = fragment_ttl
+        self.max_rooms = max(1, max_rooms)
+        # LRU caches bounded to max_rooms, so rooms nobody acts in any more fall out
+        # room_id -> (expires_at, signature, fragment)
+        self._room_fragments: "OrderedDict[str, Tuple[float, Tuple, Dict[str, Any]]]" = OrderedDict()
+        # room_id -> (expires_at, item_ids, items)
+        self._room_items: "OrderedDict[str, Tuple[float, Tuple, List[Dict[str, Any]]]]" = OrderedDict()
+        self.metrics = {
+            'actions': 0,
+            'total_tokens': 0,
+            'max_tokens': 0,
+            'truncated_actions': 0,
+            'fragment_hits': 0,
+            'fragment_misses': 0,
+            'prompts': 0,
+            'total_prompt_tokens': 0,
+            'max_prompt_tokens': 0
+        }
+
+    async def load_room_items(self, room, db) -> List[Dict[str, Any]]:
+        """Load room item documents, reusing the cached copy while the room's item list is unchanged"""
+        item_ids = tuple(room.items or [])
+        cached = self._room_items.get(room.id)
+        if cached and cached[0] > time.time() and cached[1] == item_ids:
+            self._room_items.move_to_end(room.id)
+            return cached[2]
+
+        items = []
+        for item_id in item_ids:
+            try:
+                item_data = await db.get_item(item_id)
+                if item_data:
+                    items.append(item_data)
+                else:
+                    logger.warning(f"[AI Context] Room item {item_id} not found in database!")
+            except Exception as e:
+                logger.warning(f"[AI Context] Failed to load room item {item_id}: {str(e)}")
+
+        self._remember(self._room_items, room.id, (time.time() + self.fragment_ttl, item_ids, items))
+        return items
+
+    def _remember(self, cache: "OrderedDict[str, Any]", room_id: str, entry: Any) -> None:
+        cache[room_id] = entry
+        cache.move_to_end(room_id)
+        while len(cache) > self.max_rooms:
+            cache.popitem(last=False)
+
+    def invalidate_room(self, room_id: str) -> None:
+        """Drop cached fragments for a room"""
+        self._room_fragments.pop(room_id, None)
+        self._room_items.pop(room_id, None)
+
+    def _room_fragment(self, room, npcs: List[Any], monsters: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Projected room/NPC/monster fragment, cached per room while its contents are unchanged"""
+        room_dict = room.dict()
+        signature = (
+            room_dict.get('title'),
+            room_dict.get('description'),
+            tuple(room_dict.get('npcs') or []),
+            tuple(room_dict.get('monsters') or []),
+            tuple(room_dict.get('players') or []),
+            tuple(sorted((str(k), v) for k, v in (room_dict.get('connections') or {}).items())),
+            tuple((m.get('id'), m.get('health'), m.get('is_alive')) for m in monsters),
+            tuple((n.get('id'), len(n.get('dialogue_history') or [])) for n in npcs)
+        )
+        cached = self._room_fragments.get(room.id)
+        if cached and cached[0] > time.time() and cached[1] == signature:
+            self.metrics['fragment_hits'] += 1
+            self._room_fragments.move_to_end(room.id)
+            return cached[2]
+
+        self.metrics['fragment_misses'] += 1
+        projected_npcs = []
+        for npc in npcs:
+            npc_view = _project(npc, NPC_FIELDS)
+            npc_view['dialogue_history'] = (npc.get('dialogue_history') or [])[-MAX_DIALOGUE_HISTORY:]
+            projected_npcs.append(npc_view)
+
+        fragment = {
+            'room': _project(room_dict, ROOM_FIELDS),
+            'npcs': projected_npcs,
+            'monsters': [_project(m, MONSTER_FIELDS) for m in monsters]
+        }
+        self._remember(self._room_fragments, room.id, (time.time() + self.fragment_ttl, signature, fragment))
+        return fragment
+
+    def build(
+        self,
+        action: str,
+        player,
+        room,
+        game_state,
+        npcs: List[Any],
+        monsters: Optional[List[Dict[str, Any]]],
+        room_items: List[Dict[str, Any]],
+        item_availability: Dict[str, Any],
+        chat_history: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[Dict[str, Any], int]:
+        """Build the compact context and return it with its token count"""
+        npc_dicts = [npc.dict() if hasattr(npc, 'dict') else npc for npc in npcs]
+        fragment = self._room_fragment(room, npc_dicts, monsters or [])
+
+        player_view = _project(player.dict(), PLAYER_FIELDS)
+        player_view['memory_log'] = (player_view.get('memory_log') or [])[-MAX_MEMORY_LOG:]
+
+        state_dict = game_state.dict()
+        context = {
+            "player": player_view,
+            "room": fragment['room'],
+            "game_state": {
+                "world_seed": state_dict.get('world_seed'),
+                "main_quest_summary": state_dict.get('main_quest_summary')
+            },
+            "npcs": [dict(npc) for npc in fragment['npcs']],
+            "monsters": [dict(monster) for monster in fragment['monsters']],
+            "room_items": [_project(item, ITEM_FIELDS) for item in room_items],
+            "action": action,
+            "timestamp": datetime.utcnow().isoformat(),
+            "item_availability": item_availability
+        }
+        if chat_history:
+            context["recent_chat"] = [_project(m, CHAT_FIELDS) for m in chat_history[:MAX_RECENT_CHAT]]
+
+        tokens = count_tokens(json.dumps(context))
+        truncated = False
+        # Trim in priority order (least important first) until the context fits
+        for trim in (self._trim_chat, self._trim_memory_log, self._trim_dialogue, self._trim_descriptions):
+            if tokens <= self.token_budget:
+                break
+            while tokens > self.token_budget and trim(context):
+                truncated = True
+                tokens = count_tokens(json.dumps(context))
+
+        self.metrics['actions'] += 1
+        self.metrics['total_tokens'] += tokens
+        self.metrics['max_tokens'] = max(self.metrics['max_tokens'], tokens)
+        if truncated:
+            self.metrics['truncated_actions'] += 1
+            logger.info(f"[AI Context] Context truncated to {tokens} tokens (budget {self.token_budget})")
+
+        return context, tokens
+
+    @staticmethod
+    def _trim_chat(context: Dict[str, Any]) -> bool:
+        """Drop the older half of recent chat"""
+        chat = context.get("recent_chat")
+        if not chat:
+            return False
+        # Newest first, so drop from the end
+        context["recent_chat"] = chat[:len(chat) // 2] if len(chat) > 1 else []
+        return True
+
+    @staticmethod
+    def _trim_memory_log(context: Dict[str, Any]) -> bool:
+        """Drop the older half of the player memory log"""
+        memory_log = context["player"].get("memory_log")
+        if not memory_log:
+            return False
+        context["player"]["memory_log"] = memory_log[len(memory_log) // 2 + 1:]
+        return True
+
+    @staticmethod
+    def _trim_dialogue(context: Dict[str, Any]) -> bool:
+        """Drop the oldest dialogue line from each NPC"""
+        trimmed = False
+        for npc in context["npcs"]:
+            if npc.get("dialogue_history"):
+                npc["dialogue_history"] = npc["dialogue_history"][1:]
+                trimmed = True
+        return trimmed
+
+    @staticmethod
+    def _trim_descriptions(context: Dict[str, Any]) -> bool:
+        """Drop NPC and monster descriptions, which the prompt's room sections repeat"""
+        trimmed = False
+        for entity in context["npcs"] + context["monsters"]:
+            if entity.get("description"):
+                entity.pop("description")
+                trimmed = True
+        return trimmed
+
+    def record_prompt_tokens(self, tokens: int) -> None:
+        """Record the token count of a full prompt built around this context"""
+        self.metrics['prompts'] += 1
+        self.metrics['total_prompt_tokens'] += tokens
+        self.metrics['max_prompt_tokens'] = max(self.metrics['max_prompt_tokens'], tokens)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Prompt token metrics across all actions built so far"""
+        actions = self.metrics['actions'] or 1
+        prompts = self.metrics['prompts'] or 1
+        return {
+            **self.metrics,
+            'avg_tokens': round(self.metrics['total_tokens'] / actions, 1),
+            'avg_prompt_tokens': round(self.metrics['total_prompt_tokens'] / prompts, 1),
+            'token_budget': self.token_budget,
+            'cached_rooms': len(self._room_fragments)
+        }
+
+
+# Global builder instance shared by every action in this process
+action_context_builder = ActionContextBuilder(
+    settings.ACTION_CONTEXT_TOKEN_BUDGET,
+    settings.ACTION_CONTEXT_FRAGMENT_TTL,
+    settings.ACTION_CONTEXT_CACHED_ROOMS
+)
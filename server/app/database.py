@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Optional
 from .config import settings
 import logging
 from .logger import setup_logging
+from .presence import presence
 from datetime import datetime
 import uuid
 
@@ -300,10 +301,10 @@ class Database:
 
     @staticmethod
     async def add_to_room_players(room_id: str, player_id: str) -> bool:
-        """Add player to room's player list"""
+        """Add player to room's player list (and take them out of the room they were in)"""
         try:
             logger.debug(f"Adding player {player_id} to room {room_id}")
-            return redis_client.sadd(f"room:{room_id}:players", player_id)
+            return presence.join(room_id, player_id)
         except Exception as e:
             logger.error(f"Error adding player {player_id} to room {room_id}: {str(e)}")
             raise
@@ -313,24 +314,16 @@ class Database:
         """Remove player from room's player list"""
         try:
             logger.debug(f"Removing player {player_id} from room {room_id}")
-            return redis_client.srem(f"room:{room_id}:players", player_id)
+            return presence.leave(room_id, player_id)
         except Exception as e:
             logger.error(f"Error removing player {player_id} from room {room_id}: {str(e)}")
             raise
 
     @staticmethod
     async def get_room_players(room_id: str) -> List[str]:
-        """Get list of players in a room"""
+        """Get list of players in a room; players without a heartbeat within PRESENCE_TTL are dropped"""
         try:
-            players = redis_client.smembers(f"room:{room_id}:players")
-            # Convert any bytes to strings and filter out null/empty values
-            valid_players = []
-            for p in players:
-                player_id = p.decode('utf-8') if isinstance(p, bytes) else p
-                # Filter out None, empty strings, and 'null' string
-                if player_id and player_id != 'null' and player_id != 'None':
-                    valid_players.append(player_id)
-            return valid_players
+            return presence.room_players(room_id)
         except Exception as e:
             logger.error(f"Error getting players for room {room_id}: {str(e)}")
             raise
@@ -2,9 +2,10 @@
 FAL AI service for 3D model generation using hunyuan_world model.
 Uses polling (not webhooks) to check job completion.
 """
+import asyncio
 import logging
 import os
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple
 from .config import settings
 from .logger import setup_logging
 
@@ -78,6 +79,27 @@ class FALService:
             Dict with 'status' ('queued', 'in_progress', 'completed', 'failed')
             and optionally 'result_url' (the world_file URL) or 'error'
         """
+        # fal_client is synchronous; keep its HTTP calls off the event loop
+        return await asyncio.to_thread(FALService._poll_job_status_sync, request_id)
+
+    @staticmethod
+    async def poll_job_statuses(request_ids: List[str], concurrency: int = 10) -> Dict[str, Dict[str, Any]]:
+        """
+        Poll a batch of FAL jobs with at most `concurrency` status requests in flight.
+
+        Returns:
+            Dict of request_id -> poll_job_status result
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def poll(request_id: str) -> Tuple[str, Dict[str, Any]]:
+            async with semaphore:
+                return request_id, await FALService.poll_job_status(request_id)
+
+        return dict(await asyncio.gather(*(poll(request_id) for request_id in request_ids)))
+
+    @staticmethod
+    def _poll_job_status_sync(request_id: str) -> Dict[str, Any]:
         if not settings.FAL_KEY:
             return {"status": "failed", "error": "FAL_KEY not configured"}
 
@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 import time
 import uuid
@@ -13,7 +13,19 @@ from .hybrid_database import HybridDatabase as Database
 from .ai_handler import AIHandler, WORLD_CONFIG
 from .rate_limiter import RateLimiter
 from .biome_manager import BiomeManager
-from .image_storage import is_temporary_image_url
+from .image_storage import is_temporary_image_url, copy_room_image
+from .structured_output import StructuredOutputError
+from .room_pool import room_content_pool
+from .preload_planner import preload_planner, PreloadTarget
+from .generation_manager import generation_manager, GenerationShedError, PRIORITY_IMAGE_REGENERATION, PRIORITY_ROOM_IMAGE, PRIORITY_IMAGE_DERIVATIVES, PRIORITY_IMAGE_VARIATION
+from .job_queue import job_queue
+from .model_3d_poller import model_3d_poller
+from .image_derivatives import image_derivatives
+from .image_reuse import prompt_image_index
+from .image_regeneration import image_regeneration, QUEUED, RESOLVED
+from .broadcast_bus import broadcast_bus
+from .room_state import room_state
+from .config import settings
 
 # Helper to get chunk id using Perlin noise
 CHUNK_SIZE = 13  # Slightly larger chunk size for bigger biomes
@@ -465,9 +477,23 @@ class GameManager:
 
     async def generate_room_monsters(self, room_context: Dict[str, Any]) -> List[str]:
         """Generate 0-3 monsters for a room based on biome and environment"""
+        specs = await self._generate_monster_specs(room_context)
+        return await self._save_monster_specs(room_context, specs)
+
+    async def _save_monster_specs(self, room_context: Dict[str, Any], specs: List[Tuple[Dict[str, Any], Any]]) -> List[str]:
+        """Store (base_data, generated_data) monster specs for a room, returning the saved ids"""
+        results = await asyncio.gather(*(
+            self._save_generated_monster(room_context, base_data, generated_data, i)
+            for i, (base_data, generated_data) in enumerate(specs)
+        ))
+
+        return [monster_id for monster_id in results if monster_id]
+
+    async def _generate_monster_specs(self, room_context: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Any]]:
+        """Roll attributes and generate AI content for a room's monsters without saving them"""
         import random
-        import uuid
         from .templates.monsters import GenericMonsterTemplate
+        from .config import settings
 
         # Use pre-determined number if provided, otherwise random
         monster_count = room_context.get('monster_count')
@@ -481,101 +507,158 @@ class GameManager:
             return []
 
         monster_template = GenericMonsterTemplate()
-        monster_ids = []
 
+        # Roll base attributes for every monster up front so the AI calls can run together
+        slots = []
         for i in range(num_monsters):
-            monster_id = None
+            # Create a fresh context for each monster to ensure diversity
+            # Don't pass room_context directly as it gets modified
+            fresh_context = {
+                'room_id': room_context.get('room_id', ''),
+                'room_title': room_context.get('room_title', ''),
+                'room_description': room_context.get('room_description', ''),
+                'biome': room_context.get('biome', ''),
+                'x': room_context.get('x', 0),
+                'y': room_context.get('y', 0)
+                # Deliberately exclude aggressiveness, intelligence, size to force random generation
+            }
+
+            # Generate base monster data with random attributes
+            base_data = monster_template.generate_monster_data(fresh_context)
+            # Enforce: no aggressive monsters in the starting room
+            if room_context.get('room_id') == 'room_start' and base_data.get('aggressiveness') == 'aggressive':
+                # Re-roll to a safe aggressiveness
+                base_data['aggressiveness'] = random.choice(['passive', 'neutral', 'territorial'])
+            slots.append((fresh_context, base_data))
+
+        # Batched mode: one prompt produces every monster in the room
+        generated: List[Any] = [None] * num_monsters
+        if settings.MONSTER_BATCH_GENERATION and num_monsters > 1:
             try:
-                # Create a fresh context for each monster to ensure diversity
-                # Don't pass room_context directly as it gets modified
-                fresh_context = {
-                    'room_id': room_context.get('room_id', ''),
-                    'room_title': room_context.get('room_title', ''),
-                    'room_description': room_context.get('room_description', ''),
-                    'biome': room_context.get('biome', ''),
-                    'x': room_context.get('x', 0),
-                    'y': room_context.get('y', 0)
-                    # Deliberately exclude aggressiveness, intelligence, size to force random generation
-                }
+                prompt = monster_template.generate_batch_prompt([context for context, _ in slots])
+                batch = await self.ai_handler.generate_structured(
+                    prompt, monster_template.batch_output_model, call_site="room_monsters_batch", background=True
+                )
+                generated = monster_template.parse_batch_response(batch, num_monsters)
+                produced = sum(1 for data in generated if data is not None)
+                logger.info(f"[Monsters] Batch generation produced {produced}/{num_monsters} monsters for room {room_context.get('room_id', 'unknown')}")
+            except Exception as e:
+                logger.error(f"[Monsters] Batch generation failed, falling back to individual generation: {str(e)}")
+                generated = [None] * num_monsters
 
-                # Generate base monster data with random attributes
-                base_data = monster_template.generate_monster_data(fresh_context)
-                # Enforce: no aggressive monsters in the starting room
-                if room_context.get('room_id') == 'room_start' and base_data.get('aggressiveness') == 'aggressive':
-                    # Re-roll to a safe aggressiveness
-                    base_data['aggressiveness'] = random.choice(['passive', 'neutral', 'territorial'])
+        # Generate the slots the batch did not cover with one call per monster, concurrently
+        async def generate_single(context: Dict[str, Any]) -> Dict[str, Any]:
+            # Use the fresh context that now includes the generated attributes
+            prompt = monster_template.generate_prompt(context)
+            try:
+                return await self.ai_handler.generate_structured(
+                    prompt, monster_template.output_model, call_site="room_monster", background=True
+                )
+            except StructuredOutputError as e:
+                logger.error(f"[Monsters] No valid monster generated, using fallback monster: {str(e)}")
+                return monster_template.fallback_output()
+
+        missing = [index for index, data in enumerate(generated) if data is None]
+        if missing:
+            results = await asyncio.gather(
+                *(generate_single(slots[index][0]) for index in missing),
+                return_exceptions=True
+            )
+            for index, result in zip(missing, results):
+                generated[index] = result
 
-                # Generate AI content (name, description, special effects)
-                # Use the fresh context that now includes the generated attributes
-                prompt = monster_template.generate_prompt(fresh_context)
-                ai_response = await self.ai_handler.generate_text(prompt)
+        return [(base_data, generated_data) for (_, base_data), generated_data in zip(slots, generated)]
 
-                generated_data = await monster_template.parse_response(ai_response)
+    async def _save_generated_monster(
+        self,
+        room_context: Dict[str, Any],
+        base_data: Dict[str, Any],
+        generated_data: Any,
+        index: int
+    ) -> Optional[str]:
+        """Validate and store one generated monster, returning its id or None"""
+        import uuid
 
-                # Validate generated data has required fields
-                if not generated_data.get('name') or not generated_data.get('name').strip():
-                    logger.error(f"[Monsters] AI generation failed: missing or empty name")
-                    continue
-                if not generated_data.get('description') or not generated_data.get('description').strip():
-                    logger.error(f"[Monsters] AI generation failed: missing or empty description")
-                    continue
+        monster_id = None
+        try:
+            if isinstance(generated_data, Exception):
+                raise generated_data
 
-                # Create complete monster data
-                monster_id = f"monster_{uuid.uuid4()}"
-                monster_data = {
-                    'id': monster_id,
-                    'name': generated_data['name'].strip(),
-                    'description': generated_data['description'].strip(),
-                    'aggressiveness': base_data['aggressiveness'],
-                    'intelligence': base_data['intelligence'],
-                    'size': base_data['size'],
-                    'special_effects': generated_data.get('special_effects', '').strip(),
-                    'location': room_context.get('room_id', ''),
-                    'health': base_data['health'],
-                    'is_alive': True,
-                    'properties': {}
-                }
+            # Validate generated data has required fields
+            if not generated_data.get('name') or not generated_data.get('name').strip():
+                logger.error(f"[Monsters] AI generation failed: missing or empty name")
+                return None
+            if not generated_data.get('description') or not generated_data.get('description').strip():
+                logger.error(f"[Monsters] AI generation failed: missing or empty description")
+                return None
 
-                # Validate monster data before saving (FIX #1 & #4)
-                is_valid, error_msg = self._validate_monster_data(monster_data)
-                if not is_valid:
-                    logger.error(f"[Monsters] Monster validation failed: {error_msg}")
-                    logger.error(f"[Monsters] Invalid monster data: {monster_data}")
-                    continue
+            # Create complete monster data
+            monster_id = f"monster_{uuid.uuid4()}"
+            monster_data = {
+                'id': monster_id,
+                'name': generated_data['name'].strip(),
+                'description': generated_data['description'].strip(),
+                'aggressiveness': base_data['aggressiveness'],
+                'intelligence': base_data['intelligence'],
+                'size': base_data['size'],
+                'special_effects': generated_data.get('special_effects', '').strip(),
+                'location': room_context.get('room_id', ''),
+                'health': base_data['health'],
+                'is_alive': True,
+                'properties': {}
+            }
 
-                # Store monster in database (atomic operation)
-                try:
-                    await self.db.set_monster(monster_id, monster_data)
-                    # Verify the save was successful by reading it back
-                    verification = await self.db.get_monster(monster_id)
-                    if not verification:
-                        raise Exception("Failed to verify monster save")
-
-                    monster_ids.append(monster_id)
-                    logger.info(f"[Monsters] Generated and validated monster {generated_data['name']} ({monster_id}) for room {room_context.get('room_id', 'unknown')}")
-
-                except Exception as save_error:
-                    logger.error(f"[Monsters] Failed to save monster to database: {str(save_error)}")
-                    # If save failed, don't add to monster_ids
-                    continue
+            # Validate monster data before saving (FIX #1 & #4)
+            is_valid, error_msg = self._validate_monster_data(monster_data)
+            if not is_valid:
+                logger.error(f"[Monsters] Monster validation failed: {error_msg}")
+                logger.error(f"[Monsters] Invalid monster data: {monster_data}")
+                return None
 
-            except Exception as e:
-                logger.error(f"[Monsters] Error generating monster {i+1}: {str(e)}")
-                # If we created a partial monster, try to clean it up
-                if monster_id:
-                    try:
-                        await self.db.delete_monster(monster_id)
-                        logger.info(f"[Monsters] Cleaned up partial monster {monster_id}")
-                    except Exception as cleanup_error:
-                        logger.error(f"[Monsters] Failed to cleanup partial monster: {cleanup_error}")
-                continue
+            # Store monster in database (atomic operation)
+            try:
+                await self.db.set_monster(monster_id, monster_data)
+                # Verify the save was successful by reading it back
+                verification = await self.db.get_monster(monster_id)
+                if not verification:
+                    raise Exception("Failed to verify monster save")
+
+                logger.info(f"[Monsters] Generated and validated monster {generated_data['name']} ({monster_id}) for room {room_context.get('room_id', 'unknown')}")
+                return monster_id
+
+            except Exception as save_error:
+                logger.error(f"[Monsters] Failed to save monster to database: {str(save_error)}")
+                # If save failed, don't add to monster_ids
+                return None
 
-        return monster_ids
+        except Exception as e:
+            logger.error(f"[Monsters] Error generating monster {index+1}: {str(e)}")
+            # If we created a partial monster, try to clean it up
+            if monster_id:
+                try:
+                    await self.db.delete_monster(monster_id)
+                    logger.info(f"[Monsters] Cleaned up partial monster {monster_id}")
+                except Exception as cleanup_error:
+                    logger.error(f"[Monsters] Failed to cleanup partial monster: {cleanup_error}")
+            return None
 
     async def generate_room_npcs(self, room_context: Dict[str, Any]) -> List[str]:
         """Generate 0-2 NPCs for a room based on biome and environment"""
+        specs = await self._generate_npc_specs(room_context)
+        return await self._save_npc_specs(room_context, specs)
+
+    async def _save_npc_specs(self, room_context: Dict[str, Any], specs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[str]:
+        """Store (base_data, generated_data) NPC specs for a room, returning the saved ids"""
+        results = await asyncio.gather(*(
+            self._save_generated_npc(room_context, base_data, generated_data, i)
+            for i, (base_data, generated_data) in enumerate(specs)
+        ))
+
+        return [npc_id for npc_id in results if npc_id]
+
+    async def _generate_npc_specs(self, room_context: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Roll the NPC count and generate AI content for each NPC without saving them"""
         import random
-        import uuid
         from .templates.npcs import GenericNPCTemplate
 
         # Random NPC spawn: 0-2 NPCs per room (lower chance than monsters)
@@ -586,82 +669,107 @@ class GameManager:
             return []
 
         npc_template = GenericNPCTemplate()
-        npc_ids = []
+        results = await asyncio.gather(*(
+            self._generate_npc_spec(npc_template, room_context, i)
+            for i in range(num_npcs)
+        ))
 
-        for i in range(num_npcs):
-            npc_id = None
-            try:
-                # Create a fresh context for each NPC to ensure diversity
-                fresh_context = {
-                    'room_id': room_context.get('room_id', ''),
-                    'room_title': room_context.get('room_title', ''),
-                    'room_description': room_context.get('room_description', ''),
-                    'biome': room_context.get('biome', '')
-                }
+        return [spec for spec in results if spec]
 
-                # Generate base NPC data
-                base_data = npc_template.generate_npc_data(fresh_context)
+    async def _generate_npc_spec(self, npc_template, room_context: Dict[str, Any], index: int) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Generate base attributes and AI content for one NPC, or None on failure"""
+        try:
+            # Create a fresh context for each NPC to ensure diversity
+            fresh_context = {
+                'room_id': room_context.get('room_id', ''),
+                'room_title': room_context.get('room_title', ''),
+                'room_description': room_context.get('room_description', ''),
+                'biome': room_context.get('biome', '')
+            }
 
-                # Generate AI content (name, description, backstory, etc.)
-                prompt = npc_template.generate_prompt(fresh_context)
-                ai_response = await self.ai_handler.generate_text(prompt)
+            # Generate base NPC data
+            base_data = npc_template.generate_npc_data(fresh_context)
 
-                generated_data = await npc_template.parse_response(ai_response)
+            # Generate AI content (name, description, backstory, etc.)
+            prompt = npc_template.generate_prompt(fresh_context)
+            try:
+                generated_data = await self.ai_handler.generate_structured(
+                    prompt, npc_template.output_model, call_site="room_npc", background=True
+                )
+            except StructuredOutputError as e:
+                logger.error(f"[NPCs] No valid NPC generated, using fallback NPC: {str(e)}")
+                generated_data = npc_template.fallback_output()
 
-                # Validate generated data has required fields
-                if not generated_data.get('name') or not generated_data.get('name').strip():
-                    logger.error(f"[NPCs] AI generation failed: missing or empty name")
-                    continue
-                if not generated_data.get('description') or not generated_data.get('description').strip():
-                    logger.error(f"[NPCs] AI generation failed: missing or empty description")
-                    continue
+            return base_data, generated_data
 
-                # Create complete NPC data
-                npc_id = f"npc_{uuid.uuid4()}"
-                npc_data = {
-                    'id': npc_id,
-                    'name': generated_data['name'].strip(),
-                    'description': generated_data['description'].strip(),
-                    'backstory': generated_data.get('backstory', '').strip(),
-                    'dialogue_style': generated_data.get('dialogue_style', 'speaks plainly').strip(),
-                    'knowledge': generated_data.get('knowledge', 'local area').strip(),
-                    'quest_hint': generated_data.get('quest_hint', '').strip(),
-                    'location': room_context.get('room_id', ''),
-                    'is_active': base_data.get('is_active', True),
-                    'interaction_count': base_data.get('interaction_count', 0),
-                    'mood': base_data.get('mood', 'neutral'),
-                    'properties': {}
-                }
+        except Exception as e:
+            logger.error(f"[NPCs] Error generating NPC {index+1}: {str(e)}")
+            return None
 
-                # Store NPC in database (atomic operation)
-                try:
-                    await self.db.set_npc(npc_id, npc_data)
-                    # Verify the save was successful by reading it back
-                    verification = await self.db.get_npc(npc_id)
-                    if not verification:
-                        raise Exception("Failed to verify NPC save")
-
-                    npc_ids.append(npc_id)
-                    logger.info(f"[NPCs] Generated and validated NPC {generated_data['name']} ({npc_id}) for room {room_context.get('room_id', 'unknown')}")
-
-                except Exception as save_error:
-                    logger.error(f"[NPCs] Failed to save NPC to database: {str(save_error)}")
-                    # If save failed, don't add to npc_ids
-                    continue
+    async def _save_generated_npc(
+        self,
+        room_context: Dict[str, Any],
+        base_data: Dict[str, Any],
+        generated_data: Dict[str, Any],
+        index: int
+    ) -> Optional[str]:
+        """Validate and store one generated NPC, returning its id or None"""
+        import uuid
 
-            except Exception as e:
-                logger.error(f"[NPCs] Error generating NPC {i+1}: {str(e)}")
-                # If we created a partial NPC, try to clean it up
-                if npc_id:
-                    try:
-                        # Assuming there's a delete_npc method, or we'll need to add one
-                        # For now, just log the error
-                        logger.warning(f"[NPCs] Could not cleanup partial NPC {npc_id}")
-                    except Exception as cleanup_error:
-                        logger.error(f"[NPCs] Failed to cleanup partial NPC: {cleanup_error}")
-                continue
+        npc_id = None
+        try:
+            # Validate generated data has required fields
+            if not generated_data.get('name') or not generated_data.get('name').strip():
+                logger.error(f"[NPCs] AI generation failed: missing or empty name")
+                return None
+            if not generated_data.get('description') or not generated_data.get('description').strip():
+                logger.error(f"[NPCs] AI generation failed: missing or empty description")
+                return None
+
+            # Create complete NPC data
+            npc_id = f"npc_{uuid.uuid4()}"
+            npc_data = {
+                'id': npc_id,
+                'name': generated_data['name'].strip(),
+                'description': generated_data['description'].strip(),
+                'backstory': generated_data.get('backstory', '').strip(),
+                'dialogue_style': generated_data.get('dialogue_style', 'speaks plainly').strip(),
+                'knowledge': generated_data.get('knowledge', 'local area').strip(),
+                'quest_hint': generated_data.get('quest_hint', '').strip(),
+                'location': room_context.get('room_id', ''),
+                'is_active': base_data.get('is_active', True),
+                'interaction_count': base_data.get('interaction_count', 0),
+                'mood': base_data.get('mood', 'neutral'),
+                'properties': {}
+            }
 
-        return npc_ids
+            # Store NPC in database (atomic operation)
+            try:
+                await self.db.set_npc(npc_id, npc_data)
+                # Verify the save was successful by reading it back
+                verification = await self.db.get_npc(npc_id)
+                if not verification:
+                    raise Exception("Failed to verify NPC save")
+
+                logger.info(f"[NPCs] Generated and validated NPC {generated_data['name']} ({npc_id}) for room {room_context.get('room_id', 'unknown')}")
+                return npc_id
+
+            except Exception as save_error:
+                logger.error(f"[NPCs] Failed to save NPC to database: {str(save_error)}")
+                # If save failed, don't add to npc_ids
+                return None
+
+        except Exception as e:
+            logger.error(f"[NPCs] Error saving NPC {index+1}: {str(e)}")
+            # If we created a partial NPC, try to clean it up
+            if npc_id:
+                try:
+                    # Assuming there's a delete_npc method, or we'll need to add one
+                    # For now, just log the error
+                    logger.warning(f"[NPCs] Could not cleanup partial NPC {npc_id}")
+                except Exception as cleanup_error:
+                    logger.error(f"[NPCs] Failed to cleanup partial NPC: {cleanup_error}")
+            return None
 
     def _build_room_generation_context(
         self,
@@ -813,7 +921,7 @@ class GameManager:
         logger.info(f"[Performance] Created starting room with title and description in {content_time:.2f}s")
 
         # Generate image in background
-        asyncio.create_task(self._generate_room_image_background(room_id, image_prompt))
+        self._submit_image_job(room_id, image_prompt=image_prompt)
 
         # Trigger preloading of adjacent rooms for the starting room
         # Create a dummy player for context since we don't have the actual player yet
@@ -1054,6 +1162,8 @@ class GameManager:
         new_x, new_y = self._get_coordinates_for_direction(current_x, current_y, direction_enum)
         
         logger.info(f"[Performance] Player moving {direction} from ({current_x}, {current_y}) to ({new_x}, {new_y})")
+        if preload_planner.record_entry(new_x, new_y):
+            logger.info(f"[Preload] Player {player.id} entered preloaded room at ({new_x}, {new_y})")
         
         # Check if destination coordinates have been discovered
         discovery_check_start = time.time()
@@ -1077,11 +1187,7 @@ class GameManager:
                 image_url = existing_room_data.get('image_url', '')
                 if image_url and is_temporary_image_url(image_url):
                     logger.warning(f"[Image Retry] Room {existing_room_id} has temporary/expired image URL, regenerating...")
-                    # Set status to pending so client knows image is being regenerated
-                    existing_room_data['image_status'] = 'pending'
-                    await self.db.set_room(existing_room_id, existing_room_data)
-                    # Trigger image regeneration in background
-                    asyncio.create_task(self._regenerate_room_image(existing_room_id, existing_room_data))
+                    await self._request_image_regeneration(existing_room_id, existing_room_data, owner=player.id)
                 
                 room_load_time = time.time() - room_load_start
                 total_time = time.time() - start_time
@@ -1104,6 +1210,22 @@ class GameManager:
             logger.info(f"[Discovery] Coordinate ({new_x}, {new_y}) not discovered - waiting for preloading")
             room_id = f"room_{new_x}_{new_y}"
 
+            if room_content_pool.enabled:
+                # With pooled bundles the room can be built right away instead of waiting for a full preload;
+                # this is a no-op if a preload already holds the coordinate
+                try:
+                    created_room_id = await self._preload_single_room(new_x, new_y, direction, current_room, player)
+                    if created_room_id and await self.db.is_coordinate_discovered(new_x, new_y):
+                        room_data = await self.db.get_room_by_coordinates(new_x, new_y)
+                        if room_data:
+                            room_data["players"] = await self.db.get_room_players(room_data["id"])
+                            room = Room(**room_data)
+                            logger.info(f"[Discovery] Built room {room.id} for ({new_x}, {new_y}) on arrival in {time.time() - start_time:.2f}s")
+                            asyncio.create_task(self.preload_adjacent_rooms(new_x, new_y, room, player))
+                            return room.id, room
+                except Exception as e:
+                    logger.error(f"[Discovery] On-arrival room build failed at ({new_x}, {new_y}), waiting for preloading: {str(e)}")
+
             # Wait for room to be generated by preloading (with longer timeout)
             timeout = 60  # 60 seconds timeout (increased from 30)
             start_wait = time.time()
@@ -1249,65 +1371,152 @@ class GameManager:
 
     async def _generate_room_items(self, room_id: str, item_distribution: Dict[str, Any], biome: str, room_title: str, room_description: str) -> List[str]:
         """Generate actual items for a room based on its distribution settings"""
-        import uuid
         from .templates.items import AIItemGenerator
         
         logger.info(f"[Item Generation] Generating items for room {room_id}: {item_distribution}")
         
-        item_ids = []
         item_generator = AIItemGenerator()
         
-        # Generate 3-star item if this room has one
+        # 3-star item first (if this room has one), then the 2-star items
+        rarities = []
         if item_distribution['has_three_star']:
-            try:
-                item_context = {
-                    'world_seed': 'room_generation',  # We'll get the actual world seed later
-                    'world_theme': WORLD_CONFIG['setting_secondary'],
-                    'room_description': room_description,
-                    'room_biome': biome,
-                    'room_title': room_title,
-                    'situation_context': 'room_generation_3star',
-                    'desired_rarity': 3,
-                    'database': self.db  # Pass database for recent items context
-                }
-                
-                item_data = await item_generator.generate_item(self.ai_handler, item_context)
-                item_id = f"item_{str(uuid.uuid4())}"
-                item_data['id'] = item_id  # Add the ID to the item data
-                await self.db.set_item(item_id, item_data)
-                item_ids.append(item_id)
-                
-                logger.info(f"[Item Generation] Generated 3-star item '{item_data['name']}' for room {room_id}")
-            except Exception as e:
-                logger.error(f"[Item Generation] Failed to generate 3-star item for room {room_id}: {str(e)}")
+            rarities.append(3)
+        rarities.extend([2] * item_distribution['two_star_count'])
         
-        # Generate 2-star items
-        for i in range(item_distribution['two_star_count']):
-            try:
-                item_context = {
-                    'world_seed': 'room_generation',
-                    'world_theme': WORLD_CONFIG['setting_secondary'],
-                    'room_description': room_description,
-                    'room_biome': biome,
-                    'room_title': room_title,
-                    'situation_context': 'room_generation_2star',
-                    'desired_rarity': 2,
-                    'database': self.db  # Pass database for recent items context
-                }
-                
-                item_data = await item_generator.generate_item(self.ai_handler, item_context)
-                item_id = f"item_{str(uuid.uuid4())}"
-                item_data['id'] = item_id  # Add the ID to the item data
-                await self.db.set_item(item_id, item_data)
-                item_ids.append(item_id)
-                
-                logger.info(f"[Item Generation] Generated 2-star item '{item_data['name']}' for room {room_id}")
-            except Exception as e:
-                logger.error(f"[Item Generation] Failed to generate 2-star item {i+1} for room {room_id}: {str(e)}")
+        results = await asyncio.gather(*(
+            self._generate_single_room_item(item_generator, room_id, rarity, biome, room_title, room_description)
+            for rarity in rarities
+        ))
+        item_ids = [item_id for item_id in results if item_id]
         
         logger.info(f"[Item Generation] Generated {len(item_ids)} items for room {room_id}")
         return item_ids
 
+    async def _generate_single_room_item(self, item_generator, room_id: str, rarity: int, biome: str, room_title: str, room_description: str) -> Optional[str]:
+        """Generate and store one room item of the given rarity, returning its id or None"""
+        try:
+            item_data = await self._generate_room_item_data(item_generator, rarity, biome, room_title, room_description)
+            return await self._save_room_item(room_id, rarity, item_data)
+        except Exception as e:
+            logger.error(f"[Item Generation] Failed to generate {rarity}-star item for room {room_id}: {str(e)}")
+            return None
+
+    async def _generate_room_item_data(self, item_generator, rarity: int, biome: str, room_title: str, room_description: str) -> Dict[str, Any]:
+        """Generate the data for one room item without storing it"""
+        item_context = {
+            'world_seed': 'room_generation',  # We'll get the actual world seed later
+            'world_theme': WORLD_CONFIG['setting_secondary'],
+            'room_description': room_description,
+            'room_biome': biome,
+            'room_title': room_title,
+            'situation_context': f'room_generation_{rarity}star',
+            'desired_rarity': rarity,
+            'database': self.db  # Pass database for recent items context
+        }
+
+        # Room population, like monsters and NPCs: keep interactive LLM slots free for player actions
+        return await item_generator.generate_item(self.ai_handler, item_context, background=True)
+
+    async def _save_room_item(self, room_id: str, rarity: int, item_data: Dict[str, Any]) -> Optional[str]:
+        """Store generated item data under a new id, returning the id or None"""
+        import uuid
+
+        try:
+            item_id = f"item_{str(uuid.uuid4())}"
+            item_data = dict(item_data, id=item_id)  # Add the ID to the item data
+            await self.db.set_item(item_id, item_data)
+
+            logger.info(f"[Item Generation] Generated {rarity}-star item '{item_data['name']}' for room {room_id}")
+            return item_id
+        except Exception as e:
+            logger.error(f"[Item Generation] Failed to save {rarity}-star item for room {room_id}: {str(e)}")
+            return None
+
+    async def generate_room_content_bundle(self, biome: str, biome_description: str, x: int, y: int) -> Dict[str, Any]:
+        """Generate a coordinate-free room bundle for the room content pool"""
+        from .templates.items import AIItemGenerator
+
+        # Same weighting as preloading; the room text is written for this count
+        monster_count = random.choice([0, 0, 1, 1, 2, 3])
+        context = self._build_room_generation_context(
+            biome=biome,
+            biome_description=biome_description,
+            monster_count=monster_count,
+            is_preload=True
+        )
+        title, description, image_prompt = await self.ai_handler.generate_room_description(context=context, background=True)
+
+        # Monster attributes scale with distance, so roll them for the area that asked for the refill
+        room_context = {
+            'room_title': title,
+            'room_description': description,
+            'biome': biome,
+            'x': x,
+            'y': y,
+            'monster_count': monster_count
+        }
+        item_generator = AIItemGenerator()
+        monster_specs, npc_specs, items = await asyncio.gather(
+            self._generate_monster_specs(room_context),
+            self._generate_npc_specs(room_context),
+            asyncio.gather(*(
+                self._generate_room_item_data(item_generator, 2, biome, title, description)
+                for _ in range(random.randint(0, 4))
+            ), return_exceptions=True)
+        )
+
+        image_url = ""
+        if settings.ROOM_POOL_PREGENERATE_IMAGES:
+            image_url = await self.ai_handler.generate_room_image(image_prompt, room_id=f"pool_{uuid.uuid4().hex[:12]}")
+
+        return {
+            'biome': biome,
+            'title': title,
+            'description': description,
+            'image_prompt': image_prompt,
+            'image_url': image_url or "",
+            'monster_count': monster_count,
+            'monsters': [
+                {'base': base_data, 'generated': generated_data}
+                for base_data, generated_data in monster_specs
+                if not isinstance(generated_data, Exception)
+            ],
+            'npcs': [{'base': base_data, 'generated': generated_data} for base_data, generated_data in npc_specs],
+            'two_star_items': [item for item in items if not isinstance(item, Exception)],
+            'created_at': time.time()
+        }
+
+    async def _populate_room_from_bundle(self, room_id: str, title: str, description: str, biome: str, x: int, y: int, bundle: Dict[str, Any]) -> Tuple[List[str], List[str], List[str]]:
+        """Store a claimed bundle's monsters, NPCs and items for a room; only a 3-star item is generated here"""
+        room_context = {
+            'room_id': room_id,
+            'room_title': title,
+            'room_description': description,
+            'biome': biome,
+            'x': x,
+            'y': y
+        }
+
+        async def populate_items() -> List[str]:
+            # The 3-star item is tied to this coordinate, so it cannot come from the pool
+            item_distribution = await self._assign_room_item_distribution(biome, x, y)
+            item_ids = []
+            if item_distribution['has_three_star']:
+                from .templates.items import AIItemGenerator
+                three_star_id = await self._generate_single_room_item(AIItemGenerator(), room_id, 3, biome, title, description)
+                if three_star_id:
+                    item_ids.append(three_star_id)
+            saved = await asyncio.gather(*(
+                self._save_room_item(room_id, 2, item_data) for item_data in bundle.get('two_star_items', [])
+            ))
+            return item_ids + [item_id for item_id in saved if item_id]
+
+        return await asyncio.gather(
+            self._save_monster_specs(room_context, [(spec['base'], spec['generated']) for spec in bundle.get('monsters', [])]),
+            self._save_npc_specs(room_context, [(spec['base'], spec['generated']) for spec in bundle.get('npcs', [])]),
+            populate_items()
+        )
+
     async def create_room_with_coordinates(
         self,
         room_id: str,
@@ -1324,13 +1533,25 @@ class GameManager:
 
         # Extract players from kwargs if provided, otherwise use empty list
         players = kwargs.pop('players', [])
+        # A claimed room pool bundle already carries the monsters, NPCs and items
+        content_bundle = kwargs.pop('content_bundle', None)
 
         # Debug logging for biome
         biome = kwargs.get('biome', None)
         logger.info(f"[GameManager] Creating room {room_id} with biome: {biome}")
         logger.info(f"[GameManager] kwargs: {kwargs}")
 
-        # Generate monsters for the room
+        # Populate monsters, NPCs and items concurrently; they are independent LLM calls
+        populate_start = time.time()
+        stage_timings = {}
+
+        async def timed_stage(stage: str, coro):
+            stage_start = time.time()
+            try:
+                return await coro
+            finally:
+                stage_timings[stage] = time.time() - stage_start
+
         monster_context = {
             'room_id': room_id,
             'room_title': title,
@@ -1340,9 +1561,6 @@ class GameManager:
             'y': y,
             'monster_count': kwargs.get('monster_count')  # Use pre-determined count if available
         }
-        monsters = await self.generate_room_monsters(monster_context)
-
-        # Generate NPCs for the room
         npc_context = {
             'room_id': room_id,
             'room_title': title,
@@ -1351,17 +1569,32 @@ class GameManager:
             'x': x,
             'y': y
         }
-        npcs = await self.generate_room_npcs(npc_context)
-        logger.info(f"[Room Creation] Generated {len(npcs)} NPCs for room {room_id}: {npcs}")
 
-        # Assign item distribution for this room
-        item_distribution = await self._assign_room_item_distribution(kwargs.get('biome', 'unknown'), x, y)
-        logger.info(f"[Room Creation] Item distribution for room {room_id}: {item_distribution}")
+        async def populate_items() -> List[str]:
+            # Assign item distribution for this room
+            item_distribution = await self._assign_room_item_distribution(kwargs.get('biome', 'unknown'), x, y)
+            logger.info(f"[Room Creation] Item distribution for room {room_id}: {item_distribution}")
 
-        # Generate actual items for this room based on distribution
-        room_items = await self._generate_room_items(room_id, item_distribution, kwargs.get('biome', 'unknown'), title, description)
+            # Generate actual items for this room based on distribution
+            return await self._generate_room_items(room_id, item_distribution, kwargs.get('biome', 'unknown'), title, description)
+
+        if content_bundle:
+            monsters, npcs, room_items = await timed_stage('bundle', self._populate_room_from_bundle(
+                room_id, title, description, kwargs.get('biome', 'unknown'), x, y, content_bundle
+            ))
+        else:
+            monsters, npcs, room_items = await asyncio.gather(
+                timed_stage('monsters', self.generate_room_monsters(monster_context)),
+                timed_stage('npcs', self.generate_room_npcs(npc_context)),
+                timed_stage('items', populate_items())
+            )
+        logger.info(f"[Room Creation] Generated {len(npcs)} NPCs for room {room_id}: {npcs}")
         logger.info(f"[Room Creation] Generated {len(room_items)} items for room {room_id}: {room_items}")
 
+        populate_elapsed = time.time() - populate_start
+        stage_summary = ", ".join(f"{stage}: {elapsed:.2f}s" for stage, elapsed in stage_timings.items())
+        logger.info(f"⏱️ [TIMING] Room {room_id} populated in {populate_elapsed:.2f}s ({stage_summary})")
+
         # Create the room object
         room = Room(
             id=room_id,
@@ -1447,45 +1680,53 @@ class GameManager:
         logger.info(f"[GameManager] Auto-connection completed for room {room_id}")
 
     async def preload_adjacent_rooms(self, x: int, y: int, current_room: Room, player: Player):
-        """Preload the 4 adjacent rooms (north, south, east, west) in parallel"""
+        """Preload rooms along the player's likely path, replacing (and cancelling) their previous plan"""
         start_time = time.time()
-        logger.info(f"[Performance] Starting preload of adjacent rooms for ({x}, {y})")
-        
-        # Calculate adjacent coordinates
-        adjacent_coords = [
-            ("north", x, y + 1),
-            ("south", x, y - 1), 
-            ("east", x + 1, y),
-            ("west", x - 1, y)
-        ]
-        
-        # Create tasks for each adjacent room
-        preload_tasks = []
-        for direction, adj_x, adj_y in adjacent_coords:
-            task = self._preload_single_room(adj_x, adj_y, direction, current_room, player)
-            preload_tasks.append(task)
-        
-        # Execute all preload tasks in parallel
+        targets = preload_planner.plan(player.id, x, y, player.visited_coordinates)
+        logger.info(f"[Performance] Starting preload of {len(targets)} rooms for ({x}, {y}): "
+                    f"{', '.join(f'({t.x}, {t.y}) r{t.ring} p={t.probability:.2f}' for t in targets)}")
+
+        async def preload(target: PreloadTarget) -> Optional[str]:
+            try:
+                # Deduplicated by coordinate and bounded with every other player's generation work
+                return await generation_manager.run(
+                    f"room:{target.x},{target.y}",
+                    "room_preload",
+                    lambda: self._preload_planned_room(target, current_room, player),
+                    priority=target.ring,
+                    owner=player.id
+                )
+            except GenerationShedError as e:
+                logger.info(f"[Preload] {str(e)}")
+                return None
+
         try:
-            results = await asyncio.gather(*preload_tasks, return_exceptions=True)
-            
-            # Count successful and failed preloads
-            successful = sum(1 for r in results if not isinstance(r, Exception))
-            failed = len(results) - successful
-            
+            summary = await preload_planner.run(player.id, targets, preload)
             elapsed = time.time() - start_time
-            logger.info(f"[Performance] Preload completed in {elapsed:.2f}s - {successful} successful, {failed} failed")
-            
-            # Log any errors
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    direction = adjacent_coords[i][0]
-                    logger.error(f"[Preload] Error preloading {direction} room: {str(result)}")
-                    
+            logger.info(f"[Performance] Preload completed in {elapsed:.2f}s - {summary['scheduled']} scheduled, {summary['skipped']} already preloaded")
         except Exception as e:
             elapsed = time.time() - start_time
             logger.error(f"[Performance] Preload failed after {elapsed:.2f}s: {str(e)}")
 
+    async def _preload_planned_room(self, target: PreloadTarget, current_room: Room, player: Player) -> Optional[str]:
+        """Preload one planned room; returns its id only if this call generated it"""
+        if await self.db.is_coordinate_discovered(target.x, target.y):
+            # Still run the existing-room checks (e.g. expired image URLs), but it is not preload work
+            await self._preload_single_room(target.x, target.y, target.direction, current_room, player)
+            return None
+
+        parent_room = current_room
+        if target.parent != (current_room.x, current_room.y):
+            # Deeper rings follow on from the room generated in the previous ring
+            parent_data = await self.db.get_room_by_coordinates(*target.parent)
+            if parent_data:
+                parent_room = Room(**parent_data)
+
+        room_id = await self._preload_single_room(target.x, target.y, target.direction, parent_room, player)
+        if room_id and await self.db.is_coordinate_discovered(target.x, target.y):
+            return room_id
+        return None
+
     async def _preload_single_room(self, x: int, y: int, direction: str, current_room: Room, player: Player):
         """Preload a single room at the given coordinates"""
         start_time = time.time()
@@ -1502,8 +1743,7 @@ class GameManager:
                 image_url = existing_room_data.get('image_url', '')
                 if image_url and is_temporary_image_url(image_url):
                     logger.warning(f"[Image Retry] Room {room_id} has temporary/expired image URL, regenerating...")
-                    # Trigger image regeneration in background
-                    asyncio.create_task(self._regenerate_room_image(room_id, existing_room_data))
+                    await self._request_image_regeneration(room_id, existing_room_data, owner=player.id)
                 
                 return existing_room_data["id"]
             
@@ -1548,6 +1788,7 @@ class GameManager:
                     logger.debug(f"[Performance] Could not acquire lock for {room_id} - skipped in {elapsed:.2f}s")
                     return room_id
                 
+                commit: Optional[asyncio.Future] = None
                 try:
                     logger.info(f"[Performance] Generating room {room_id} at ({x}, {y}) in direction {direction}")
                     
@@ -1562,51 +1803,79 @@ class GameManager:
                     biome_time = time.time() - biome_start
                     logger.info(f"[Performance] Biome generation took {biome_time:.2f}s for {room_id}: {biome}")
                     
-                    # Pre-generate monster count for room description
-                    import random
-                    monster_count = random.choice([0, 0, 1, 1, 2, 3])  # Same weighting as monster generation
-                    
-                    # Generate room description with biome context
                     content_start = time.time()
-                    context = self._build_room_generation_context(
-                        current_room=current_room,
-                        direction=direction,
-                        biome=biome,
-                        biome_description=biome_desc,
-                        monster_count=monster_count,
-                        is_preload=True
-                    )
-                    title, description, image_prompt = await self.ai_handler.generate_room_description(context=context)
+                    bundle = await room_content_pool.claim(biome)
+                    # Top the biome's pool back up during idle time
+                    room_content_pool.request_refill(biome, biome_desc, x, y, self.generate_room_content_bundle)
+
+                    if bundle:
+                        # Pooled content only needs a cheap patch to follow on from the previous room
+                        monster_count = bundle['monster_count']
+                        title, description, image_prompt = await self.ai_handler.patch_room_for_continuity(
+                            bundle, current_room.dict() if current_room else None, direction
+                        )
+                    else:
+                        # Pre-generate monster count for room description
+                        monster_count = random.choice([0, 0, 1, 1, 2, 3])  # Same weighting as monster generation
+
+                        # Generate room description with biome context
+                        context = self._build_room_generation_context(
+                            current_room=current_room,
+                            direction=direction,
+                            biome=biome,
+                            biome_description=biome_desc,
+                            monster_count=monster_count,
+                            is_preload=True
+                        )
+                        title, description, image_prompt = await self.ai_handler.generate_room_description(context=context)
                     content_time = time.time() - content_start
-                    logger.info(f"[Performance] Room content generation took {content_time:.2f}s for {room_id}")
+                    logger.info(f"[Performance] Room content generation took {content_time:.2f}s for {room_id} (pooled: {bool(bundle)})")
+                    pooled_image_url = bundle.get('image_url', '') if bundle else ''
                     
-                    # Create the room with title, description, and biome
-                    room = await self.create_room_with_coordinates(
-                        room_id=room_id,
-                        x=x,
-                        y=y,
-                        title=title,
-                        description=description,
-                        biome=biome,  # Include biome in room creation
-                        image_url="",  # No image yet
-                        image_prompt=image_prompt,  # Include image prompt
-                        players=[],  # No players in preloaded room
-                        monster_count=monster_count,  # Pass monster count to room creation
-                        mark_discovered=True
-                    )
+                    async def commit_room():
+                        # Create the room with title, description, and biome
+                        await self.create_room_with_coordinates(
+                            room_id=room_id,
+                            x=x,
+                            y=y,
+                            title=title,
+                            description=description,
+                            biome=biome,  # Include biome in room creation
+                            image_url=pooled_image_url,  # No image yet unless the bundle came with one
+                            image_status="ready" if pooled_image_url else "pending",
+                            image_prompt=image_prompt,  # Include image prompt
+                            players=[],  # No players in preloaded room
+                            monster_count=monster_count,  # Pass monster count to room creation
+                            content_bundle=bundle,
+                            mark_discovered=True
+                        )
                     
-                    # Set generation status to content_ready (image still pending)
-                    await self.db.set_room_generation_status(room_id, "content_ready")
+                        # Set generation status to content_ready (image still pending)
+                        await self.db.set_room_generation_status(room_id, "content_ready")
                     
-                    logger.info(f"[Performance] Created room {room_id} with title and description in {content_time:.2f}s")
+                        logger.info(f"[Performance] Created room {room_id} with title and description in {content_time:.2f}s")
                     
-                    # Generate image in background
-                    asyncio.create_task(self._generate_room_image_background(room_id, image_prompt))
+                        # Generate image in background
+                        if not pooled_image_url:
+                            self._submit_image_job(room_id, image_prompt=image_prompt, owner=player.id)
+
+                    # Once the content exists, finish creating the room even if a stale preload is cancelled
+                    commit = asyncio.ensure_future(commit_room())
+                    await asyncio.shield(commit)
                     
                     elapsed = time.time() - start_time
                     logger.info(f"[Performance] Successfully generated room {room_id} content in {elapsed:.2f}s (image generation in background)")
                     return room_id
                     
+                except asyncio.CancelledError:
+                    logger.info(f"[Performance] Preload of room {room_id} cancelled after {time.time() - start_time:.2f}s")
+                    if commit is None:
+                        await self.db.set_room_generation_status(room_id, "pending")
+                    else:
+                        # The room is being committed: hold both locks until it exists, and keep its status
+                        await self._wait_for_commit(commit, room_id)
+                    raise
+
                 except Exception as e:
                     logger.error(f"[Performance] Error generating room {room_id}: {str(e)}")
                     await self.db.set_room_generation_status(room_id, "error")
@@ -1625,6 +1894,19 @@ class GameManager:
             logger.error(f"[Performance] Failed to preload room {room_id} after {elapsed:.2f}s: {str(e)}")
             raise
 
+    @staticmethod
+    async def _wait_for_commit(commit: asyncio.Future, room_id: str) -> None:
+        """Wait out a shielded room commit, even through further cancellation"""
+        while not commit.done():
+            try:
+                await asyncio.shield(commit)
+            except asyncio.CancelledError:
+                continue
+            except Exception:
+                break
+        if not commit.cancelled() and commit.exception() is not None:
+            logger.error(f"[Performance] Commit of cancelled preload {room_id} failed: {str(commit.exception())}")
+
     async def get_adjacent_biomes(self, x: int, y: int) -> List[str]:
         """Get biomes of adjacent rooms that already exist"""
         adjacent_biomes = []
@@ -1698,7 +1980,7 @@ class GameManager:
                 })
                 
                 # Generate image in background
-                asyncio.create_task(self._generate_room_image(room_id, image_prompt))
+                self._submit_image_job(room_id, image_prompt=image_prompt, mark_generating=True, owner=player.id)
             else:
                 logger.warning(f"[Room Generation] Room {room_id} not found when updating details")
                 
@@ -1759,20 +2041,21 @@ class GameManager:
                 })
                 
                 # Generate image in background
-                asyncio.create_task(self._generate_room_image(room_id, image_prompt))
+                self._submit_image_job(room_id, image_prompt=image_prompt, mark_generating=True, owner=player.id)
             else:
                 logger.warning(f"[Room Generation] Room {room_id} not found when updating details")
                 
         except Exception as e:
             logger.error(f"[Room Generation] Error generating room details for {room_id}: {str(e)}")
 
-    async def _generate_room_image(self, room_id: str, image_prompt: str):
+    async def _generate_room_image(self, room_id: str, image_prompt: str, raise_errors: bool = False):
         """Generate an image for a room and update the room data"""
         try:
             logger.info(f"[Image Generation] Starting image generation for room {room_id}")
             
             # Set image status to generating
             room_data = await self.db.get_room(room_id)
+            biome = room_data.get('biome') if room_data else None
             if room_data:
                 room_data['image_status'] = 'generating'
                 await self.db.set_room(room_id, room_data)
@@ -1783,15 +2066,17 @@ class GameManager:
                     "room": room_data
                 })
             
-            # Generate and upload the image to Supabase Storage
-            image_url = await self.ai_handler.generate_room_image(image_prompt, room_id=room_id)
+            # Generate and upload the image to Supabase Storage (or reuse a near-identical room's image)
+            image_url, image_variants = await self._room_image_for_prompt(room_id, image_prompt, biome)
 
             # Update room with Supabase image URL
             room_data = await self.db.get_room(room_id)
             if room_data:
                 room_data['image_url'] = image_url
                 room_data['image_status'] = 'ready' if image_url else 'error'
+                room_data['image_variants'] = image_variants  # Derivatives of the previous image are stale
                 await self.db.set_room(room_id, room_data)
+                image_regeneration.note(room_id, image_url)
                 
                 logger.info(f"[Image Generation] Successfully generated image for room {room_id}")
                 
@@ -1800,11 +2085,16 @@ class GameManager:
                     "type": "room_update",
                     "room": room_data
                 })
+                if not image_variants:
+                    self._submit_derivatives_job(room_id, image_url)
             else:
                 logger.error(f"[Image Generation] Room {room_id} not found when updating image")
                 
         except Exception as e:
             logger.error(f"[Image Generation] Error generating image for room {room_id}: {str(e)}")
+            if raise_errors:
+                # Job queue workers retry instead; the room is marked as errored once retries run out
+                raise
             
             # Set error status
             room_data = await self.db.get_room(room_id)
@@ -1818,20 +2108,181 @@ class GameManager:
                     "room": room_data
                 })
 
-    async def _generate_room_image_background(self, room_id: str, image_prompt: str):
+    async def _request_image_regeneration(self, room_id: str, room_data: dict, owner: Optional[str] = None) -> str:
+        """Regenerate a room's temporary image unless it is already in progress or over the rate limit"""
+        outcome = image_regeneration.request(room_id)
+        if outcome != QUEUED:
+            logger.info(f"[Image Retry] Regeneration for room {room_id} not started: {outcome}")
+            return outcome
+        # Set status to pending so client knows image is being regenerated
+        room_data['image_status'] = 'pending'
+        await self.db.set_room(room_id, room_data)
+        self._submit_image_job(room_id, room_data=room_data, regenerate=True, owner=owner)
+        return outcome
+
+    async def _sweep_temporary_image(self, room_id: str) -> str:
+        """Sweeper hook: regenerate an indexed room if its image URL is still temporary"""
+        room_data = await self.db.get_room(room_id)
+        image_url = (room_data or {}).get('image_url') or ''
+        if not is_temporary_image_url(image_url):
+            image_regeneration.note(room_id, image_url)
+            return RESOLVED
+        return await self._request_image_regeneration(room_id, room_data)
+
+    def _submit_image_job(
+        self,
+        room_id: str,
+        image_prompt: Optional[str] = None,
+        regenerate: bool = False,
+        mark_generating: bool = False,
+        room_data: Optional[dict] = None,
+        owner: Optional[str] = None
+    ) -> None:
+        """Queue a room image (re)generation, one job per room: on the durable job queue when enabled,
+        otherwise on the in-process generation manager"""
+        kind = "room_image_regenerate" if regenerate else "room_image"
+        if settings.JOB_QUEUE_ENABLED:
+            payload = {"room_id": room_id} if regenerate else {
+                "room_id": room_id,
+                "image_prompt": image_prompt,
+                "mark_generating": mark_generating
+            }
+            job_queue.enqueue(kind, payload, idempotency_key=f"image:{room_id}")
+            return
+
+        if regenerate:
+            job = lambda: self._regenerate_room_image(room_id, room_data)
+        elif mark_generating:
+            job = lambda: self._generate_room_image(room_id, image_prompt)
+        else:
+            job = lambda: self._generate_room_image_background(room_id, image_prompt)
+        generation_manager.submit(
+            f"image:{room_id}",
+            kind,
+            job,
+            PRIORITY_IMAGE_REGENERATION if regenerate else PRIORITY_ROOM_IMAGE,
+            owner=owner,
+            sheddable=False  # A shed image would leave the room without one
+        )
+
+    async def _room_image_for_prompt(self, room_id: str, image_prompt: str, biome: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Image URL (and any derivatives) for a room: a similar room's image when the prompt
+        index allows reuse, otherwise a freshly generated one.
+        """
+        match = prompt_image_index.find_reusable(biome, image_prompt, room_id)
+        if match:
+            source = await self.db.get_room(match['room_id'])
+            # The index can lag behind a room whose image has since changed
+            if source and source.get('image_url') == match['image_url']:
+                # The room gets its own copy so deleting or replacing the source image leaves it intact
+                image_url = await copy_room_image(match['image_url'], room_id)
+                if image_url:
+                    prompt_image_index.record_reuse(room_id, match)
+                    if prompt_image_index.mode == "variation":
+                        self._submit_image_variation_job(room_id, image_prompt, image_url)
+                    return image_url, dict(source.get('image_variants') or {})
+
+        started = time.time()
+        image_url = await self.ai_handler.generate_room_image(image_prompt, room_id=room_id)
+        if image_url and not is_temporary_image_url(image_url):
+            prompt_image_index.add(biome, room_id, image_prompt, image_url, time.time() - started)
+        return image_url, {}
+
+    def _submit_image_variation_job(self, room_id: str, image_prompt: str, source_url: str) -> None:
+        """Queue an img2img variation to replace a reused room image"""
+        payload = {"room_id": room_id, "image_prompt": image_prompt, "source_url": source_url}
+        if settings.JOB_QUEUE_ENABLED:
+            job_queue.enqueue("room_image_variation", payload, idempotency_key=f"image_variation:{room_id}")
+            return
+        # Sheddable: the room already shows the reused image
+        generation_manager.submit(
+            f"image_variation:{room_id}",
+            "room_image_variation",
+            lambda: self._generate_room_image_variation(room_id, image_prompt, source_url),
+            PRIORITY_IMAGE_VARIATION
+        )
+
+    async def _generate_room_image_variation(self, room_id: str, image_prompt: str, source_url: str, raise_errors: bool = False):
+        """Replace a reused room image with a variation drawn towards the room's own prompt"""
+        started = time.time()
+        image_url = await self.ai_handler.generate_room_image_variation(image_prompt, source_url, room_id)
+        if not image_url:
+            if raise_errors:
+                raise RuntimeError(f"Image variation failed for room {room_id}")
+            return
+        prompt_image_index.record_variation(time.time() - started)
+
+        room_data = await self.db.get_room(room_id)
+        if not room_data or room_data.get('image_url') != source_url:
+            # The room got a different image in the meantime
+            return
+        room_data['image_url'] = image_url
+        room_data['image_variants'] = {}
+        await self.db.set_room(room_id, room_data)
+        image_regeneration.note(room_id, image_url)
+        if not is_temporary_image_url(image_url):
+            prompt_image_index.add(room_data.get('biome'), room_id, image_prompt, image_url)
+        await self.broadcast_room_update(room_id, {
+            "type": "room_update",
+            "room": room_data
+        })
+        self._submit_derivatives_job(room_id, image_url)
+
+    def _submit_derivatives_job(self, room_id: str, image_url: Optional[str]) -> None:
+        """Queue resized derivatives of a room's newly stored image"""
+        if not image_derivatives.enabled or not image_url or is_temporary_image_url(image_url):
+            return
+        # Keyed by URL so a newer image is never deduplicated into the old image's job
+        key = f"image_derivatives:{room_id}:{image_url}"
+        if settings.JOB_QUEUE_ENABLED:
+            job_queue.enqueue("image_derivatives", {"room_id": room_id, "image_url": image_url}, idempotency_key=key)
+            return
+        generation_manager.submit(
+            key,
+            "image_derivatives",
+            lambda: self._create_image_derivatives(room_id, image_url),
+            PRIORITY_IMAGE_DERIVATIVES
+        )
+
+    async def _create_image_derivatives(self, room_id: str, image_url: str, raise_errors: bool = False):
+        """Build thumbnail/mobile/desktop derivatives and add their URLs to the room"""
+        try:
+            variants = await image_derivatives.create_for_room(room_id, image_url)
+        except Exception:
+            if raise_errors:
+                raise
+            return
+
+        room_data = await self.db.get_room(room_id)
+        if not room_data or room_data.get('image_url') != image_url:
+            # A newer image replaced this one while it was being resized
+            return
+        room_data['image_variants'] = variants
+        await self.db.set_room(room_id, room_data)
+        await self.broadcast_room_update(room_id, {
+            "type": "room_update",
+            "room": room_data
+        })
+
+    async def _generate_room_image_background(self, room_id: str, image_prompt: str, raise_errors: bool = False):
         """Generate an image for a room in the background (for rooms that already have content)"""
         try:
             logger.info(f"[Background Image] Starting background image generation for room {room_id}")
 
             # Generate and upload the image to Supabase Storage
-            image_url = await self.ai_handler.generate_room_image(image_prompt, room_id=room_id)
+            room_data = await self.db.get_room(room_id)
+            biome = room_data.get('biome') if room_data else None
+            image_url, image_variants = await self._room_image_for_prompt(room_id, image_prompt, biome)
 
             # Update room with Supabase image URL
             room_data = await self.db.get_room(room_id)
             if room_data:
                 room_data['image_url'] = image_url
                 room_data['image_status'] = 'ready' if image_url else 'error'
+                room_data['image_variants'] = image_variants
                 await self.db.set_room(room_id, room_data)
+                image_regeneration.note(room_id, image_url)
                 
                 logger.info(f"[Background Image] Successfully generated image for room {room_id}")
                 
@@ -1840,11 +2291,15 @@ class GameManager:
                     "type": "room_update",
                     "room": room_data
                 })
+                if not image_variants:
+                    self._submit_derivatives_job(room_id, image_url)
             else:
                 logger.error(f"[Background Image] Room {room_id} not found when updating image")
                 
         except Exception as e:
             logger.error(f"[Background Image] Error generating image for room {room_id}: {str(e)}")
+            if raise_errors:
+                raise
             
             # Set error status
             room_data = await self.db.get_room(room_id)
@@ -1858,7 +2313,7 @@ class GameManager:
                     "room": room_data
                 })
     
-    async def _regenerate_room_image(self, room_id: str, room_data: dict):
+    async def _regenerate_room_image(self, room_id: str, room_data: dict, raise_errors: bool = False):
         """
         Regenerate an image for a room that has an expired/temporary URL.
         This generates a new image based on the room's description and uploads to Supabase.
@@ -1880,15 +2335,17 @@ class GameManager:
             logger.info(f"[Image Retry] Generated image prompt for {room_id}: {image_prompt[:100]}...")
             
             # Generate and upload the new image to Supabase Storage
-            image_url = await self.ai_handler.generate_room_image(image_prompt, room_id=room_id)
+            image_url, image_variants = await self._room_image_for_prompt(room_id, image_prompt, biome)
             
             # Update room with new image URL
             fresh_room_data = await self.db.get_room(room_id)
             if fresh_room_data:
                 fresh_room_data['image_url'] = image_url
                 fresh_room_data['image_status'] = 'ready' if image_url else 'error'
+                fresh_room_data['image_variants'] = image_variants
                 fresh_room_data['image_prompt'] = None  # Clear old prompt
                 await self.db.set_room(room_id, fresh_room_data)
+                image_regeneration.note(room_id, image_url)
                 
                 logger.info(f"[Image Retry] Successfully regenerated image for room {room_id}: {image_url[:100] if image_url else 'Failed'}")
                 
@@ -1897,11 +2354,15 @@ class GameManager:
                     "type": "room_update",
                     "room": fresh_room_data
                 })
+                if not image_variants:
+                    self._submit_derivatives_job(room_id, image_url)
             else:
                 logger.error(f"[Image Retry] Room {room_id} not found when updating regenerated image")
                 
         except Exception as e:
             logger.error(f"[Image Retry] Error regenerating image for room {room_id}: {str(e)}")
+            if raise_errors:
+                raise
             
             # Set error status but keep the temporary URL for now
             fresh_room_data = await self.db.get_room(room_id)
@@ -1922,10 +2383,6 @@ class GameManager:
             logger.info(f"[GameManager] Broadcasting room update - room: {room_id}, update type: {update.get('type')}")
             logger.debug(f"[GameManager] Full update data: {update}")
 
-            if not self.connection_manager:
-                logger.error("[GameManager] Connection manager not set - cannot broadcast update")
-                return
-
             # Get current room data to ensure we're sending complete state
             room_data = await self.db.get_room(room_id)
             if not room_data:
@@ -1948,10 +2405,16 @@ class GameManager:
                         elif hasattr(image_url, '__str__'):
                             room_updates['image_url'] = str(image_url)
                     room = Room(**{**room.dict(), **room_updates})
-                # Send complete room state
+                # Send complete room state, versioned so patch-capable clients only get the changes
                 update['room'] = room.dict()
-                logger.info(f"[GameManager] Broadcasting complete room state for {room_id}")
-                logger.debug(f"[GameManager] Room state: {room.dict()}")
+                update['version'], update['patch'] = room_state.commit(room_id, update['room'])
+                logger.info(f"[GameManager] Broadcasting room state v{update['version']} for {room_id}")
+                logger.debug(f"[GameManager] Room state: {update['room']}")
+
+            if not self.connection_manager:
+                # Job worker processes hand the update to the API processes holding the sockets
+                await broadcast_bus.publish(room_id, update)
+                return
 
             await self.connection_manager.broadcast_to_room(room_id, update)
             logger.info(f"[GameManager] Successfully broadcast update to room {room_id}")
@@ -2358,7 +2821,6 @@ class GameManager:
         Returns:
             True if generation was triggered, False otherwise
         """
-        from .fal_service import FALService
         from .config import settings
 
         if not settings.MODEL_3D_GENERATION_ENABLED:
@@ -2388,25 +2850,15 @@ class GameManager:
                 logger.info(f"[3D Gen] Room {room_id} has temporary image URL, skipping 3D generation")
                 return False
 
-            # Submit job to FAL
-            logger.info(f"[3D Gen] Triggering 3D generation for room {room_id}")
-            request_id, error = await FALService.submit_3d_generation(image_url, room_id)
-
-            if request_id:
-                # Update room with generating status and job ID
-                room_data['model_3d_status'] = 'generating'
-                room_data['model_3d_job_id'] = request_id
+            if settings.JOB_QUEUE_ENABLED:
+                # Submission is retried by a job worker; the 3D poller takes over from there
+                room_data['model_3d_status'] = 'pending'
                 await self.db.set_room(room_id, room_data)
-
-                # Start background polling task
-                asyncio.create_task(self._poll_3d_job(room_id, request_id))
-                logger.info(f"[3D Gen] Started 3D generation for room {room_id}, job: {request_id}")
+                job_queue.enqueue("model_3d", {"room_id": room_id}, idempotency_key=f"model_3d:{room_id}")
+                logger.info(f"[3D Gen] Queued 3D generation job for room {room_id}")
                 return True
-            else:
-                logger.error(f"[3D Gen] Failed to submit 3D job for room {room_id}: {error}")
-                room_data['model_3d_status'] = 'error'
-                await self.db.set_room(room_id, room_data)
-                return False
+
+            return await self._submit_3d_job(room_id, room_data) is not None
 
         except Exception as e:
             logger.error(f"[3D Gen] Error triggering 3D generation for room {room_id}: {str(e)}")
@@ -2414,87 +2866,96 @@ class GameManager:
             logger.error(f"[3D Gen] Traceback: {traceback.format_exc()}")
             return False
 
-    async def _poll_3d_job(self, room_id: str, request_id: str, max_polls: int = 120, poll_interval: int = 10):
+    async def _submit_3d_job(self, room_id: str, room_data: Dict[str, Any]) -> Optional[str]:
+        """Submit a room's image to FAL, record the job on the room and hand it to the poller; returns the FAL request id"""
+        from .fal_service import FALService
+
+        logger.info(f"[3D Gen] Triggering 3D generation for room {room_id}")
+        request_id, error = await FALService.submit_3d_generation(room_data.get('image_url'), room_id)
+
+        if request_id:
+            # Update room with generating status and job ID
+            room_data['model_3d_status'] = 'generating'
+            room_data['model_3d_job_id'] = request_id
+            await self.db.set_room(room_id, room_data)
+            model_3d_poller.track(room_id, request_id)
+            logger.info(f"[3D Gen] Started 3D generation for room {room_id}, job: {request_id}")
+            return request_id
+
+        logger.error(f"[3D Gen] Failed to submit 3D job for room {room_id}: {error}")
+        room_data['model_3d_status'] = 'error'
+        await self.db.set_room(room_id, room_data)
+        return None
+
+    async def _apply_3d_result(self, room_id: str, status_result: Dict[str, Any]):
         """
-        Background task to poll FAL job status until completion.
-        Polls every 10 seconds for up to 20 minutes.
+        Apply a finished FAL job to its room: upload the model to Supabase and notify clients,
+        or mark the room as errored. Called by the 3D poller's upload workers.
 
         Args:
             room_id: The room ID
-            request_id: The FAL job request ID
-            max_polls: Maximum number of poll attempts (default 120 = 20 minutes)
-            poll_interval: Seconds between polls (default 10)
+            status_result: FALService.poll_job_status result with status 'completed' or 'failed'
         """
-        from .fal_service import FALService
         from .model_storage import upload_model_to_supabase
 
-        logger.info(f"[3D Poll] Starting poll loop for room {room_id}, job: {request_id}")
-
-        for i in range(max_polls):
-            await asyncio.sleep(poll_interval)
-
-            try:
-                status_result = await FALService.poll_job_status(request_id)
-                status = status_result.get('status')
-
-                if i % 6 == 0:  # Log every minute
-                    logger.info(f"[3D Poll] Room {room_id} poll {i+1}/{max_polls}: {status}")
-
-                if status == 'completed':
-                    # Download and upload to Supabase
-                    result_url = status_result.get('result_url')
-                    file_size = status_result.get('file_size', 0)
-                    logger.info(f"[3D Poll] Room {room_id} job completed, file size: {file_size} bytes")
+        if status_result.get('status') != 'completed':
+            error = status_result.get('error', 'Unknown error')
+            logger.error(f"[3D Poll] Room {room_id} job failed: {error}")
+            await self._mark_3d_error(room_id)
+            return
 
-                    if result_url:
-                        permanent_url = await upload_model_to_supabase(result_url, room_id)
+        # Download and upload to Supabase
+        result_url = status_result.get('result_url')
+        file_size = status_result.get('file_size', 0)
+        logger.info(f"[3D Poll] Room {room_id} job completed, file size: {file_size} bytes")
+        if not result_url:
+            return
 
-                        room_data = await self.db.get_room(room_id)
-                        if room_data:
-                            if permanent_url:
-                                room_data['model_3d_url'] = permanent_url
-                                room_data['model_3d_status'] = 'ready'
-                                logger.info(f"[3D Poll] Room {room_id} 3D model ready: {permanent_url}")
-                            else:
-                                room_data['model_3d_status'] = 'error'
-                                logger.error(f"[3D Poll] Room {room_id} failed to upload 3D model")
-                            room_data['model_3d_job_id'] = None
-                            await self.db.set_room(room_id, room_data)
-
-                            # Notify connected clients via WebSocket
-                            if self.connection_manager:
-                                try:
-                                    await self.connection_manager.broadcast_to_room(room_id, {
-                                        "type": "room_3d_update",
-                                        "room_id": room_id,
-                                        "model_3d_url": room_data.get('model_3d_url'),
-                                        "model_3d_status": room_data.get('model_3d_status')
-                                    })
-                                except Exception as ws_error:
-                                    logger.warning(f"[3D Poll] WebSocket broadcast failed: {ws_error}")
-                    return
-
-                elif status == 'failed':
-                    error = status_result.get('error', 'Unknown error')
-                    logger.error(f"[3D Poll] Room {room_id} job failed: {error}")
-
-                    room_data = await self.db.get_room(room_id)
-                    if room_data:
-                        room_data['model_3d_status'] = 'error'
-                        room_data['model_3d_job_id'] = None
-                        await self.db.set_room(room_id, room_data)
-                    return
-
-                # For 'queued' and 'in_progress', continue polling
+        permanent_url = await upload_model_to_supabase(result_url, room_id)
 
-            except Exception as e:
-                logger.error(f"[3D Poll] Error polling job {request_id}: {str(e)}")
-                # Continue polling on transient errors
+        room_data = await self.db.get_room(room_id)
+        if not room_data:
+            return
+        if permanent_url:
+            room_data['model_3d_url'] = permanent_url
+            room_data['model_3d_status'] = 'ready'
+            logger.info(f"[3D Poll] Room {room_id} 3D model ready: {permanent_url}")
+        else:
+            room_data['model_3d_status'] = 'error'
+            logger.error(f"[3D Poll] Room {room_id} failed to upload 3D model")
+        room_data['model_3d_job_id'] = None
+        await self.db.set_room(room_id, room_data)
+
+        # Notify connected clients via WebSocket
+        update = {
+            "type": "room_3d_update",
+            "room_id": room_id,
+            "model_3d_url": room_data.get('model_3d_url'),
+            "model_3d_status": room_data.get('model_3d_status')
+        }
+        if self.connection_manager:
+            try:
+                await self.connection_manager.broadcast_to_room(room_id, update)
+            except Exception as ws_error:
+                logger.warning(f"[3D Poll] WebSocket broadcast failed: {ws_error}")
+        else:
+            await broadcast_bus.publish(room_id, update)
 
-        # Timeout - mark as error
-        logger.error(f"[3D Poll] Room {room_id} job timed out after {max_polls * poll_interval} seconds")
+    async def _mark_3d_error(self, room_id: str):
+        """Mark a room's 3D generation as failed and clear its job id"""
         room_data = await self.db.get_room(room_id)
         if room_data:
             room_data['model_3d_status'] = 'error'
             room_data['model_3d_job_id'] = None
-            await self.db.set_room(room_id, room_data)
\ No newline at end of file
+            await self.db.set_room(room_id, room_data)
+
+    async def _mark_room_image_error(self, room_id: str):
+        """Mark a room's image as failed once its job has run out of retries"""
+        room_data = await self.db.get_room(room_id)
+        if room_data:
+            room_data['image_status'] = 'error'
+            await self.db.set_room(room_id, room_data)
+            await self.broadcast_room_update(room_id, {
+                "type": "room_update",
+                "room": room_data
+            })
@@ -0,0 +1,300 @@
+"""
+Global work manager for background world generation.
+Room preloads and room image jobs from every player go through one bounded worker
+pool. Jobs are deduplicated by key (e.g. a coordinate or room id), served in
+priority order with round-robin fairness between players, and speculative work
+is shed when the queue is full or has gone stale.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Lower runs first. Room preloads use their preload ring (1 = adjacent room).
+PRIORITY_IMAGE_REGENERATION = 1
+PRIORITY_ROOM_IMAGE = 2
+PRIORITY_IMAGE_DERIVATIVES = 3
+PRIORITY_IMAGE_VARIATION = 4
+
+SYSTEM_OWNER = "system"
+
+
+class GenerationShedError(Exception):
+    """Raised to callers whose job was dropped under load"""
+    pass
+
+
+@dataclass(order=True)
+class GenerationJob:
+    priority: int
+    seq: int
+    key: str = field(compare=False)
+    kind: str = field(compare=False)
+    owner: str = field(compare=False)
+    factory: Callable[[], Awaitable[Any]] = field(compare=False, repr=False)
+    sheddable: bool = field(compare=False, default=True)
+    queued_at: float = field(compare=False, default_factory=time.time)
+    started_at: Optional[float] = field(compare=False, default=None)
+    future: Optional[asyncio.Future] = field(compare=False, default=None, repr=False)
+    task: Optional[asyncio.Task] = field(compare=False, default=None, repr=False)
+    waiters: int = field(compare=False, default=0)
+    removed: bool = field(compare=False, default=False)
+
+    def describe(self, now: float) -> Dict[str, Any]:
+        return {
+            'key': self.key,
+            'kind': self.kind,
+            'owner': self.owner,
+            'priority': self.priority,
+            'waiters': self.waiters,
+            'queued_for': round((self.started_at or now) - self.queued_at, 2),
+            'running_for': round(now - self.started_at, 2) if self.started_at else None
+        }
+
+
+class GenerationWorkManager:
+    """Bounded worker pool with a deduplicating, per-owner fair priority queue"""
+
+    def __init__(self, max_workers: int, max_queue: int, max_queued_per_owner: int, max_queue_age: float):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(1, max_queue)
+        self.max_queued_per_owner = max(1, max_queued_per_owner)
+        self.max_queue_age = max_queue_age
+        self._seq = itertools.count()
+        self._jobs: Dict[str, GenerationJob] = {}  # key -> queued or running job
+        self._queues: Dict[str, List[GenerationJob]] = {}  # owner -> heap of queued jobs
+        self._running: Dict[str, GenerationJob] = {}
+        self._running_per_owner: Dict[str, int] = {}
+        self._last_served: Dict[str, float] = {}
+        self._queued = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: Set[asyncio.Task] = set()
+        self.metrics: Dict[str, int] = {
+            'submitted': 0,
+            'deduplicated': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'shed': 0
+        }
+
+    def _ensure_workers(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        while len(self._workers) < self.max_workers:
+            worker = asyncio.create_task(self._worker())
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+
+    def submit(
+        self,
+        key: str,
+        kind: str,
+        factory: Callable[[], Awaitable[Any]],
+        priority: int,
+        owner: Optional[str] = None,
+        sheddable: bool = True
+    ) -> asyncio.Future:
+        """Queue a job unless one with the same key is already queued or running; returns its future"""
+        self._ensure_workers()
+        owner = owner or SYSTEM_OWNER
+
+        existing = self._jobs.get(key)
+        if existing is not None:
+            self.metrics['deduplicated'] += 1
+            existing.waiters += 1
+            existing.sheddable = existing.sheddable and sheddable
+            if existing.started_at is None and priority < existing.priority:
+                # A more urgent request for the same work moves the queued job up
+                queue = self._queues[existing.owner]
+                queue.remove(existing)
+                existing.priority = priority
+                heapq.heapify(queue)
+                heapq.heappush(queue, existing)
+            return existing.future
+
+        job = GenerationJob(priority, next(self._seq), key, kind, owner, factory, sheddable)
+        job.future = asyncio.get_running_loop().create_future()
+        job.waiters = 1
+        self.metrics['submitted'] += 1
+
+        if not self._make_room_for(job):
+            self._shed(job, "queue full")
+            return job.future
+
+        self._jobs[key] = job
+        self._push(job)
+        return job.future
+
+    async def run(self, key: str, kind: str, factory: Callable[[], Awaitable[Any]], priority: int,
+                  owner: Optional[str] = None, sheddable: bool = True) -> Any:
+        """Submit and wait; cancelling the caller drops the job if nobody else is waiting for it"""
+        future = self.submit(key, kind, factory, priority, owner, sheddable)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.release(key, future)
+            raise
+
+    def release(self, key: str, future: Optional[asyncio.Future] = None) -> None:
+        """One waiter lost interest; cancel the job once no waiters remain"""
+        job = self._jobs.get(key)
+        if job is None or (future is not None and job.future is not future):
+            return
+        job.waiters -= 1
+        if job.waiters > 0:
+            return
+        self.metrics['cancelled'] += 1
+        if job.started_at is None:
+            self._remove_queued(job)
+            self._jobs.pop(key, None)
+            job.future.cancel()
+        elif job.task is not None:
+            job.task.cancel()
+
+    def _push(self, job: GenerationJob) -> None:
+        heapq.heappush(self._queues.setdefault(job.owner, []), job)
+        self._queued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _remove_queued(self, job: GenerationJob) -> None:
+        if not job.removed and job.started_at is None:
+            job.removed = True
+            self._queued -= 1
+
+    def _queued_jobs(self, owner: Optional[str] = None) -> List[GenerationJob]:
+        queues = [self._queues.get(owner, [])] if owner else self._queues.values()
+        return [job for queue in queues for job in queue if not job.removed]
+
+    def _make_room_for(self, job: GenerationJob) -> bool:
+        """Shed lower-value queued work so `job` fits; False if `job` itself should be shed"""
+        owner_jobs = self._queued_jobs(job.owner)
+        if job.owner != SYSTEM_OWNER and len(owner_jobs) >= self.max_queued_per_owner:
+            # One player's burst only ever displaces that player's own speculative work
+            if not self._shed_worst(owner_jobs, job):
+                return not job.sheddable
+        if self._queued >= self.max_queue:
+            if not self._shed_worst(self._queued_jobs(), job):
+                return not job.sheddable
+        return True
+
+    def _shed_worst(self, candidates: List[GenerationJob], incoming: GenerationJob) -> bool:
+        victims = [job for job in candidates if job.sheddable]
+        if not victims:
+            return False
+        victim = max(victims)
+        if incoming.sheddable and victim <= incoming:
+            return False
+        self._remove_queued(victim)
+        self._jobs.pop(victim.key, None)
+        self._shed(victim, "displaced by higher priority work")
+        return True
+
+    def _shed(self, job: GenerationJob, reason: str) -> None:
+        self.metrics['shed'] += 1
+        logger.info(f"[Generation] Shed {job.kind} job {job.key} for {job.owner}: {reason}")
+        if job.future is not None and not job.future.done():
+            job.future.set_exception(GenerationShedError(f"{job.kind} job {job.key} shed: {reason}"))
+            # Fire-and-forget callers never read the exception
+            job.future.exception()
+
+    def _next_job(self) -> Optional[GenerationJob]:
+        """Best-priority job, breaking ties toward owners with the least running and least recently served"""
+        now = time.time()
+        best_owner = None
+        best_rank = None
+        for owner, queue in list(self._queues.items()):
+            while queue and queue[0].removed:
+                heapq.heappop(queue)
+            # Stale speculative work is dropped rather than run late
+            while queue and queue[0].sheddable and self.max_queue_age and now - queue[0].queued_at > self.max_queue_age:
+                stale = heapq.heappop(queue)
+                self._queued -= 1
+                self._jobs.pop(stale.key, None)
+                self._shed(stale, f"queued longer than {self.max_queue_age:.0f}s")
+                while queue and queue[0].removed:
+                    heapq.heappop(queue)
+            if not queue:
+                del self._queues[owner]
+                continue
+            rank = (queue[0].priority, self._running_per_owner.get(owner, 0), self._last_served.get(owner, 0.0))
+            if best_rank is None or rank < best_rank:
+                best_owner, best_rank = owner, rank
+        if best_owner is None:
+            return None
+        job = heapq.heappop(self._queues[best_owner])
+        self._queued -= 1
+        self._last_served[best_owner] = now
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            job.started_at = time.time()
+            self._running[job.key] = job
+            self._running_per_owner[job.owner] = self._running_per_owner.get(job.owner, 0) + 1
+            job.task = asyncio.create_task(job.factory())
+            try:
+                result = await job.task
+                self.metrics['completed'] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                if not job.task.cancelled():
+                    # The worker itself is shutting down
+                    raise
+            except Exception as e:
+                self.metrics['failed'] += 1
+                logger.error(f"[Generation] {job.kind} job {job.key} failed: {str(e)}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+                    job.future.exception()
+            finally:
+                self._running.pop(job.key, None)
+                self._running_per_owner[job.owner] -= 1
+                if not self._running_per_owner[job.owner]:
+                    del self._running_per_owner[job.owner]
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+                logger.debug(f"[Generation] {job.kind} job {job.key} finished in {time.time() - job.started_at:.2f}s")
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Queued and running jobs plus counters, for the introspection endpoint"""
+        now = time.time()
+        queued = sorted(self._queued_jobs())
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'running_count': len(self._running),
+            'queued_count': self._queued,
+            'running': [job.describe(now) for job in self._running.values()],
+            'queued': [job.describe(now) for job in queued],
+            'queued_per_owner': {owner: len(self._queued_jobs(owner)) for owner in self._queues},
+            'metrics': dict(self.metrics)
+        }
+
+
+# Global manager shared by every player's background generation in this process
+generation_manager = GenerationWorkManager(
+    settings.GENERATION_MAX_WORKERS,
+    settings.GENERATION_MAX_QUEUE,
+    settings.GENERATION_MAX_QUEUED_PER_PLAYER,
+    settings.GENERATION_MAX_QUEUE_AGE
+)
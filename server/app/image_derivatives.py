@@ -0,0 +1,188 @@
+"""
+Resized WebP/AVIF derivatives of room art.
+After a room image is stored, it is resized to thumbnail, mobile and desktop
+widths in a process pool (Pillow work would otherwise hold the event loop) and the
+derivatives are uploaded under content-addressed keys. Their URLs are written to the
+room's `image_variants` so clients can pick the smallest adequate image.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Variant -> maximum width; images are never upscaled
+DERIVATIVE_WIDTHS = {
+    "thumb": 256,
+    "mobile": 768,
+    "desktop": 1280
+}
+DERIVATIVE_CONTENT_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif"
+}
+DERIVATIVE_BUCKET = "room-images"
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"  # Keys change whenever the source does
+
+
+def derivative_path(room_id: str, source_digest: str, variant: str, fmt: str) -> str:
+    """Deterministic storage key for one derivative of one source image"""
+    return f"rooms/derived/{room_id}/{source_digest}/{variant}.{fmt}"
+
+
+def render_derivatives(data: bytes, widths: Dict[str, int], formats: List[str], quality: int) -> List[Dict[str, Any]]:
+    """
+    Resize and encode a source image. Runs in a worker process.
+
+    Returns:
+        One dict per derivative: variant, format, width, height and the encoded bytes
+    """
+    from PIL import Image, features
+
+    # Pillow wheels only encode AVIF from 11.3 on; skip formats this build lacks
+    formats = [fmt for fmt in formats if features.check(fmt)]
+
+    with Image.open(io.BytesIO(data)) as source:
+        source = source.convert("RGB")
+        rendered = []
+        for variant, max_width in sorted(widths.items(), key=lambda item: item[1]):
+            width = min(max_width, source.width)
+            height = max(1, round(source.height * width / source.width))
+            resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                buffer = io.BytesIO()
+                if fmt == "webp":
+                    resized.save(buffer, "WEBP", quality=quality, method=4)
+                else:
+                    resized.save(buffer, fmt.upper(), quality=quality)
+                rendered.append({
+                    "variant": variant,
+                    "format": fmt,
+                    "width": width,
+                    "height": height,
+                    "data": buffer.getvalue()
+                })
+        return rendered
+
+
+class ImageDerivativePipeline:
+    """Process-pool resizing plus upload of room image derivatives"""
+
+    def __init__(self, enabled: bool, max_workers: int, formats: List[str], quality: int):
+        self.enabled = enabled
+        self.max_workers = max(1, max_workers)
+        self.formats = [fmt for fmt in formats if fmt in DERIVATIVE_CONTENT_TYPES]
+        self.quality = quality
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.metrics: Dict[str, Any] = {
+            'rooms': 0,
+            'failed': 0,
+            'source_bytes': 0,
+            'render_seconds': 0.0,
+            'derivative_bytes': {},  # "variant.format" -> total bytes
+            'derivatives': {}  # "variant.format" -> count
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, data: bytes) -> List[Dict[str, Any]]:
+        """Resize and encode `data` in the process pool"""
+        loop = asyncio.get_running_loop()
+        started = time.time()
+        rendered = await loop.run_in_executor(
+            self._get_executor(), render_derivatives, data, DERIVATIVE_WIDTHS, self.formats, self.quality
+        )
+        self.metrics['render_seconds'] += time.time() - started
+        return rendered
+
+    def _record(self, source_size: int, rendered: List[Dict[str, Any]]) -> None:
+        self.metrics['rooms'] += 1
+        self.metrics['source_bytes'] += source_size
+        for derivative in rendered:
+            key = f"{derivative['variant']}.{derivative['format']}"
+            self.metrics['derivative_bytes'][key] = self.metrics['derivative_bytes'].get(key, 0) + len(derivative['data'])
+            self.metrics['derivatives'][key] = self.metrics['derivatives'].get(key, 0) + 1
+
+    async def create_for_room(self, room_id: str, image_url: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Build and upload derivatives of a room's stored image.
+
+        Returns:
+            Variant -> {"width", "height", <format>: url}, for the room's `image_variants`
+        """
+        from .asset_transfer import asset_transfer
+
+        try:
+            data = await asset_transfer.fetch_bytes(image_url, f"image_source:{room_id}", MAX_SOURCE_BYTES)
+            digest = hashlib.sha256(data).hexdigest()[:16]
+            rendered = await self.render(data)
+
+            async def upload(derivative: Dict[str, Any]) -> str:
+                return await asset_transfer.upload_bytes(
+                    DERIVATIVE_BUCKET,
+                    derivative_path(room_id, digest, derivative['variant'], derivative['format']),
+                    derivative['data'],
+                    DERIVATIVE_CONTENT_TYPES[derivative['format']],
+                    f"image_derivative:{room_id}",
+                    cache_control=IMMUTABLE_CACHE_CONTROL,
+                    cache_bust=False
+                )
+
+            urls = await asyncio.gather(*(upload(derivative) for derivative in rendered))
+        except Exception as e:
+            self.metrics['failed'] += 1
+            logger.error(f"[Image Derivatives] Failed for room {room_id}: {str(e)}")
+            raise
+
+        variants: Dict[str, Dict[str, Any]] = {}
+        for derivative, url in zip(rendered, urls):
+            entry = variants.setdefault(derivative['variant'], {'width': derivative['width'], 'height': derivative['height']})
+            entry[derivative['format']] = url
+        self._record(len(data), rendered)
+        logger.info(f"[Image Derivatives] Room {room_id}: {len(rendered)} derivatives from {len(data)} bytes")
+        return variants
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Derivation throughput and average bytes saved per view of each variant"""
+        rooms = self.metrics['rooms']
+        avg_source = self.metrics['source_bytes'] / rooms if rooms else 0
+        avg_bytes = {
+            key: round(total / self.metrics['derivatives'][key])
+            for key, total in self.metrics['derivative_bytes'].items()
+        }
+        return {
+            'enabled': self.enabled,
+            'formats': self.formats,
+            'rooms': rooms,
+            'failed': self.metrics['failed'],
+            'images_per_second': round(rooms / self.metrics['render_seconds'], 2) if self.metrics['render_seconds'] else 0.0,
+            'avg_source_bytes': round(avg_source),
+            'avg_bytes': avg_bytes,
+            'avg_saved_per_view': {key: round(avg_source - size) for key, size in avg_bytes.items()}
+        }
+
+
+# Global pipeline; one process pool per server process
+image_derivatives = ImageDerivativePipeline(
+    settings.IMAGE_DERIVATIVES_ENABLED,
+    settings.IMAGE_DERIVATIVE_WORKERS,
+    [fmt.strip() for fmt in settings.IMAGE_DERIVATIVE_FORMATS.split(",") if fmt.strip()],
+    settings.IMAGE_DERIVATIVE_QUALITY
+)
@@ -0,0 +1,183 @@
+"""
+Deduplicated, rate-limited regeneration of room images stuck on temporary URLs.
+Provider URLs (replicate.delivery, DALL-E blobs) expire. Rooms seen with one are
+recorded in a Redis index, and each is regenerated by at most one job at a time
+(a persisted in-progress marker) and at most a fixed number per minute across all
+processes. A background sweeper drains the index so expired images are usually
+replaced before a player walks into the room.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from .config import settings
+from .image_storage import is_temporary_image_url
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = "image_regen:temporary"  # sorted set: room id -> time first seen with a temporary URL
+MARKER_PREFIX = "image_regen:marker:"
+RATE_PREFIX = "image_regen:rate:"
+SWEEP_LOCK_KEY = "image_regen:sweep_lock"
+
+# Request outcomes
+QUEUED = "queued"
+IN_PROGRESS = "in_progress"
+RATE_LIMITED = "rate_limited"
+RESOLVED = "resolved"  # The room no longer has a temporary URL
+
+SweepHandler = Callable[[str], Awaitable[str]]
+
+
+class ImageRegenerationQueue:
+    """Index, in-progress markers and a shared per-minute budget for image regenerations"""
+
+    def __init__(self, per_minute: int, marker_ttl: int, sweep_interval: float, sweep_batch: int):
+        self.per_minute = max(1, per_minute)
+        self.marker_ttl = max(1, marker_ttl)
+        self.sweep_interval = max(1.0, sweep_interval)
+        self.sweep_batch = max(1, sweep_batch)
+        self.metrics: Dict[str, int] = {
+            'requested': 0,
+            'queued': 0,
+            'deduplicated': 0,
+            'rate_limited': 0,
+            'completed': 0,
+            'swept': 0
+        }
+
+    @staticmethod
+    def _redis():
+        from .database import redis_client
+        return redis_client
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def _take_rate_slot(self) -> bool:
+        """Use one regeneration from the current minute's budget, shared by every process"""
+        key = f"{RATE_PREFIX}{int(time.time() // 60)}"
+        pipe = self._redis().pipeline()
+        pipe.incr(key)
+        pipe.expire(key, 120)
+        count, _ = pipe.execute()
+        return int(count) <= self.per_minute
+
+    def request(self, room_id: str) -> str:
+        """
+        Ask for a room's image to be regenerated. Returns QUEUED if the caller should
+        submit the job now, otherwise IN_PROGRESS or RATE_LIMITED (the sweeper retries later).
+        """
+        redis_client = self._redis()
+        self.metrics['requested'] += 1
+        redis_client.zadd(INDEX_KEY, {room_id: time.time()}, nx=True)
+
+        # The marker outlives the job on failure, which doubles as a retry cooldown
+        if not redis_client.set(f"{MARKER_PREFIX}{room_id}", str(time.time()), nx=True, ex=self.marker_ttl):
+            self.metrics['deduplicated'] += 1
+            return IN_PROGRESS
+        if not self._take_rate_slot():
+            redis_client.delete(f"{MARKER_PREFIX}{room_id}")
+            self.metrics['rate_limited'] += 1
+            return RATE_LIMITED
+        self.metrics['queued'] += 1
+        return QUEUED
+
+    def note(self, room_id: str, image_url: str) -> None:
+        """Update the index after a room's image URL was stored"""
+        if is_temporary_image_url(image_url):
+            # e.g. the Supabase upload failed and the provider URL was kept
+            self._redis().zadd(INDEX_KEY, {room_id: time.time()}, nx=True)
+            return
+        pipe = self._redis().pipeline()
+        pipe.zrem(INDEX_KEY, room_id)
+        pipe.delete(f"{MARKER_PREFIX}{room_id}")
+        removed, _ = pipe.execute()
+        if removed:
+            self.metrics['completed'] += 1
+
+    def index_cached_rooms(self) -> int:
+        """Add every Redis-cached room with a temporary image URL to the index"""
+        redis_client = self._redis()
+        found = 0
+        for key in redis_client.scan_iter(match="room:*"):
+            key = self._decode(key)
+            if key.count(':') != 1:
+                continue
+            raw = redis_client.get(key)
+            if not raw:
+                continue
+            try:
+                room = json.loads(self._decode(raw))
+            except json.JSONDecodeError:
+                continue
+            if is_temporary_image_url(room.get('image_url') or ''):
+                redis_client.zadd(INDEX_KEY, {room.get('id') or key.split(':', 1)[1]: time.time()}, nx=True)
+                found += 1
+        return found
+
+    async def sweep_once(self, handler: SweepHandler) -> int:
+        """
+        Hand the oldest indexed rooms to `handler`, which returns a request outcome.
+        Only one process sweeps per interval. Returns how many rooms were queued.
+        """
+        redis_client = self._redis()
+        if not redis_client.set(SWEEP_LOCK_KEY, "1", nx=True, ex=max(1, int(self.sweep_interval))):
+            return 0
+        queued = 0
+        for room_id in redis_client.zrange(INDEX_KEY, 0, self.sweep_batch - 1):
+            room_id = self._decode(room_id)
+            try:
+                outcome = await handler(room_id)
+            except Exception as e:
+                logger.error(f"[Image Regen] Sweep failed for room {room_id}: {str(e)}")
+                continue
+            if outcome == QUEUED:
+                queued += 1
+            elif outcome == IN_PROGRESS:
+                # Move it behind the rest so rooms cooling down after a failure don't fill every batch
+                redis_client.zadd(INDEX_KEY, {room_id: time.time()}, xx=True)
+            elif outcome == RATE_LIMITED:
+                break
+        self.metrics['swept'] += queued
+        if queued:
+            logger.info(f"[Image Regen] Sweeper queued {queued} temporary image regenerations")
+        return queued
+
+    async def run(self, handler: SweepHandler) -> None:
+        """Sweep the index until cancelled"""
+        try:
+            # The keyspace scan is blocking, so it runs off the event loop
+            indexed = await asyncio.to_thread(self.index_cached_rooms)
+            logger.info(f"[Image Regen] Indexed {indexed} cached rooms with temporary image URLs")
+        except Exception as e:
+            logger.error(f"[Image Regen] Could not index cached rooms: {str(e)}")
+        while True:
+            try:
+                await self.sweep_once(handler)
+            except Exception as e:
+                logger.error(f"[Image Regen] Sweep loop error: {str(e)}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        redis_client = self._redis()
+        return {
+            **self.metrics,
+            'per_minute': self.per_minute,
+            'indexed': redis_client.zcard(INDEX_KEY),
+            'used_this_minute': int(redis_client.get(f"{RATE_PREFIX}{int(time.time() // 60)}") or 0)
+        }
+
+
+# Global queue; markers, index and rate budget live in Redis and are shared by every process
+image_regeneration = ImageRegenerationQueue(
+    settings.IMAGE_REGEN_PER_MINUTE,
+    settings.IMAGE_REGEN_MARKER_TTL,
+    settings.IMAGE_REGEN_SWEEP_INTERVAL,
+    settings.IMAGE_REGEN_SWEEP_BATCH
+)
@@ -0,0 +1,272 @@
+"""
+Room image reuse via a prompt similarity index.
+Image prompts of stored room images are indexed per biome with MinHash signatures
+and LSH buckets. When a new room's prompt is close enough to an indexed one, its
+image can be reused instead of generated (optionally followed by a cheap img2img
+variation). The latest entry of each room is kept in a per-biome Redis hash; a short,
+trimmed log of changed room ids lets every process catch up from where it last read,
+so all processes share one index without replaying its history.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "image_index:"  # Hash per biome: room_id -> latest entry
+CHANGES_KEY_PREFIX = "image_index_changes:"  # Room ids in the order they were (re)indexed
+SEQUENCE_KEY_PREFIX = "image_index_seq:"  # Changes ever made to the biome
+CHANGES_KEPT = 1000  # Processes further behind than this reload the hash instead
+REUSE_MODES = ("off", "reuse", "variation")
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard almost always share a bucket
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)  # Fixed seed: signatures must match across processes and restarts
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# Words that appear in most prompts and say nothing about the scene
+STOPWORDS = {
+    "a", "an", "the", "of", "and", "or", "in", "on", "at", "to", "with", "by", "for", "from",
+    "is", "are", "its", "it", "into", "over", "under", "through", "that", "this", "as", "while"
+}
+
+# Room ids changed since a process's position, read together with the sequence so none are
+# skipped when another process adds in between. A false result means the process must reload.
+# KEYS: sequence, changes; ARGV: position
+CHANGES_SCRIPT = """
+local sequence = tonumber(redis.call('GET', KEYS[1]) or '0')
+local missing = sequence - tonumber(ARGV[1])
+if missing == 0 then
+    return {sequence}
+end
+if missing < 0 or missing > redis.call('LLEN', KEYS[2]) then
+    return {sequence, false}
+end
+local changed = redis.call('LRANGE', KEYS[2], -missing, -1)
+table.insert(changed, 1, sequence)
+return changed
+"""
+
+
+def prompt_shingles(prompt: str) -> Set[str]:
+    """Content words and adjacent word pairs of a prompt"""
+    words = [w for w in re.findall(r"[a-z0-9]+", (prompt or "").lower()) if w not in STOPWORDS]
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def minhash_signature(shingles: Set[str]) -> List[int]:
+    """MinHash signature of a shingle set; stable across processes"""
+    if not shingles:
+        return [_PRIME] * NUM_PERM
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingles]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+
+class BiomeIndex:
+    """In-process LSH buckets over one biome's signatures"""
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[List[int], str]] = {}  # room_id -> (signature, image_url)
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self.log_position = 0  # Changes of the shared Redis index applied so far
+
+    def add(self, room_id: str, signature: List[int], image_url: str) -> None:
+        self.remove(room_id)
+        self.entries[room_id] = (signature, image_url)
+        for band in range(BANDS):
+            self.buckets.setdefault((band, tuple(signature[band * ROWS:(band + 1) * ROWS])), set()).add(room_id)
+
+    def remove(self, room_id: str) -> None:
+        entry = self.entries.pop(room_id, None)
+        if entry is None:
+            return
+        for band in range(BANDS):
+            key = (band, tuple(entry[0][band * ROWS:(band + 1) * ROWS]))
+            members = self.buckets.get(key)
+            if members:
+                members.discard(room_id)
+                if not members:
+                    del self.buckets[key]
+
+    def candidates(self, signature: List[int]) -> Set[str]:
+        found: Set[str] = set()
+        for band in range(BANDS):
+            found |= self.buckets.get((band, tuple(signature[band * ROWS:(band + 1) * ROWS])), set())
+        return found
+
+
+class PromptImageIndex:
+    """Per-biome MinHash index of room image prompts with reuse decisions and savings metrics"""
+
+    def __init__(self, mode: str, threshold: float, reuse_ratio: float):
+        if mode not in REUSE_MODES:
+            logger.warning(f"[Image Reuse] Unknown mode '{mode}', reuse disabled")
+            mode = "off"
+        self.mode = mode
+        self.threshold = threshold
+        self.reuse_ratio = min(1.0, max(0.0, reuse_ratio))
+        self._biomes: Dict[str, BiomeIndex] = {}
+        self.metrics: Dict[str, float] = {
+            'lookups': 0,
+            'matches': 0,
+            'reused': 0,
+            'generated': 0,
+            'generation_seconds': 0.0,
+            'saved_seconds': 0.0,
+            'variations': 0,
+            'variation_seconds': 0.0
+        }
+
+    @staticmethod
+    def _redis():
+        try:
+            from .database import redis_client
+            return redis_client
+        except Exception as e:
+            logger.debug(f"[Image Reuse] Redis backend unavailable: {str(e)}")
+            return None
+
+    @staticmethod
+    def _key(biome: str, prefix: str = REDIS_KEY_PREFIX) -> str:
+        return f"{prefix}{(biome or 'unknown').lower()}"
+
+    def _biome_index(self, biome: str) -> BiomeIndex:
+        """The biome's index, caught up with entries other processes stored since the last lookup"""
+        name = (biome or "unknown").lower()
+        index = self._biomes.setdefault(name, BiomeIndex())
+        redis_client = self._redis()
+        if redis_client is None:
+            return index
+        try:
+            result = redis_client.eval(
+                CHANGES_SCRIPT, 2, self._key(name, SEQUENCE_KEY_PREFIX), self._key(name, CHANGES_KEY_PREFIX), index.log_position
+            )
+            sequence, changed = int(result[0]), result[1:]
+            if sequence == index.log_position:
+                return index
+            if changed and changed[0] is None:
+                # Too far behind the trimmed log (or a fresh process): load the latest entries
+                entries = redis_client.hgetall(self._key(name))
+                index = self._biomes[name] = BiomeIndex()
+            else:
+                room_ids = list(dict.fromkeys(changed))
+                entries = dict(zip(room_ids, redis_client.hmget(self._key(name), room_ids)))
+            # The hash only ever holds a room's latest entry, so reading it after the sequence is safe
+            for room_id, raw in entries.items():
+                if raw is not None:
+                    entry = json.loads(raw)
+                    index.add(room_id.decode() if isinstance(room_id, bytes) else room_id, entry['signature'], entry['image_url'])
+            index.log_position = sequence
+        except Exception as e:
+            logger.warning(f"[Image Reuse] Could not load index for biome {name}: {str(e)}")
+        return index
+
+    def find_similar(self, biome: str, prompt: str, exclude_room_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Most similar indexed prompt in the biome at or above the threshold"""
+        signature = minhash_signature(prompt_shingles(prompt))
+        index = self._biome_index(biome)
+        best = None
+        for room_id in index.candidates(signature):
+            if room_id == exclude_room_id:
+                continue
+            other_signature, image_url = index.entries[room_id]
+            similarity = estimate_similarity(signature, other_signature)
+            if similarity >= self.threshold and (best is None or similarity > best['similarity']):
+                best = {'room_id': room_id, 'image_url': image_url, 'similarity': similarity}
+        return best
+
+    def find_reusable(self, biome: str, prompt: str, room_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Match to reuse for a new room image, or None to generate one.
+        Only a `reuse_ratio` share of matches is reused so a biome keeps some fresh art;
+        with mode "off" matches are only counted.
+        """
+        if not prompt:
+            return None
+        self.metrics['lookups'] += 1
+        match = self.find_similar(biome, prompt, exclude_room_id=room_id)
+        if match is None:
+            return None
+        self.metrics['matches'] += 1
+        if self.mode == "off" or random.random() >= self.reuse_ratio:
+            return None
+        return match
+
+    def record_reuse(self, room_id: str, match: Dict[str, Any]) -> None:
+        self.metrics['reused'] += 1
+        # A reuse saves roughly one average generation
+        if self.metrics['generated']:
+            self.metrics['saved_seconds'] += self.metrics['generation_seconds'] / self.metrics['generated']
+        logger.info(f"[Image Reuse] Room {room_id} reuses image of {match['room_id']} (similarity {match['similarity']:.2f})")
+
+    def record_variation(self, seconds: float) -> None:
+        self.metrics['variations'] += 1
+        self.metrics['variation_seconds'] += seconds
+
+    def add(self, biome: str, room_id: str, prompt: str, image_url: str, generation_seconds: Optional[float] = None) -> None:
+        """Index a room's stored image under its prompt"""
+        if generation_seconds is not None:
+            self.metrics['generated'] += 1
+            self.metrics['generation_seconds'] += generation_seconds
+        if not prompt or not image_url:
+            return
+        signature = minhash_signature(prompt_shingles(prompt))
+        index = self._biome_index(biome)
+        index.add(room_id, signature, image_url)
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                name = (biome or "unknown").lower()
+                pipe = redis_client.pipeline()
+                pipe.hset(self._key(name), room_id, json.dumps({'signature': signature, 'image_url': image_url}))
+                pipe.rpush(self._key(name, CHANGES_KEY_PREFIX), room_id)
+                pipe.ltrim(self._key(name, CHANGES_KEY_PREFIX), -CHANGES_KEPT, -1)
+                pipe.incr(self._key(name, SEQUENCE_KEY_PREFIX))
+                sequence = pipe.execute()[-1]
+                if sequence == index.log_position + 1:
+                    # Nobody stored anything since we caught up: our entry is already applied
+                    index.log_position = sequence
+            except Exception as e:
+                logger.warning(f"[Image Reuse] Could not store index entry for room {room_id}: {str(e)}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Reuse rate and generation time saved"""
+        images = self.metrics['reused'] + self.metrics['generated']
+        return {
+            'mode': self.mode,
+            'threshold': self.threshold,
+            'reuse_ratio': self.reuse_ratio,
+            'indexed': {biome: len(index.entries) for biome, index in self._biomes.items()},
+            'lookups': self.metrics['lookups'],
+            'matches': self.metrics['matches'],
+            'reused': self.metrics['reused'],
+            'generated': self.metrics['generated'],
+            'reuse_rate': round(self.metrics['reused'] / images, 3) if images else 0.0,
+            'avg_generation_seconds': round(self.metrics['generation_seconds'] / self.metrics['generated'], 2) if self.metrics['generated'] else 0.0,
+            # Variations spend part of what reuse saved
+            'saved_seconds': round(self.metrics['saved_seconds'] - self.metrics['variation_seconds'], 2),
+            'variations': self.metrics['variations'],
+            'avg_variation_seconds': round(self.metrics['variation_seconds'] / self.metrics['variations'], 2) if self.metrics['variations'] else 0.0
+        }
+
+
+# Global index shared by every room image generation in this process
+prompt_image_index = PromptImageIndex(
+    settings.IMAGE_REUSE_MODE,
+    settings.IMAGE_REUSE_THRESHOLD,
+    settings.IMAGE_REUSE_RATIO
+)
@@ -2,11 +2,11 @@
 Image storage utilities for uploading AI-generated images to Supabase Storage.
 """
 import aiohttp
-import ssl
-import certifi
+import asyncio
 import logging
 from typing import Optional
 from .supabase_client import get_supabase_client
+from .asset_transfer import asset_transfer, AssetTransferError
 from .logger import setup_logging
 from storage3.utils import StorageException
 
@@ -64,120 +64,62 @@ async def upload_image_to_supabase(
         logger.warning("[Image Storage] No image URL provided")
         return None
 
-    # Download the image first (only once)
-    try:
-        logger.info(f"[Image Storage] Downloading image from {image_url[:100]}...")
-
-        # Create SSL context with proper certificate verification
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-
-        # Download the image from the temporary URL
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                image_url,
-                timeout=aiohttp.ClientTimeout(total=timeout),
-                ssl=ssl_context
-            ) as resp:
-                if resp.status != 200:
-                    logger.error(f"[Image Storage] Failed to download image: HTTP {resp.status}")
-                    return None
-
-                image_data = await resp.read()
-                content_type = resp.headers.get('Content-Type', 'image/webp')
-
-                logger.info(f"[Image Storage] Downloaded {len(image_data)} bytes, type: {content_type}")
-
-    except aiohttp.ClientError as e:
-        logger.error(f"[Image Storage] Network error downloading image: {str(e)}")
-        return None
-    except Exception as e:
-        logger.error(f"[Image Storage] Error downloading image: {str(e)}")
-        return None
-
-    # Determine file extension from content type
-    extension = "webp"
-    if "jpeg" in content_type or "jpg" in content_type:
-        extension = "jpg"
-    elif "png" in content_type:
-        extension = "png"
-
-    # Generate file path in storage
-    file_path = f"rooms/{room_id}.{extension}"
-
-    # Retry upload with exponential backoff
-    import asyncio
+    # Stream straight from the temporary URL into storage, retrying with exponential backoff
     for attempt in range(max_retries):
         try:
-            logger.info(f"[Image Storage] Uploading to Supabase Storage: {file_path} (attempt {attempt + 1}/{max_retries})")
-
-            supabase = get_supabase_client()
-            
-            if not supabase:
-                logger.error("[Image Storage] Supabase client is None")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s
-                    continue
-                return None
-
-            # Upload the file (upsert=True allows overwriting if exists)
-            response = supabase.storage.from_(STORAGE_BUCKET).upload(
-                path=file_path,
-                file=image_data,
-                file_options={
-                    "content-type": content_type,
-                    "upsert": "true",  # Overwrite if exists
-                    "cacheControl": "no-cache"  # Prevent server-side caching
-                }
-            )
-            logger.info(f"[Image Storage] Upload response: {response}")
-
-            # Get the public URL with cache-busting parameter
-            public_url = supabase.storage.from_(STORAGE_BUCKET).get_public_url(file_path)
-            
-            # Add cache-busting parameter to prevent client caching issues
-            import time
-            cache_buster = int(time.time())
-            if '?' in public_url:
-                public_url += f"&v={cache_buster}"
-            else:
-                public_url += f"?v={cache_buster}"
-
+            logger.info(f"[Image Storage] Transferring image for room {room_id} from {image_url[:100]}... (attempt {attempt + 1}/{max_retries})")
+            public_url = await asset_transfer.transfer_image(image_url, STORAGE_BUCKET, room_id, timeout=timeout)
             logger.info(f"[Image Storage] Successfully uploaded image to Supabase: {public_url}")
             return public_url
 
-        except StorageException as upload_error:
-            # Handle Supabase storage-specific errors
-            logger.error(f"[Image Storage] StorageException during upload (attempt {attempt + 1}/{max_retries}):")
-            logger.error(f"  - Name: {getattr(upload_error, 'name', 'N/A')}")
-            logger.error(f"  - Message: {getattr(upload_error, 'message', str(upload_error))}")
-            logger.error(f"  - Code: {getattr(upload_error, 'code', 'N/A')}")
-            logger.error(f"  - Status: {getattr(upload_error, 'status', 'N/A')}")
-            
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                continue
-            return None
-
-        except Exception as upload_error:
-            logger.error(f"[Image Storage] Upload failed (attempt {attempt + 1}/{max_retries}) - Type: {type(upload_error).__name__}, Error: {upload_error}")
-            if hasattr(upload_error, 'message'):
-                logger.error(f"[Image Storage] Error message: {upload_error.message}")
-            if hasattr(upload_error, 'args'):
-                logger.error(f"[Image Storage] Error args: {upload_error.args}")
-            
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                continue
-            
+        except AssetTransferError as transfer_error:
+            logger.error(f"[Image Storage] Transfer failed (attempt {attempt + 1}/{max_retries}): {transfer_error}")
+            if not transfer_error.retryable:
+                return None
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as transfer_error:
+            logger.error(f"[Image Storage] Network error (attempt {attempt + 1}/{max_retries}) - Type: {type(transfer_error).__name__}, Error: {transfer_error}")
+
+        except Exception as transfer_error:
+            logger.error(f"[Image Storage] Upload failed (attempt {attempt + 1}/{max_retries}) - Type: {type(transfer_error).__name__}, Error: {transfer_error}")
             import traceback
             logger.error(f"[Image Storage] Traceback: {traceback.format_exc()}")
-            return None
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s
 
     # All retries exhausted
     logger.error(f"[Image Storage] Failed to upload after {max_retries} attempts")
     return None
 
 
+async def copy_room_image(image_url: str, room_id: str, timeout: int = 30) -> Optional[str]:
+    """
+    Store another room's image as this room's own `rooms/{room_id}` object.
+
+    Args:
+        image_url: Public URL of the image to copy
+        room_id: The room ID to use for naming the copy
+        timeout: Request timeout in seconds
+
+    Returns:
+        The public URL of the copy, or None if it could not be made
+    """
+    source_path = asset_transfer.storage_path(STORAGE_BUCKET, image_url)
+    if source_path is None:
+        # Not one of our stored objects: stream it in like a generated image
+        return await upload_image_to_supabase(image_url, room_id, timeout=timeout)
+
+    extension = source_path.rsplit('.', 1)[-1] if '.' in source_path.rsplit('/', 1)[-1] else 'webp'
+    try:
+        public_url = await asset_transfer.copy_object(STORAGE_BUCKET, source_path, f"rooms/{room_id}.{extension}", timeout=timeout)
+        logger.info(f"[Image Storage] Copied {source_path} for room {room_id}: {public_url}")
+        return public_url
+    except (AssetTransferError, aiohttp.ClientError, asyncio.TimeoutError) as copy_error:
+        logger.error(f"[Image Storage] Could not copy {source_path} for room {room_id}: {copy_error}")
+        return None
+
+
 def is_temporary_image_url(image_url: str) -> bool:
     """
     Check if an image URL is from a temporary provider (Replicate, OpenAI, etc.)
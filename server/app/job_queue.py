@@ -0,0 +1,279 @@
+"""
+Durable Redis-backed job queue for background world generation.
+Room image, image regeneration and 3D model jobs are stored in Redis so they
+survive restarts and run in separate worker processes (see job_worker.py).
+Jobs carry an idempotency key per room, are retried with exponential backoff, and
+are handed back to the queue if a worker stops heartbeating within the visibility
+timeout.
+"""
+import json
+import logging
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+READY_KEY = "jobs:ready"  # sorted set: job id -> time it may run
+PROCESSING_KEY = "jobs:processing"  # sorted set: job id -> visibility deadline
+DEAD_KEY = "jobs:dead"  # sorted set: job id -> time it was given up on
+JOB_KEY_PREFIX = "job:"
+IDEMPOTENCY_KEY_PREFIX = "job_key:"
+
+ACTIVE_STATUSES = ("queued", "running", "retrying")
+FINISHED_JOB_TTL = 86400  # Keep succeeded jobs queryable for a day
+DEAD_JOB_TTL = 7 * 86400  # Keep dead jobs around for a week so they can be requeued
+
+# Move the earliest due job from ready to processing in one step, so a worker that dies
+# right after claiming leaves the job to the visibility timeout instead of losing it.
+# KEYS: ready, processing; ARGV: now, visibility deadline
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+if #due == 0 then
+    return false
+end
+redis.call('ZREM', KEYS[1], due[1])
+redis.call('ZADD', KEYS[2], ARGV[2], due[1])
+return due[1]
+"""
+
+
+class JobDeferred(Exception):
+    """Raised by a handler to run the job again after `delay` seconds without using up an attempt"""
+
+    def __init__(self, delay: float, payload_updates: Optional[Dict[str, Any]] = None):
+        super().__init__(f"deferred for {delay}s")
+        self.delay = delay
+        self.payload_updates = payload_updates or {}
+
+
+class JobQueue:
+    """Ready/processing/dead sorted sets plus one JSON record per job"""
+
+    def __init__(self, visibility_timeout: float, max_attempts: int, backoff_base: float, backoff_max: float):
+        self.visibility_timeout = max(1.0, visibility_timeout)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = max(0.0, backoff_base)
+        self.backoff_max = max(self.backoff_base, backoff_max)
+
+    @staticmethod
+    def _redis():
+        from .database import redis_client
+        return redis_client
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def _save(self, job: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        self._redis().set(f"{JOB_KEY_PREFIX}{job['id']}", json.dumps(job), ex=ttl)
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Full job record, or None if unknown or expired"""
+        raw = self._redis().get(f"{JOB_KEY_PREFIX}{job_id}")
+        return json.loads(self._decode(raw)) if raw else None
+
+    def get_status_by_key(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """The active job holding an idempotency key, if any"""
+        job_id = self._redis().get(f"{IDEMPOTENCY_KEY_PREFIX}{idempotency_key}")
+        return self.get_status(self._decode(job_id)) if job_id else None
+
+    def has_active_job(self, idempotency_key: str) -> bool:
+        job = self.get_status_by_key(idempotency_key)
+        return bool(job and job['status'] in ACTIVE_STATUSES)
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        idempotency_key: Optional[str] = None,
+        delay: float = 0.0,
+        max_attempts: Optional[int] = None
+    ) -> str:
+        """Add a job and return its id; an active job with the same idempotency key is returned instead"""
+        redis_client = self._redis()
+        now = time.time()
+        job_id = f"job_{uuid.uuid4().hex}"
+
+        if idempotency_key:
+            key = f"{IDEMPOTENCY_KEY_PREFIX}{idempotency_key}"
+            if not redis_client.set(key, job_id, nx=True):
+                existing_id = self._decode(redis_client.get(key))
+                existing = self.get_status(existing_id) if existing_id else None
+                if existing and existing['status'] in ACTIVE_STATUSES:
+                    logger.debug(f"[Jobs] {kind} already queued for {idempotency_key} as {existing_id}")
+                    return existing_id
+                # The previous holder finished or vanished; take the key over
+                redis_client.set(key, job_id)
+
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'payload': payload,
+            'idempotency_key': idempotency_key,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': max_attempts or self.max_attempts,
+            'last_error': None,
+            'worker': None,
+            'created_at': now,
+            'updated_at': now,
+            'run_at': now + delay
+        }
+        self._save(job)
+        redis_client.zadd(READY_KEY, {job_id: now + delay})
+        logger.info(f"[Jobs] Enqueued {kind} job {job_id}" + (f" ({idempotency_key})" if idempotency_key else ""))
+        return job_id
+
+    def _take_due(self, now: float) -> Optional[str]:
+        """Atomically move the next due job id into processing under a fresh visibility deadline"""
+        job_id = self._redis().eval(CLAIM_SCRIPT, 2, READY_KEY, PROCESSING_KEY, now, now + self.visibility_timeout)
+        return self._decode(job_id) if job_id else None
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Take the next due job and start its visibility timeout"""
+        now = time.time()
+        job_id = self._take_due(now)
+        if job_id is None:
+            return None
+
+        job = self.get_status(job_id)
+        if job is None:
+            logger.warning(f"[Jobs] Dropping job {job_id} with no record")
+            self._redis().zrem(PROCESSING_KEY, job_id)
+            return None
+
+        job['status'] = 'running'
+        job['attempts'] += 1
+        job['worker'] = worker_id
+        job['started_at'] = now
+        job['updated_at'] = now
+        self._save(job)
+        return job
+
+    def heartbeat(self, job_id: str) -> None:
+        """Push a running job's visibility deadline out again"""
+        self._redis().zadd(PROCESSING_KEY, {job_id: time.time() + self.visibility_timeout}, xx=True)
+
+    def _release_key(self, job: Dict[str, Any]) -> None:
+        idempotency_key = job.get('idempotency_key')
+        if not idempotency_key:
+            return
+        key = f"{IDEMPOTENCY_KEY_PREFIX}{idempotency_key}"
+        redis_client = self._redis()
+        if self._decode(redis_client.get(key)) == job['id']:
+            redis_client.delete(key)
+
+    def complete(self, job: Dict[str, Any]) -> None:
+        job['status'] = 'succeeded'
+        job['updated_at'] = time.time()
+        self._redis().zrem(PROCESSING_KEY, job['id'])
+        self._release_key(job)
+        self._save(job, FINISHED_JOB_TTL)
+
+    def backoff(self, attempts: int) -> float:
+        """Exponential backoff with jitter for the given number of attempts so far"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * (0.5 + random.random() / 2)
+
+    def fail(self, job: Dict[str, Any], error: str) -> bool:
+        """Record a failed attempt; returns True if the job is now dead"""
+        redis_client = self._redis()
+        now = time.time()
+        job['last_error'] = error
+        job['updated_at'] = now
+        redis_client.zrem(PROCESSING_KEY, job['id'])
+
+        if job['attempts'] < job['max_attempts']:
+            delay = self.backoff(job['attempts'])
+            job['status'] = 'retrying'
+            job['run_at'] = now + delay
+            self._save(job)
+            redis_client.zadd(READY_KEY, {job['id']: now + delay})
+            logger.warning(f"[Jobs] {job['kind']} job {job['id']} failed (attempt {job['attempts']}/{job['max_attempts']}), retrying in {delay:.1f}s: {error}")
+            return False
+
+        job['status'] = 'dead'
+        self._release_key(job)
+        self._save(job, DEAD_JOB_TTL)
+        redis_client.zadd(DEAD_KEY, {job['id']: now})
+        logger.error(f"[Jobs] {job['kind']} job {job['id']} gave up after {job['attempts']} attempts: {error}")
+        return True
+
+    def defer(self, job: Dict[str, Any], delay: float, payload_updates: Optional[Dict[str, Any]] = None) -> None:
+        """Reschedule a running job without counting the attempt (e.g. an external job still in progress)"""
+        redis_client = self._redis()
+        now = time.time()
+        job['payload'].update(payload_updates or {})
+        job['attempts'] = max(0, job['attempts'] - 1)
+        job['status'] = 'queued'
+        job['run_at'] = now + delay
+        job['updated_at'] = now
+        redis_client.zrem(PROCESSING_KEY, job['id'])
+        self._save(job)
+        redis_client.zadd(READY_KEY, {job['id']: now + delay})
+
+    def requeue_expired(self) -> List[Dict[str, Any]]:
+        """Fail running jobs whose worker stopped heartbeating; returns the jobs that are now dead"""
+        redis_client = self._redis()
+        dead = []
+        for job_id in redis_client.zrangebyscore(PROCESSING_KEY, '-inf', time.time()):
+            job_id = self._decode(job_id)
+            # Only the reaper that removes the entry handles it
+            if not redis_client.zrem(PROCESSING_KEY, job_id):
+                continue
+            job = self.get_status(job_id)
+            if job is None:
+                continue
+            if self.fail(job, f"visibility timeout expired on worker {job.get('worker')}"):
+                dead.append(job)
+        return dead
+
+    def requeue(self, job_id: str) -> bool:
+        """Admin: put a dead or stuck job back on the queue with a fresh set of attempts"""
+        redis_client = self._redis()
+        job = self.get_status(job_id)
+        if job is None:
+            return False
+        if job.get('idempotency_key'):
+            existing = self.get_status_by_key(job['idempotency_key'])
+            if existing and existing['id'] != job_id and existing['status'] in ACTIVE_STATUSES:
+                logger.info(f"[Jobs] Not requeueing {job_id}: {existing['id']} is already active for {job['idempotency_key']}")
+                return False
+            redis_client.set(f"{IDEMPOTENCY_KEY_PREFIX}{job['idempotency_key']}", job_id)
+        now = time.time()
+        job.update(status='queued', attempts=0, run_at=now, updated_at=now)
+        pipe = redis_client.pipeline()
+        pipe.zrem(DEAD_KEY, job_id)
+        pipe.zrem(PROCESSING_KEY, job_id)
+        pipe.set(f"{JOB_KEY_PREFIX}{job_id}", json.dumps(job))
+        pipe.zadd(READY_KEY, {job_id: now})
+        pipe.execute()
+        logger.info(f"[Jobs] Requeued {job['kind']} job {job_id}")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depths for the status endpoint"""
+        redis_client = self._redis()
+        now = time.time()
+        return {
+            'ready': redis_client.zcard(READY_KEY),
+            'due': redis_client.zcount(READY_KEY, '-inf', now),
+            'processing': redis_client.zcard(PROCESSING_KEY),
+            'expired': redis_client.zcount(PROCESSING_KEY, '-inf', now),
+            'dead': redis_client.zcard(DEAD_KEY)
+        }
+
+
+# Global queue shared by the API (enqueue/status) and worker processes
+job_queue = JobQueue(
+    settings.JOB_VISIBILITY_TIMEOUT,
+    settings.JOB_MAX_ATTEMPTS,
+    settings.JOB_RETRY_BACKOFF_BASE,
+    settings.JOB_RETRY_BACKOFF_MAX
+)
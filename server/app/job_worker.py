@@ -0,0 +1,248 @@
+"""
+Worker process for the durable job queue.
+Run with `python -m app.job_worker`. Each worker claims room image, image
+regeneration and 3D model jobs from Redis, heartbeats while they run, and hands
+expired jobs from crashed workers back to the queue. Room broadcasts are published
+to Redis and relayed to players by the API processes.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+from typing import Any, Awaitable, Callable, Dict, List
+
+from .config import settings
+from .image_derivatives import image_derivatives
+from .logger import setup_logging
+from .job_queue import JobDeferred, job_queue
+from .model_3d_poller import model_3d_poller
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+async def handle_room_image(game_manager, payload: Dict[str, Any]) -> None:
+    room_id = payload['room_id']
+    if payload.get('mark_generating'):
+        await game_manager._generate_room_image(room_id, payload['image_prompt'], raise_errors=True)
+    else:
+        await game_manager._generate_room_image_background(room_id, payload['image_prompt'], raise_errors=True)
+
+
+async def handle_room_image_regenerate(game_manager, payload: Dict[str, Any]) -> None:
+    room_id = payload['room_id']
+    room_data = await game_manager.db.get_room(room_id)
+    if not room_data:
+        logger.warning(f"[Worker] Room {room_id} not found, skipping image regeneration")
+        return
+    await game_manager._regenerate_room_image(room_id, room_data, raise_errors=True)
+
+
+async def handle_image_derivatives(game_manager, payload: Dict[str, Any]) -> None:
+    await game_manager._create_image_derivatives(payload['room_id'], payload['image_url'], raise_errors=True)
+
+
+async def handle_room_image_variation(game_manager, payload: Dict[str, Any]) -> None:
+    await game_manager._generate_room_image_variation(
+        payload['room_id'], payload['image_prompt'], payload['source_url'], raise_errors=True
+    )
+
+
+async def handle_model_3d(game_manager, payload: Dict[str, Any]) -> None:
+    room_id = payload['room_id']
+    room_data = await game_manager.db.get_room(room_id)
+    if not room_data:
+        logger.warning(f"[Worker] Room {room_id} not found, skipping 3D generation")
+        return
+
+    request_id = room_data.get('model_3d_job_id')
+    if room_data.get('model_3d_status') == 'generating' and request_id:
+        # Already submitted to FAL (e.g. requeued after a restart); just make sure it is being polled
+        if not model_3d_poller.is_tracking(room_id):
+            model_3d_poller.track(room_id, request_id)
+        return
+
+    if not await game_manager._submit_3d_job(room_id, room_data):
+        raise RuntimeError(f"FAL rejected 3D generation for room {room_id}")
+
+
+async def mark_image_dead(game_manager, payload: Dict[str, Any]) -> None:
+    await game_manager._mark_room_image_error(payload['room_id'])
+
+
+async def mark_model_3d_dead(game_manager, payload: Dict[str, Any]) -> None:
+    await game_manager._mark_3d_error(payload['room_id'])
+
+
+JobHandler = Callable[[Any, Dict[str, Any]], Awaitable[None]]
+
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    "room_image": handle_room_image,
+    "room_image_regenerate": handle_room_image_regenerate,
+    "image_derivatives": handle_image_derivatives,
+    "room_image_variation": handle_room_image_variation,
+    "model_3d": handle_model_3d
+}
+
+# Run once a job has used up its attempts so the room doesn't stay "generating" forever
+DEAD_JOB_HANDLERS: Dict[str, JobHandler] = {
+    "room_image": mark_image_dead,
+    "room_image_regenerate": mark_image_dead,
+    "model_3d": mark_model_3d_dead
+}
+
+
+async def handle_dead_job(game_manager, job: Dict[str, Any]) -> None:
+    handler = DEAD_JOB_HANDLERS.get(job['kind'])
+    if handler is None:
+        return
+    try:
+        await handler(game_manager, job['payload'])
+    except Exception as e:
+        logger.error(f"[Worker] Error marking dead {job['kind']} job {job['id']}: {str(e)}")
+
+
+class JobWorker:
+    """Claims jobs from the queue and runs them with a fixed number of consumers"""
+
+    def __init__(self, game_manager, concurrency: int, poll_interval: float):
+        self.game_manager = game_manager
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        logger.info(f"[Worker] {self.worker_id} stopping after running jobs finish")
+        self._stopping.set()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(job_queue.visibility_timeout / 3)
+            try:
+                job_queue.heartbeat(job_id)
+            except Exception as e:
+                logger.warning(f"[Worker] Heartbeat failed for job {job_id}: {str(e)}")
+
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        handler = JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            if job_queue.fail(job, f"no handler for job kind {job['kind']}"):
+                await handle_dead_job(self.game_manager, job)
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job['id']))
+        try:
+            await handler(self.game_manager, job['payload'])
+            job_queue.complete(job)
+            logger.info(f"[Worker] Completed {job['kind']} job {job['id']}")
+        except JobDeferred as deferred:
+            job_queue.defer(job, deferred.delay, deferred.payload_updates)
+        except Exception as e:
+            if job_queue.fail(job, str(e)):
+                await handle_dead_job(self.game_manager, job)
+        finally:
+            heartbeat.cancel()
+
+    async def _consumer(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = job_queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"[Worker] Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                await self._sleep(self.poll_interval)
+                continue
+            await self.run_job(job)
+
+    async def _reaper(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                for job in job_queue.requeue_expired():
+                    await handle_dead_job(self.game_manager, job)
+            except Exception as e:
+                logger.error(f"[Worker] Error requeueing expired jobs: {str(e)}")
+            await self._sleep(job_queue.visibility_timeout / 4)
+
+    async def run(self) -> None:
+        logger.info(f"[Worker] {self.worker_id} started with {self.concurrency} consumers")
+        await asyncio.gather(self._reaper(), *(self._consumer() for _ in range(self.concurrency)))
+        logger.info(f"[Worker] {self.worker_id} stopped")
+
+
+def _decode(value: Any) -> Any:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def find_stuck_rooms(redis_client) -> List[Dict[str, Any]]:
+    """Rooms marked as generating an image or 3D model with no active job behind them"""
+    stuck = []
+    for key in redis_client.scan_iter(match="room:*"):
+        key = _decode(key)
+        if key.count(':') != 1:
+            # room:{id}:players, room:{id}:generation and similar bookkeeping keys
+            continue
+        raw = redis_client.get(key)
+        if not raw:
+            continue
+        try:
+            room = json.loads(_decode(raw))
+        except json.JSONDecodeError:
+            continue
+        room_id = room.get('id') or key.split(':', 1)[1]
+
+        if room.get('image_status') in ('pending', 'generating') and not job_queue.has_active_job(f"image:{room_id}"):
+            stuck.append({'room_id': room_id, 'kind': 'room_image_regenerate', 'status': room.get('image_status')})
+        if room.get('model_3d_status') in ('pending', 'generating') \
+                and not job_queue.has_active_job(f"model_3d:{room_id}") \
+                and not model_3d_poller.is_tracking(room_id):
+            stuck.append({'room_id': room_id, 'kind': 'model_3d', 'status': room.get('model_3d_status')})
+    return stuck
+
+
+def requeue_stuck_rooms(redis_client, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """Enqueue jobs for every stuck room; returns what was (or would be) requeued"""
+    stuck = find_stuck_rooms(redis_client)
+    for entry in stuck:
+        if dry_run:
+            continue
+        key_prefix = "image" if entry['kind'] == 'room_image_regenerate' else "model_3d"
+        entry['job_id'] = job_queue.enqueue(
+            entry['kind'],
+            {"room_id": entry['room_id']},
+            idempotency_key=f"{key_prefix}:{entry['room_id']}"
+        )
+    return stuck
+
+
+async def main() -> None:
+    from .game_manager import GameManager
+
+    game_manager = GameManager()
+    worker = JobWorker(game_manager, settings.JOB_WORKER_CONCURRENCY, settings.JOB_POLL_INTERVAL)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            pass
+    # FAL jobs submitted by this and other processes are polled and uploaded here, off the API processes
+    poller = asyncio.create_task(model_3d_poller.run(game_manager._apply_3d_result))
+    try:
+        await worker.run()
+    finally:
+        poller.cancel()
+        image_derivatives.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+"""
+Pluggable LLM providers.
+Every provider exposes the OpenAI-compatible `chat.completions.create` surface the
+rest of the server already uses, so switching LLM_PROVIDER needs no call site changes.
+The "fake" provider answers locally with schema-valid responses and configurable
+latency, for load and latency testing without network access.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ["north", "south", "east", "west", "up", "down"]
+
+FAKE_NARRATIVES = [
+    "You steady yourself and act, and the world answers in kind.",
+    "The air shifts around you as your action takes hold.",
+    "Nothing stirs for a moment, then the room seems to take notice.",
+    "Your effort pays off, if only a little.",
+]
+
+FAKE_SENTENCES = [
+    "The duel ends as suddenly as it began, and the stronger will prevails.",
+    "A low growl answers you, wary but curious.",
+    "Lunging strike forward",
+    "Victory is claimed amid drifting dust and ringing steel.",
+]
+
+NAME_SUFFIXES = ["of the Vale", "the Elder", "of Ashmoor", "the Wanderer", "of Greywater", "the Bold"]
+
+
+class FakeChatCompletions:
+    """Local stand-in for `client.chat.completions`"""
+
+    def __init__(self, tokens_per_second: float, ttft_ms: float, ttft_jitter_ms: float, seed: Optional[int] = None):
+        self.tokens_per_second = max(1.0, tokens_per_second)
+        self.ttft_ms = max(0.0, ttft_ms)
+        self.ttft_jitter_ms = max(0.0, ttft_jitter_ms)
+        self.rng = random.Random(seed)
+
+    async def create(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7,
+                     stream: bool = False, stream_options: Optional[Dict[str, Any]] = None, **kwargs):
+        """Mirror the OpenAI call: a response object, or an async chunk iterator when stream=True"""
+        system = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+        user = "\n".join(m["content"] for m in messages if m.get("role") == "user")
+        content = self.respond(system, user)
+        tokens = self._tokenize(content)
+        usage = SimpleNamespace(
+            prompt_tokens=(len(system) + len(user)) // 4,
+            completion_tokens=len(tokens),
+            total_tokens=(len(system) + len(user)) // 4 + len(tokens),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0)
+        )
+
+        if stream:
+            include_usage = bool((stream_options or {}).get("include_usage"))
+            return self._stream(tokens, usage if include_usage else None)
+
+        await asyncio.sleep(self._sample_ttft() + len(tokens) / self.tokens_per_second)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")],
+            usage=usage
+        )
+
+    async def _stream(self, tokens: List[str], usage: Optional[Any]) -> AsyncIterator[Any]:
+        await asyncio.sleep(self._sample_ttft())
+        delay = 1.0 / self.tokens_per_second
+        for token in tokens:
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=token), finish_reason=None)], usage=None)
+            await asyncio.sleep(delay)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+    def _sample_ttft(self) -> float:
+        return max(0.0, self.rng.gauss(self.ttft_ms, self.ttft_jitter_ms)) / 1000.0
+
+    @staticmethod
+    def _tokenize(content: str) -> List[str]:
+        # Roughly 4 characters per token, matching the context builder's fallback estimate
+        return [content[i:i + 4] for i in range(0, len(content), 4)] or [""]
+
+    def respond(self, system: str, user: str) -> str:
+        """Pick a response shape from the prompt"""
+        combined = f"{system}\n{user}"
+        if "You are the game master of a multiplayer" in system:
+            return self._game_master_response(user)
+        if '{"monsters": [...]}' in combined:
+            match = re.search(r'containing exactly (\d+) monsters', combined)
+            count = int(match.group(1)) if match else 1
+            example = self._first_json_object(combined) or {"name": "Creature", "description": "A creature.", "special_effects": "none"}
+            return json.dumps({"monsters": [{**self._vary(example), "slot": slot} for slot in range(1, count + 1)]})
+        if "is_attack" in combined:
+            return json.dumps({"is_attack": False, "target_monster_id": None})
+
+        example = self._first_json_object(combined)
+        if example is not None:
+            return json.dumps(self._vary(example))
+        return self.rng.choice(FAKE_SENTENCES)
+
+    def _game_master_response(self, user: str) -> str:
+        action = ""
+        match = re.search(r'^Context: (.*)$', user, re.MULTILINE)
+        if match:
+            try:
+                action = str(json.loads(match.group(1)).get("action", ""))
+            except (json.JSONDecodeError, AttributeError):
+                action = ""
+
+        narrative = self.rng.choice(FAKE_NARRATIVES)
+        player_updates: Dict[str, Any] = {}
+        for direction in DIRECTIONS:
+            if re.search(rf'\b{direction}\b', action.lower()):
+                player_updates["direction"] = direction
+                narrative = f"You set off {direction}."
+                break
+
+        payload = {"updates": {"player": player_updates} if player_updates else {}}
+        return f"{narrative}\n\n{json.dumps(payload)}"
+
+    @staticmethod
+    def _first_json_object(text: str) -> Optional[Dict[str, Any]]:
+        """First example/template object in the prompt that parses once placeholders are filled"""
+        cleaned = text.replace("true/false", "true")
+        decoder = json.JSONDecoder()
+        for match in re.finditer(r'\{', cleaned):
+            try:
+                value, _ = decoder.raw_decode(cleaned, match.start())
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, dict) and value:
+                return value
+        return None
+
+    def _vary(self, example: Dict[str, Any]) -> Dict[str, Any]:
+        result = dict(example)
+        for key in ("name", "title"):
+            if isinstance(result.get(key), str):
+                result[key] = f"{result[key]} {self.rng.choice(NAME_SUFFIXES)}"[:50]
+        return result
+
+
+class FakeLLMClient:
+    """OpenAI-shaped client backed by FakeChatCompletions"""
+
+    def __init__(self, tokens_per_second: float, ttft_ms: float, ttft_jitter_ms: float, seed: Optional[int] = None):
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(tokens_per_second, ttft_ms, ttft_jitter_ms, seed))
+
+
+def _create_openai_client():
+    from openai import AsyncOpenAI
+
+    # The SDK handles timeout gracefully with proper defaults
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        timeout=60.0,  # 60 second timeout for all requests
+        max_retries=2  # SDK will retry failed requests up to 2 times
+    )
+
+
+def _create_fake_client():
+    return FakeLLMClient(
+        settings.LLM_FAKE_TOKENS_PER_SECOND,
+        settings.LLM_FAKE_TTFT_MS,
+        settings.LLM_FAKE_TTFT_JITTER_MS
+    )
+
+
+LLM_PROVIDERS: Dict[str, Callable[[], Any]] = {
+    "openai": _create_openai_client,
+    "fake": _create_fake_client,
+}
+
+
+def create_llm_client(provider: Optional[str] = None):
+    """Build the chat client for the configured provider"""
+    provider = (provider or settings.LLM_PROVIDER).lower()
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    if provider != "openai":
+        logger.warning(f"[LLM Provider] Using '{provider}' LLM provider - responses are not generated by a real model")
+    return LLM_PROVIDERS[provider]()
@@ -0,0 +1,106 @@
+"""
+Global scheduler for outbound LLM calls.
+Bounds how many completions run at once in this process and keeps per call site
+timing so room population fan-out cannot starve interactive requests.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class LLMScheduler:
+    """Concurrency limiter for LLM calls with a separate budget for background work"""
+
+    def __init__(self, max_concurrency: int, background_max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        # Background work (room population, preloads) may never take every slot
+        self.background_max_concurrency = max(1, min(background_max_concurrency, self.max_concurrency))
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._background_slots = asyncio.Semaphore(self.background_max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.call_sites: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, call_site: str, wait_time: float, run_time: float, failed: bool) -> None:
+        stats = self.call_sites.setdefault(call_site, {
+            'calls': 0,
+            'failures': 0,
+            'total_wait': 0.0,
+            'total_time': 0.0,
+            'max_time': 0.0
+        })
+        stats['calls'] += 1
+        if failed:
+            stats['failures'] += 1
+        stats['total_wait'] += wait_time
+        stats['total_time'] += run_time
+        stats['max_time'] = max(stats['max_time'], run_time)
+
+    @asynccontextmanager
+    async def slot(self, call_site: str, background: bool = False):
+        """Hold one LLM slot for the duration of the block"""
+        queued_at = time.time()
+        self.waiting += 1
+        acquired_background = False
+        try:
+            if background:
+                await self._background_slots.acquire()
+                acquired_background = True
+            await self._slots.acquire()
+        except BaseException:
+            self.waiting -= 1
+            if acquired_background:
+                self._background_slots.release()
+            raise
+
+        self.waiting -= 1
+        self.in_flight += 1
+        started_at = time.time()
+        wait_time = started_at - queued_at
+        if wait_time > 1.0:
+            logger.info(f"[LLM Scheduler] {call_site} waited {wait_time:.2f}s for a slot ({self.in_flight}/{self.max_concurrency} in flight)")
+
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            if background:
+                self._background_slots.release()
+            self._record(call_site, wait_time, time.time() - started_at, failed)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Snapshot of scheduler load and per call site latency"""
+        call_sites = {}
+        for call_site, stats in self.call_sites.items():
+            calls = stats['calls'] or 1
+            call_sites[call_site] = {
+                'calls': stats['calls'],
+                'failures': stats['failures'],
+                'avg_wait': round(stats['total_wait'] / calls, 3),
+                'avg_time': round(stats['total_time'] / calls, 3),
+                'max_time': round(stats['max_time'], 3)
+            }
+        return {
+            'max_concurrency': self.max_concurrency,
+            'background_max_concurrency': self.background_max_concurrency,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'call_sites': call_sites
+        }
+
+
+# Global scheduler instance shared by every LLM call in this process
+llm_scheduler = LLMScheduler(settings.LLM_MAX_CONCURRENCY, settings.LLM_BACKGROUND_MAX_CONCURRENCY)
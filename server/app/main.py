@@ -2,6 +2,7 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depe
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, List, Optional, Any
+import weakref
 import json
 import asyncio
 import random
@@ -23,8 +24,10 @@ from .models import (
     ActionRecord,
     Monster,
     NPC,
-    Item
+    Item,
+    AttackIntentOutput
 )
+from .structured_output import StructuredOutputError
 from .auth_models import (
     RegisterRequest,
     LoginRequest,
@@ -37,8 +40,17 @@ from .auth_models import (
 )
 from .auth_service import AuthService
 from .auth_utils import get_current_user, get_optional_current_user, validate_username, is_username_available
+from fastapi.security import HTTPAuthorizationCredentials
 from .supabase_client import get_supabase_client
 from .game_manager import GameManager
+from .broadcast_bus import LocalBroadcastBus, broadcast_bus
+from .outbound_queue import create_outbound_connection, encode_message
+from .connection_registry import ConnectionRegistry
+from .room_state import room_state
+from .ws_actions import ws_actions, ACTION_MESSAGE_TYPES
+from .presence import presence
+from .room_affinity import ROOM_MOVED_CLOSE_CODE, create_room_affinity
+from .stream_coalescer import coalesce_action_stream, stream_metrics
 from .config import settings
 from .logger import setup_logging
 from .api_key_auth import api_key_auth
@@ -100,93 +112,208 @@ async def api_key_middleware(request: Request, call_next):
 
 # WebSocket connection manager
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, Dict[str, WebSocket]] = {}  # room_id -> {player_id: websocket}
-        self.player_last_seen: Dict[str, float] = {}  # player_id -> timestamp
-
-    async def connect(self, websocket: WebSocket, room_id: str, player_id: str):
+    def __init__(self, bus: LocalBroadcastBus):
+        # Sockets in this process, by room and by player; players idle for 2 minutes are cleaned up
+        self.connections = ConnectionRegistry(inactivity_timeout=120)
+        # The bus carries messages to players on other workers
+        self.bus = bus
+        self.bus.set_delivery(self._deliver)
+        # Sockets closed because their room moved to another worker: the client reconnects, so not a real disconnect
+        self.moved: "weakref.WeakSet[WebSocket]" = weakref.WeakSet()
+
+    async def connect(self, websocket: WebSocket, room_id: str, player_id: str, room_version: Optional[int] = None):
+        """Accept a socket; `room_version` is the room state version the client holds, if it applies room patches"""
         logger.info(f"[WebSocket] New connection request - room: {room_id}, player: {player_id}")
         await websocket.accept()
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = {}
-        self.active_connections[room_id][player_id] = websocket
+        connection = create_outbound_connection(websocket, player_id)
+        if room_version is not None:
+            connection.accepts_patches = True
+            connection.room_version = room_version
+        connection.start()
+        previous = self.connections.add(room_id, player_id, connection)
+        if previous is None:
+            self.bus.join(room_id, player_id)
+        else:
+            previous.stop()
         logger.info(f"[WebSocket] Connection accepted - room: {room_id}, player: {player_id}")
-        logger.info(f"[WebSocket] Active connections: {self.get_connection_summary()}")
+        logger.debug(f"[WebSocket] Active connections: {self.get_connection_summary()}")
 
-    def disconnect(self, room_id: str, player_id: str):
+    def disconnect(self, room_id: str, player_id: str, websocket: Optional[WebSocket] = None):
+        """Drop the player's socket; with `websocket`, only if it hasn't been replaced by a reconnect"""
         logger.info(f"[WebSocket] Disconnecting - room: {room_id}, player: {player_id}")
-        if room_id in self.active_connections:
-            self.active_connections[room_id].pop(player_id, None)
-            if not self.active_connections[room_id]:
-                self.active_connections.pop(room_id)
-        logger.info(f"[WebSocket] Active connections after disconnect: {self.get_connection_summary()}")
+        connection = self.connections.remove(room_id, player_id, websocket)
+        if connection is not None:
+            connection.stop()
+            self.bus.leave(room_id, player_id)
+        logger.debug(f"[WebSocket] Active connections after disconnect: {self.get_connection_summary()}")
+
+    def move_room(self, room_id: str, close_code: int) -> int:
+        """Close a room's sockets, after what is queued on them, so its players reconnect to the room's new owner"""
+        moved = 0
+        for player_id, connection in list(self.connections.in_room(room_id).items()):
+            self.moved.add(connection.websocket)
+            self.connections.remove(room_id, player_id, connection.websocket)
+            self.bus.leave(room_id, player_id)
+            connection.close(close_code)
+            moved += 1
+        logger.info(f"[WebSocket] Moved {moved} sockets off room {room_id}")
+        return moved
 
     def get_connection_summary(self) -> str:
-        summary = {}
-        for room_id, connections in self.active_connections.items():
-            summary[room_id] = len(connections)
-        return str(summary)
-
-    def update_player_activity(self, player_id: str):
-        """Update the last seen timestamp for a player"""
-        import time
-        self.player_last_seen[player_id] = time.time()
+        return str(self.connections.summary())
+
+    def update_player_activity(self, player_id: str, room_id: Optional[str] = None):
+        """Update the last seen timestamp for a player; with `room_id`, also refresh their shared presence"""
+        self.connections.touch(player_id)
+        if room_id is not None:
+            try:
+                presence.heartbeat(room_id, player_id)
+            except Exception as e:
+                logger.error(f"[Heartbeat] Error refreshing presence for player {player_id}: {str(e)}")
         logger.debug(f"[Heartbeat] Updated activity for player {player_id}")
 
     def is_player_active(self, player_id: str, timeout_seconds: int = 120) -> bool:
         """Check if a player has been active within the timeout period"""
-        import time
-        if player_id not in self.player_last_seen:
+        return self.connections.is_active(player_id, timeout_seconds)
+
+    async def _deliver(
+        self,
+        room_id: Optional[str],
+        message: dict,
+        exclude_player: Optional[str] = None,
+        target_player: Optional[str] = None
+    ) -> int:
+        """Queue a bus message on the matching sockets held by this process; never waits on a client"""
+        if target_player:
+            # room_id None: whichever room the player is connected to
+            recipients = [
+                (rid, target_player, connection)
+                for rid, connection in self.connections.for_player(target_player).items()
+                if (room_id is None or rid == room_id) and target_player != exclude_player
+            ]
+        else:
+            recipients = [
+                (room_id, player_id, connection)
+                for player_id, connection in self.connections.in_room(room_id).items()
+                if player_id != exclude_player
+            ]
+
+        snapshot = patch = None
+        if message.get('type') == 'room_update' and message.get('version') is not None:
+            snapshot, patch = room_state.split(message)
+
+        delivered = 0
+        payloads: Dict[int, str] = {}
+        for rid, player_id, connection in recipients:
+            outgoing = message
+            if snapshot is not None:
+                outgoing = room_state.select(connection, snapshot, patch)
+                if outgoing is None:
+                    continue
+            if id(outgoing) not in payloads:
+                # Serialized once and shared by every recipient's queue
+                payloads[id(outgoing)] = encode_message(outgoing)
+            if connection.enqueue(outgoing, payloads[id(outgoing)]):
+                delivered += 1
+                logger.debug(f"[WebSocket] Queued message for player {player_id} in room {rid}")
+            else:
+                logger.warning(f"[WebSocket] Dropped {message.get('type')} message for player {player_id}")
+        return delivered
+
+    def get_queue_metrics(self) -> Dict[str, Any]:
+        """Outbound queue depth and counters for every socket in this process"""
+        connections = {
+            f"{room_id}/{player_id}": connection.get_metrics()
+            for room_id, room_connections in self.connections.rooms.items()
+            for player_id, connection in room_connections.items()
+        }
+        return {
+            'connections': len(connections),
+            'queued': sum(c['depth'] for c in connections.values()),
+            'dropped': sum(c['dropped'] for c in connections.values()),
+            'per_connection': connections
+        }
+
+    async def send_room_state(self, room_id: str, player_id: str, room: dict) -> bool:
+        """
+        Queue a socket's initial room state: a patch from the version its client holds, or a snapshot.
+        If the room changed since its last commit (e.g. the joining player), the new version is
+        also broadcast so the room's other sockets don't fall a version behind.
+        """
+        connection = self.connections.get(room_id, player_id)
+        if connection is None:
+            return False
+        previous_version = room_state.version(room_id)
+        committed_version, committed_patch = room_state.commit(room_id, room)
+        version = committed_version
+        delta = None
+        if connection.accepts_patches and connection.room_version is not None:
+            delta = room_state.patch_since(room_id, connection.room_version)
+        if delta is not None:
+            current, patch = delta
+            message = room_state.patch_message(room_id, connection.room_version, current, patch)
+            version = current
+        else:
+            message = {"type": "room_update", "room": room, "version": version}
+        # Sent even when the client is up to date, so it re-renders the room it already holds.
+        # The client now holds exactly this version, even if it claimed a newer one (e.g. the server's state expired)
+        connection.room_version = version
+        queued = connection.enqueue(message)
+        if committed_version > previous_version:
+            await self.broadcast_to_room(
+                room_id,
+                {"type": "room_update", "room": room, "version": committed_version, "patch": committed_patch},
+                exclude_player=player_id
+            )
+        return queued
+
+    def send_to_local_player(self, player_id: str, message: dict) -> bool:
+        """Queue a message on the player's most recent socket in this process, whatever its room"""
+        for connection in reversed(list(self.connections.for_player(player_id).values())):
+            if connection.enqueue(message):
+                return True
+        return False
+
+    def send_local(self, room_id: str, player_id: str, message: dict) -> bool:
+        """Queue a reply on a socket held by this process, in order with its broadcasts"""
+        connection = self.connections.get(room_id, player_id)
+        return connection.enqueue(message) if connection is not None else False
+
+    def schedule_local(self, room_id: str, player_id: str, name: str, messages: List[dict], interval: float, on_complete=None) -> bool:
+        """Queue timed messages on a local socket without holding up its receive loop"""
+        connection = self.connections.get(room_id, player_id)
+        if connection is None:
             return False
-        return (time.time() - self.player_last_seen[player_id]) < timeout_seconds
+        connection.schedule(name, messages, interval, on_complete=on_complete)
+        return True
+
+    def fast_forward_local(self, room_id: str, player_id: str, name: Optional[str] = None) -> int:
+        """Send the rest of a socket's scheduled messages now"""
+        connection = self.connections.get(room_id, player_id)
+        return connection.fast_forward(name) if connection is not None else 0
 
     async def broadcast_to_room(self, room_id: str, message: dict, exclude_player: Optional[str] = None):
         logger.info(f"[WebSocket] Broadcasting to room {room_id} - message type: {message.get('type')}")
-        if room_id in self.active_connections:
-            for player_id, connection in self.active_connections[room_id].items():
-                if player_id != exclude_player:
-                    try:
-                        await connection.send_json(message)
-                        logger.debug(f"[WebSocket] Sent message to player {player_id} in room {room_id}")
-                    except Exception as e:
-                        logger.error(f"[WebSocket] Failed to send message to player {player_id}: {str(e)}")
-        else:
-            logger.warning(f"[WebSocket] No active connections in room {room_id}")
+        await self.bus.publish(room_id, message, exclude_player=exclude_player)
 
     async def send_to_player(self, room_id: str, player_id: str, message: dict):
         """Send a message to a specific player in a room"""
         logger.info(f"[WebSocket] Sending to player {player_id} in room {room_id} - message type: {message.get('type')}")
-        if room_id in self.active_connections and player_id in self.active_connections[room_id]:
-            try:
-                await self.active_connections[room_id][player_id].send_json(message)
-                logger.debug(f"[WebSocket] Sent message to player {player_id} in room {room_id}")
-            except Exception as e:
-                logger.error(f"[WebSocket] Failed to send message to player {player_id}: {str(e)}")
-        else:
-            logger.warning(f"[WebSocket] Player {player_id} not found in room {room_id}")
+        await self.bus.publish(room_id, message, target_player=player_id)
 
     async def cleanup_inactive_players(self, game_manager):
-        """Background task to clean up inactive players from room lists"""
-        import time
+        """
+        Background task to close sockets of inactive players in this process. Room player
+        lists don't need a sweep: presence expires once the player stops sending pings.
+        """
         logger.info("[Cleanup] Starting inactive player cleanup")
-        
-        current_time = time.time()
-        inactive_players = []
-        
-        # Find inactive players
-        for room_id, connections in self.active_connections.items():
-            for player_id in list(connections.keys()):
-                if not self.is_player_active(player_id, timeout_seconds=120):  # 2 minutes
-                    inactive_players.append((room_id, player_id))
-                    logger.info(f"[Cleanup] Player {player_id} in room {room_id} is inactive")
-        
-        # Remove inactive players
+
+        # Only players whose last activity is past the timeout are looked at
+        inactive_players = self.connections.expire()
         for room_id, player_id in inactive_players:
             try:
-                # Remove from room player list in database
-                await game_manager.db.remove_from_room_players(room_id, player_id)
-                logger.info(f"[Cleanup] Removed inactive player {player_id} from room {room_id} player list")
-                
+                logger.info(f"[Cleanup] Player {player_id} in room {room_id} is inactive")
+
                 # Disconnect WebSocket
                 self.disconnect(room_id, player_id)
                 
@@ -195,10 +322,6 @@ class ConnectionManager:
                     room_id=room_id,
                     message={"type": "presence", "player_id": player_id, "status": "disconnected"}
                 )
-                
-                # Remove from activity tracking
-                if player_id in self.player_last_seen:
-                    del self.player_last_seen[player_id]
                     
             except Exception as e:
                 logger.error(f"[Cleanup] Error removing inactive player {player_id}: {str(e)}")
@@ -206,31 +329,21 @@ class ConnectionManager:
         if inactive_players:
             logger.info(f"[Cleanup] Cleaned up {len(inactive_players)} inactive players")
 
-    async def send_personal_message(self, message: dict, player_id: str):
-        """Send a personal message to a specific player (finds their room automatically)"""
+    async def send_personal_message(self, message: dict, player_id: str, room_id: Optional[str] = None):
+        """Send a personal message to a specific player in `room_id`, or wherever they are connected"""
         logger.info(f"[WebSocket] Sending personal message to player {player_id} - message type: {message.get('type')}")
-        
-        # Find which room the player is in
-        for room_id, connections in self.active_connections.items():
-            if player_id in connections:
-                try:
-                    await connections[player_id].send_json(message)
-                    logger.debug(f"[WebSocket] Sent personal message to player {player_id} in room {room_id}")
-                    return
-                except Exception as e:
-                    logger.error(f"[WebSocket] Failed to send personal message to player {player_id}: {str(e)}")
-                    return
-        
-        logger.warning(f"[WebSocket] Player {player_id} not found in any active room")
+        await self.bus.publish(room_id, message, target_player=player_id)
 
 def rarity_to_stars(rarity: int) -> str:
     """Convert rarity number to star representation"""
     return "★" * rarity + "☆" * (4 - rarity)
 
 # Initialize managers
-manager = ConnectionManager()
+manager = ConnectionManager(broadcast_bus)
 game_manager = GameManager()
 game_manager.set_connection_manager(manager)
+# This worker's share of the rooms when they are spread over workers by consistent hashing
+room_affinity = create_room_affinity() if settings.ROOM_AFFINITY_ENABLED else None
 
 @app.on_event("startup")
 async def startup_event():
@@ -249,6 +362,28 @@ def get_game_manager():
 duel_moves = combat.duel_moves
 duel_pending = combat.duel_pending
 
+async def release_room(room_id: str):
+    """Room affinity: drop a room's in-process state once another worker owns it and send its players there"""
+    for duel_id, duel in list(duel_pending.items()):
+        if duel.get('room_id') != room_id:
+            continue
+        # Duel rounds live in this process only, so a duel can't follow the room; cancel it
+        del duel_pending[duel_id]
+        try:
+            await game_manager.db.end_active_duel(duel_id)
+        except Exception as e:
+            logger.error(f"[Affinity] Error ending duel {duel_id}: {str(e)}")
+        for player_id, opponent_id in ((duel['player1_id'], duel['player2_id']), (duel['player2_id'], duel['player1_id'])):
+            manager.send_local(room_id, player_id, {
+                "type": "duel_cancel",
+                "player_id": opponent_id,
+                "opponent_id": player_id,
+                "room_id": room_id,
+                "timestamp": datetime.now().isoformat()
+            })
+    monster_behavior_manager.release_room(room_id)
+    manager.move_room(room_id, ROOM_MOVED_CLOSE_CODE)
+
 async def handle_duel_message(message: dict, room_id: str, player_id: str, game_manager: GameManager):
     """Handle duel-related messages and coordinate AI analysis"""
     global duel_moves, duel_pending
@@ -444,61 +579,38 @@ async def detect_monster_attack(action_text: str, player_id: str, room_data: Dic
             return None
         
         # Ask AI to classify whether the action intends to attack a monster, and which one
-        # Retry mechanism for JSON parsing
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                monsters_context = [
-                    {"id": mid, "name": mdata.get("name", "Unknown Monster")}
-                    for (mid, mdata) in monsters_in_room
-                ]
-                prompt = (
-                    f"You are an impartial combat intent classifier for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}.\n"
-                    f"Player action: {json.dumps(action_text)}\n"
-                    f"Monsters present: {json.dumps(monsters_context)}\n"
-                    "Task: Determine if the player intends to ATTACK any of the listed monsters right now.\n"
-                    "Return ONLY strict JSON with keys: is_attack (boolean) and target_monster_id (string|null). "
-                    "If an attack is intended but target is ambiguous, pick the most obvious; otherwise null.\n"
-                    "Base your judgment on overall intent and semantics, not fixed keywords."
-                )
-                response = await game_manager.ai_handler.generate_text(prompt)
-                logger.info(f"[detect_monster_attack] AI raw response (attempt {attempt + 1}): {response}")
-                
-                result = json.loads(response)
-                is_attack = bool(result.get('is_attack', False))
-                target_monster_id = result.get('target_monster_id')
-                if is_attack:
-                    valid_ids = {mid for (mid, _) in monsters_in_room}
-                    if target_monster_id in valid_ids:
-                        logger.info(f"[detect_monster_attack] AI classified action as attack on monster {target_monster_id}")
-                        return target_monster_id
-                    # Fallback if unspecified/ambiguous: choose first alive monster
-                    first_id = monsters_in_room[0][0]
-                    logger.info(f"[detect_monster_attack] AI classified attack with ambiguous target; defaulting to {first_id}")
-                    return first_id
-                return None
-                
-            except json.JSONDecodeError as e:
-                logger.warning(f"[detect_monster_attack] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries - 1:
-                    # Final attempt failed, return None (no attack detected)
-                    logger.error(f"[detect_monster_attack] All {max_retries} attempts failed, assuming no attack intended")
-                    return None
-                else:
-                    # Wait a bit before retrying
-                    await asyncio.sleep(0.5)
-                    continue
-                    
-            except Exception as e:
-                logger.error(f"[detect_monster_attack] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries - 1:
-                    # Final attempt failed, return None (no attack detected)
-                    logger.error(f"[detect_monster_attack] All {max_retries} attempts failed due to unexpected error, assuming no attack intended")
-                    return None
-                else:
-                    # Wait a bit before retrying
-                    await asyncio.sleep(0.5)
-                    continue
+        monsters_context = [
+            {"id": mid, "name": mdata.get("name", "Unknown Monster")}
+            for (mid, mdata) in monsters_in_room
+        ]
+        prompt = (
+            f"You are an impartial combat intent classifier for a {WORLD_CONFIG['setting_primary']} {WORLD_CONFIG['setting_secondary']} {WORLD_CONFIG['game_type']}.\n"
+            f"Player action: {json.dumps(action_text)}\n"
+            f"Monsters present: {json.dumps(monsters_context)}\n"
+            "Task: Determine if the player intends to ATTACK any of the listed monsters right now.\n"
+            "Return ONLY strict JSON with keys: is_attack (boolean) and target_monster_id (string|null). "
+            "If an attack is intended but target is ambiguous, pick the most obvious; otherwise null.\n"
+            "Base your judgment on overall intent and semantics, not fixed keywords."
+        )
+        try:
+            result = await game_manager.ai_handler.generate_structured(prompt, AttackIntentOutput, call_site="detect_monster_attack")
+        except StructuredOutputError as e:
+            logger.error(f"[detect_monster_attack] No valid classification, assuming no attack intended: {str(e)}")
+            return None
+        logger.info(f"[detect_monster_attack] AI classification: {result}")
+
+        is_attack = result['is_attack']
+        target_monster_id = result.get('target_monster_id')
+        if is_attack:
+            valid_ids = {mid for (mid, _) in monsters_in_room}
+            if target_monster_id in valid_ids:
+                logger.info(f"[detect_monster_attack] AI classified action as attack on monster {target_monster_id}")
+                return target_monster_id
+            # Fallback if unspecified/ambiguous: choose first alive monster
+            first_id = monsters_in_room[0][0]
+            logger.info(f"[detect_monster_attack] AI classified attack with ambiguous target; defaulting to {first_id}")
+            return first_id
+        return None
         
     except Exception as e:
         logger.error(f"Error detecting monster attack: {str(e)}")
@@ -604,11 +716,27 @@ async def generate_combat_tags_from_narrative(*args, **kwargs):
     return {'player1_new_tags': [], 'player2_new_tags': []}
 
 
+# Actions sent over authenticated sockets run the same pipeline as POST /action/stream
+ws_actions.set_pipeline(
+    lambda action_request, request_start: action_event_stream(action_request, game_manager, request_start),
+    lambda token: get_optional_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)),
+    game_manager.get_player
+)
+ws_actions.set_delivery(manager.send_local, manager.send_to_local_player, manager.send_personal_message)
+
+
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws/{room_id}/{player_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str):
+async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str, room_version: Optional[int] = None):
     logger.info(f"[WebSocket] New connection request from player {player_id} for room {room_id}")
-    await manager.connect(websocket, room_id, player_id)
+    if room_affinity is not None and not room_affinity.owns(room_id):
+        # Routed with a ring that has since changed; the client reconnects through the router
+        logger.info(f"[WebSocket] Room {room_id} belongs to worker {room_affinity.owner(room_id)}, closing")
+        await websocket.accept()
+        await websocket.close(code=ROOM_MOVED_CLOSE_CODE)
+        return
+    await manager.connect(websocket, room_id, player_id, room_version)
+    action_session = ws_actions.session(room_id, player_id)
     
     # Update player activity on connection
     manager.update_player_activity(player_id)
@@ -656,10 +784,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                     if isinstance(value, bytes):
                         room_dict[key] = value.decode('utf-8')
 
-                await websocket.send_json({
-                    "type": "room_update",
-                    "room": room_dict
-                })
+                await manager.send_room_state(room_id, player_id, room_dict)
                 logger.info(f"[WebSocket] Successfully sent initial room state for {room_id}")
 
                 # Check for active quest and send storyline if not shown
@@ -681,17 +806,21 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                                 chunk_size=80
                             )
 
-                            for chunk in chunks:
-                                await websocket.send_json({
-                                    'type': 'quest_storyline',
-                                    'message': chunk
-                                })
-                                await asyncio.sleep(0.3)  # Delay between chunks for typewriter effect
-
-                            # Mark storyline as shown
-                            player_quest['storyline_shown'] = True
-                            await quest_manager._save_player_quest(player_quest)
-                            logger.info(f"[Quest] Sent storyline for quest {player_data['active_quest_id']} to player {player_id}")
+                            # Mark storyline as shown once every chunk is queued
+                            async def mark_storyline_shown(player_quest=player_quest, quest_id=player_data['active_quest_id']):
+                                player_quest['storyline_shown'] = True
+                                await quest_manager._save_player_quest(player_quest)
+                                logger.info(f"[Quest] Sent storyline for quest {quest_id} to player {player_id}")
+
+                            # Paced by the connection's schedule task, so the receive loop starts right away
+                            manager.schedule_local(
+                                room_id,
+                                player_id,
+                                'quest_storyline',
+                                [{'type': 'quest_storyline', 'message': chunk} for chunk in chunks],
+                                settings.WS_TYPEWRITER_INTERVAL,
+                                on_complete=mark_storyline_shown
+                            )
                 except Exception as e:
                     logger.error(f"[Quest] Error sending quest storyline: {str(e)}")
 
@@ -718,7 +847,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                     if attempt == max_retries - 1:
                         # Final attempt failed, send error message to client
                         logger.error(f"[WebSocket] All {max_retries} attempts failed, sending error to client")
-                        await websocket.send_json({
+                        manager.send_local(room_id, player_id, {
                             "type": "error",
                             "message": "Invalid message format. Please try again.",
                             "timestamp": datetime.now().isoformat()
@@ -733,7 +862,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                     if attempt == max_retries - 1:
                         # Final attempt failed, send error message to client
                         logger.error(f"[WebSocket] All {max_retries} attempts failed due to unexpected error, sending error to client")
-                        await websocket.send_json({
+                        manager.send_local(room_id, player_id, {
                             "type": "error",
                             "message": "Message processing error. Please try again.",
                             "timestamp": datetime.now().isoformat()
@@ -750,14 +879,16 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
 
             if message.get('type') == 'ping':
                 logger.debug(f"[WebSocket] Received heartbeat ping from player {player_id}")
-                # Update player activity and send pong
-                manager.update_player_activity(player_id)
-                await websocket.send_json({"type": "pong"})
-            elif message.get('type') == 'action':
-                logger.info(f"[WebSocket] Received action from player {player_id}: {message['action']}")
-                # Actions are now processed only through the streaming endpoint
-                # WebSocket just acknowledges receipt but doesn't process
-                logger.info(f"[WebSocket] Action will be processed via streaming endpoint")
+                # Update player activity (keeps them listed in the room) and send pong
+                manager.update_player_activity(player_id, room_id)
+                manager.send_local(room_id, player_id, {"type": "pong"})
+            elif message.get('type') == 'fast_forward':
+                # Skip the typewriter delay: the rest of the named schedule (or all of them) is sent now
+                sped_up = manager.fast_forward_local(room_id, player_id, message.get('schedule'))
+                logger.debug(f"[WebSocket] Fast-forwarded {sped_up} schedules for player {player_id}")
+            elif message.get('type') in ACTION_MESSAGE_TYPES:
+                # Authenticates the socket once, then streams its actions' events back on it
+                await action_session.handle(message)
             elif message.get('type') in ['duel_challenge', 'duel_response', 'duel_move', 'duel_cancel', 'duel_outcome']:
                 logger.info(f"[WebSocket] Received duel message type {message.get('type')} from player {player_id}")
                 # Handle duel messages
@@ -772,6 +903,9 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                 )
     except WebSocketDisconnect:
         logger.info(f"[WebSocket] Client disconnected - room: {room_id}, player: {player_id}")
+        if websocket in manager.moved:
+            # The room moved to another worker; the player is reconnecting there, not leaving
+            return
         
         # Handle duel forfeit on disconnect
         await handle_player_disconnect(player_id, room_id)
@@ -783,14 +917,14 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
         except Exception as e:
             logger.error(f"[WebSocket] Error removing player from room list: {str(e)}")
         
-        manager.disconnect(room_id, player_id)
+        manager.disconnect(room_id, player_id, websocket)
         await manager.broadcast_to_room(
             room_id=room_id,
             message={"type": "presence", "player_id": player_id, "status": "disconnected"}
         )
     except Exception as e:
         logger.error(f"[WebSocket] Error in connection: {str(e)}")
-        manager.disconnect(room_id, player_id)
+        manager.disconnect(room_id, player_id, websocket)
 
 # ===============================
 # Duel Forfeit Handler
@@ -1232,6 +1366,122 @@ async def debug_duel_state():
         "duel_pending_count": len(duel_pending)
     }
 
+@app.get("/debug/llm-metrics")
+async def debug_llm_metrics():
+    """Debug endpoint for LLM scheduler load, prompt size, cache, structured output and room pool metrics"""
+    from .llm_scheduler import llm_scheduler
+    from .context_builder import action_context_builder
+    from .prompt_metrics import prompt_cache_metrics
+    from .response_cache import response_cache
+    from .structured_output import structured_output_metrics
+    from .room_pool import room_content_pool
+    return {
+        "scheduler": llm_scheduler.get_stats(),
+        "action_context": action_context_builder.get_metrics(),
+        "prompt_cache": prompt_cache_metrics.get_report(),
+        "response_cache": response_cache.get_metrics(),
+        "structured_output": structured_output_metrics.get_report(),
+        "room_pool": room_content_pool.get_metrics()
+    }
+
+@app.get("/debug/preload-metrics")
+async def debug_preload_metrics():
+    """Debug endpoint for speculative preloading: plans, cancellations and per ring hit rate"""
+    from .preload_planner import preload_planner
+    return preload_planner.get_metrics()
+
+@app.get("/debug/generation-jobs")
+async def debug_generation_jobs():
+    """Debug endpoint listing queued and running background generation jobs"""
+    from .generation_manager import generation_manager
+    return generation_manager.get_snapshot()
+
+@app.get("/debug/jobs")
+async def debug_jobs():
+    """Debug endpoint with durable job queue depths"""
+    from .job_queue import job_queue
+    return job_queue.get_stats()
+
+@app.get("/debug/model-3d-poller")
+async def debug_model_3d_poller():
+    """Debug endpoint for the batched FAL 3D job poller"""
+    from .model_3d_poller import model_3d_poller
+    return model_3d_poller.get_metrics()
+
+@app.get("/debug/asset-transfers")
+async def debug_asset_transfers():
+    """Debug endpoint with image/model transfer counts and throughput"""
+    from .asset_transfer import asset_transfer
+    return asset_transfer.get_metrics()
+
+@app.get("/debug/image-derivatives")
+async def debug_image_derivatives():
+    """Debug endpoint with derivative throughput and bytes saved per room view"""
+    from .image_derivatives import image_derivatives
+    return image_derivatives.get_metrics()
+
+@app.get("/debug/image-reuse")
+async def debug_image_reuse():
+    """Debug endpoint with the room image reuse rate and generation time saved"""
+    from .image_reuse import prompt_image_index
+    return prompt_image_index.get_metrics()
+
+@app.get("/debug/broadcast-bus")
+async def debug_broadcast_bus():
+    """Debug endpoint with broadcast bus fan-out counters"""
+    return {**broadcast_bus.get_metrics(), 'local_connections': manager.get_connection_summary()}
+
+@app.get("/debug/outbound-queues")
+async def debug_outbound_queues():
+    """Debug endpoint with per-socket outbound queue depth and drop counters"""
+    return manager.get_queue_metrics()
+
+@app.get("/debug/room-state")
+async def debug_room_state():
+    """Debug endpoint with room state sync counters (patches vs snapshots sent)"""
+    return room_state.get_metrics()
+
+@app.get("/debug/presence/{room_id}")
+async def debug_presence(room_id: str):
+    """Debug endpoint with a room's present players (expired ones are trimmed) and presence counters"""
+    return {
+        "room_id": room_id,
+        "players": presence.room_players(room_id),
+        "metrics": presence.get_metrics()
+    }
+
+@app.get("/debug/room-affinity")
+async def debug_room_affinity():
+    """Debug endpoint with the room affinity ring: live workers, this worker's id and rebalance counters"""
+    if room_affinity is None:
+        return {"enabled": False}
+    return {"enabled": True, **room_affinity.get_metrics()}
+
+@app.get("/debug/ws-actions")
+async def debug_ws_actions():
+    """Debug endpoint with WebSocket action counters (authentications, actions, rejections, events)"""
+    return ws_actions.get_metrics()
+
+@app.get("/debug/narrative-stream")
+async def debug_narrative_stream():
+    """Debug endpoint with narrative stream counters (deltas, events per action, sampled timing)"""
+    return stream_metrics.get_metrics()
+
+@app.get("/debug/image-regeneration")
+async def debug_image_regeneration():
+    """Debug endpoint with the temporary image URL index and regeneration rate limit"""
+    from .image_regeneration import image_regeneration
+    return image_regeneration.get_metrics()
+
+@app.get("/debug/jobs/{job_id}")
+async def debug_job_status(job_id: str):
+    """Status, attempts and last error of one durable job"""
+    from .job_queue import job_queue
+    job = job_queue.get_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 # Game initialization endpoint (admin only - creates world)
 @app.post("/start")
 async def start_game(game_manager: GameManager = Depends(get_game_manager)):
@@ -1768,296 +2018,302 @@ async def get_player_by_id(
     
     return player
 
-# Action endpoint with streaming support (requires auth)
-@app.post("/action/stream")
-async def process_action_stream(
-    action_request: ActionRequest,
-    current_user: Optional[Dict[str, Any]] = Depends(get_optional_current_user),
-    game_manager: GameManager = Depends(get_game_manager)
-):
+async def action_event_stream(action_request: ActionRequest, game_manager: GameManager, request_start: float):
+    """
+    Run a player action, yielding its events as JSON strings (text chunks, room_update,
+    final, quest events). Shared by the SSE endpoint and actions sent over the WebSocket.
+    """
     import time
-    request_start = time.time()
-    logger.info(f"⏱️ [TIMING] Action request received: {action_request.action[:50]}...")
+    try:
+        generator_start = time.time()
+        # Check if player is in a duel - but also check if the duel is actually active
+        for duel_id, duel_info in duel_pending.items():
+            if (action_request.player_id == duel_info['player1_id'] or 
+                action_request.player_id == duel_info['player2_id']):
+                # Check if this is an active duel (not completed)
+                if duel_info.get('is_active', True):  # Default to True for backwards compatibility
+                    logger.info(f"[Action Stream] Player {action_request.player_id} is in active duel {duel_id}")
+                    # Player is in a duel - don't process normal actions
+                    yield json.dumps({
+                        "type": "final",
+                        "content": "⚔️ You are in a duel! Use the chat input to submit your combat move.",
+                        "updates": {}
+                    })
+                    return
+                else:
+                    logger.info(f"[Action Stream] Player {action_request.player_id} was in completed duel {duel_id}, clearing from duel_pending")
+                    # Remove completed duel from pending
+                    del duel_pending[duel_id]
+
+        # Get initial state
+        db_start = time.time()
+        player_data = await game_manager.db.get_player(action_request.player_id)
+        logger.info(f"⏱️ [TIMING] Get player data: {(time.time() - db_start)*1000:.2f}ms")
+        if not player_data:
+            yield json.dumps({"error": "Player not found"})
+            return
 
-    # Validate that the user owns this player (skip for guest players)
-    player = await game_manager.get_player(action_request.player_id)
-    if not player or (not current_user or player.user_id != current_user['id']):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only perform actions for your own player"
-        )
+        # Clear rejoin immunity when player takes an action
+        if player_data.get('rejoin_immunity', False):
+            logger.info(f"[Action Stream] Clearing rejoin immunity for player {action_request.player_id}")
+            player_data['rejoin_immunity'] = False
+            await game_manager.db.set_player(action_request.player_id, player_data)
+                
+            # Also clear rejoin_safe flags from monsters in the room
+            room_data = await game_manager.db.get_room(player_data.get('current_room', ''))
+            if room_data and room_data.get('monsters'):
+                for monster_id in room_data.get('monsters', []):
+                    try:
+                        monster_data = await game_manager.db.get_monster(monster_id)
+                        if monster_data and monster_data.get('rejoin_safe', False):
+                            monster_data['rejoin_safe'] = False
+                            # Restore original aggressiveness if it was changed
+                            if monster_data.get('aggressiveness') == 'neutral':
+                                monster_data['aggressiveness'] = 'aggressive'
+                            await game_manager.db.set_monster(monster_id, monster_data)
+                            logger.info(f"[Action Stream] Cleared rejoin_safe flag for monster {monster_id}")
+                    except Exception as e:
+                        logger.warning(f"[Action Stream] Error clearing monster {monster_id} rejoin_safe flag: {str(e)}")
 
-    logger.info(f"⏱️ [TIMING] Player validation: {(time.time() - request_start)*1000:.2f}ms")
+        player = Player(**player_data)
 
-    async def event_generator():
+        db_start = time.time()
+        logger.info(f"[Stream] Looking for room: {player.current_room}")
         try:
-            generator_start = time.time()
-            # Check if player is in a duel - but also check if the duel is actually active
-            for duel_id, duel_info in duel_pending.items():
-                if (action_request.player_id == duel_info['player1_id'] or 
-                    action_request.player_id == duel_info['player2_id']):
-                    # Check if this is an active duel (not completed)
-                    if duel_info.get('is_active', True):  # Default to True for backwards compatibility
-                        logger.info(f"[Action Stream] Player {action_request.player_id} is in active duel {duel_id}")
-                        # Player is in a duel - don't process normal actions
-                        yield json.dumps({
-                            "type": "final",
-                            "content": "⚔️ You are in a duel! Use the chat input to submit your combat move.",
-                            "updates": {}
-                        })
-                        return
-                    else:
-                        logger.info(f"[Action Stream] Player {action_request.player_id} was in completed duel {duel_id}, clearing from duel_pending")
-                        # Remove completed duel from pending
-                        del duel_pending[duel_id]
-
-            # Get initial state
-            db_start = time.time()
-            player_data = await game_manager.db.get_player(action_request.player_id)
-            logger.info(f"⏱️ [TIMING] Get player data: {(time.time() - db_start)*1000:.2f}ms")
-            if not player_data:
-                yield json.dumps({"error": "Player not found"})
+            room_data = await game_manager.db.get_room(player.current_room)
+            logger.info(f"⏱️ [TIMING] Get room data: {(time.time() - db_start)*1000:.2f}ms")
+            if not room_data:
+                logger.error(f"[Stream] Room not found: {player.current_room}")
+                yield json.dumps({"error": "Room not found"})
                 return
+        except Exception as e:
+            logger.error(f"[Stream] Error getting room {player.current_room}: {str(e)}")
+            yield json.dumps({"error": f"Database error: {str(e)}"})
+            return
 
-            # Clear rejoin immunity when player takes an action
-            if player_data.get('rejoin_immunity', False):
-                logger.info(f"[Action Stream] Clearing rejoin immunity for player {action_request.player_id}")
-                player_data['rejoin_immunity'] = False
-                await game_manager.db.set_player(action_request.player_id, player_data)
-                
-                # Also clear rejoin_safe flags from monsters in the room
-                room_data = await game_manager.db.get_room(player_data.get('current_room', ''))
-                if room_data and room_data.get('monsters'):
-                    for monster_id in room_data.get('monsters', []):
-                        try:
-                            monster_data = await game_manager.db.get_monster(monster_id)
-                            if monster_data and monster_data.get('rejoin_safe', False):
-                                monster_data['rejoin_safe'] = False
-                                # Restore original aggressiveness if it was changed
-                                if monster_data.get('aggressiveness') == 'neutral':
-                                    monster_data['aggressiveness'] = 'aggressive'
-                                await game_manager.db.set_monster(monster_id, monster_data)
-                                logger.info(f"[Action Stream] Cleared rejoin_safe flag for monster {monster_id}")
-                        except Exception as e:
-                            logger.warning(f"[Action Stream] Error clearing monster {monster_id} rejoin_safe flag: {str(e)}")
+        room = Room(**room_data)
 
-            player = Player(**player_data)
+        db_start = time.time()
+        game_state_data = await game_manager.db.get_game_state()
+        logger.info(f"⏱️ [TIMING] Get game state: {(time.time() - db_start)*1000:.2f}ms")
+        game_state = GameState(**game_state_data)
 
-            db_start = time.time()
-            logger.info(f"[Stream] Looking for room: {player.current_room}")
-            try:
-                room_data = await game_manager.db.get_room(player.current_room)
-                logger.info(f"⏱️ [TIMING] Get room data: {(time.time() - db_start)*1000:.2f}ms")
-                if not room_data:
-                    logger.error(f"[Stream] Room not found: {player.current_room}")
-                    yield json.dumps({"error": "Room not found"})
-                    return
-            except Exception as e:
-                logger.error(f"[Stream] Error getting room {player.current_room}: {str(e)}")
-                yield json.dumps({"error": f"Database error: {str(e)}"})
-                return
+        # Store the player's action as a message
+        try:
+            from .models import ChatMessage
+            from datetime import datetime as dt
+            action_message = ChatMessage(
+                player_id=action_request.player_id,
+                room_id=player.current_room,
+                message=f">> {action_request.action}",
+                message_type="system",
+                timestamp=dt.utcnow()
+            )
+            logger.info(f"[Stream] Attempting to store player action: {action_request.action} for player {action_request.player_id}")
+            result = await game_manager.db.store_player_message(action_request.player_id, action_message)
+            logger.info(f"[Stream] Player action storage result: {result}")
+        except Exception as e:
+            logger.error(f"[Stream] Failed to store player action as message: {str(e)}")
+            import traceback
+            logger.error(f"[Stream] Traceback: {traceback.format_exc()}")
 
-            room = Room(**room_data)
+        # Get NPCs in the room
+        db_start = time.time()
+        npcs = []
+        for npc_id in room.npcs:
+            npc_data = await game_manager.db.get_npc(npc_id)
+            if npc_data:
+                npcs.append(NPC(**npc_data))
+        logger.info(f"⏱️ [TIMING] Get {len(npcs)} NPCs: {(time.time() - db_start)*1000:.2f}ms")
+
+        # Get monster details for AI context
+        db_start = time.time()
+        monsters = []
+        for monster_id in room.monsters:
+            monster_data = await game_manager.db.get_monster(monster_id)
+            if monster_data:
+                monsters.append(monster_data)
+        logger.info(f"⏱️ [TIMING] Get {len(monsters)} monsters: {(time.time() - db_start)*1000:.2f}ms")
 
-            db_start = time.time()
-            game_state_data = await game_manager.db.get_game_state()
-            logger.info(f"⏱️ [TIMING] Get game state: {(time.time() - db_start)*1000:.2f}ms")
-            game_state = GameState(**game_state_data)
+        # Fetch last 10 chat messages for this room (newest-first)
+        db_start = time.time()
+        try:
+            recent_chat = await game_manager.db.get_chat_history(room_id=room.id, limit=10)
+        except Exception as e:
+            logger.warning(f"[Stream] Failed to fetch recent chat for room {room.id}: {str(e)}")
+            recent_chat = []
+        logger.info(f"⏱️ [TIMING] Get chat history: {(time.time() - db_start)*1000:.2f}ms")
 
-            # Store the player's action as a message
-            try:
-                from .models import ChatMessage
-                from datetime import datetime as dt
-                action_message = ChatMessage(
-                    player_id=action_request.player_id,
-                    room_id=player.current_room,
-                    message=f">> {action_request.action}",
-                    message_type="system",
-                    timestamp=dt.utcnow()
-                )
-                logger.info(f"[Stream] Attempting to store player action: {action_request.action} for player {action_request.player_id}")
-                result = await game_manager.db.store_player_message(action_request.player_id, action_message)
-                logger.info(f"[Stream] Player action storage result: {result}")
-            except Exception as e:
-                logger.error(f"[Stream] Failed to store player action as message: {str(e)}")
-                import traceback
-                logger.error(f"[Stream] Traceback: {traceback.format_exc()}")
-
-            # Get NPCs in the room
-            db_start = time.time()
-            npcs = []
-            for npc_id in room.npcs:
-                npc_data = await game_manager.db.get_npc(npc_id)
-                if npc_data:
-                    npcs.append(NPC(**npc_data))
-            logger.info(f"⏱️ [TIMING] Get {len(npcs)} NPCs: {(time.time() - db_start)*1000:.2f}ms")
-
-            # Get monster details for AI context
-            db_start = time.time()
-            monsters = []
-            for monster_id in room.monsters:
-                monster_data = await game_manager.db.get_monster(monster_id)
-                if monster_data:
-                    monsters.append(monster_data)
-            logger.info(f"⏱️ [TIMING] Get {len(monsters)} monsters: {(time.time() - db_start)*1000:.2f}ms")
-
-            # Fetch last 10 chat messages for this room (newest-first)
-            db_start = time.time()
-            try:
-                recent_chat = await game_manager.db.get_chat_history(room_id=room.id, limit=10)
-            except Exception as e:
-                logger.warning(f"[Stream] Failed to fetch recent chat for room {room.id}: {str(e)}")
-                recent_chat = []
-            logger.info(f"⏱️ [TIMING] Get chat history: {(time.time() - db_start)*1000:.2f}ms")
-
-            # Check rate limit before processing action
-            is_allowed, rate_limit_info = await game_manager.rate_limiter.check_rate_limit(
-                action_request.player_id,
-                game_manager.rate_limit_config['limit'],
-                game_manager.rate_limit_config['interval_minutes']
-            )
+        # Check rate limit before processing action
+        is_allowed, rate_limit_info = await game_manager.rate_limiter.check_rate_limit(
+            action_request.player_id,
+            game_manager.rate_limit_config['limit'],
+            game_manager.rate_limit_config['interval_minutes']
+        )
             
-            if not is_allowed:
-                # Player has exceeded rate limit - display as chat message instead of error
-                wait_minutes = rate_limit_info['interval_minutes']
-                wait_seconds = rate_limit_info['time_until_reset']
+        if not is_allowed:
+            # Player has exceeded rate limit - display as chat message instead of error
+            wait_minutes = rate_limit_info['interval_minutes']
+            wait_seconds = rate_limit_info['time_until_reset']
                 
-                if wait_minutes >= 1:
-                    time_message = f"{wait_minutes:.1f} minutes"
-                else:
-                    time_message = f"{wait_seconds} seconds"
+            if wait_minutes >= 1:
+                time_message = f"{wait_minutes:.1f} minutes"
+            else:
+                time_message = f"{wait_seconds} seconds"
                 
-                rate_limit_message = f"⏰ Rate limit reached! You can only send {rate_limit_info['limit']} message every {wait_minutes} minutes. Please wait {time_message} before sending another message."
+            rate_limit_message = f"⏰ Rate limit reached! You can only send {rate_limit_info['limit']} message every {wait_minutes} minutes. Please wait {time_message} before sending another message."
                 
-                logger.warning(f"Rate limit exceeded for {action_request.player_id}: {rate_limit_info['action_count']}/{rate_limit_info['limit']} actions")
+            logger.warning(f"Rate limit exceeded for {action_request.player_id}: {rate_limit_info['action_count']}/{rate_limit_info['limit']} actions")
                 
-                # Return as a normal chat message instead of an error
-                yield json.dumps({
-                    "type": "final",
-                    "content": rate_limit_message,
-                    "updates": {}
-                })
-                return
+            # Return as a normal chat message instead of an error
+            yield json.dumps({
+                "type": "final",
+                "content": rate_limit_message,
+                "updates": {}
+            })
+            return
             
-            # All actions go through AI processing for rich narrative responses
-            logger.info(f"[Stream] Processing action with AI: {action_request.action}")
-            logger.info(f"⏱️ [TIMING] Data loading complete: {(time.time() - generator_start)*1000:.2f}ms")
-
-            # AI will determine item discovery and rewards based on context using the unified system
-
-            # Use AI processing for all actions (including movement)
-            logger.info(f"[Stream] AI context includes {len(monsters)} monsters: {[m.get('name', 'Unknown') for m in monsters]}")
-            ai_start = time.time()
-            first_chunk_time = None
-            chunk_count = 0
-            last_chunk_time = None
-            async for chunk in game_manager.ai_handler.stream_action(
-                action=action_request.action,
-                player=player,
-                room=room,
-                game_state=game_state,
-                npcs=npcs,
-                monsters=monsters,
-                chat_history=recent_chat
-            ):
-                chunk_start = time.time()
-                chunk_count += 1
-                
-                if first_chunk_time is None:
-                    first_chunk_time = time.time()
-                    logger.info(f"⏱️ [TIMING] First AI chunk received: {(first_chunk_time - ai_start)*1000:.2f}ms")
-                else:
-                    if last_chunk_time:
-                        time_since_last = (chunk_start - last_chunk_time) * 1000
-                        logger.info(f"⏱️ [TIMING] Time between chunks {chunk_count-1} and {chunk_count}: {time_since_last:.2f}ms")
-                
-                last_chunk_time = chunk_start
-
-                if isinstance(chunk, dict):
-                    # Ensure chunk has the expected structure
-                    if "updates" not in chunk:
-                        logger.warning(f"[Stream] Chunk missing 'updates' field: {chunk}")
-                        chunk["updates"] = {}
-
-                    # OPTIMIZATION: Handle room_data chunks - skip for now, we'll send after movement processing
-                    if chunk.get("type") == "room_data":
-                        logger.info(f"⏱️ [TIMING] Room data chunk received at {(time.time() - request_start)*1000:.2f}ms - will process after movement")
-                        # Don't send yet - movement logic needs to run first to get correct room ID
-                        # Continue to process the final chunk which will handle everything
-                        continue
+        # All actions go through AI processing for rich narrative responses
+        logger.info(f"[Stream] Processing action with AI: {action_request.action}")
+        logger.info(f"⏱️ [TIMING] Data loading complete: {(time.time() - generator_start)*1000:.2f}ms")
+
+        # AI will determine item discovery and rewards based on context using the unified system
+
+        # Use AI processing for all actions (including movement)
+        logger.info(f"[Stream] AI context includes {len(monsters)} monsters: {[m.get('name', 'Unknown') for m in monsters]}")
+        async for chunk in coalesce_action_stream(game_manager.ai_handler.stream_action(
+            action=action_request.action,
+            player=player,
+            room=room,
+            game_state=game_state,
+            npcs=npcs,
+            monsters=monsters,
+            chat_history=recent_chat
+        )):
+            if isinstance(chunk, dict):
+                # Ensure chunk has the expected structure
+                if "updates" not in chunk:
+                    logger.warning(f"[Stream] Chunk missing 'updates' field: {chunk}")
+                    chunk["updates"] = {}
+
+                # OPTIMIZATION: Handle room_data chunks - skip for now, we'll send after movement processing
+                if chunk.get("type") == "room_data":
+                    logger.info(f"⏱️ [TIMING] Room data chunk received at {(time.time() - request_start)*1000:.2f}ms - will process after movement")
+                    # Don't send yet - movement logic needs to run first to get correct room ID
+                    # Continue to process the final chunk which will handle everything
+                    continue
 
-                    # Store the AI response as a message
-                    if chunk.get("type") == "final" and "response" in chunk:
-                        try:
-                            from .models import ChatMessage
-                            from datetime import datetime as dt
-                            ai_response_message = ChatMessage(
-                                player_id=action_request.player_id,
-                                room_id=player.current_room,
-                                message=chunk["response"],
-                                message_type="ai_response",
-                                timestamp=dt.utcnow(),
-                                is_ai_response=True
-                            )
-                            logger.info(f"[Stream] Attempting to store AI response for player {action_request.player_id}")
-                            result = await game_manager.db.store_player_message(action_request.player_id, ai_response_message)
-                            logger.info(f"[Stream] AI response storage result: {result}")
-                        except Exception as e:
-                            logger.error(f"[Stream] Failed to store AI response as message: {str(e)}")
-                            import traceback
-                            logger.error(f"[Stream] Traceback: {traceback.format_exc()}")
-
-                    # Apply updates BEFORE yielding the final response
-                    if "player" in chunk["updates"]:
-                        player_updates = chunk["updates"]["player"]
-                        if "direction" in player_updates:
-                            movement_start = time.time()
-                            direction = player_updates["direction"]
-
-                            # Skip movement processing if direction is None (non-movement actions)
-                            if direction is None:
-                                logger.info(f"[Stream] Player direction is None, skipping movement processing")
+                # Store the AI response as a message
+                if chunk.get("type") == "final" and "response" in chunk:
+                    try:
+                        from .models import ChatMessage
+                        from datetime import datetime as dt
+                        ai_response_message = ChatMessage(
+                            player_id=action_request.player_id,
+                            room_id=player.current_room,
+                            message=chunk["response"],
+                            message_type="ai_response",
+                            timestamp=dt.utcnow(),
+                            is_ai_response=True
+                        )
+                        logger.info(f"[Stream] Attempting to store AI response for player {action_request.player_id}")
+                        result = await game_manager.db.store_player_message(action_request.player_id, ai_response_message)
+                        logger.info(f"[Stream] AI response storage result: {result}")
+                    except Exception as e:
+                        logger.error(f"[Stream] Failed to store AI response as message: {str(e)}")
+                        import traceback
+                        logger.error(f"[Stream] Traceback: {traceback.format_exc()}")
+
+                # Apply updates BEFORE yielding the final response
+                if "player" in chunk["updates"]:
+                    player_updates = chunk["updates"]["player"]
+                    if "direction" in player_updates:
+                        movement_start = time.time()
+                        direction = player_updates["direction"]
+
+                        # Skip movement processing if direction is None (non-movement actions)
+                        if direction is None:
+                            logger.info(f"[Stream] Player direction is None, skipping movement processing")
+                        else:
+                            logger.info(f"[Stream] Player attempting to move {direction} from {player.current_room}")
+                            logger.info(f"⏱️ [TIMING] Starting movement processing")
+
+                            # Structured movement blocking: compute retreat and check monsters
+                            room_data_current = await game_manager.db.get_room(player.current_room)
+                            connections_raw = room_data_current.get('connections', {}) if room_data_current else {}
+                            # Normalize connection keys to lowercase strings (handle Enum keys)
+                            connections = {}
+                            try:
+                                for k, v in connections_raw.items():
+                                    key = getattr(k, 'value', k)
+                                    if isinstance(key, str):
+                                        connections[key.lower()] = v
+                            except Exception:
+                                connections = {str(k).lower(): v for k, v in connections_raw.items()}
+                            last_room = monster_behavior_manager.player_last_room.get(action_request.player_id)
+                            target_room = connections.get(direction.lower())
+                            is_retreat = (last_room is not None and target_room == last_room)
+                                
+                            print(f"\n🚨 [Movement] Retreat check:")
+                            print(f"   player: {action_request.player_id}")
+                            print(f"   last_room: {last_room}")
+                            print(f"   target_room: {target_room}")
+                            print(f"   is_retreat: {is_retreat}")
+                            print(f"   All player_last_room entries: {monster_behavior_manager.player_last_room}")
+                            logger.info(f"[Movement] Retreat check: player={action_request.player_id}, last_room={last_room}, target_room={target_room}, is_retreat={is_retreat}")
+                            logger.info(f"[Movement] All player_last_room entries: {monster_behavior_manager.player_last_room}")
+
+                            # Aggressive blocking (allows retreat internally)
+                            aggressive_block = None
+                            if not is_retreat:
+                                logger.info(f"[Movement] Not a retreat - checking aggressive monster blocking")
+                                aggressive_block = await monster_behavior_manager.check_aggressive_monster_blocking(
+                                    action_request.player_id, player.current_room, direction, game_manager
+                                )
                             else:
-                                logger.info(f"[Stream] Player attempting to move {direction} from {player.current_room}")
-                                logger.info(f"⏱️ [TIMING] Starting movement processing")
-
-                                # Structured movement blocking: compute retreat and check monsters
-                                room_data_current = await game_manager.db.get_room(player.current_room)
-                                connections_raw = room_data_current.get('connections', {}) if room_data_current else {}
-                                # Normalize connection keys to lowercase strings (handle Enum keys)
-                                connections = {}
+                                logger.info(f"[Movement] Retreat detected - skipping aggressive monster blocking")
+                            if aggressive_block:
+                                monster_id, _ = aggressive_block
+                                combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
+                                    action_request.player_id, monster_id, player.current_room, direction, game_manager
+                                )
                                 try:
-                                    for k, v in connections_raw.items():
-                                        key = getattr(k, 'value', k)
-                                        if isinstance(key, str):
-                                            connections[key.lower()] = v
+                                    monster_data = await game_manager.db.get_monster(monster_id)
                                 except Exception:
-                                    connections = {str(k).lower(): v for k, v in connections_raw.items()}
-                                last_room = monster_behavior_manager.player_last_room.get(action_request.player_id)
-                                target_room = connections.get(direction.lower())
-                                is_retreat = (last_room is not None and target_room == last_room)
-                                
-                                print(f"\n🚨 [Movement] Retreat check:")
-                                print(f"   player: {action_request.player_id}")
-                                print(f"   last_room: {last_room}")
-                                print(f"   target_room: {target_room}")
-                                print(f"   is_retreat: {is_retreat}")
-                                print(f"   All player_last_room entries: {monster_behavior_manager.player_last_room}")
-                                logger.info(f"[Movement] Retreat check: player={action_request.player_id}, last_room={last_room}, target_room={target_room}, is_retreat={is_retreat}")
-                                logger.info(f"[Movement] All player_last_room entries: {monster_behavior_manager.player_last_room}")
-
-                                # Aggressive blocking (allows retreat internally)
-                                aggressive_block = None
-                                if not is_retreat:
-                                    logger.info(f"[Movement] Not a retreat - checking aggressive monster blocking")
-                                    aggressive_block = await monster_behavior_manager.check_aggressive_monster_blocking(
-                                        action_request.player_id, player.current_room, direction, game_manager
-                                    )
-                                else:
-                                    logger.info(f"[Movement] Retreat detected - skipping aggressive monster blocking")
-                                if aggressive_block:
-                                    monster_id, _ = aggressive_block
-                                    combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
+                                    monster_data = None
+                                monster_name = (monster_data or {}).get('name', 'Unknown Monster')
+                                try:
+                                    player1_max_vital = 5
+                                    player2_max_vital = await get_monster_max_vital(monster_data or {})
+                                except Exception:
+                                    player1_max_vital = 5
+                                    player2_max_vital = 5
+                                yield json.dumps({
+                                    "type": "final",
+                                    "content": combat_message,
+                                    "updates": {
+                                        "duel": {
+                                            "is_monster_duel": True,
+                                            "opponent_id": monster_id,
+                                            "opponent_name": monster_name,
+                                            "player1_max_vital": player1_max_vital,
+                                            "player2_max_vital": player2_max_vital
+                                        }
+                                    }
+                                })
+                                return
+
+                            # Territorial blocking (skip on retreat)
+                            territorial_block = None
+                            if not is_retreat:
+                                territorial_block = await monster_behavior_manager.check_territorial_blocking(
+                                    action_request.player_id, player.current_room, direction, game_manager
+                                )
+                            else:
+                                logger.info(f"[Movement] Retreat detected - skipping territorial monster blocking")
+                            if territorial_block:
+                                    monster_id, _ = territorial_block
+                                    combat_message = await monster_behavior_manager.handle_territorial_combat_initiation(
                                         action_request.player_id, monster_id, player.current_room, direction, game_manager
                                     )
                                     try:
@@ -2086,861 +2342,840 @@ async def process_action_stream(
                                     })
                                     return
 
-                                # Territorial blocking (skip on retreat)
-                                territorial_block = None
-                                if not is_retreat:
-                                    territorial_block = await monster_behavior_manager.check_territorial_blocking(
-                                        action_request.player_id, player.current_room, direction, game_manager
-                                    )
-                                else:
-                                    logger.info(f"[Movement] Retreat detected - skipping territorial monster blocking")
-                                if territorial_block:
-                                        monster_id, _ = territorial_block
-                                        combat_message = await monster_behavior_manager.handle_territorial_combat_initiation(
-                                            action_request.player_id, monster_id, player.current_room, direction, game_manager
-                                        )
-                                        try:
-                                            monster_data = await game_manager.db.get_monster(monster_id)
-                                        except Exception:
-                                            monster_data = None
-                                        monster_name = (monster_data or {}).get('name', 'Unknown Monster')
-                                        try:
-                                            player1_max_vital = 5
-                                            player2_max_vital = await get_monster_max_vital(monster_data or {})
-                                        except Exception:
-                                            player1_max_vital = 5
-                                            player2_max_vital = 5
-                                        yield json.dumps({
-                                            "type": "final",
-                                            "content": combat_message,
-                                            "updates": {
-                                                "duel": {
-                                                    "is_monster_duel": True,
-                                                    "opponent_id": monster_id,
-                                                    "opponent_name": monster_name,
-                                                    "player1_max_vital": player1_max_vital,
-                                                    "player2_max_vital": player2_max_vital
-                                                }
-                                            }
-                                        })
-                                        return
-
-                                # Proceed with movement
-                                # Clear rejoin immunity when player moves to a different room
-                                if player.rejoin_immunity:
-                                    player.rejoin_immunity = False
-                                    logger.info(f"[Stream] Cleared rejoin immunity for player {action_request.player_id} due to movement")
+                            # Proceed with movement
+                            # Clear rejoin immunity when player moves to a different room
+                            if player.rejoin_immunity:
+                                player.rejoin_immunity = False
+                                logger.info(f"[Stream] Cleared rejoin immunity for player {action_request.player_id} due to movement")
 
-                                logger.info(f"⏱️ [TIMING] Monster blocking checks: {(time.time() - movement_start)*1000:.2f}ms")
-
-                                # CRITICAL: Use GameManager's coordinate-based room movement logic to prevent duplicate coordinates
-                                room_gen_start = time.time()
-                                actual_room_id, new_room = await game_manager.handle_room_movement_by_direction(
-                                    player, room, direction
-                                )
-                                logger.info(f"⏱️ [TIMING] Room generation/retrieval: {(time.time() - room_gen_start)*1000:.2f}ms")
+                            logger.info(f"⏱️ [TIMING] Monster blocking checks: {(time.time() - movement_start)*1000:.2f}ms")
 
-                                # Update player's destination to the actual room ID
-                                player_updates["current_room"] = actual_room_id
-                                player.current_room = actual_room_id  # CRITICAL: Also update the player object itself
-                                new_room_id = actual_room_id
+                            # CRITICAL: Use GameManager's coordinate-based room movement logic to prevent duplicate coordinates
+                            room_gen_start = time.time()
+                            actual_room_id, new_room = await game_manager.handle_room_movement_by_direction(
+                                player, room, direction
+                            )
+                            logger.info(f"⏱️ [TIMING] Room generation/retrieval: {(time.time() - room_gen_start)*1000:.2f}ms")
 
-                                logger.info(f"[Stream] Player moving to room: {new_room_id}")
+                            # Update player's destination to the actual room ID
+                            player_updates["current_room"] = actual_room_id
+                            player.current_room = actual_room_id  # CRITICAL: Also update the player object itself
+                            new_room_id = actual_room_id
 
-                                # Room movement is now handled entirely by GameManager
-                                # Remove the direction from updates since it's been processed
-                                del player_updates["direction"]
+                            logger.info(f"[Stream] Player moving to room: {new_room_id}")
 
-                                # OPTIMIZATION: Send room_update immediately with new room data
-                                logger.info(f"⏱️ [TIMING] Fetching room data for immediate room_update at {(time.time() - request_start)*1000:.2f}ms")
-                                try:
-                                    room_fetch_start = time.time()
-                                    new_room_data = await game_manager.db.get_room(new_room_id)
-                                    logger.info(f"⏱️ [TIMING] Room data fetched in {(time.time() - room_fetch_start)*1000:.2f}ms")
+                            # Room movement is now handled entirely by GameManager
+                            # Remove the direction from updates since it's been processed
+                            del player_updates["direction"]
 
-                                    # Send room_update with complete room data
-                                    room_update_payload = {
-                                        "type": "room_update",
-                                        "updates": {
-                                            "player": {**player_updates, "current_room": new_room_id},
-                                            "room": new_room_data
-                                        }
+                            # OPTIMIZATION: Send room_update immediately with new room data
+                            logger.info(f"⏱️ [TIMING] Fetching room data for immediate room_update at {(time.time() - request_start)*1000:.2f}ms")
+                            try:
+                                room_fetch_start = time.time()
+                                new_room_data = await game_manager.db.get_room(new_room_id)
+                                logger.info(f"⏱️ [TIMING] Room data fetched in {(time.time() - room_fetch_start)*1000:.2f}ms")
+
+                                # Send room_update with complete room data
+                                room_update_payload = {
+                                    "type": "room_update",
+                                    "updates": {
+                                        "player": {**player_updates, "current_room": new_room_id},
+                                        "room": new_room_data
                                     }
-                                    yield json.dumps(room_update_payload)
-                                    logger.info(f"⏱️ [TIMING] Sent room_update to client at {(time.time() - request_start)*1000:.2f}ms")
-                                except Exception as e:
-                                    logger.error(f"[Stream] Error sending room_update: {str(e)}")
+                                }
+                                yield json.dumps(room_update_payload)
+                                logger.info(f"⏱️ [TIMING] Sent room_update to client at {(time.time() - request_start)*1000:.2f}ms")
+                            except Exception as e:
+                                logger.error(f"[Stream] Error sending room_update: {str(e)}")
 
-                                # CRITICAL: Update player data in database BEFORE broadcasting
-                                # Use latest DB data as base to avoid stale inventory from quest items added during this action
-                                db_update_start = time.time()
-                                try:
-                                    latest_player_data = await game_manager.db.get_player(action_request.player_id)
-                                except Exception:
-                                    latest_player_data = None
+                            # CRITICAL: Update player data in database BEFORE broadcasting
+                            # Use latest DB data as base to avoid stale inventory from quest items added during this action
+                            db_update_start = time.time()
+                            try:
+                                latest_player_data = await game_manager.db.get_player(action_request.player_id)
+                            except Exception:
+                                latest_player_data = None
                                 
-                                # CRITICAL FIX: Use latest_player_data as base instead of stale player object
-                                # The player object is from the start of the action and doesn't include quest items added during this action
-                                base_player_dict = latest_player_data if latest_player_data and isinstance(latest_player_data, dict) else player.dict()
+                            # CRITICAL FIX: Use latest_player_data as base instead of stale player object
+                            # The player object is from the start of the action and doesn't include quest items added during this action
+                            base_player_dict = latest_player_data if latest_player_data and isinstance(latest_player_data, dict) else player.dict()
                                 
-                                # Build updated player with movement/action updates
-                                merged_player_dict = {**base_player_dict, **player_updates}
+                            # Build updated player with movement/action updates
+                            merged_player_dict = {**base_player_dict, **player_updates}
                                 
-                                # If updates explicitly include inventory, trust it (overrides DB)
-                                if 'player' in chunk.get('updates', {}) and 'inventory' in chunk['updates']['player']:
-                                    merged_player_dict['inventory'] = chunk['updates']['player']['inventory']
-                                    logger.info(f"[Inventory] Using explicit inventory from updates: {len(chunk['updates']['player']['inventory'])} items")
-                                else:
-                                    logger.info(f"[Inventory] Preserving inventory from DB: {len(base_player_dict.get('inventory', []))} items")
+                            # If updates explicitly include inventory, trust it (overrides DB)
+                            if 'player' in chunk.get('updates', {}) and 'inventory' in chunk['updates']['player']:
+                                merged_player_dict['inventory'] = chunk['updates']['player']['inventory']
+                                logger.info(f"[Inventory] Using explicit inventory from updates: {len(chunk['updates']['player']['inventory'])} items")
+                            else:
+                                logger.info(f"[Inventory] Preserving inventory from DB: {len(base_player_dict.get('inventory', []))} items")
                                 
-                                updated_player = Player(**merged_player_dict)
-                                await game_manager.db.set_player(action_request.player_id, updated_player.dict())
-                                logger.info(f"⏱️ [TIMING] Update player in DB (inventory-safe): {(time.time() - db_update_start)*1000:.2f}ms; inv_count={len(updated_player.inventory) if hasattr(updated_player, 'inventory') else 'n/a'}")
-
-                                # CRITICAL: Update room player lists in database
-                                db_update_start = time.time()
-                                old_room_id = player.current_room
-                                await game_manager.db.remove_from_room_players(old_room_id, action_request.player_id)
-                                await game_manager.db.add_to_room_players(new_room_id, action_request.player_id)
-                                logger.info(f"⏱️ [TIMING] Update room player lists: {(time.time() - db_update_start)*1000:.2f}ms")
-                                logger.info(f"[Stream] Updated room player lists: removed from {old_room_id}, added to {new_room_id}")
-
-                                # Clear combat history when player leaves a room
-                                try:
-                                    monster_behavior_manager._clear_player_combat_history(action_request.player_id)
-                                except Exception as e:
-                                    logger.error(f"[Stream] Error clearing combat history: {str(e)}")
-
-                                # Handle monster behaviors when entering new room
-                                try:
-                                    behavior_start = time.time()
-                                    new_room_data = await game_manager.db.get_room(new_room_id)
-                                    if new_room_data:
-                                        # Get the direction the player came FROM (opposite of where they're going)
-                                        # If player moves WEST, they entered from EAST
-                                        opposite_directions = {
-                                            'north': 'south',
-                                            'south': 'north',
-                                            'east': 'west',
-                                            'west': 'east',
-                                            'up': 'down',
-                                            'down': 'up'
-                                        }
-                                        # The entry direction is the opposite of the movement direction
-                                        # Safety check for None direction
-                                        if direction is not None:
-                                            entry_direction = opposite_directions.get(direction.lower(), direction)
-                                        else:
-                                            entry_direction = "unknown"
-
-                                        logger.info(f"[MonsterBehavior] Player moved {direction}, entered from {entry_direction}")
-                                        logger.info(f"[MonsterBehavior] Calling handle_player_room_entry: player={action_request.player_id}, new_room={new_room_id}, old_room={old_room_id}")
+                            updated_player = Player(**merged_player_dict)
+                            await game_manager.db.set_player(action_request.player_id, updated_player.dict())
+                            logger.info(f"⏱️ [TIMING] Update player in DB (inventory-safe): {(time.time() - db_update_start)*1000:.2f}ms; inv_count={len(updated_player.inventory) if hasattr(updated_player, 'inventory') else 'n/a'}")
+
+                            # CRITICAL: Update room player lists in database
+                            db_update_start = time.time()
+                            old_room_id = player.current_room
+                            await game_manager.db.remove_from_room_players(old_room_id, action_request.player_id)
+                            await game_manager.db.add_to_room_players(new_room_id, action_request.player_id)
+                            logger.info(f"⏱️ [TIMING] Update room player lists: {(time.time() - db_update_start)*1000:.2f}ms")
+                            logger.info(f"[Stream] Updated room player lists: removed from {old_room_id}, added to {new_room_id}")
+
+                            # Clear combat history when player leaves a room
+                            try:
+                                monster_behavior_manager._clear_player_combat_history(action_request.player_id)
+                            except Exception as e:
+                                logger.error(f"[Stream] Error clearing combat history: {str(e)}")
 
-                                        behavior_messages = await monster_behavior_manager.handle_player_room_entry(
-                                            action_request.player_id, new_room_id, old_room_id, entry_direction, new_room_data, game_manager
-                                        )
+                            # Handle monster behaviors when entering new room
+                            try:
+                                behavior_start = time.time()
+                                new_room_data = await game_manager.db.get_room(new_room_id)
+                                if new_room_data:
+                                    # Get the direction the player came FROM (opposite of where they're going)
+                                    # If player moves WEST, they entered from EAST
+                                    opposite_directions = {
+                                        'north': 'south',
+                                        'south': 'north',
+                                        'east': 'west',
+                                        'west': 'east',
+                                        'up': 'down',
+                                        'down': 'up'
+                                    }
+                                    # The entry direction is the opposite of the movement direction
+                                    # Safety check for None direction
+                                    if direction is not None:
+                                        entry_direction = opposite_directions.get(direction.lower(), direction)
+                                    else:
+                                        entry_direction = "unknown"
+
+                                    logger.info(f"[MonsterBehavior] Player moved {direction}, entered from {entry_direction}")
+                                    logger.info(f"[MonsterBehavior] Calling handle_player_room_entry: player={action_request.player_id}, new_room={new_room_id}, old_room={old_room_id}")
+
+                                    behavior_messages = await monster_behavior_manager.handle_player_room_entry(
+                                        action_request.player_id, new_room_id, old_room_id, entry_direction, new_room_data, game_manager
+                                    )
 
-                                        logger.info(f"⏱️ [TIMING] Monster behavior handling: {(time.time() - behavior_start)*1000:.2f}ms")
-                                        logger.info(f"[MonsterBehavior] handle_player_room_entry completed, player_last_room now: {monster_behavior_manager.player_last_room}")
+                                    logger.info(f"⏱️ [TIMING] Monster behavior handling: {(time.time() - behavior_start)*1000:.2f}ms")
+                                    logger.info(f"[MonsterBehavior] handle_player_room_entry completed, player_last_room now: {monster_behavior_manager.player_last_room}")
 
-                                        # Send behavior messages to player if any
-                                        for behavior_message in behavior_messages:
-                                            await manager.send_to_player(new_room_id, action_request.player_id, {
-                                                "type": "system_message",
-                                                "message": behavior_message,
-                                                "timestamp": datetime.now().isoformat()
-                                            })
+                                    # Send behavior messages to player if any
+                                    for behavior_message in behavior_messages:
+                                        await manager.send_to_player(new_room_id, action_request.player_id, {
+                                            "type": "system_message",
+                                            "message": behavior_message,
+                                            "timestamp": datetime.now().isoformat()
+                                        })
 
-                                        # Aggressive monster descriptions are now included in atmospheric_presence via room info
+                                    # Aggressive monster descriptions are now included in atmospheric_presence via room info
 
-                                except Exception as e:
-                                    logger.error(f"[Stream] Error handling monster behaviors: {str(e)}")
-
-                                # CRITICAL: Handle presence updates for room movement
-                                # Notify old room that player is leaving BEFORE they disconnect
-                                broadcast_start = time.time()
-                                if manager.active_connections.get(old_room_id):
-                                    await manager.broadcast_to_room(
-                                        room_id=old_room_id,
-                                        message={
-                                            "type": "presence",
-                                            "player_id": action_request.player_id,
-                                            "status": "left"
-                                        },
-                                        exclude_player=action_request.player_id
-                                    )
-                                    logger.info(f"⏱️ [TIMING] Broadcast presence update: {(time.time() - broadcast_start)*1000:.2f}ms")
-                                    logger.info(f"[Stream] Sent 'left' presence to room {old_room_id} for player {action_request.player_id}")
+                            except Exception as e:
+                                logger.error(f"[Stream] Error handling monster behaviors: {str(e)}")
+
+                            # CRITICAL: Handle presence updates for room movement
+                            # Notify old room that player is leaving BEFORE they disconnect
+                            broadcast_start = time.time()
+                            # Other players in the old room may be connected to other workers
+                            await manager.broadcast_to_room(
+                                room_id=old_room_id,
+                                message={
+                                    "type": "presence",
+                                    "player_id": action_request.player_id,
+                                    "status": "left"
+                                },
+                                exclude_player=action_request.player_id
+                            )
+                            logger.info(f"⏱️ [TIMING] Broadcast presence update: {(time.time() - broadcast_start)*1000:.2f}ms")
+                            logger.info(f"[Stream] Sent 'left' presence to room {old_room_id} for player {action_request.player_id}")
 
-                                # The client will handle disconnecting from old room and connecting to new room
-                                # We don't need to manually move WebSocket connections since they're tied to room endpoints
+                            # The client will handle disconnecting from old room and connecting to new room
+                            # We don't need to manually move WebSocket connections since they're tied to room endpoints
 
-                    # Check if this is a rate limit error
-                    if chunk.get("updates", {}).get("error") == "rate_limit_exceeded":
-                        # Yield rate limit error
-                        yield json.dumps({
-                                "type": "error",
-                                "error": "rate_limit_exceeded",
-                                "message": chunk["updates"]["message"],
-                                "rate_limit_info": chunk["updates"]["rate_limit_info"]
-                        })
-                    else:
-                        # Non-movement actions: aggressive monsters attack on any action (retreat handled in movement logic)
-                        is_movement = ("player" in chunk.get("updates", {}) and "direction" in chunk["updates"].get("player", {}))
-                        additional_content = ""
+                # Check if this is a rate limit error
+                if chunk.get("updates", {}).get("error") == "rate_limit_exceeded":
+                    # Yield rate limit error
+                    yield json.dumps({
+                            "type": "error",
+                            "error": "rate_limit_exceeded",
+                            "message": chunk["updates"]["message"],
+                            "rate_limit_info": chunk["updates"]["rate_limit_info"]
+                    })
+                else:
+                    # Non-movement actions: aggressive monsters attack on any action (retreat handled in movement logic)
+                    is_movement = ("player" in chunk.get("updates", {}) and "direction" in chunk["updates"].get("player", {}))
+                    additional_content = ""
                         
-                        # Also check if this was a movement action by looking at the original action
-                        action_lower = (action_request.action or "").lower()
-                        cardinal_dirs = {"north", "south", "east", "west", "up", "down"}
-                        is_movement_action = action_lower in cardinal_dirs or action_lower.startswith(("move ", "go ", "walk ", "run ", "head "))
-
-                        # If user sent a bare cardinal direction (e.g. button press) and AI omitted updates,
-                        # inject a movement update so retreat logic runs.
-                        if (not is_movement) and (action_lower in cardinal_dirs):
-                            logger.info(f"[Stream] Injecting movement update for bare cardinal action '{action_lower}'")
-                            if "updates" not in chunk or not isinstance(chunk.get("updates"), dict):
-                                chunk["updates"] = {}
-                            if "player" not in chunk["updates"] or not isinstance(chunk["updates"].get("player"), dict):
-                                chunk["updates"]["player"] = {}
-                            chunk["updates"]["player"]["direction"] = action_lower
-                            is_movement = True
+                    # Also check if this was a movement action by looking at the original action
+                    action_lower = (action_request.action or "").lower()
+                    cardinal_dirs = {"north", "south", "east", "west", "up", "down"}
+                    is_movement_action = action_lower in cardinal_dirs or action_lower.startswith(("move ", "go ", "walk ", "run ", "head "))
+
+                    # If user sent a bare cardinal direction (e.g. button press) and AI omitted updates,
+                    # inject a movement update so retreat logic runs.
+                    if (not is_movement) and (action_lower in cardinal_dirs):
+                        logger.info(f"[Stream] Injecting movement update for bare cardinal action '{action_lower}'")
+                        if "updates" not in chunk or not isinstance(chunk.get("updates"), dict):
+                            chunk["updates"] = {}
+                        if "player" not in chunk["updates"] or not isinstance(chunk["updates"].get("player"), dict):
+                            chunk["updates"]["player"] = {}
+                        chunk["updates"]["player"]["direction"] = action_lower
+                        is_movement = True
                         
-                        logger.info(f"[Stream] Action analysis: is_movement={is_movement}, is_movement_action={is_movement_action}, action='{action_request.action}'")
+                    logger.info(f"[Stream] Action analysis: is_movement={is_movement}, is_movement_action={is_movement_action}, action='{action_request.action}'")
 
-                        if not is_movement and not is_movement_action:
-                                logger.info(f"[Stream] Non-movement action detected - checking aggressive monster blocking")
+                    if not is_movement and not is_movement_action:
+                            logger.info(f"[Stream] Non-movement action detected - checking aggressive monster blocking")
                                 
-                                # Handle item awarding from AI (unified system) - MOVED HERE FOR NON-MOVEMENT ACTIONS
-                                try:
-                                    # Check for unified item_award system
-                                    item_award_info = chunk.get("updates", {}).get("item_award")
-                                    if item_award_info is not None:
-                                        award_type = item_award_info.get("type")
-                                        awarded_item_name = item_award_info.get("item_name")
-                                        rarity = item_award_info.get("rarity", 1)
-
-                                        # Ensure updates scaffolding exists
-                                        if "updates" not in chunk or not isinstance(chunk["updates"], dict):
-                                            chunk["updates"] = {}
-                                        if "player" not in chunk["updates"] or not isinstance(chunk["updates"].get("player"), dict):
-                                            chunk["updates"]["player"] = {}
-
-                                        logger.info(f"[Item System] Processing item award: type={award_type}, name={awarded_item_name}, rarity={rarity}")
-
-                                        # Process unified item award system
-                                        item_id = None
-                                        item_data = None
+                            # Handle item awarding from AI (unified system) - MOVED HERE FOR NON-MOVEMENT ACTIONS
+                            try:
+                                # Check for unified item_award system
+                                item_award_info = chunk.get("updates", {}).get("item_award")
+                                if item_award_info is not None:
+                                    award_type = item_award_info.get("type")
+                                    awarded_item_name = item_award_info.get("item_name")
+                                    rarity = item_award_info.get("rarity", 1)
+
+                                    # Ensure updates scaffolding exists
+                                    if "updates" not in chunk or not isinstance(chunk["updates"], dict):
+                                        chunk["updates"] = {}
+                                    if "player" not in chunk["updates"] or not isinstance(chunk["updates"].get("player"), dict):
+                                        chunk["updates"]["player"] = {}
+
+                                    logger.info(f"[Item System] Processing item award: type={award_type}, name={awarded_item_name}, rarity={rarity}")
+
+                                    # Process unified item award system
+                                    item_id = None
+                                    item_data = None
                                         
-                                        if award_type == "room_item" and awarded_item_name:
-                                            # Award specific room item
-                                            logger.info(f"[Item System] AI awarded room item: {awarded_item_name}")
+                                    if award_type == "room_item" and awarded_item_name:
+                                        # Award specific room item
+                                        logger.info(f"[Item System] AI awarded room item: {awarded_item_name}")
                                             
-                                            if room.items:
-                                                # Find the matching room item
-                                                item_found = False
-                                                for room_item_id in room.items[:]:
-                                                    if item_found:
-                                                        break
-                                                    try:
-                                                        room_item_data = await game_manager.db.get_item(room_item_id)
-                                                        if room_item_data and room_item_data['name'] == awarded_item_name:
-                                                            # If it's a quest item assigned to another player, skip
-                                                            try:
-                                                                props = (room_item_data.get('properties') or {})
-                                                                quest_flag = props.get('quest_item')
-                                                                is_quest_item = quest_flag in ['True', 'true', True]
-                                                                spawned_for = props.get('spawned_for_player_id')
-                                                                if is_quest_item and spawned_for and spawned_for != action_request.player_id:
-                                                                    logger.info(f"[Item System] Skipping quest room item '{room_item_data['name']}' not assigned to player {action_request.player_id}")
-                                                                    continue
-                                                            except Exception:
-                                                                pass
-                                                            # Award this specific room item
-                                                            item_id = room_item_id
-                                                            item_data = room_item_data
+                                        if room.items:
+                                            # Find the matching room item
+                                            item_found = False
+                                            for room_item_id in room.items[:]:
+                                                if item_found:
+                                                    break
+                                                try:
+                                                    room_item_data = await game_manager.db.get_item(room_item_id)
+                                                    if room_item_data and room_item_data['name'] == awarded_item_name:
+                                                        # If it's a quest item assigned to another player, skip
+                                                        try:
+                                                            props = (room_item_data.get('properties') or {})
+                                                            quest_flag = props.get('quest_item')
+                                                            is_quest_item = quest_flag in ['True', 'true', True]
+                                                            spawned_for = props.get('spawned_for_player_id')
+                                                            if is_quest_item and spawned_for and spawned_for != action_request.player_id:
+                                                                logger.info(f"[Item System] Skipping quest room item '{room_item_data['name']}' not assigned to player {action_request.player_id}")
+                                                                continue
+                                                        except Exception:
+                                                            pass
+                                                        # Award this specific room item
+                                                        item_id = room_item_id
+                                                        item_data = room_item_data
                                                             
-                                                            # Remove from room
-                                                            room.items.remove(room_item_id)
-                                                            await game_manager.db.set_room(room.id, room.dict())
+                                                        # Remove from room
+                                                        room.items.remove(room_item_id)
+                                                        await game_manager.db.set_room(room.id, room.dict())
                                                             
-                                                            # Add to player inventory
-                                                            player.inventory.append(item_id)
-                                                            await game_manager.db.set_player(action_request.player_id, player.dict())
+                                                        # Add to player inventory
+                                                        player.inventory.append(item_id)
+                                                        await game_manager.db.set_player(action_request.player_id, player.dict())
                                                             
-                                                            logger.info(f"[Item System] AI awarded room item '{item_data['name']}' to player {action_request.player_id}")
-                                                            item_found = True
-                                                            break
-                                                    except Exception as e:
-                                                        logger.warning(f"[Item System] Failed to check room item {room_item_id}: {str(e)}")
+                                                        logger.info(f"[Item System] AI awarded room item '{item_data['name']}' to player {action_request.player_id}")
+                                                        item_found = True
+                                                        break
+                                                except Exception as e:
+                                                    logger.warning(f"[Item System] Failed to check room item {room_item_id}: {str(e)}")
                                         
-                                        elif award_type == "generate_item":
-                                            # Generate new item
-                                            logger.info(f"[Item System] AI requested generated item with rarity: {rarity}")
+                                    elif award_type == "generate_item":
+                                        # Generate new item
+                                        logger.info(f"[Item System] AI requested generated item with rarity: {rarity}")
                                             
-                                            try:
-                                                from .templates.items import AIItemGenerator
-                                                item_generator = AIItemGenerator()
+                                        try:
+                                            from .templates.items import AIItemGenerator
+                                            item_generator = AIItemGenerator()
                                                 
-                                                item_context = {
-                                                    'world_seed': game_state.world_seed,
-                                                    'world_theme': WORLD_CONFIG['setting_secondary'],
-                                                    'main_quest': game_state.main_quest_summary,
-                                                    'room_description': room.description,
-                                                    'room_biome': room.biome or 'unknown',
-                                                    'player_action': action_request.action,
-                                                    'situation_context': 'basic_environmental_item',
-                                                    'desired_rarity': rarity,
-                                                    'database': game_manager.db  # Pass database for recent items context
-                                                }
+                                            item_context = {
+                                                'world_seed': game_state.world_seed,
+                                                'world_theme': WORLD_CONFIG['setting_secondary'],
+                                                'main_quest': game_state.main_quest_summary,
+                                                'room_description': room.description,
+                                                'room_biome': room.biome or 'unknown',
+                                                'player_action': action_request.action,
+                                                'situation_context': 'basic_environmental_item',
+                                                'desired_rarity': rarity,
+                                                'database': game_manager.db  # Pass database for recent items context
+                                            }
                                                 
-                                                # Generate item
-                                                item_data = await item_generator.generate_item(game_manager.ai_handler, item_context)
+                                            # Generate item
+                                            item_data = await item_generator.generate_item(game_manager.ai_handler, item_context)
                                                 
-                                                # Create unique item ID and store in database
-                                                import uuid
-                                                item_id = f"item_{str(uuid.uuid4())}"
-                                                item_data['id'] = item_id
-                                                await game_manager.db.set_item(item_id, item_data)
+                                            # Create unique item ID and store in database
+                                            import uuid
+                                            item_id = f"item_{str(uuid.uuid4())}"
+                                            item_data['id'] = item_id
+                                            await game_manager.db.set_item(item_id, item_data)
                                                 
-                                                # Add to player inventory
-                                                player.inventory.append(item_id)
-                                                await game_manager.db.set_player(action_request.player_id, player.dict())
+                                            # Add to player inventory
+                                            player.inventory.append(item_id)
+                                            await game_manager.db.set_player(action_request.player_id, player.dict())
                                                 
-                                                logger.info(f"[Item System] Generated item '{item_data['name']}' (rarity {rarity}) for player {action_request.player_id}")
+                                            logger.info(f"[Item System] Generated item '{item_data['name']}' (rarity {rarity}) for player {action_request.player_id}")
                                                 
-                                            except Exception as e:
-                                                logger.error(f"[Item System] Failed to generate item: {str(e)}")
+                                        except Exception as e:
+                                            logger.error(f"[Item System] Failed to generate item: {str(e)}")
                                         
-                                        # Send item notifications if an item was awarded
-                                        if item_id and item_data:
-                                            # Update response to include item information
-                                            chunk["updates"]["player"]["inventory"] = player.inventory
-                                            chunk["updates"]["new_item"] = {
-                                                "id": item_id,
-                                                "name": item_data['name'],
-                                                "description": item_data['description'],
-                                                "rarity": item_data['rarity'],
-                                                "capabilities": item_data['capabilities'],
-                                                "properties": {}
-                                            }
+                                    # Send item notifications if an item was awarded
+                                    if item_id and item_data:
+                                        # Update response to include item information
+                                        chunk["updates"]["player"]["inventory"] = player.inventory
+                                        chunk["updates"]["new_item"] = {
+                                            "id": item_id,
+                                            "name": item_data['name'],
+                                            "description": item_data['description'],
+                                            "rarity": item_data['rarity'],
+                                            "capabilities": item_data['capabilities'],
+                                            "properties": {}
+                                        }
                                             
-                                            # Send item obtained notification via WebSocket
-                                            await manager.send_to_player(room.id, action_request.player_id, {
-                                                "type": "item_obtained",
-                                                "player_id": action_request.player_id,
-                                                "item_id": item_id,
-                                                "item_name": item_data['name'],
-                                                "item_rarity": item_data['rarity'],
-                                                "rarity_stars": "★" * item_data['rarity'] + "☆" * (4 - item_data['rarity']),
-                                                "message": f"📦 You obtained: {'★' * item_data['rarity']}{'☆' * (4 - item_data['rarity'])} {item_data['name']}",
-                                                "timestamp": datetime.now().isoformat()
-                                            })
+                                        # Send item obtained notification via WebSocket
+                                        await manager.send_to_player(room.id, action_request.player_id, {
+                                            "type": "item_obtained",
+                                            "player_id": action_request.player_id,
+                                            "item_id": item_id,
+                                            "item_name": item_data['name'],
+                                            "item_rarity": item_data['rarity'],
+                                            "rarity_stars": "★" * item_data['rarity'] + "☆" * (4 - item_data['rarity']),
+                                            "message": f"📦 You obtained: {'★' * item_data['rarity']}{'☆' * (4 - item_data['rarity'])} {item_data['name']}",
+                                            "timestamp": datetime.now().isoformat()
+                                        })
                                             
-                                            logger.info(f"[Item System] Sent item obtained notification for '{item_data['name']}' to player {action_request.player_id}")
+                                        logger.info(f"[Item System] Sent item obtained notification for '{item_data['name']}' to player {action_request.player_id}")
                                     
-                                    # Handle item combination from AI
-                                    item_combination_info = chunk.get("updates", {}).get("item_combination")
-                                    if item_combination_info is not None:
-                                        item_ids = item_combination_info.get("item_ids", [])
-                                        combination_description = item_combination_info.get("combination_description", "")
+                                # Handle item combination from AI
+                                item_combination_info = chunk.get("updates", {}).get("item_combination")
+                                if item_combination_info is not None:
+                                    item_ids = item_combination_info.get("item_ids", [])
+                                    combination_description = item_combination_info.get("combination_description", "")
                                         
-                                        if item_ids and len(item_ids) >= 2:
-                                            logger.info(f"[Item Combination] AI requested combination of {len(item_ids)} items: {item_ids}")
+                                    if item_ids and len(item_ids) >= 2:
+                                        logger.info(f"[Item Combination] AI requested combination of {len(item_ids)} items: {item_ids}")
                                             
-                                            try:
-                                                # Call the combine_items function
-                                                combination_result = await game_manager.combine_items(
-                                                    action_request.player_id, 
-                                                    item_ids, 
-                                                    combination_description
-                                                )
+                                        try:
+                                            # Call the combine_items function
+                                            combination_result = await game_manager.combine_items(
+                                                action_request.player_id, 
+                                                item_ids, 
+                                                combination_description
+                                            )
                                                 
-                                                if combination_result["success"]:
-                                                    # Update the chunk with the combination results
-                                                    chunk["updates"]["player"] = combination_result["updates"]["player"]
-                                                    chunk["updates"]["new_item"] = combination_result["updates"]["new_item"]
+                                            if combination_result["success"]:
+                                                # Update the chunk with the combination results
+                                                chunk["updates"]["player"] = combination_result["updates"]["player"]
+                                                chunk["updates"]["new_item"] = combination_result["updates"]["new_item"]
                                                     
-                                                    # Send item combination notification via WebSocket
-                                                    await manager.send_to_player(room.id, action_request.player_id, {
-                                                        "type": "item_obtained",
-                                                        "player_id": action_request.player_id,
-                                                        "item_id": combination_result["updates"]["new_item"]["id"],
-                                                        "item_name": combination_result["updates"]["new_item"]["name"],
-                                                        "item_rarity": combination_result["updates"]["new_item"]["rarity"],
-                                                        "rarity_stars": "★" * combination_result["updates"]["new_item"]["rarity"] + "☆" * (4 - combination_result["updates"]["new_item"]["rarity"]),
-                                                        "message": f"🔨 You crafted: {'★' * combination_result['updates']['new_item']['rarity']}{'☆' * (4 - combination_result['updates']['new_item']['rarity'])} {combination_result['updates']['new_item']['name']}",
-                                                        "timestamp": datetime.now().isoformat()
-                                                    })
+                                                # Send item combination notification via WebSocket
+                                                await manager.send_to_player(room.id, action_request.player_id, {
+                                                    "type": "item_obtained",
+                                                    "player_id": action_request.player_id,
+                                                    "item_id": combination_result["updates"]["new_item"]["id"],
+                                                    "item_name": combination_result["updates"]["new_item"]["name"],
+                                                    "item_rarity": combination_result["updates"]["new_item"]["rarity"],
+                                                    "rarity_stars": "★" * combination_result["updates"]["new_item"]["rarity"] + "☆" * (4 - combination_result["updates"]["new_item"]["rarity"]),
+                                                    "message": f"🔨 You crafted: {'★' * combination_result['updates']['new_item']['rarity']}{'☆' * (4 - combination_result['updates']['new_item']['rarity'])} {combination_result['updates']['new_item']['name']}",
+                                                    "timestamp": datetime.now().isoformat()
+                                                })
                                                     
-                                                    logger.info(f"[Item Combination] Successfully combined items into '{combination_result['updates']['new_item']['name']}'")
-                                                else:
-                                                    logger.warning(f"[Item Combination] Failed to combine items: {combination_result['message']}")
+                                                logger.info(f"[Item Combination] Successfully combined items into '{combination_result['updates']['new_item']['name']}'")
+                                            else:
+                                                logger.warning(f"[Item Combination] Failed to combine items: {combination_result['message']}")
                                                     
-                                            except Exception as e:
-                                                logger.error(f"[Item Combination] Error combining items: {str(e)}")
-                                        else:
-                                            logger.warning(f"[Item Combination] Invalid item combination request: {item_combination_info}")
-
-                                except Exception as e:
-                                    logger.error(f"[Item Handling] Unexpected error: {str(e)}")
+                                        except Exception as e:
+                                            logger.error(f"[Item Combination] Error combining items: {str(e)}")
+                                    else:
+                                        logger.warning(f"[Item Combination] Invalid item combination request: {item_combination_info}")
 
-                                # Handle explicit combat intent signaled by AI
-                                combat_intent = chunk.get("updates", {}).get("combat")
-                                if combat_intent is not None:
-                                    try:
-                                        # Resolve target monster
-                                        player_room_data = await game_manager.db.get_room(player.current_room)
-                                        room_monsters = player_room_data.get("monsters", []) if player_room_data else []
-                                        target_monster_id = None
-                                        if isinstance(combat_intent, dict):
-                                            target_monster_id = combat_intent.get("monster_id")
-                                        if not target_monster_id and len(room_monsters) == 1:
-                                            target_monster_id = room_monsters[0]
-                                        if target_monster_id:
-                                            combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
-                                                action_request.player_id, target_monster_id, player.current_room, "any_action", game_manager
-                                            )
-                                            try:
-                                                monster_data = await game_manager.db.get_monster(target_monster_id)
-                                            except Exception:
-                                                monster_data = None
-                                            monster_name = (monster_data or {}).get('name', 'Unknown Monster')
-                                            try:
-                                                player1_max_vital = 5
-                                                player2_max_vital = await get_monster_max_vital(monster_data or {})
-                                            except Exception:
-                                                player1_max_vital = 5
-                                                player2_max_vital = 5
-                                            yield json.dumps({
-                                                "type": "final",
-                                                "content": combat_message,
-                                                "updates": {
-                                                    "duel": {
-                                                        "is_monster_duel": True,
-                                                        "opponent_id": target_monster_id,
-                                                        "opponent_name": monster_name,
-                                                        "player1_max_vital": player1_max_vital,
-                                                        "player2_max_vital": player2_max_vital
-                                                    }
-                                                }
-                                            })
-                                            return
-                                    except Exception as e:
-                                        logger.error(f"[Stream] Error initiating combat from AI intent: {str(e)}")
+                            except Exception as e:
+                                logger.error(f"[Item Handling] Unexpected error: {str(e)}")
 
-                                # If the AI indicates a monster interaction (talking), handle it before generic aggressive check
-                                interaction = chunk.get("updates", {}).get("monster_interaction")
-                                if interaction:
-                                    # Resolve monster target
-                                    target_monster_id = interaction.get("monster_id") if isinstance(interaction, dict) else None
+                            # Handle explicit combat intent signaled by AI
+                            combat_intent = chunk.get("updates", {}).get("combat")
+                            if combat_intent is not None:
+                                try:
+                                    # Resolve target monster
                                     player_room_data = await game_manager.db.get_room(player.current_room)
                                     room_monsters = player_room_data.get("monsters", []) if player_room_data else []
+                                    target_monster_id = None
+                                    if isinstance(combat_intent, dict):
+                                        target_monster_id = combat_intent.get("monster_id")
                                     if not target_monster_id and len(room_monsters) == 1:
                                         target_monster_id = room_monsters[0]
-
-                                    # If a target is found, check aggressiveness
                                     if target_monster_id:
-                                        monster_data = await game_manager.db.get_monster(target_monster_id)
-                                        if monster_data and monster_data.get("is_alive", True):
-                                            if monster_data.get("aggressiveness") == "aggressive":
-                                                # Aggressive: initiate combat immediately on any action
-                                                aggressive_block = await monster_behavior_manager.check_aggressive_monster_blocking(
-                                                    action_request.player_id, player.current_room, "any_action", game_manager
-                                                )
-                                                if aggressive_block:
-                                                    monster_id, _ = aggressive_block
-                                                    combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
-                                                        action_request.player_id, monster_id, player.current_room, "any_action", game_manager
-                                                    )
-                                                    yield json.dumps({
-                                                        "type": "final",
-                                                        "content": combat_message,
-                                                        "updates": {}
-                                                    })
-                                                    return
-                                            else:
-                                                # Non-aggressive: produce dialogue based on intelligence via AI
-                                                player_message = interaction.get("message", "") if isinstance(interaction, dict) else ""
-                                                reply = await monster_behavior_manager.generate_monster_dialogue(
-                                                    target_monster_id, player_message, player.current_room, game_manager
+                                        combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
+                                            action_request.player_id, target_monster_id, player.current_room, "any_action", game_manager
+                                        )
+                                        try:
+                                            monster_data = await game_manager.db.get_monster(target_monster_id)
+                                        except Exception:
+                                            monster_data = None
+                                        monster_name = (monster_data or {}).get('name', 'Unknown Monster')
+                                        try:
+                                            player1_max_vital = 5
+                                            player2_max_vital = await get_monster_max_vital(monster_data or {})
+                                        except Exception:
+                                            player1_max_vital = 5
+                                            player2_max_vital = 5
+                                        yield json.dumps({
+                                            "type": "final",
+                                            "content": combat_message,
+                                            "updates": {
+                                                "duel": {
+                                                    "is_monster_duel": True,
+                                                    "opponent_id": target_monster_id,
+                                                    "opponent_name": monster_name,
+                                                    "player1_max_vital": player1_max_vital,
+                                                    "player2_max_vital": player2_max_vital
+                                                }
+                                            }
+                                        })
+                                        return
+                                except Exception as e:
+                                    logger.error(f"[Stream] Error initiating combat from AI intent: {str(e)}")
+
+                            # If the AI indicates a monster interaction (talking), handle it before generic aggressive check
+                            interaction = chunk.get("updates", {}).get("monster_interaction")
+                            if interaction:
+                                # Resolve monster target
+                                target_monster_id = interaction.get("monster_id") if isinstance(interaction, dict) else None
+                                player_room_data = await game_manager.db.get_room(player.current_room)
+                                room_monsters = player_room_data.get("monsters", []) if player_room_data else []
+                                if not target_monster_id and len(room_monsters) == 1:
+                                    target_monster_id = room_monsters[0]
+
+                                # If a target is found, check aggressiveness
+                                if target_monster_id:
+                                    monster_data = await game_manager.db.get_monster(target_monster_id)
+                                    if monster_data and monster_data.get("is_alive", True):
+                                        if monster_data.get("aggressiveness") == "aggressive":
+                                            # Aggressive: initiate combat immediately on any action
+                                            aggressive_block = await monster_behavior_manager.check_aggressive_monster_blocking(
+                                                action_request.player_id, player.current_room, "any_action", game_manager
+                                            )
+                                            if aggressive_block:
+                                                monster_id, _ = aggressive_block
+                                                combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
+                                                    action_request.player_id, monster_id, player.current_room, "any_action", game_manager
                                                 )
-                                                if reply:
-                                                    additional_content = reply
+                                                yield json.dumps({
+                                                    "type": "final",
+                                                    "content": combat_message,
+                                                    "updates": {}
+                                                })
+                                                return
+                                        else:
+                                            # Non-aggressive: produce dialogue based on intelligence via AI
+                                            player_message = interaction.get("message", "") if isinstance(interaction, dict) else ""
+                                            reply = await monster_behavior_manager.generate_monster_dialogue(
+                                                target_monster_id, player_message, player.current_room, game_manager
+                                            )
+                                            if reply:
+                                                additional_content = reply
 
-                                # If no resolvable target, fall through to aggressive any_action check
-                                aggressive_block = await monster_behavior_manager.check_aggressive_monster_blocking(
-                                    action_request.player_id, player.current_room, "any_action", game_manager
+                            # If no resolvable target, fall through to aggressive any_action check
+                            aggressive_block = await monster_behavior_manager.check_aggressive_monster_blocking(
+                                action_request.player_id, player.current_room, "any_action", game_manager
+                            )
+                            if aggressive_block:
+                                monster_id, _ = aggressive_block
+                                combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
+                                    action_request.player_id, monster_id, player.current_room, "any_action", game_manager
                                 )
-                                if aggressive_block:
-                                    monster_id, _ = aggressive_block
-                                    combat_message = await monster_behavior_manager.handle_aggressive_combat_initiation(
-                                        action_request.player_id, monster_id, player.current_room, "any_action", game_manager
-                                    )
-                                    try:
-                                        monster_data = await game_manager.db.get_monster(monster_id)
-                                    except Exception:
-                                        monster_data = None
-                                    monster_name = (monster_data or {}).get('name', 'Unknown Monster')
-                                    try:
-                                        player1_max_vital = 5
-                                        player2_max_vital = await get_monster_max_vital(monster_data or {})
-                                    except Exception:
-                                        player1_max_vital = 5
-                                        player2_max_vital = 5
-                                    yield json.dumps({
-                                        "type": "final",
-                                        "content": combat_message,
-                                        "updates": {
-                                            "duel": {
-                                                "is_monster_duel": True,
-                                                "opponent_id": monster_id,
-                                                "opponent_name": monster_name,
-                                                "player1_max_vital": player1_max_vital,
-                                                "player2_max_vital": player2_max_vital
-                                            }
+                                try:
+                                    monster_data = await game_manager.db.get_monster(monster_id)
+                                except Exception:
+                                    monster_data = None
+                                monster_name = (monster_data or {}).get('name', 'Unknown Monster')
+                                try:
+                                    player1_max_vital = 5
+                                    player2_max_vital = await get_monster_max_vital(monster_data or {})
+                                except Exception:
+                                    player1_max_vital = 5
+                                    player2_max_vital = 5
+                                yield json.dumps({
+                                    "type": "final",
+                                    "content": combat_message,
+                                    "updates": {
+                                        "duel": {
+                                            "is_monster_duel": True,
+                                            "opponent_id": monster_id,
+                                            "opponent_name": monster_name,
+                                            "player1_max_vital": player1_max_vital,
+                                            "player2_max_vital": player2_max_vital
                                         }
-                                    })
-                                    return
-                        else:
-                                logger.info(f"[Stream] Movement action detected - skipping aggressive monster blocking (retreat logic already handled)")
+                                    }
+                                })
+                                return
+                    else:
+                            logger.info(f"[Stream] Movement action detected - skipping aggressive monster blocking (retreat logic already handled)")
 
-                                # Fallback monster auto-reply disabled: only respond when AI explicitly sets updates.monster_interaction earlier
+                            # Fallback monster auto-reply disabled: only respond when AI explicitly sets updates.monster_interaction earlier
 
-                        # NOW yield the final response with updated player data (default path)
+                    # NOW yield the final response with updated player data (default path)
+                    try:
+                        # Quest tracking integration
+                        quest_completion_message = None
                         try:
-                            # Quest tracking integration
-                            quest_completion_message = None
-                            try:
-                                from .quest_manager import QuestManager
-                                quest_manager = QuestManager(game_manager.db)
+                            from .quest_manager import QuestManager
+                            quest_manager = QuestManager(game_manager.db)
+
+                            # Track movement (only if direction variable exists in scope)
+                            if 'direction' in locals() and direction:
+                                quest_result = await quest_manager.check_objectives(
+                                    action_request.player_id, action_request.action, 'move', {}
+                                )
+                                if quest_result and quest_result.get('type') == 'quest_completed':
+                                    quest_completion_message = quest_result
+
+                            # Track "look" command
+                            if 'look' in action_request.action.lower():
+                                quest_result = await quest_manager.check_objectives(
+                                    action_request.player_id, action_request.action, 'command', {'command': 'look'}
+                                )
+                                if quest_result and quest_result.get('type') == 'quest_completed':
+                                    quest_completion_message = quest_result
+
+                            # Track NPC interactions (talk to, speak with, etc.)
+                            npc_interaction_keywords = ['talk', 'speak', 'chat', 'converse', 'ask', 'tell', 'greet']
+                            npc_dialogue_generated = False
+                            if any(keyword in action_request.action.lower() for keyword in npc_interaction_keywords):
+                                # Check if there's an NPC in the room that matches the interaction
+                                target_npc = None
+
+                                # First, check if AI identified an NPC in updates
+                                npc_data = None
+                                if chunk.get('updates', {}).get('npc'):
+                                    npc_data = chunk['updates']['npc']
+                                elif chunk.get('updates', {}).get('npcs') and len(chunk['updates']['npcs']) > 0:
+                                    npc_data = chunk['updates']['npcs'][0]  # Get first NPC
+
+                                # If AI identified an NPC, find it in the room's NPCs
+                                if npc_data and npc_data.get('name'):
+                                    npc_name = npc_data.get('name', '')
+                                    for room_npc in npcs:
+                                        if room_npc.name.lower() == npc_name.lower():
+                                            target_npc = room_npc
+                                            break
+
+                                # If no NPC identified by AI, but action contains talk keywords and there's only one NPC in room
+                                if not target_npc and len(npcs) == 1:
+                                    target_npc = npcs[0]
+
+                                # If we found an NPC to talk to, generate their dialogue
+                                if target_npc:
+                                    try:
+                                        from .ai_handler import AIHandler
+
+                                        # Get NPC's relevant memories (last 5 interactions)
+                                        relevant_memories = target_npc.memory_log[-5:] if hasattr(target_npc, 'memory_log') and target_npc.memory_log else []
+
+                                        # Generate NPC dialogue
+                                        npc_response, npc_memory = await AIHandler.process_npc_interaction(
+                                            message=action_request.action,
+                                            npc=target_npc,
+                                            player=player,
+                                            room=room,
+                                            relevant_memories=relevant_memories
+                                        )
+
+                                        # Update NPC's memory and dialogue history
+                                        if hasattr(target_npc, 'memory_log'):
+                                            target_npc.memory_log.append(npc_memory)
+                                        else:
+                                            target_npc.memory_log = [npc_memory]
+
+                                        if hasattr(target_npc, 'dialogue_history'):
+                                            target_npc.dialogue_history.append({
+                                                'player_id': action_request.player_id,
+                                                'player_message': action_request.action,
+                                                'npc_response': npc_response,
+                                                'timestamp': datetime.now().isoformat()
+                                            })
+
+                                        # Save updated NPC
+                                        await game_manager.db.set_npc(target_npc.id, target_npc.dict())
+
+                                        # Append NPC dialogue to the response
+                                        if chunk.get("response"):
+                                            chunk["response"] += f"\n\n{npc_response}"
+                                        else:
+                                            chunk["response"] = npc_response
+
+                                        npc_dialogue_generated = True
+                                        logger.info(f"[NPC Dialogue] Generated dialogue from {target_npc.name} for player {action_request.player_id}")
+
+                                    except Exception as e:
+                                        logger.error(f"[NPC Dialogue] Error generating NPC dialogue: {str(e)}")
 
-                                # Track movement (only if direction variable exists in scope)
-                                if 'direction' in locals() and direction:
+                                    # Track quest objectives
                                     quest_result = await quest_manager.check_objectives(
-                                        action_request.player_id, action_request.action, 'move', {}
+                                        action_request.player_id, action_request.action, 'talk_npc', {'npc_name': target_npc.name}
                                     )
                                     if quest_result and quest_result.get('type') == 'quest_completed':
                                         quest_completion_message = quest_result
+                                    logger.info(f"[Quest] Tracked NPC interaction with '{target_npc.name}' for player {action_request.player_id}")
+
+                            # Track item taken (check if item was awarded and variables exist)
+                            if 'item_id' in locals() and 'item_data' in locals() and item_id and item_data:
+                                quest_result = await quest_manager.check_objectives(
+                                    action_request.player_id, action_request.action, 'take_item', {'item_name': item_data.get('name', '')}
+                                )
+                                if quest_result and quest_result.get('type') == 'quest_completed':
+                                    quest_completion_message = quest_result
 
-                                # Track "look" command
-                                if 'look' in action_request.action.lower():
+                            # Track biome visit (on room entry after movement - only if variables exist)
+                            if 'direction' in locals() and 'new_room' in locals() and direction and new_room:
+                                biome = new_room.biome
+                                if biome:
                                     quest_result = await quest_manager.check_objectives(
-                                        action_request.player_id, action_request.action, 'command', {'command': 'look'}
+                                        action_request.player_id, action_request.action, 'visit_biome', {'biome': biome}
                                     )
                                     if quest_result and quest_result.get('type') == 'quest_completed':
                                         quest_completion_message = quest_result
 
-                                # Track NPC interactions (talk to, speak with, etc.)
-                                npc_interaction_keywords = ['talk', 'speak', 'chat', 'converse', 'ask', 'tell', 'greet']
-                                npc_dialogue_generated = False
-                                if any(keyword in action_request.action.lower() for keyword in npc_interaction_keywords):
-                                    # Check if there's an NPC in the room that matches the interaction
-                                    target_npc = None
-
-                                    # First, check if AI identified an NPC in updates
-                                    npc_data = None
-                                    if chunk.get('updates', {}).get('npc'):
-                                        npc_data = chunk['updates']['npc']
-                                    elif chunk.get('updates', {}).get('npcs') and len(chunk['updates']['npcs']) > 0:
-                                        npc_data = chunk['updates']['npcs'][0]  # Get first NPC
-
-                                    # If AI identified an NPC, find it in the room's NPCs
-                                    if npc_data and npc_data.get('name'):
-                                        npc_name = npc_data.get('name', '')
-                                        for room_npc in npcs:
-                                            if room_npc.name.lower() == npc_name.lower():
-                                                target_npc = room_npc
-                                                break
+                            # Track find_item (when entering a room with quest items)
+                            # Check both new_room (after movement) and current room (for look/other actions)
+                            check_room = None
+                            if 'new_room' in locals() and new_room:
+                                check_room = new_room
+                            else:
+                                # For non-movement actions, check current room
+                                check_room = room
 
-                                    # If no NPC identified by AI, but action contains talk keywords and there's only one NPC in room
-                                    if not target_npc and len(npcs) == 1:
-                                        target_npc = npcs[0]
+                            if check_room and check_room.items:
+                                for room_item_id in check_room.items[:]:
+                                    try:
+                                        room_item_data = await game_manager.db.get_item(room_item_id)
+                                        if not room_item_data:
+                                            logger.warning(f"[Quest] Item {room_item_id} not found in database")
+                                            continue
 
-                                    # If we found an NPC to talk to, generate their dialogue
-                                    if target_npc:
-                                        try:
-                                            from .ai_handler import AIHandler
-
-                                            # Get NPC's relevant memories (last 5 interactions)
-                                            relevant_memories = target_npc.memory_log[-5:] if hasattr(target_npc, 'memory_log') and target_npc.memory_log else []
-
-                                            # Generate NPC dialogue
-                                            npc_response, npc_memory = await AIHandler.process_npc_interaction(
-                                                message=action_request.action,
-                                                npc=target_npc,
-                                                player=player,
-                                                room=room,
-                                                relevant_memories=relevant_memories
-                                            )
+                                        # Check if it's a quest item (stored as string "True")
+                                        quest_item_value = room_item_data.get('properties', {}).get('quest_item')
+                                        is_quest_item = quest_item_value in ['True', 'true', True]
 
-                                            # Update NPC's memory and dialogue history
-                                            if hasattr(target_npc, 'memory_log'):
-                                                target_npc.memory_log.append(npc_memory)
-                                            else:
-                                                target_npc.memory_log = [npc_memory]
-
-                                            if hasattr(target_npc, 'dialogue_history'):
-                                                target_npc.dialogue_history.append({
-                                                    'player_id': action_request.player_id,
-                                                    'player_message': action_request.action,
-                                                    'npc_response': npc_response,
-                                                    'timestamp': datetime.now().isoformat()
-                                                })
+                                        logger.debug(f"[Quest] Checking item {room_item_data.get('name')} - quest_item={quest_item_value}, is_quest_item={is_quest_item}, properties={room_item_data.get('properties')}")
 
-                                            # Save updated NPC
-                                            await game_manager.db.set_npc(target_npc.id, target_npc.dict())
+                                        if is_quest_item:
+                                            # Check if this quest item belongs to this player
+                                            spawned_for = room_item_data.get('properties', {}).get('spawned_for_player_id')
 
-                                            # Append NPC dialogue to the response
-                                            if chunk.get("response"):
-                                                chunk["response"] += f"\n\n{npc_response}"
-                                            else:
-                                                chunk["response"] = npc_response
+                                            # Only process if it's the player's item or it's a shared quest item (no owner)
+                                            if spawned_for and spawned_for != action_request.player_id:
+                                                logger.debug(f"[Quest] Item '{room_item_data.get('name')}' belongs to player {spawned_for}, skipping for {action_request.player_id}")
+                                                continue
 
-                                            npc_dialogue_generated = True
-                                            logger.info(f"[NPC Dialogue] Generated dialogue from {target_npc.name} for player {action_request.player_id}")
+                                            # This is a quest item for this player - check if it completes an objective
+                                            logger.info(f"[Quest] Found quest item '{room_item_data.get('name')}' for player {action_request.player_id} - checking objectives")
+                                            quest_result = await quest_manager.check_objectives(
+                                                action_request.player_id,
+                                                action_request.action,
+                                                'room_has_item',
+                                                {'item_name': room_item_data.get('name', '')}
+                                            )
+                                            logger.info(f"[Quest] check_objectives returned: {quest_result}")
 
-                                        except Exception as e:
-                                            logger.error(f"[NPC Dialogue] Error generating NPC dialogue: {str(e)}")
+                                            if quest_result:
+                                                # Quest objective completed - auto-take the quest item
+                                                logger.info(f"[Quest] Player {action_request.player_id} found quest item '{room_item_data.get('name')}' - auto-taking")
 
-                                        # Track quest objectives
-                                        quest_result = await quest_manager.check_objectives(
-                                            action_request.player_id, action_request.action, 'talk_npc', {'npc_name': target_npc.name}
-                                        )
-                                        if quest_result and quest_result.get('type') == 'quest_completed':
-                                            quest_completion_message = quest_result
-                                        logger.info(f"[Quest] Tracked NPC interaction with '{target_npc.name}' for player {action_request.player_id}")
+                                                # Remove from room
+                                                check_room.items.remove(room_item_id)
+                                                await game_manager.db.set_room(check_room.id, check_room.dict())
 
-                                # Track item taken (check if item was awarded and variables exist)
-                                if 'item_id' in locals() and 'item_data' in locals() and item_id and item_data:
-                                    quest_result = await quest_manager.check_objectives(
-                                        action_request.player_id, action_request.action, 'take_item', {'item_name': item_data.get('name', '')}
-                                    )
-                                    if quest_result and quest_result.get('type') == 'quest_completed':
-                                        quest_completion_message = quest_result
+                                                # Add to player inventory
+                                                player.inventory.append(room_item_id)
+                                                await game_manager.db.set_player(action_request.player_id, player.dict())
 
-                                # Track biome visit (on room entry after movement - only if variables exist)
-                                if 'direction' in locals() and 'new_room' in locals() and direction and new_room:
-                                    biome = new_room.biome
-                                    if biome:
-                                        quest_result = await quest_manager.check_objectives(
-                                            action_request.player_id, action_request.action, 'visit_biome', {'biome': biome}
-                                        )
-                                        if quest_result and quest_result.get('type') == 'quest_completed':
-                                            quest_completion_message = quest_result
-
-                                # Track find_item (when entering a room with quest items)
-                                # Check both new_room (after movement) and current room (for look/other actions)
-                                check_room = None
-                                if 'new_room' in locals() and new_room:
-                                    check_room = new_room
-                                else:
-                                    # For non-movement actions, check current room
-                                    check_room = room
-
-                                if check_room and check_room.items:
-                                    for room_item_id in check_room.items[:]:
-                                        try:
-                                            room_item_data = await game_manager.db.get_item(room_item_id)
-                                            if not room_item_data:
-                                                logger.warning(f"[Quest] Item {room_item_id} not found in database")
-                                                continue
+                                                # Update chunk to reflect inventory change
+                                                if "updates" not in chunk:
+                                                    chunk["updates"] = {}
+                                                if "player" not in chunk["updates"]:
+                                                    chunk["updates"]["player"] = {}
+                                                chunk["updates"]["player"]["inventory"] = player.inventory
+
+                                                # Add discovery notification to updates
+                                                chunk["updates"]["quest_item_found"] = {
+                                                    "id": room_item_id,
+                                                    "name": room_item_data['name'],
+                                                    "description": room_item_data['description'],
+                                                    "rarity": room_item_data.get('rarity', 1)
+                                                }
 
-                                            # Check if it's a quest item (stored as string "True")
-                                            quest_item_value = room_item_data.get('properties', {}).get('quest_item')
-                                            is_quest_item = quest_item_value in ['True', 'true', True]
+                                                # Send item obtained notification via WebSocket (same as regular items)
+                                                # Use the player's current room (where they're still connected) not the new room
+                                                websocket_room = room.id if room else check_room.id
+                                                try:
+                                                    await manager.send_to_player(websocket_room, action_request.player_id, {
+                                                        "type": "item_obtained",
+                                                        "player_id": action_request.player_id,
+                                                        "item_id": room_item_id,
+                                                        "item_name": room_item_data['name'],
+                                                        "item_rarity": room_item_data.get('rarity', 1),
+                                                        "rarity_stars": "★" * room_item_data.get('rarity', 1) + "☆" * (4 - room_item_data.get('rarity', 1)),
+                                                        "message": f"📦 You obtained: {'★' * room_item_data.get('rarity', 1)}{'☆' * (4 - room_item_data.get('rarity', 1))} {room_item_data['name']}",
+                                                        "timestamp": datetime.now().isoformat()
+                                                    })
+                                                    logger.info(f"[Quest] Sent item_obtained WebSocket notification for '{room_item_data['name']}' to player {action_request.player_id} in room {websocket_room}")
+                                                except Exception as ws_error:
+                                                    logger.error(f"[Quest] Failed to send item_obtained WebSocket notification: {str(ws_error)}")
 
-                                            logger.debug(f"[Quest] Checking item {room_item_data.get('name')} - quest_item={quest_item_value}, is_quest_item={is_quest_item}, properties={room_item_data.get('properties')}")
+                                                logger.info(f"[Quest] Successfully auto-took quest item '{room_item_data.get('name')}' for player {action_request.player_id}")
 
-                                            if is_quest_item:
-                                                # Check if this quest item belongs to this player
-                                                spawned_for = room_item_data.get('properties', {}).get('spawned_for_player_id')
+                                                # Check if quest was completed
+                                                if quest_result.get('type') == 'quest_completed':
+                                                    quest_completion_message = quest_result
 
-                                                # Only process if it's the player's item or it's a shared quest item (no owner)
-                                                if spawned_for and spawned_for != action_request.player_id:
-                                                    logger.debug(f"[Quest] Item '{room_item_data.get('name')}' belongs to player {spawned_for}, skipping for {action_request.player_id}")
-                                                    continue
+                                                # Only process one quest item per action
+                                                break
+                                    except Exception as e:
+                                        logger.warning(f"[Quest] Error checking room item {room_item_id} for quest: {str(e)}")
 
-                                                # This is a quest item for this player - check if it completes an objective
-                                                logger.info(f"[Quest] Found quest item '{room_item_data.get('name')}' for player {action_request.player_id} - checking objectives")
-                                                quest_result = await quest_manager.check_objectives(
-                                                    action_request.player_id,
-                                                    action_request.action,
-                                                    'room_has_item',
-                                                    {'item_name': room_item_data.get('name', '')}
-                                                )
-                                                logger.info(f"[Quest] check_objectives returned: {quest_result}")
-
-                                                if quest_result:
-                                                    # Quest objective completed - auto-take the quest item
-                                                    logger.info(f"[Quest] Player {action_request.player_id} found quest item '{room_item_data.get('name')}' - auto-taking")
-
-                                                    # Remove from room
-                                                    check_room.items.remove(room_item_id)
-                                                    await game_manager.db.set_room(check_room.id, check_room.dict())
-
-                                                    # Add to player inventory
-                                                    player.inventory.append(room_item_id)
-                                                    await game_manager.db.set_player(action_request.player_id, player.dict())
-
-                                                    # Update chunk to reflect inventory change
-                                                    if "updates" not in chunk:
-                                                        chunk["updates"] = {}
-                                                    if "player" not in chunk["updates"]:
-                                                        chunk["updates"]["player"] = {}
-                                                    chunk["updates"]["player"]["inventory"] = player.inventory
-
-                                                    # Add discovery notification to updates
-                                                    chunk["updates"]["quest_item_found"] = {
-                                                        "id": room_item_id,
-                                                        "name": room_item_data['name'],
-                                                        "description": room_item_data['description'],
-                                                        "rarity": room_item_data.get('rarity', 1)
-                                                    }
-
-                                                    # Send item obtained notification via WebSocket (same as regular items)
-                                                    # Use the player's current room (where they're still connected) not the new room
-                                                    websocket_room = room.id if room else check_room.id
-                                                    try:
-                                                        await manager.send_to_player(websocket_room, action_request.player_id, {
-                                                            "type": "item_obtained",
-                                                            "player_id": action_request.player_id,
-                                                            "item_id": room_item_id,
-                                                            "item_name": room_item_data['name'],
-                                                            "item_rarity": room_item_data.get('rarity', 1),
-                                                            "rarity_stars": "★" * room_item_data.get('rarity', 1) + "☆" * (4 - room_item_data.get('rarity', 1)),
-                                                            "message": f"📦 You obtained: {'★' * room_item_data.get('rarity', 1)}{'☆' * (4 - room_item_data.get('rarity', 1))} {room_item_data['name']}",
-                                                            "timestamp": datetime.now().isoformat()
-                                                        })
-                                                        logger.info(f"[Quest] Sent item_obtained WebSocket notification for '{room_item_data['name']}' to player {action_request.player_id} in room {websocket_room}")
-                                                    except Exception as ws_error:
-                                                        logger.error(f"[Quest] Failed to send item_obtained WebSocket notification: {str(ws_error)}")
-
-                                                    logger.info(f"[Quest] Successfully auto-took quest item '{room_item_data.get('name')}' for player {action_request.player_id}")
-
-                                                    # Check if quest was completed
-                                                    if quest_result.get('type') == 'quest_completed':
-                                                        quest_completion_message = quest_result
-
-                                                    # Only process one quest item per action
-                                                    break
-                                        except Exception as e:
-                                            logger.warning(f"[Quest] Error checking room item {room_item_id} for quest: {str(e)}")
+                        except Exception as e:
+                            logger.error(f"[Quest] Error tracking quest objectives: {str(e)}")
 
-                            except Exception as e:
-                                logger.error(f"[Quest] Error tracking quest objectives: {str(e)}")
+                        # Extract only the narrative response, not the full JSON structure
+                        narrative_response = chunk.get("response", "")
+                        if not narrative_response:
+                            logger.warning(f"[Stream] No narrative response found in chunk: {chunk}")
+                            narrative_response = "You perform the action."
+
+                        final_content = narrative_response + (f"\n\n{additional_content}" if additional_content else "")
 
-                            # Extract only the narrative response, not the full JSON structure
-                            narrative_response = chunk.get("response", "")
-                            if not narrative_response:
-                                logger.warning(f"[Stream] No narrative response found in chunk: {chunk}")
-                                narrative_response = "You perform the action."
+                        final_response_time = time.time()
+                        logger.info(f"⏱️ [TIMING] About to send final response to client: {(final_response_time - request_start)*1000:.2f}ms from request start")
+                        yield json.dumps({
+                            "type": "final",
+                            "content": final_content,
+                            "updates": chunk.get("updates", {})
+                        })
+                        logger.info(f"⏱️ [TIMING] Final response sent to client")
+
+                        # Send quest completion as a separate message if quest was completed
+                        if quest_completion_message:
+                            quest_data = quest_completion_message.get('quest', {})
+                            quest_name = quest_data.get('name', 'Unknown Quest') if quest_data else 'Unknown Quest'
+                            gold_reward = quest_completion_message.get('gold_reward', 0)
+                            badge_id = quest_completion_message.get('badge_id', '')
+                            # Get badge name if badge_id exists (for now just use badge_id)
+                            badge_name = badge_id if badge_id else ''
+
+                            completion_text = f"🎉 **Quest Complete: {quest_name}**\n"
+                            completion_text += f"💰 Earned {gold_reward} gold"
+                            if badge_name:
+                                completion_text += f" and the '{badge_name}' badge!"
+                            else:
+                                completion_text += "!"
+
+                            # Get next quest details with objectives for the client
+                            next_quest_info = None
+                            next_quest = quest_completion_message.get('next_quest')
+                            if next_quest:
+                                try:
+                                    # Get objectives for the next quest
+                                    next_objectives = await quest_manager._get_quest_objectives(next_quest['id'])
+                                    next_quest_info = {
+                                        'quest': next_quest,
+                                        'objectives': next_objectives
+                                    }
+                                    logger.info(f"[Quest] Including next quest info: {next_quest['name']} with {len(next_objectives)} objectives")
+                                except Exception as e:
+                                    logger.error(f"[Quest] Error getting next quest objectives: {str(e)}")
 
-                            final_content = narrative_response + (f"\n\n{additional_content}" if additional_content else "")
+                            logger.info(f"[Quest] Player {action_request.player_id} completed quest: {quest_name}")
 
-                            final_response_time = time.time()
-                            logger.info(f"⏱️ [TIMING] About to send final response to client: {(final_response_time - request_start)*1000:.2f}ms from request start")
                             yield json.dumps({
-                                "type": "final",
-                                "content": final_content,
-                                "updates": chunk.get("updates", {})
+                                "type": "quest_complete",
+                                "content": completion_text,
+                                "quest_data": quest_completion_message,
+                                "next_quest_info": next_quest_info
                             })
-                            logger.info(f"⏱️ [TIMING] Final response sent to client")
-
-                            # Send quest completion as a separate message if quest was completed
-                            if quest_completion_message:
-                                quest_data = quest_completion_message.get('quest', {})
-                                quest_name = quest_data.get('name', 'Unknown Quest') if quest_data else 'Unknown Quest'
-                                gold_reward = quest_completion_message.get('gold_reward', 0)
-                                badge_id = quest_completion_message.get('badge_id', '')
-                                # Get badge name if badge_id exists (for now just use badge_id)
-                                badge_name = badge_id if badge_id else ''
-
-                                completion_text = f"🎉 **Quest Complete: {quest_name}**\n"
-                                completion_text += f"💰 Earned {gold_reward} gold"
-                                if badge_name:
-                                    completion_text += f" and the '{badge_name}' badge!"
-                                else:
-                                    completion_text += "!"
-
-                                # Get next quest details with objectives for the client
-                                next_quest_info = None
-                                next_quest = quest_completion_message.get('next_quest')
-                                if next_quest:
-                                    try:
-                                        # Get objectives for the next quest
-                                        next_objectives = await quest_manager._get_quest_objectives(next_quest['id'])
-                                        next_quest_info = {
-                                            'quest': next_quest,
-                                            'objectives': next_objectives
-                                        }
-                                        logger.info(f"[Quest] Including next quest info: {next_quest['name']} with {len(next_objectives)} objectives")
-                                    except Exception as e:
-                                        logger.error(f"[Quest] Error getting next quest objectives: {str(e)}")
 
-                                logger.info(f"[Quest] Player {action_request.player_id} completed quest: {quest_name}")
+                            # Send next quest storyline immediately after completion if available
+                            if next_quest:
+                                try:
+                                    storyline_chunks = await quest_manager.get_storyline_chunks(
+                                        next_quest['id'],
+                                        chunk_size=80
+                                    )
 
-                                yield json.dumps({
-                                    "type": "quest_complete",
-                                    "content": completion_text,
-                                    "quest_data": quest_completion_message,
-                                    "next_quest_info": next_quest_info
-                                })
+                                    for chunk in storyline_chunks:
+                                        yield json.dumps({
+                                            'type': 'quest_storyline',
+                                            'message': chunk
+                                        })
 
-                                # Send next quest storyline immediately after completion if available
-                                if next_quest:
-                                    try:
-                                        storyline_chunks = await quest_manager.get_storyline_chunks(
-                                            next_quest['id'],
-                                            chunk_size=80
-                                        )
+                                    # Mark storyline as shown for the new quest
+                                    player_quest = await quest_manager._get_player_quest(
+                                        action_request.player_id,
+                                        next_quest['id']
+                                    )
+                                    if player_quest:
+                                        player_quest['storyline_shown'] = True
+                                        await quest_manager._save_player_quest(player_quest)
+                                        logger.info(f"[Quest] Sent storyline for new quest {next_quest['name']} to player {action_request.player_id}")
+                                except Exception as e:
+                                    logger.error(f"[Quest] Error sending next quest storyline: {str(e)}")
+                    except Exception as e:
+                        logger.error(f"[Stream] Error generating final response: {str(e)}")
+                        # Fallback response to prevent freezing
+                        yield json.dumps({
+                            "type": "final",
+                            "content": "You perform the action.",
+                            "updates": {}
+                        })
+            else:
+                # Coalesced narrative text (timing is sampled in stream_coalescer)
+                yield json.dumps({
+                    "type": "chunk",
+                    "content": chunk
+                })
 
-                                        for chunk in storyline_chunks:
-                                            yield json.dumps({
-                                                'type': 'quest_storyline',
-                                                'message': chunk
-                                            })
+    except Exception as e:
+        logger.error(f"[Stream] Critical error in event generator: {str(e)}")
+        import traceback
+        logger.error(f"[Stream] Traceback: {traceback.format_exc()}")
+        yield json.dumps({
+            "type": "error",
+            "content": "An error occurred while processing your action. Please try again.",
+            "updates": {}
+        })
 
-                                        # Mark storyline as shown for the new quest
-                                        player_quest = await quest_manager._get_player_quest(
-                                            action_request.player_id,
-                                            next_quest['id']
-                                        )
-                                        if player_quest:
-                                            player_quest['storyline_shown'] = True
-                                            await quest_manager._save_player_quest(player_quest)
-                                            logger.info(f"[Quest] Sent storyline for new quest {next_quest['name']} to player {action_request.player_id}")
-                                    except Exception as e:
-                                        logger.error(f"[Quest] Error sending next quest storyline: {str(e)}")
-                        except Exception as e:
-                            logger.error(f"[Stream] Error generating final response: {str(e)}")
-                            # Fallback response to prevent freezing
-                            yield json.dumps({
-                                "type": "final",
-                                "content": "You perform the action.",
-                                "updates": {}
-                            })
-                else:
-                    # This is a text chunk
-                    before_yield = time.time()
-                    logger.info(f"⏱️ [TIMING] About to yield text chunk {chunk_count} at {(before_yield - request_start)*1000:.2f}ms")
-                    yield json.dumps({
-                        "type": "chunk",
-                        "content": chunk
-                    })
-                    after_yield = time.time()
-                    logger.info(f"⏱️ [TIMING] Chunk {chunk_count} yielded, took {(after_yield - before_yield)*1000:.2f}ms")
 
-        except Exception as e:
-            logger.error(f"[Stream] Critical error in event generator: {str(e)}")
-            import traceback
-            logger.error(f"[Stream] Traceback: {traceback.format_exc()}")
-            yield json.dumps({
-                "type": "error",
-                "content": "An error occurred while processing your action. Please try again.",
-                "updates": {}
-            })
+# Action endpoint with streaming support (requires auth)
+@app.post("/action/stream")
+async def process_action_stream(
+    action_request: ActionRequest,
+    current_user: Optional[Dict[str, Any]] = Depends(get_optional_current_user),
+    game_manager: GameManager = Depends(get_game_manager)
+):
+    import time
+    request_start = time.time()
+    logger.info(f"⏱️ [TIMING] Action request received: {action_request.action[:50]}...")
+
+    # Validate that the user owns this player (skip for guest players)
+    player = await game_manager.get_player(action_request.player_id)
+    if not player or (not current_user or player.user_id != current_user['id']):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only perform actions for your own player"
+        )
+
+    logger.info(f"⏱️ [TIMING] Player validation: {(time.time() - request_start)*1000:.2f}ms")
 
-    return EventSourceResponse(event_generator())
+    return EventSourceResponse(action_event_stream(action_request, game_manager, request_start))
 
 # Room information endpoint
 @app.get("/room/{room_id}")
@@ -3302,6 +3537,35 @@ async def startup_event():
     import asyncio
     logger.info("[Startup] Starting background cleanup task")
     asyncio.create_task(cleanup_task())
+    # Receives broadcasts published by other API workers and by job workers
+    asyncio.create_task(broadcast_bus.run())
+    if settings.IMAGE_REGEN_SWEEPER_ENABLED:
+        from .image_regeneration import image_regeneration
+        logger.info("[Startup] Starting temporary image URL sweeper")
+        asyncio.create_task(image_regeneration.run(game_manager._sweep_temporary_image))
+    if not settings.JOB_QUEUE_ENABLED and settings.MODEL_3D_GENERATION_ENABLED:
+        # Without job workers this process polls FAL and uploads finished 3D models itself
+        from .model_3d_poller import model_3d_poller
+        logger.info("[Startup] Starting 3D model poller")
+        asyncio.create_task(model_3d_poller.run(game_manager._apply_3d_result))
+    if room_affinity is not None:
+        room_affinity.track_rooms(lambda: (
+            set(manager.connections.rooms)
+            | monster_behavior_manager.rooms()
+            | {duel['room_id'] for duel in duel_pending.values() if duel.get('room_id')}
+        ))
+        room_affinity.on_release(release_room)
+        logger.info("[Startup] Joining the room affinity ring")
+        asyncio.create_task(room_affinity.run(settings.ROOM_AFFINITY_HEARTBEAT))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Leave the room affinity ring so the other workers take this worker's rooms over right away"""
+    if room_affinity is not None:
+        room_affinity.leave()
+    # Stop the image resizing worker processes so they don't outlive this one
+    from .image_derivatives import image_derivatives
+    image_derivatives.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
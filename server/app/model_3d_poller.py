@@ -0,0 +1,236 @@
+"""
+Centralized poller for FAL 3D generation jobs.
+Instead of one sleeping coroutine per room, pending FAL request ids live in a Redis
+sorted set keyed by their next poll time. A single loop per process polls whatever
+is due in batches, backs each job's interval off from fast to slow, and hands
+finished jobs to a small pool of upload workers. State lives in Redis, so polling
+resumes after a restart and several processes can share the work.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+POLL_SET_KEY = "model_3d:polls"  # sorted set: room id -> next poll time
+POLL_STATE_KEY = "model_3d:poll_state"  # hash: room id -> {"request_id", "submitted_at", "polls"}
+POLL_LOCK_PREFIX = "model_3d:poll_lock:"
+POLL_LOCK_SECONDS = 60  # Long enough for one batch; a crashed poller's claims expire after this
+UPLOAD_LEASE_SECONDS = 900  # Finished jobs are re-polled after this if their upload never completes
+
+# Untrack a room only if it is still tracking the request that just finished; it may have
+# been re-tracked with a new FAL job while the old result was being handled.
+# KEYS: poll set, poll state; ARGV: room id, request id
+UNTRACK_SCRIPT = """
+local raw = redis.call('HGET', KEYS[2], ARGV[1])
+if raw and cjson.decode(raw)['request_id'] ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+return 1
+"""
+
+ResultHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class Model3DPoller:
+    """Batched, adaptive-interval poller over every pending FAL 3D job"""
+
+    def __init__(
+        self,
+        batch_size: int,
+        min_interval: float,
+        max_interval: float,
+        backoff: float,
+        timeout: float,
+        poll_concurrency: int,
+        upload_concurrency: int
+    ):
+        self.batch_size = max(1, batch_size)
+        self.min_interval = max(0.1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.backoff = max(1.0, backoff)
+        self.timeout = timeout
+        self.poll_concurrency = max(1, poll_concurrency)
+        self.upload_concurrency = max(1, upload_concurrency)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._uploads: Optional[asyncio.Queue] = None
+        self.metrics: Dict[str, int] = {
+            'tracked': 0,
+            'batches': 0,
+            'polls': 0,
+            'completed': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'handler_errors': 0
+        }
+
+    @staticmethod
+    def _redis():
+        from .database import redis_client
+        return redis_client
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    async def fetch_statuses(self, request_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        from .fal_service import FALService
+        return await FALService.poll_job_statuses(request_ids, self.poll_concurrency)
+
+    def interval_for(self, polls: int) -> float:
+        """Seconds until the next poll of a job that has been polled `polls` times"""
+        return min(self.max_interval, self.min_interval * (self.backoff ** polls))
+
+    def track(self, room_id: str, request_id: str) -> None:
+        """Start polling a submitted FAL job for a room (replaces any earlier job for the room)"""
+        now = time.time()
+        state = {'request_id': request_id, 'submitted_at': now, 'polls': 0}
+        pipe = self._redis().pipeline()
+        pipe.hset(POLL_STATE_KEY, room_id, json.dumps(state))
+        pipe.zadd(POLL_SET_KEY, {room_id: now + self.interval_for(0)})
+        pipe.execute()
+        self.metrics['tracked'] += 1
+        logger.info(f"[3D Poller] Tracking FAL job {request_id} for room {room_id}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def is_tracking(self, room_id: str) -> bool:
+        return self._redis().zscore(POLL_SET_KEY, room_id) is not None
+
+    def untrack(self, room_id: str, request_id: Optional[str] = None) -> bool:
+        """Stop polling a room; with `request_id`, only if that is still the room's job"""
+        if request_id is not None:
+            return bool(self._redis().eval(UNTRACK_SCRIPT, 2, POLL_SET_KEY, POLL_STATE_KEY, room_id, request_id))
+        pipe = self._redis().pipeline()
+        pipe.zrem(POLL_SET_KEY, room_id)
+        pipe.hdel(POLL_STATE_KEY, room_id)
+        pipe.execute()
+        return True
+
+    def _claim_due(self, now: float) -> List[Tuple[str, Dict[str, Any]]]:
+        redis_client = self._redis()
+        claimed = []
+        for room_id in redis_client.zrangebyscore(POLL_SET_KEY, '-inf', now, start=0, num=self.batch_size):
+            room_id = self._decode(room_id)
+            # Other processes run the same loop; a short lock keeps each job to one poller per round
+            if not redis_client.set(f"{POLL_LOCK_PREFIX}{room_id}", "1", nx=True, ex=POLL_LOCK_SECONDS):
+                continue
+            raw = redis_client.hget(POLL_STATE_KEY, room_id)
+            if not raw:
+                redis_client.zrem(POLL_SET_KEY, room_id)
+                redis_client.delete(f"{POLL_LOCK_PREFIX}{room_id}")
+                continue
+            claimed.append((room_id, json.loads(self._decode(raw))))
+        return claimed
+
+    async def poll_once(self) -> int:
+        """Poll one batch of due jobs; returns how many were polled"""
+        now = time.time()
+        claimed = self._claim_due(now)
+        if not claimed:
+            return 0
+
+        self.metrics['batches'] += 1
+        try:
+            statuses = await self.fetch_statuses([state['request_id'] for _, state in claimed])
+        except Exception as e:
+            logger.error(f"[3D Poller] Error polling batch of {len(claimed)} jobs: {str(e)}")
+            statuses = {}
+
+        redis_client = self._redis()
+        for room_id, state in claimed:
+            self.metrics['polls'] += 1
+            result = statuses.get(state['request_id']) or {'status': 'unknown'}
+            status = result.get('status')
+            if status not in ('completed', 'failed') and now - state['submitted_at'] > self.timeout:
+                self.metrics['timed_out'] += 1
+                logger.error(f"[3D Poller] Room {room_id} job timed out after {self.timeout:.0f} seconds")
+                result = {'status': 'failed', 'error': f"timed out after {self.timeout:.0f}s"}
+                status = 'failed'
+
+            if status in ('completed', 'failed'):
+                # Keep the entry until the handler has run so a crash mid-upload is retried
+                redis_client.zadd(POLL_SET_KEY, {room_id: now + UPLOAD_LEASE_SECONDS})
+                self._uploads.put_nowait((room_id, state['request_id'], result))
+            else:
+                state['polls'] += 1
+                redis_client.hset(POLL_STATE_KEY, room_id, json.dumps(state))
+                redis_client.zadd(POLL_SET_KEY, {room_id: now + self.interval_for(state['polls'])})
+            redis_client.delete(f"{POLL_LOCK_PREFIX}{room_id}")
+
+        logger.debug(f"[3D Poller] Polled {len(claimed)} jobs in {time.time() - now:.2f}s")
+        return len(claimed)
+
+    async def _upload_worker(self, handler: ResultHandler) -> None:
+        while True:
+            room_id, request_id, result = await self._uploads.get()
+            try:
+                await handler(room_id, result)
+                self.metrics['completed' if result.get('status') == 'completed' else 'failed'] += 1
+                if not self.untrack(room_id, request_id):
+                    logger.info(f"[3D Poller] Room {room_id} was re-tracked while FAL job {request_id} was handled; keeping the new job")
+            except Exception as e:
+                self.metrics['handler_errors'] += 1
+                logger.error(f"[3D Poller] Error handling finished job for room {room_id}: {str(e)}")
+            finally:
+                self._uploads.task_done()
+
+    async def _wait_for_due(self) -> None:
+        delay = self.min_interval
+        earliest = self._redis().zrange(POLL_SET_KEY, 0, 0, withscores=True)
+        if earliest:
+            # Never sleep longer than min_interval so jobs tracked by other processes are picked up promptly
+            delay = max(0.1, min(delay, earliest[0][1] - time.time()))
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, handler: ResultHandler) -> None:
+        """Poll until cancelled, passing each finished job's status result to `handler`"""
+        self._wakeup = asyncio.Event()
+        self._uploads = asyncio.Queue()
+        workers = [asyncio.create_task(self._upload_worker(handler)) for _ in range(self.upload_concurrency)]
+        logger.info(f"[3D Poller] Started with {self.upload_concurrency} upload workers")
+        try:
+            while True:
+                try:
+                    polled = await self.poll_once()
+                except Exception as e:
+                    logger.error(f"[3D Poller] Poll loop error: {str(e)}")
+                    polled = 0
+                if polled < self.batch_size:
+                    await self._wait_for_due()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        redis_client = self._redis()
+        return {
+            **self.metrics,
+            'pending': redis_client.zcard(POLL_SET_KEY),
+            'due': redis_client.zcount(POLL_SET_KEY, '-inf', time.time()),
+            'uploads_queued': self._uploads.qsize() if self._uploads is not None else 0
+        }
+
+
+# Global poller; one loop per process shares the Redis poll set with every other process
+model_3d_poller = Model3DPoller(
+    settings.MODEL_3D_POLL_BATCH_SIZE,
+    settings.MODEL_3D_POLL_MIN_INTERVAL,
+    settings.MODEL_3D_POLL_MAX_INTERVAL,
+    settings.MODEL_3D_POLL_BACKOFF,
+    settings.MODEL_3D_POLL_TIMEOUT,
+    settings.MODEL_3D_POLL_CONCURRENCY,
+    settings.MODEL_3D_UPLOAD_CONCURRENCY
+)
@@ -1,21 +1,18 @@
 """
 3D model storage utilities for uploading GLB files to Supabase Storage.
-GLB files can be 50-200MB so we need appropriate timeout/chunk handling.
-FAL returns a ZIP file containing GLB + textures - we extract and upload the GLB.
+GLB files can be 50-200MB so transfers are streamed through the shared asset
+transfer service. FAL returns a ZIP file containing GLB + textures - we extract
+and upload the GLB.
 """
 import aiohttp
-import ssl
-import certifi
 import logging
 import asyncio
-import time
-import zipfile
-import io
 import httpx
 from typing import Optional
 from supabase import create_client
 from .config import settings
 from .logger import setup_logging
+from .asset_transfer import asset_transfer, AssetTransferError
 from storage3.utils import StorageException
 
 setup_logging()
@@ -107,152 +104,32 @@ async def upload_model_to_supabase(
         logger.warning("[Model Storage] No model URL provided")
         return None
 
-    # Download the model file
-    try:
-        logger.info(f"[Model Storage] Downloading 3D model from {model_url[:100]}...")
-
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                model_url,
-                timeout=aiohttp.ClientTimeout(total=timeout),
-                ssl=ssl_context
-            ) as resp:
-                if resp.status != 200:
-                    logger.error(f"[Model Storage] Failed to download: HTTP {resp.status}")
-                    return None
-
-                downloaded_data = await resp.read()
-                content_type = resp.headers.get('Content-Type', 'application/octet-stream')
-                file_size_mb = len(downloaded_data) / (1024 * 1024)
-
-                logger.info(f"[Model Storage] Downloaded {file_size_mb:.2f} MB, type: {content_type}")
-
-        # Check if the downloaded file is a ZIP (FAL hunyuan_world returns ZIP with mesh layers + textures)
-        if model_url.endswith('.zip') or downloaded_data[:4] == b'PK\x03\x04':
-            logger.info("[Model Storage] File is a ZIP archive from hunyuan_world")
-            try:
-                with zipfile.ZipFile(io.BytesIO(downloaded_data)) as zf:
-                    zip_contents = zf.namelist()
-                    logger.info(f"[Model Storage] ZIP contents: {zip_contents}")
-
-                    # Check what's in the ZIP
-                    glb_files = [f for f in zip_contents if f.endswith('.glb')]
-                    drc_files = [f for f in zip_contents if f.endswith('.drc')]
-                    ply_files = [f for f in zip_contents if f.endswith('.ply')]
-
-                    logger.info(f"[Model Storage] ZIP analysis - GLB: {glb_files}, DRC: {drc_files}, PLY: {len(ply_files)} files")
-
-                    # Prefer Draco-compressed GLB if available (from export_drc=True)
-                    if glb_files:
-                        model_data = zf.read(glb_files[0])
-                        file_ext = 'glb'
-                        logger.info(f"[Model Storage] Using GLB: {glb_files[0]} ({len(model_data) / 1024 / 1024:.2f} MB)")
-                    elif drc_files:
-                        # DRC is raw Draco - would need different viewer support
-                        model_data = zf.read(drc_files[0])
-                        file_ext = 'drc'
-                        logger.info(f"[Model Storage] Using DRC: {drc_files[0]} ({len(model_data) / 1024 / 1024:.2f} MB)")
-                    elif ply_files:
-                        # Fall back to full ZIP with PLY layers (for layered scene support)
-                        model_data = downloaded_data
-                        file_ext = 'zip'
-                        logger.info(f"[Model Storage] No GLB/DRC found, storing full ZIP with PLY ({len(model_data) / 1024 / 1024:.2f} MB)")
-                    else:
-                        logger.error("[Model Storage] No supported 3D files found in ZIP")
-                        return None
-
-            except zipfile.BadZipFile as e:
-                logger.error(f"[Model Storage] Invalid ZIP file: {str(e)}")
-                return None
-        else:
-            # Direct file (GLB or PLY)
-            model_data = downloaded_data
-            file_ext = 'glb' if model_url.endswith('.glb') else 'ply'
-
-    except aiohttp.ClientError as e:
-        logger.error(f"[Model Storage] Network error downloading model: {str(e)}")
-        return None
-    except asyncio.TimeoutError:
-        logger.error(f"[Model Storage] Timeout downloading model (>{timeout}s)")
-        return None
-    except Exception as e:
-        logger.error(f"[Model Storage] Error downloading model: {str(e)}")
-        import traceback
-        logger.error(f"[Model Storage] Traceback: {traceback.format_exc()}")
-        return None
-
-    # Upload to Supabase with retries
-    # Use appropriate extension and MIME type based on file type
-    file_path = f"models/{room_id}.{file_ext}"
-    content_type_map = {
-        'glb': 'model/gltf-binary',
-        'ply': 'application/x-ply',
-        'zip': 'application/zip'
-    }
-    content_type = content_type_map.get(file_ext, 'application/octet-stream')
-
+    # Stream from FAL into storage; ZIPs are spooled to disk rather than held in memory
     for attempt in range(max_retries):
         try:
-            logger.info(f"[Model Storage] Uploading to Supabase: {file_path} (attempt {attempt + 1}/{max_retries})")
-            logger.info(f"[Model Storage] File size: {len(model_data) / 1024 / 1024:.2f} MB")
-
-            # Use dedicated storage client with extended timeout
-            supabase = get_storage_client()
-            if not supabase:
-                logger.error("[Model Storage] Storage client is None")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return None
-
-            # Upload the file (upsert=True allows overwriting if exists)
-            response = supabase.storage.from_(MODEL_BUCKET).upload(
-                path=file_path,
-                file=model_data,
-                file_options={
-                    "content-type": content_type,
-                    "upsert": "true"
-                }
-            )
-            logger.info(f"[Model Storage] Upload response: {response}")
-
-            # Get the public URL with cache-busting parameter
-            public_url = supabase.storage.from_(MODEL_BUCKET).get_public_url(file_path)
-
-            # Add cache-busting parameter
-            cache_buster = int(time.time())
-            if '?' in public_url:
-                public_url += f"&v={cache_buster}"
-            else:
-                public_url += f"?v={cache_buster}"
-
+            logger.info(f"[Model Storage] Transferring 3D model for room {room_id} from {model_url[:100]}... (attempt {attempt + 1}/{max_retries})")
+            public_url = await asset_transfer.transfer_model(model_url, MODEL_BUCKET, room_id, timeout=timeout)
             logger.info(f"[Model Storage] Successfully uploaded model to Supabase: {public_url}")
             return public_url
 
-        except StorageException as upload_error:
-            logger.error(f"[Model Storage] StorageException during upload (attempt {attempt + 1}/{max_retries}):")
-            logger.error(f"  - Name: {getattr(upload_error, 'name', 'N/A')}")
-            logger.error(f"  - Message: {getattr(upload_error, 'message', str(upload_error))}")
-            logger.error(f"  - Code: {getattr(upload_error, 'code', 'N/A')}")
-            logger.error(f"  - Status: {getattr(upload_error, 'status', 'N/A')}")
-
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                continue
-            return None
+        except AssetTransferError as transfer_error:
+            logger.error(f"[Model Storage] Transfer failed (attempt {attempt + 1}/{max_retries}): {transfer_error}")
+            if not transfer_error.retryable:
+                return None
 
-        except Exception as upload_error:
-            logger.error(f"[Model Storage] Upload failed (attempt {attempt + 1}/{max_retries}) - Type: {type(upload_error).__name__}, Error: {upload_error}")
+        except aiohttp.ClientError as transfer_error:
+            logger.error(f"[Model Storage] Network error (attempt {attempt + 1}/{max_retries}): {str(transfer_error)}")
 
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)
-                continue
+        except asyncio.TimeoutError:
+            logger.error(f"[Model Storage] Timeout transferring model (>{timeout}s, attempt {attempt + 1}/{max_retries})")
 
+        except Exception as transfer_error:
+            logger.error(f"[Model Storage] Upload failed (attempt {attempt + 1}/{max_retries}) - Type: {type(transfer_error).__name__}, Error: {transfer_error}")
             import traceback
             logger.error(f"[Model Storage] Traceback: {traceback.format_exc()}")
-            return None
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(2 ** attempt)  # Exponential backoff
 
     # All retries exhausted
     logger.error(f"[Model Storage] Failed to upload after {max_retries} attempts")
@@ -52,6 +52,7 @@ class Room(BaseModel):
     image_url: Optional[str] = None
     image_status: Optional[str] = "pending"  # "pending", "generating", "content_ready", "ready", "error"
     image_prompt: Optional[str] = None
+    image_variants: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # "thumb"/"mobile"/"desktop" -> {"width", "height", "webp", "avif"}
     connections: Dict[Direction, str] = Field(default_factory=dict)  # direction -> room_id
     npcs: List[str] = Field(default_factory=list)  # List of NPC IDs
     items: List[str] = Field(default_factory=list)  # List of Item IDs
@@ -223,4 +224,94 @@ class GoldTransaction(BaseModel):
     reference_id: Optional[str] = None
     description: Optional[str] = None
     balance_after: int
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Structured LLM outputs (also used to build the provider response_format schemas)
+class RoomDescriptionOutput(BaseModel):
+    title: str
+    description: str
+    image_prompt: str
+
+class NPCInteractionOutput(BaseModel):
+    response: str
+    memory: str
+
+class BiomeOutput(BaseModel):
+    name: str
+    description: str
+    color: str  # Hex color code
+
+class WorldStartingState(BaseModel):
+    quest_stage: str
+    world_time: str
+    weather: str
+
+class WorldSeedOutput(BaseModel):
+    world_seed: str
+    main_quest_summary: str
+    starting_state: WorldStartingState
+
+class MonsterOutput(BaseModel):
+    name: str
+    description: str
+    special_effects: str
+
+class MonsterBatchEntry(MonsterOutput):
+    slot: int  # The "MONSTER n" this entry was generated for
+
+class MonsterBatchOutput(BaseModel):
+    monsters: List[MonsterBatchEntry]
+
+class NPCOutput(BaseModel):
+    name: str
+    description: str
+    backstory: str
+    dialogue_style: str
+    knowledge: str
+    quest_hint: str = ""
+
+class ItemOutput(BaseModel):
+    name: str
+    rarity: int
+    description: str
+    capabilities: List[str]
+
+class ActionValidationOutput(BaseModel):
+    valid: bool
+    reason: str
+    suggestion: Optional[str] = None
+
+class AttackIntentOutput(BaseModel):
+    is_attack: bool
+    target_monster_id: Optional[str] = None
+
+class CombatantRoundResult(BaseModel):
+    reason: str
+
+class CombatRoundOutput(BaseModel):
+    narrative: str
+    player1_result: CombatantRoundResult
+    player2_result: CombatantRoundResult
+    player1_damage_dealt: int = 0
+    player2_damage_dealt: int = 0
+    player1_control_delta: int = 0
+    player2_control_delta: int = 0
+    player1_intends_heal: bool = False
+    player2_intends_heal: bool = False
+
+class ItemActionCheckOutput(BaseModel):
+    can_perform: bool
+    reason: str = ""
+
+class WorldValidationRules(BaseModel):
+    magic_allowed: bool
+    technology_allowed: bool
+    firearms_allowed: bool
+    special_restrictions: List[str] = Field(default_factory=list)
+
+class ValidationRulesOutput(BaseModel):
+    validation_mode: str
+    basic_actions: List[str]
+    equipment_actions: List[str]
+    action_mappings: Dict[str, List[str]] = Field(default_factory=dict)  # Free-form keys, so this schema is non-strict
+    world_specific_rules: WorldValidationRules
@@ -317,6 +317,17 @@ class MonsterBehaviorManager:
             del self.monster_combat_history[player_id]
             logger.info(f"[MonsterBehavior] Cleared combat history for {player_id}")
     
+    def rooms(self) -> set:
+        """Rooms this process holds monster behaviour state for"""
+        return set(self.territorial_blocks) | set(self.aggressive_monsters)
+    
+    def release_room(self, room_id: str):
+        """Forget a room's in-memory state when another worker takes the room over
+        (territorial blocks are persisted in room properties and resynced on entry)"""
+        self.territorial_blocks.pop(room_id, None)
+        self.aggressive_monsters.pop(room_id, None)
+        logger.info(f"[MonsterBehavior] Released state for room {room_id}")
+    
     async def check_territorial_blocking(
         self, 
         player_id: str, 
@@ -1,7 +1,7 @@
-import asyncio
 from typing import Tuple, List, Dict, Any, Optional, Set
 import logging
-import json
+from .models import ValidationRulesOutput, ActionValidationOutput, ItemActionCheckOutput
+from .structured_output import StructuredOutputError
 
 logger = logging.getLogger(__name__)
 
@@ -139,33 +139,11 @@ Create a JSON object with the following structure:
 Make the rules appropriate for the world theme and context.
 """
             
-            response = await self.game_manager.ai_handler.generate_text(prompt)
-            
-            # Parse AI response with retry mechanism
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    rules = json.loads(response)
-                    logger.info(f"[DynamicMoveValidator] Generated validation rules for world {world_seed}")
-                    return rules
-                except json.JSONDecodeError as e:
-                    logger.warning(f"[DynamicMoveValidator] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        logger.warning(f"[DynamicMoveValidator] All {max_retries} attempts failed, using defaults")
-                        return self._get_default_validation_rules()
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
-                except Exception as e:
-                    logger.error(f"[DynamicMoveValidator] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        logger.error(f"[DynamicMoveValidator] All {max_retries} attempts failed due to unexpected error, using defaults")
-                        return self._get_default_validation_rules()
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
+            rules = await self.game_manager.ai_handler.generate_structured(
+                prompt, ValidationRulesOutput, call_site="validation_rules", cacheable=True
+            )
+            logger.info(f"[DynamicMoveValidator] Generated validation rules for world {world_seed}")
+            return rules
                 
         except Exception as e:
             logger.error(f"[DynamicMoveValidator] Error generating validation rules: {str(e)}")
@@ -454,39 +432,20 @@ Return JSON:
 }}
 """
             
-            response = await self.game_manager.ai_handler.generate_text(prompt)
+            try:
+                result = await self.game_manager.ai_handler.generate_structured(
+                    prompt, ActionValidationOutput, call_site="validate_action", cacheable=True
+                )
+            except StructuredOutputError as e:
+                logger.warning(f"[DynamicMoveValidator] No valid AI validation response, allowing move: {str(e)}")
+                return True, "AI validation failed - allowing move", None
+            
+            is_valid = result['valid']
+            reason = result['reason'] or 'AI validation'
+            suggestion = result.get('suggestion')
             
-            # Retry mechanism for JSON parsing
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    result = json.loads(response)
-                    is_valid = result.get('valid', True)
-                    reason = result.get('reason', 'AI validation')
-                    suggestion = result.get('suggestion')
-                    
-                    logger.info(f"[DynamicMoveValidator] AI validation result: {is_valid} - {reason}")
-                    return is_valid, reason, suggestion
-                    
-                except json.JSONDecodeError as e:
-                    logger.warning(f"[DynamicMoveValidator] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        logger.warning(f"[DynamicMoveValidator] All {max_retries} attempts failed, allowing move")
-                        return True, "AI validation failed - allowing move", None
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
-                        
-                except Exception as e:
-                    logger.error(f"[DynamicMoveValidator] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        logger.error(f"[DynamicMoveValidator] All {max_retries} attempts failed due to unexpected error, allowing move")
-                        return True, "AI validation error - allowing move", None
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
+            logger.info(f"[DynamicMoveValidator] AI validation result: {is_valid} - {reason}")
+            return is_valid, reason, suggestion
                 
         except Exception as e:
             logger.error(f"[DynamicMoveValidator] Error in AI validation: {str(e)}")
@@ -510,16 +469,17 @@ Return JSON:
             Return JSON: {{"can_perform": true/false, "reason": "brief explanation"}}
             """
             
-            response = await self.game_manager.ai_handler.generate_text(prompt)
-            
             try:
-                result = json.loads(response)
-                can_perform = result.get('can_perform', False)
-                logger.debug(f"[DynamicMoveValidator] AI item description check: {can_perform} - {result.get('reason', 'No reason')}")
-                return can_perform
-            except json.JSONDecodeError:
+                result = await self.game_manager.ai_handler.generate_structured(
+                    prompt, ItemActionCheckOutput, call_site="item_supports_action", cacheable=True
+                )
+            except StructuredOutputError:
                 logger.warning(f"[DynamicMoveValidator] Failed to parse AI item description response")
                 return False
+            
+            can_perform = result['can_perform']
+            logger.debug(f"[DynamicMoveValidator] AI item description check: {can_perform} - {result.get('reason', 'No reason')}")
+            return can_perform
                 
         except Exception as e:
             logger.error(f"[DynamicMoveValidator] Error in AI item description validation: {str(e)}")
@@ -0,0 +1,257 @@
+"""
+Per-connection outbound queues for WebSocket sends.
+Each socket gets a bounded queue drained by its own writer task, so a broadcast is
+a non-blocking enqueue and one slow or half-dead client no longer holds up the
+other recipients or the coroutine that broadcast. When a queue is full, droppable
+message types (e.g. presence) evict the oldest droppable message; anything else
+the client can't keep up with closes the connection so it reconnects and resyncs.
+Messages are queued already encoded, so a broadcast is serialized once however
+many sockets it goes to. Timed sequences (typewriter text, delayed notifications)
+are queued by a schedule task per connection rather than by the coroutine that
+reads the socket, and the client can fast-forward them.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from fastapi import WebSocket
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+OVERFLOW_CLOSE_CODE = 1013  # "Try again later"
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """Serialize a message to the JSON text sent over the socket"""
+    return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+
+class OutboundConnection:
+    """A WebSocket with a bounded outbound queue and a writer task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        player_id: str,
+        max_depth: int,
+        send_timeout: float,
+        policies: Dict[str, str],
+        default_policy: str
+    ):
+        self.websocket = websocket
+        self.player_id = player_id
+        self.max_depth = max(1, max_depth)
+        self.send_timeout = send_timeout
+        self.policies = policies
+        self.default_policy = default_policy
+        self.closed = False
+        # Room state sync: the last room version queued, and whether the client applies room_patch
+        self.room_version: Optional[int] = None
+        self.accepts_patches = False
+        self._queue: Deque[Tuple[Optional[str], str]] = deque()  # (message type, encoded message)
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._close_code: Optional[int] = None  # Set by close(): the writer closes with it once drained
+        self._schedules: Dict[str, Tuple[asyncio.Task, asyncio.Event]] = {}  # name -> (task, fast-forward flag)
+        self.metrics: Dict[str, float] = {
+            'enqueued': 0,
+            'sent': 0,
+            'dropped': 0,
+            'peak_depth': 0,
+            'send_seconds': 0.0
+        }
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._drain())
+
+    def stop(self) -> None:
+        """Stop the writer; queued messages are discarded"""
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not None:
+            self._writer.cancel()
+        for task, _ in self._schedules.values():
+            task.cancel()
+        self._schedules.clear()
+
+    def policy_for(self, message_type: Optional[str]) -> str:
+        return self.policies.get(message_type, self.default_policy)
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, message: Dict[str, Any], payload: Optional[str] = None) -> bool:
+        """
+        Queue a message without waiting; returns False if it was dropped or the connection
+        closed. `payload` is the message already passed through encode_message.
+        """
+        if self.closed:
+            return False
+        message_type = message.get('type')
+        if len(self._queue) >= self.max_depth and not self._make_room(message_type):
+            return False
+        self._queue.append((message_type, payload if payload is not None else encode_message(message)))
+        self.metrics['enqueued'] += 1
+        self.metrics['peak_depth'] = max(self.metrics['peak_depth'], len(self._queue))
+        self._ready.set()
+        return True
+
+    def schedule(
+        self,
+        name: str,
+        messages: Iterable[Dict[str, Any]],
+        interval: float,
+        delay: float = 0.0,
+        on_complete: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> None:
+        """
+        Queue `messages` one every `interval` seconds, the first after `delay`, from a task
+        of their own. A pending schedule with the same name is replaced. `on_complete`
+        runs once every message is queued, and not if the connection closes first.
+        """
+        self.cancel_schedule(name)
+        fast_forward = asyncio.Event()
+        task = asyncio.create_task(self._run_schedule(name, list(messages), interval, delay, fast_forward, on_complete))
+        self._schedules[name] = (task, fast_forward)
+
+    def fast_forward(self, name: Optional[str] = None) -> int:
+        """Queue the rest of a schedule (or of all of them) now; returns how many were sped up"""
+        names = [name] if name is not None else list(self._schedules)
+        count = 0
+        for schedule_name in names:
+            if schedule_name in self._schedules:
+                self._schedules[schedule_name][1].set()
+                count += 1
+        return count
+
+    def cancel_schedule(self, name: str) -> None:
+        if name in self._schedules:
+            self._schedules.pop(name)[0].cancel()
+
+    @property
+    def schedules(self) -> Tuple[str, ...]:
+        return tuple(self._schedules)
+
+    async def _run_schedule(
+        self,
+        name: str,
+        messages: List[Dict[str, Any]],
+        interval: float,
+        delay: float,
+        fast_forward: asyncio.Event,
+        on_complete: Optional[Callable[[], Awaitable[None]]]
+    ) -> None:
+        try:
+            for index, message in enumerate(messages):
+                wait = delay if index == 0 else interval
+                if wait > 0 and not fast_forward.is_set():
+                    try:
+                        await asyncio.wait_for(fast_forward.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                self.enqueue(message)
+                if self.closed:
+                    return
+            if on_complete is not None:
+                await on_complete()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[WebSocket] Schedule {name} for player {self.player_id} failed: {str(e)}")
+        finally:
+            if name in self._schedules and self._schedules[name][0] is asyncio.current_task():
+                del self._schedules[name]
+
+    def _make_room(self, message_type: Optional[str]) -> bool:
+        for index, (queued_type, _) in enumerate(self._queue):
+            if self.policy_for(queued_type) == DROP_OLDEST:
+                del self._queue[index]
+                self.metrics['dropped'] += 1
+                return True
+        if self.policy_for(message_type) == DROP_OLDEST:
+            self.metrics['dropped'] += 1
+            return False
+        # A critical message the client can't take: close so it reconnects and resyncs
+        logger.warning(f"[WebSocket] Outbound queue full for player {self.player_id}, disconnecting")
+        self._close(OVERFLOW_CLOSE_CODE)
+        return False
+
+    def close(self, code: int = 1000) -> None:
+        """Stop accepting messages and close the socket once what is already queued has been sent"""
+        if self.closed:
+            return
+        if self._writer is None:
+            self._close(code)
+            return
+        self.closed = True
+        self._close_code = code
+        for task, _ in self._schedules.values():
+            task.cancel()
+        self._schedules.clear()
+        self._ready.set()
+
+    def _close(self, code: int) -> None:
+        self.stop()
+
+        async def close():
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass  # Already gone
+
+        asyncio.create_task(close())
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                while not self._queue:
+                    if self._close_code is not None:
+                        await asyncio.wait_for(self.websocket.close(code=self._close_code), timeout=self.send_timeout)
+                        return
+                    self._ready.clear()
+                    await self._ready.wait()
+                _, payload = self._queue.popleft()
+                started = time.perf_counter()
+                await asyncio.wait_for(self.websocket.send_text(payload), timeout=self.send_timeout)
+                self.metrics['sent'] += 1
+                self.metrics['send_seconds'] += time.perf_counter() - started
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Send timeouts and socket errors both mean the client is gone or too slow to keep
+            logger.error(f"[WebSocket] Writer for player {self.player_id} stopped: {type(e).__name__} {str(e)}")
+            self._close(1011)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        sent = self.metrics['sent']
+        return {
+            'depth': len(self._queue),
+            'peak_depth': self.metrics['peak_depth'],
+            'enqueued': self.metrics['enqueued'],
+            'sent': sent,
+            'dropped': self.metrics['dropped'],
+            'avg_send_ms': round(self.metrics['send_seconds'] / sent * 1000, 2) if sent else 0.0,
+            'schedules': len(self._schedules),
+            'closed': self.closed
+        }
+
+
+def create_outbound_connection(websocket: WebSocket, player_id: str) -> OutboundConnection:
+    return OutboundConnection(
+        websocket,
+        player_id,
+        settings.WS_OUTBOUND_QUEUE_SIZE,
+        settings.WS_SEND_TIMEOUT,
+        settings.WS_OVERFLOW_POLICIES,
+        settings.WS_OVERFLOW_DEFAULT_POLICY
+    )
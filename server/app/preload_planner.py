@@ -0,0 +1,266 @@
+"""
+Direction-aware speculative room preloading.
+Predicts where a player is heading from their recent steps, preloads several rings
+along the likely path within a probability-weighted budget, cancels preloads nobody
+is heading towards any more, and tracks which preloaded rooms were actually entered.
+"""
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Same offsets as GameManager._get_coordinates_for_direction
+DIRECTION_OFFSETS: Dict[str, Tuple[int, int]] = {
+    "north": (0, 1),
+    "south": (0, -1),
+    "east": (1, 0),
+    "west": (-1, 0)
+}
+# Additive smoothing so unseen directions keep some probability
+HEADING_SMOOTHING = 0.5
+# Bounds for per-player trails and the record of completed preloads
+MAX_TRACKED_PLAYERS = 5000
+MAX_TRACKED_PRELOADS = 10000
+
+Coordinate = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class PreloadTarget:
+    """One room to preload, reached from `parent` by moving `direction`"""
+    x: int
+    y: int
+    direction: str
+    parent: Coordinate
+    ring: int
+    probability: float
+
+    @property
+    def coordinate(self) -> Coordinate:
+        return (self.x, self.y)
+
+
+class PreloadPlanner:
+    """Plans and runs per-player speculative preloads"""
+
+    def __init__(self, depth: int, budget: int, min_probability: float, history: int):
+        self.depth = max(1, depth)
+        self.budget = max(len(DIRECTION_OFFSETS), budget)
+        self.min_probability = max(0.0, min_probability)
+        self.history = max(1, history)
+        self._trails: "OrderedDict[str, Deque[Coordinate]]" = OrderedDict()
+        # Shared across players so two explorers heading the same way reuse one preload
+        self._tasks: Dict[Coordinate, asyncio.Task] = {}
+        self._interest: Dict[Coordinate, Set[str]] = {}
+        self._player_targets: Dict[str, Set[Coordinate]] = {}
+        # coordinate -> ring of rooms generated by a preload and not yet entered
+        self._preloaded: "OrderedDict[Coordinate, int]" = OrderedDict()
+        self.metrics: Dict[str, Any] = {
+            'plans': 0,
+            'started': 0,
+            'generated': 0,
+            'cancelled': 0,
+            'failed': 0,
+            'entered': 0,
+            'by_ring': {}
+        }
+
+    def _trail(self, player_id: str, visited_coordinates: Optional[List[str]]) -> Deque[Coordinate]:
+        trail = self._trails.get(player_id)
+        if trail is None:
+            trail = deque(maxlen=self.history + 1)
+            # Seed from the persisted exploration order, e.g. after a restart
+            for coord_key in (visited_coordinates or [])[-(self.history + 1):]:
+                try:
+                    x, y = coord_key.split(",")
+                    trail.append((int(x), int(y)))
+                except ValueError:
+                    continue
+            self._trails[player_id] = trail
+            while len(self._trails) > MAX_TRACKED_PLAYERS:
+                self._trails.popitem(last=False)
+        self._trails.move_to_end(player_id)
+        return trail
+
+    def heading_probabilities(self, trail: Deque[Coordinate]) -> Dict[str, float]:
+        """Probability of each next step from the player's recent single-room steps"""
+        counts = {direction: HEADING_SMOOTHING for direction in DIRECTION_OFFSETS}
+        points = list(trail)
+        steps = 0
+        for (x1, y1), (x2, y2) in zip(points, points[1:]):
+            for direction, offset in DIRECTION_OFFSETS.items():
+                if (x2 - x1, y2 - y1) == offset:
+                    # Recent steps count more than older ones
+                    steps += 1
+                    counts[direction] += steps
+                    break
+        total = sum(counts.values())
+        return {direction: count / total for direction, count in counts.items()}
+
+    def plan(self, player_id: str, x: int, y: int, visited_coordinates: Optional[List[str]] = None) -> List[PreloadTarget]:
+        """Preload targets for a player now at (x, y), nearest ring first then most likely"""
+        trail = self._trail(player_id, visited_coordinates)
+        if not trail or trail[-1] != (x, y):
+            trail.append((x, y))
+        probabilities = self.heading_probabilities(trail)
+
+        # Expand ring by ring, summing the probability of every path that first reaches a coordinate
+        best: Dict[Coordinate, PreloadTarget] = {}
+        frontier: Dict[Coordinate, float] = {(x, y): 1.0}
+        for ring in range(1, self.depth + 1):
+            reached: Dict[Coordinate, float] = {}
+            via: Dict[Coordinate, Tuple[float, str, Coordinate]] = {}
+            for parent, path_probability in frontier.items():
+                for direction, (dx, dy) in DIRECTION_OFFSETS.items():
+                    coordinate = (parent[0] + dx, parent[1] + dy)
+                    if coordinate == (x, y) or coordinate in best:
+                        continue
+                    probability = path_probability * probabilities[direction]
+                    reached[coordinate] = reached.get(coordinate, 0.0) + probability
+                    # Generate from the most likely parent so the room text follows the likeliest approach
+                    if coordinate not in via or via[coordinate][0] < probability:
+                        via[coordinate] = (probability, direction, parent)
+            for coordinate, probability in reached.items():
+                _, direction, parent = via[coordinate]
+                best[coordinate] = PreloadTarget(coordinate[0], coordinate[1], direction, parent, ring, probability)
+            frontier = reached
+
+        # The four neighbours are always preloaded; further rings compete for the rest of the budget
+        ring_one = [target for target in best.values() if target.ring == 1]
+        further = sorted(
+            (target for target in best.values() if target.ring > 1 and target.probability >= self.min_probability),
+            key=lambda target: -target.probability
+        )[:self.budget - len(ring_one)]
+        return sorted(ring_one + further, key=lambda target: (target.ring, -target.probability))
+
+    def _release_stale(self, player_id: str, wanted: Set[Coordinate]) -> None:
+        for coordinate in self._player_targets.get(player_id, set()) - wanted:
+            interested = self._interest.get(coordinate)
+            if interested is None:
+                continue
+            interested.discard(player_id)
+            task = self._tasks.get(coordinate)
+            if not interested and task and not task.done():
+                task.cancel()
+                self.metrics['cancelled'] += 1
+                logger.info(f"[Preload] Cancelled stale preload at {coordinate} for player {player_id}")
+
+    async def run(
+        self,
+        player_id: str,
+        targets: List[PreloadTarget],
+        preload: Callable[[PreloadTarget], Awaitable[Optional[str]]]
+    ) -> Dict[str, int]:
+        """Run a plan ring by ring, replacing the player's previous plan"""
+        wanted = {target.coordinate for target in targets}
+        self._release_stale(player_id, wanted)
+        self._player_targets[player_id] = wanted
+        self.metrics['plans'] += 1
+        try:
+            return await self._run_plan(player_id, targets, wanted, preload)
+        finally:
+            if self._player_targets.get(player_id) is wanted:
+                # Nothing of this plan is left running to cancel, so forget it
+                del self._player_targets[player_id]
+
+    async def _run_plan(
+        self,
+        player_id: str,
+        targets: List[PreloadTarget],
+        wanted: Set[Coordinate],
+        preload: Callable[[PreloadTarget], Awaitable[Optional[str]]]
+    ) -> Dict[str, int]:
+        summary = {'scheduled': 0, 'skipped': 0}
+        for ring in sorted({target.ring for target in targets}):
+            tasks = []
+            for target in (t for t in targets if t.ring == ring):
+                coordinate = target.coordinate
+                if coordinate in self._preloaded:
+                    summary['skipped'] += 1
+                    continue
+                task = self._tasks.get(coordinate)
+                if task is None or task.done():
+                    task = asyncio.create_task(self._run_target(target, preload))
+                    self._tasks[coordinate] = task
+                    self._interest[coordinate] = set()
+                    summary['scheduled'] += 1
+                self._interest[coordinate].add(player_id)
+                tasks.append(task)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if self._player_targets.get(player_id) is not wanted:
+                # The player moved on; a newer plan owns their preloads now
+                break
+        return summary
+
+    async def _run_target(self, target: PreloadTarget, preload: Callable[[PreloadTarget], Awaitable[Optional[str]]]) -> Optional[str]:
+        coordinate = target.coordinate
+        self.metrics['started'] += 1
+        try:
+            room_id = await preload(target)
+            if room_id:
+                self.metrics['generated'] += 1
+                self._ring_stats(target.ring)['generated'] += 1
+                self._preloaded[coordinate] = target.ring
+                while len(self._preloaded) > MAX_TRACKED_PRELOADS:
+                    self._preloaded.popitem(last=False)
+            return room_id
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.metrics['failed'] += 1
+            logger.error(f"[Preload] Preload failed at {coordinate}: {str(e)}")
+            return None
+        finally:
+            if self._tasks.get(coordinate) is asyncio.current_task():
+                self._tasks.pop(coordinate, None)
+                self._interest.pop(coordinate, None)
+
+    def _ring_stats(self, ring: int) -> Dict[str, int]:
+        return self.metrics['by_ring'].setdefault(ring, {'generated': 0, 'entered': 0})
+
+    def record_entry(self, x: int, y: int) -> bool:
+        """Note that a player entered (x, y); returns True if a preload had generated it"""
+        ring = self._preloaded.pop((x, y), None)
+        if ring is None:
+            return False
+        self.metrics['entered'] += 1
+        self._ring_stats(ring)['entered'] += 1
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Preload counts and the share of generated rooms that were entered, overall and per ring"""
+        generated = self.metrics['generated']
+        return {
+            'depth': self.depth,
+            'budget': self.budget,
+            'plans': self.metrics['plans'],
+            'started': self.metrics['started'],
+            'generated': generated,
+            'cancelled': self.metrics['cancelled'],
+            'failed': self.metrics['failed'],
+            'entered': self.metrics['entered'],
+            'hit_rate': round(self.metrics['entered'] / generated, 3) if generated else 0.0,
+            'in_flight': len(self._tasks),
+            'planning_players': len(self._player_targets),
+            'by_ring': {
+                ring: dict(stats, hit_rate=round(stats['entered'] / stats['generated'], 3) if stats['generated'] else 0.0)
+                for ring, stats in sorted(self.metrics['by_ring'].items())
+            }
+        }
+
+
+# Global planner shared by every player's preloads in this process
+preload_planner = PreloadPlanner(
+    settings.PRELOAD_DEPTH,
+    settings.PRELOAD_BUDGET,
+    settings.PRELOAD_MIN_PROBABILITY,
+    settings.PRELOAD_HEADING_HISTORY
+)
@@ -0,0 +1,126 @@
+"""
+Redis-backed player presence, shared by every worker.
+Each present player has a `presence:{player_id}` key holding their room, which
+expires unless heartbeats (WebSocket pings) refresh it, and each room has a
+`room:{room_id}:presence` sorted set of players scored by when they were last
+seen. Reads trim entries older than the TTL with one ZREMRANGEBYSCORE, so players
+whose connections died drop out of rooms without a sweep.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+PLAYER_KEY_PREFIX = "presence:"  # presence:{player_id} -> room_id, expires after the TTL
+ROOM_KEY_PREFIX = "room:"  # room:{room_id}:presence sorted set: player_id -> last seen
+
+INVALID_PLAYER_IDS = ("", "None", "null")
+
+
+class PresenceService:
+    """Per-player TTL keys plus a last-seen sorted set per room"""
+
+    def __init__(self, ttl: int):
+        self.ttl = max(1, ttl)
+        self.metrics: Dict[str, int] = {
+            'joins': 0,
+            'moves': 0,
+            'heartbeats': 0,
+            'stale_heartbeats': 0,
+            'leaves': 0,
+            'reads': 0,
+            'expired': 0,
+            'rejected': 0
+        }
+
+    @staticmethod
+    def _redis():
+        from .database import redis_client
+        return redis_client
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    @staticmethod
+    def _player_key(player_id: str) -> str:
+        return f"{PLAYER_KEY_PREFIX}{player_id}"
+
+    @staticmethod
+    def _room_key(room_id: str) -> str:
+        return f"{ROOM_KEY_PREFIX}{room_id}:presence"
+
+    def _mark(self, room_id: str, player_id: str, previous: Optional[str], now: Optional[float]) -> bool:
+        now = time.time() if now is None else now
+        pipe = self._redis().pipeline()
+        if previous and previous != room_id:
+            pipe.zrem(self._room_key(previous), player_id)
+        pipe.set(self._player_key(player_id), room_id, ex=self.ttl)
+        pipe.zadd(self._room_key(room_id), {player_id: now})
+        pipe.expire(self._room_key(room_id), self.ttl)
+        return bool(pipe.execute()[-2])
+
+    def join(self, room_id: str, player_id: str, now: Optional[float] = None) -> bool:
+        """Mark a player present in a room, leaving the room they were in; returns True if they weren't listed there"""
+        if not player_id or str(player_id) in INVALID_PLAYER_IDS:
+            # Rejected on write, so reads never have to filter
+            logger.warning(f"[Presence] Ignoring invalid player id {player_id!r} for room {room_id}")
+            self.metrics['rejected'] += 1
+            return False
+        previous = self._decode(self._redis().get(self._player_key(player_id)))
+        self.metrics['moves' if previous and previous != room_id else 'joins'] += 1
+        return self._mark(room_id, player_id, previous, now)
+
+    def heartbeat(self, room_id: str, player_id: str, now: Optional[float] = None) -> bool:
+        """
+        Refresh a player's TTL and last-seen score. A heartbeat from a socket in a room
+        the player has since moved out of is ignored; returns whether presence was refreshed.
+        """
+        current = self._decode(self._redis().get(self._player_key(player_id)))
+        if current is not None and current != room_id:
+            self.metrics['stale_heartbeats'] += 1
+            return False
+        self.metrics['heartbeats'] += 1
+        self._mark(room_id, player_id, current, now)
+        return True
+
+    def leave(self, room_id: str, player_id: str) -> bool:
+        """Remove a player from a room; their presence key goes too unless it already points elsewhere"""
+        redis_client = self._redis()
+        current = self._decode(redis_client.get(self._player_key(player_id)))
+        pipe = redis_client.pipeline()
+        pipe.zrem(self._room_key(room_id), player_id)
+        if current == room_id:
+            pipe.delete(self._player_key(player_id))
+        removed = pipe.execute()[0]
+        self.metrics['leaves'] += 1
+        return bool(removed)
+
+    def room_players(self, room_id: str, now: Optional[float] = None) -> List[str]:
+        """Players seen in the room within the TTL, trimming the rest"""
+        cutoff = (time.time() if now is None else now) - self.ttl
+        pipe = self._redis().pipeline()
+        pipe.zremrangebyscore(self._room_key(room_id), '-inf', f"({cutoff}")
+        pipe.zrange(self._room_key(room_id), 0, -1)
+        expired, players = pipe.execute()
+        self.metrics['reads'] += 1
+        if expired:
+            self.metrics['expired'] += expired
+            logger.info(f"[Presence] Expired {expired} players from room {room_id}")
+        return [self._decode(player_id) for player_id in players]
+
+    def room_of(self, player_id: str) -> Optional[str]:
+        """The room a player is present in, or None once their presence expired"""
+        return self._decode(self._redis().get(self._player_key(player_id)))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, 'ttl': self.ttl}
+
+
+# Global presence service; all state is in Redis, so every worker sees the same rooms
+presence = PresenceService(settings.PRESENCE_TTL)
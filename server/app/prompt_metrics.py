@@ -0,0 +1,71 @@
+"""
+Prompt cache metrics for OpenAI calls.
+Records prompt and cached-token usage per prompt type so we can see how often
+the provider-side prompt cache hits and what it does to latency.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class PromptCacheMetrics:
+    """Per prompt type counters for prompt tokens, cached tokens and latency"""
+
+    def __init__(self):
+        self.prompt_types: Dict[str, Dict[str, float]] = {}
+
+    def record(self, prompt_type: str, usage: Optional[Any], latency: float) -> None:
+        """Record one completion's usage block (may be None if the provider omitted it)"""
+        stats = self.prompt_types.setdefault(prompt_type, {
+            'calls': 0,
+            'calls_with_usage': 0,
+            'cache_hits': 0,
+            'prompt_tokens': 0,
+            'cached_tokens': 0,
+            'total_latency': 0.0,
+            'hit_latency': 0.0,
+            'miss_latency': 0.0
+        })
+        stats['calls'] += 1
+        stats['total_latency'] += latency
+        if usage is None:
+            return
+
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', 0) or 0) if details is not None else 0
+
+        stats['calls_with_usage'] += 1
+        stats['prompt_tokens'] += prompt_tokens
+        stats['cached_tokens'] += cached_tokens
+        if cached_tokens > 0:
+            stats['cache_hits'] += 1
+            stats['hit_latency'] += latency
+        else:
+            stats['miss_latency'] += latency
+        logger.debug(f"[Prompt Cache] {prompt_type}: {cached_tokens}/{prompt_tokens} prompt tokens cached, {latency*1000:.0f}ms")
+
+    def get_report(self) -> Dict[str, Any]:
+        """Cache hit ratio and latency per prompt type"""
+        report = {}
+        for prompt_type, stats in self.prompt_types.items():
+            misses = stats['calls_with_usage'] - stats['cache_hits']
+            report[prompt_type] = {
+                'calls': stats['calls'],
+                'cache_hit_ratio': round(stats['cache_hits'] / stats['calls_with_usage'], 3) if stats['calls_with_usage'] else 0.0,
+                'cached_token_ratio': round(stats['cached_tokens'] / stats['prompt_tokens'], 3) if stats['prompt_tokens'] else 0.0,
+                'prompt_tokens': stats['prompt_tokens'],
+                'cached_tokens': stats['cached_tokens'],
+                'avg_latency_ms': round(stats['total_latency'] / stats['calls'] * 1000, 1) if stats['calls'] else 0.0,
+                'avg_hit_latency_ms': round(stats['hit_latency'] / stats['cache_hits'] * 1000, 1) if stats['cache_hits'] else None,
+                'avg_miss_latency_ms': round(stats['miss_latency'] / misses * 1000, 1) if misses else None
+            }
+        return report
+
+
+# Global metrics instance shared by every OpenAI call in this process
+prompt_cache_metrics = PromptCacheMetrics()
@@ -0,0 +1,157 @@
+"""
+Content-addressed cache for deterministic, non-interactive LLM responses.
+Keys are a hash of the normalized prompt, model and temperature. An in-process
+LRU sits in front of a shared Redis backend, and each call site opts in with its
+own TTL.
+"""
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "llm_cache:"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so indentation-only differences share a cache entry"""
+    return re.sub(r'\s+', ' ', prompt or '').strip()
+
+
+class ResponseCache:
+    """Two-level (LRU + Redis) response cache with per call site TTLs and hit metrics"""
+
+    def __init__(self, enabled: bool, lru_size: int, call_site_ttls: Dict[str, int]):
+        self.enabled = enabled
+        self.lru_size = max(1, lru_size)
+        self.call_site_ttls = dict(call_site_ttls)
+        # key -> (expires_at, response)
+        self._lru: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.metrics: Dict[str, Dict[str, float]] = {}
+
+    def ttl_for(self, call_site: str) -> int:
+        """TTL for a call site; 0 means the call site has not opted in"""
+        if not self.enabled:
+            return 0
+        return int(self.call_site_ttls.get(call_site, 0) or 0)
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float, system_prompt: str = "") -> str:
+        """Content address for a completion request"""
+        material = "\x1f".join([model, f"{temperature:.3f}", normalize_prompt(system_prompt), normalize_prompt(prompt)])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _stats(self, call_site: str) -> Dict[str, float]:
+        return self.metrics.setdefault(call_site, {
+            'lru_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'saved_seconds': 0.0,
+            'total_miss_latency': 0.0
+        })
+
+    @staticmethod
+    def _redis():
+        try:
+            from .database import redis_client
+            return redis_client
+        except Exception as e:
+            logger.debug(f"[Response Cache] Redis backend unavailable: {str(e)}")
+            return None
+
+    async def get(self, call_site: str, key: str) -> Optional[str]:
+        """Look up a cached response, promoting Redis hits into the LRU"""
+        stats = self._stats(call_site)
+        now = time.time()
+
+        entry = self._lru.get(key)
+        if entry:
+            if entry[0] > now:
+                self._lru.move_to_end(key)
+                stats['lru_hits'] += 1
+                self._credit_saved_time(stats)
+                return entry[1]
+            self._lru.pop(key, None)
+
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_key = f"{REDIS_KEY_PREFIX}{key}"
+                value = redis_client.get(redis_key)
+                if value is not None:
+                    if isinstance(value, bytes):
+                        value = value.decode('utf-8')
+                    remaining = redis_client.ttl(redis_key)
+                    self._remember(key, value, remaining if remaining and remaining > 0 else self.ttl_for(call_site))
+                    stats['redis_hits'] += 1
+                    self._credit_saved_time(stats)
+                    return value
+            except Exception as e:
+                logger.warning(f"[Response Cache] Redis lookup failed for {call_site}: {str(e)}")
+
+        stats['misses'] += 1
+        return None
+
+    async def set(self, call_site: str, key: str, value: str, latency: float = 0.0) -> None:
+        """Store a response under the call site's TTL"""
+        ttl = self.ttl_for(call_site)
+        if ttl <= 0 or value is None:
+            return
+        stats = self._stats(call_site)
+        stats['stores'] += 1
+        stats['total_miss_latency'] += latency
+        self._remember(key, value, ttl)
+
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_client.set(f"{REDIS_KEY_PREFIX}{key}", value, ex=ttl)
+            except Exception as e:
+                logger.warning(f"[Response Cache] Redis store failed for {call_site}: {str(e)}")
+
+    def _remember(self, key: str, value: str, ttl: int) -> None:
+        self._lru[key] = (time.time() + ttl, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    @staticmethod
+    def _credit_saved_time(stats: Dict[str, float]) -> None:
+        # Each hit saves roughly one average API round trip for this call site
+        if stats['stores']:
+            stats['saved_seconds'] += stats['total_miss_latency'] / stats['stores']
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Hit rate and estimated API time saved per call site"""
+        call_sites = {}
+        for call_site, stats in self.metrics.items():
+            hits = stats['lru_hits'] + stats['redis_hits']
+            lookups = hits + stats['misses']
+            call_sites[call_site] = {
+                'lru_hits': stats['lru_hits'],
+                'redis_hits': stats['redis_hits'],
+                'misses': stats['misses'],
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'saved_seconds': round(stats['saved_seconds'], 2)
+            }
+        return {
+            'enabled': self.enabled,
+            'lru_entries': len(self._lru),
+            'call_sites': call_sites
+        }
+
+
+# Global cache instance shared by every cacheable LLM call in this process
+response_cache = ResponseCache(
+    settings.LLM_RESPONSE_CACHE_ENABLED,
+    settings.LLM_RESPONSE_CACHE_LRU_SIZE,
+    settings.LLM_RESPONSE_CACHE_TTLS
+)
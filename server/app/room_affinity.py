@@ -0,0 +1,236 @@
+"""
+Room-affinity deployment mode (ROOM_AFFINITY_ENABLED).
+Rooms are assigned to API worker processes by consistent hashing on room_id, so all
+of a room's sockets, monster behaviour and duels live in one process and can be
+kept in memory without cross-process coordination. Workers register themselves in
+Redis with a heartbeat; the router (app/router.py) and every worker build the same
+hash ring from the live workers. When a worker joins or leaves, only the rooms whose
+owner changed move: the previous owner releases them (closing their sockets with
+ROOM_MOVED_CLOSE_CODE) and clients reconnect through the router to the new owner.
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+WORKERS_KEY = "affinity:workers"  # sorted set: worker id -> last heartbeat
+WORKER_URLS_KEY = "affinity:worker_urls"  # hash: worker id -> internal base URL
+ROOM_MOVED_CLOSE_CODE = 4010  # Room now belongs to another worker; reconnect through the router
+
+ReleaseHandler = Callable[[str], Awaitable[None]]
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring with `replicas` virtual nodes per worker"""
+
+    def __init__(self, workers: Iterable[str] = (), replicas: int = 64):
+        self.replicas = max(1, replicas)
+        self.workers: Set[str] = set()
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for worker_id in workers:
+            self.add(worker_id)
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+    def add(self, worker_id: str) -> None:
+        if worker_id in self.workers:
+            return
+        self.workers.add(worker_id)
+        for replica in range(self.replicas):
+            point = _hash(f"{worker_id}#{replica}")
+            bisect.insort(self._points, point)
+            self._owners[point] = worker_id
+
+    def remove(self, worker_id: str) -> None:
+        if worker_id not in self.workers:
+            return
+        self.workers.discard(worker_id)
+        for replica in range(self.replicas):
+            point = _hash(f"{worker_id}#{replica}")
+            self._points.remove(point)
+            del self._owners[point]
+
+    def owner(self, room_id: str) -> Optional[str]:
+        """The worker a room belongs to: the first virtual node clockwise from its hash"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(room_id)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+class RoomAffinity:
+    """This process's view of the live workers and the rooms each one owns"""
+
+    def __init__(
+        self,
+        worker_id: Optional[str],
+        url: Optional[str],
+        worker_ttl: float,
+        replicas: int,
+        redis_client: Any = None
+    ):
+        # Without a worker id (the router) the ring is only read, never joined
+        self.worker_id = worker_id
+        self.url = url
+        self.worker_ttl = max(1.0, worker_ttl)
+        self.ring = HashRing(replicas=replicas)
+        self.urls: Dict[str, str] = {}
+        self._client = redis_client
+        self._release_handlers: List[ReleaseHandler] = []
+        self._held_rooms: Callable[[], Iterable[str]] = lambda: ()
+        self.metrics: Dict[str, int] = {
+            'rebalances': 0,
+            'rooms_released': 0,
+            'heartbeats': 0
+        }
+
+    def _redis(self):
+        if self._client is not None:
+            return self._client
+        from .database import redis_client
+        return redis_client
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def on_release(self, handler: ReleaseHandler) -> None:
+        """Register a coroutine run for each room this worker stops owning"""
+        self._release_handlers.append(handler)
+
+    def track_rooms(self, held_rooms: Callable[[], Iterable[str]]) -> None:
+        """Tell the rebalance which rooms this worker currently holds state for"""
+        self._held_rooms = held_rooms
+
+    def owner(self, room_id: str) -> Optional[str]:
+        return self.ring.owner(room_id)
+
+    def owner_url(self, room_id: str) -> Optional[str]:
+        owner = self.ring.owner(room_id)
+        return self.urls.get(owner) if owner else None
+
+    def owns(self, room_id: str) -> bool:
+        """True if this worker owns the room, or no ring is known yet (nothing to route to)"""
+        owner = self.ring.owner(room_id)
+        return owner is None or owner == self.worker_id
+
+    def heartbeat(self, now: Optional[float] = None) -> None:
+        if self.worker_id is None:
+            return
+        pipe = self._redis().pipeline()
+        pipe.zadd(WORKERS_KEY, {self.worker_id: time.time() if now is None else now})
+        pipe.hset(WORKER_URLS_KEY, self.worker_id, self.url)
+        pipe.execute()
+        self.metrics['heartbeats'] += 1
+
+    def leave(self) -> None:
+        """Deregister on shutdown so the other workers take over this worker's rooms straight away"""
+        if self.worker_id is None:
+            return
+        pipe = self._redis().pipeline()
+        pipe.zrem(WORKERS_KEY, self.worker_id)
+        pipe.hdel(WORKER_URLS_KEY, self.worker_id)
+        pipe.execute()
+
+    def live_workers(self, now: Optional[float] = None) -> Dict[str, str]:
+        """worker id -> URL for workers that heartbeated within the TTL; dead ones are trimmed"""
+        cutoff = (time.time() if now is None else now) - self.worker_ttl
+        redis_client = self._redis()
+        pipe = redis_client.pipeline()
+        pipe.zrangebyscore(WORKERS_KEY, '-inf', f"({cutoff}")
+        pipe.zremrangebyscore(WORKERS_KEY, '-inf', f"({cutoff}")
+        pipe.zrange(WORKERS_KEY, 0, -1)
+        pipe.hgetall(WORKER_URLS_KEY)
+        dead, _, live, urls = pipe.execute()
+        if dead:
+            redis_client.hdel(WORKER_URLS_KEY, *dead)
+        urls = {self._decode(k): self._decode(v) for k, v in urls.items()}
+        return {worker_id: urls.get(worker_id, '') for worker_id in map(self._decode, live)}
+
+    async def refresh(self, now: Optional[float] = None) -> Tuple[Set[str], Set[str]]:
+        """
+        Rebuild the ring if workers joined or left and release the rooms this worker no
+        longer owns. Returns the (joined, left) worker ids.
+        """
+        workers = self.live_workers(now)
+        self.urls = workers
+        joined = set(workers) - self.ring.workers
+        left = self.ring.workers - set(workers)
+        if not joined and not left:
+            return joined, left
+
+        held = list(self._held_rooms())
+        before = {room_id: self.ring.owner(room_id) for room_id in held}
+        for worker_id in left:
+            self.ring.remove(worker_id)
+        for worker_id in joined:
+            self.ring.add(worker_id)
+        self.metrics['rebalances'] += 1
+        logger.info(f"[Affinity] Ring now has {len(self.ring)} workers (joined {sorted(joined)}, left {sorted(left)})")
+
+        if self.worker_id is not None:
+            for room_id in held:
+                if before[room_id] in (None, self.worker_id) and not self.owns(room_id):
+                    await self._release(room_id)
+        return joined, left
+
+    async def _release(self, room_id: str) -> None:
+        logger.info(f"[Affinity] Room {room_id} moved to worker {self.ring.owner(room_id)}, releasing it")
+        self.metrics['rooms_released'] += 1
+        for handler in self._release_handlers:
+            try:
+                await handler(room_id)
+            except Exception as e:
+                logger.error(f"[Affinity] Error releasing room {room_id}: {str(e)}")
+
+    async def run(self, interval: float) -> None:
+        """Heartbeat and follow ring changes until cancelled"""
+        logger.info(f"[Affinity] Worker {self.worker_id} serving rooms at {self.url}")
+        while True:
+            try:
+                self.heartbeat()
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Affinity] Heartbeat/refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            'worker_id': self.worker_id,
+            'workers': dict(self.urls),
+            'ring_size': len(self.ring)
+        }
+
+
+def create_room_affinity() -> RoomAffinity:
+    """This API worker's affinity, identified by host and pid and reachable at ROOM_AFFINITY_WORKER_URL"""
+    url = settings.ROOM_AFFINITY_WORKER_URL
+    if not url:
+        # A default built from hostname and PORT is shared by every `uvicorn --workers N` process,
+        # so the router would send one worker's rooms to whichever process accepts the connection
+        raise ValueError("ROOM_AFFINITY_WORKER_URL must be set to this worker's own address when ROOM_AFFINITY_ENABLED is on")
+    return RoomAffinity(
+        worker_id=f"{socket.gethostname()}:{os.getpid()}",
+        url=url.rstrip('/'),
+        worker_ttl=settings.ROOM_AFFINITY_WORKER_TTL,
+        replicas=settings.ROOM_AFFINITY_REPLICAS
+    )
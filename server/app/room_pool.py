@@ -0,0 +1,188 @@
+"""
+Pre-generated room content pool.
+Keeps a few ready-made room bundles (text, image prompt, monster/NPC/item specs and
+optionally an image) per biome in Redis, generated while the LLM scheduler is idle,
+so exploring a new coordinate only needs a cheap continuity patch instead of a full
+generation pass.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from .config import settings
+from .llm_scheduler import llm_scheduler
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "room_pool:"
+# Window used to report the refill rate
+REFILL_RATE_WINDOW = 600.0
+
+BundleGenerator = Callable[[str, str, int, int], Awaitable[Dict[str, Any]]]
+
+
+class RoomContentPool:
+    """Per-biome FIFO of room content bundles backed by Redis lists"""
+
+    def __init__(self, enabled: bool, depth: int, idle_poll_seconds: float):
+        self.enabled = enabled
+        self.depth = max(0, depth)
+        self.idle_poll_seconds = max(0.1, idle_poll_seconds)
+        self._refilling: Set[str] = set()
+        # Held so refill tasks are not garbage collected mid-run
+        self._tasks: Set[asyncio.Task] = set()
+        self._known_biomes: Set[str] = set()
+        self._refill_times: Deque[float] = deque()
+        self.metrics: Dict[str, float] = {
+            'claims': 0,
+            'hits': 0,
+            'misses': 0,
+            'total_claim_latency': 0.0,
+            'bundles_generated': 0,
+            'generation_failures': 0
+        }
+
+    @staticmethod
+    def _redis():
+        try:
+            from .database import redis_client
+            return redis_client
+        except Exception as e:
+            logger.debug(f"[Room Pool] Redis backend unavailable: {str(e)}")
+            return None
+
+    @staticmethod
+    def _key(biome: str) -> str:
+        return f"{REDIS_KEY_PREFIX}{biome.lower()}"
+
+    def get_depth(self, biome: str) -> int:
+        """Number of ready bundles for a biome"""
+        redis_client = self._redis()
+        if redis_client is None:
+            return 0
+        try:
+            return int(redis_client.llen(self._key(biome)) or 0)
+        except Exception as e:
+            logger.warning(f"[Room Pool] Could not read depth for {biome}: {str(e)}")
+            return 0
+
+    async def claim(self, biome: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest bundle for a biome, or None if the pool is empty"""
+        if not self.enabled or not biome:
+            return None
+        self._known_biomes.add(biome.lower())
+        started_at = time.time()
+        bundle = None
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                raw = redis_client.lpop(self._key(biome))
+                if raw is not None:
+                    if isinstance(raw, bytes):
+                        raw = raw.decode('utf-8')
+                    bundle = json.loads(raw)
+            except Exception as e:
+                logger.warning(f"[Room Pool] Claim failed for {biome}: {str(e)}")
+                bundle = None
+
+        self.metrics['claims'] += 1
+        self.metrics['total_claim_latency'] += time.time() - started_at
+        if bundle:
+            self.metrics['hits'] += 1
+            logger.info(f"[Room Pool] Claimed bundle '{bundle.get('title', '')}' for biome {biome}")
+        else:
+            self.metrics['misses'] += 1
+            logger.info(f"[Room Pool] No bundle ready for biome {biome}")
+        return bundle
+
+    def add(self, biome: str, bundle: Dict[str, Any]) -> bool:
+        """Append a ready bundle to a biome's pool"""
+        redis_client = self._redis()
+        if redis_client is None:
+            return False
+        try:
+            redis_client.rpush(self._key(biome), json.dumps(bundle))
+            self._known_biomes.add(biome.lower())
+            return True
+        except Exception as e:
+            logger.warning(f"[Room Pool] Could not store bundle for {biome}: {str(e)}")
+            return False
+
+    def request_refill(self, biome: str, biome_description: str, x: int, y: int, generator: BundleGenerator) -> None:
+        """Top up a biome's pool in the background; no-op if a refill is already running"""
+        if not self.enabled or not biome or self.depth == 0:
+            return
+        biome = biome.lower()
+        if biome in self._refilling:
+            return
+        self._refilling.add(biome)
+        task = asyncio.create_task(self._refill(biome, biome_description, x, y, generator))
+        self._tasks.add(task)
+        task.add_done_callback(self._refill_done)
+
+    def _refill_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[Room Pool] Refill task failed: {str(task.exception())}")
+
+    @staticmethod
+    def _scheduler_idle() -> bool:
+        # Only use spare capacity: nobody queued and at most half the background slots busy
+        return llm_scheduler.waiting == 0 and llm_scheduler.in_flight <= llm_scheduler.background_max_concurrency // 2
+
+    async def _refill(self, biome: str, biome_description: str, x: int, y: int, generator: BundleGenerator) -> None:
+        try:
+            while self.get_depth(biome) < self.depth:
+                while not self._scheduler_idle():
+                    await asyncio.sleep(self.idle_poll_seconds)
+
+                generation_start = time.time()
+                try:
+                    bundle = await generator(biome, biome_description, x, y)
+                except Exception as e:
+                    self.metrics['generation_failures'] += 1
+                    logger.error(f"[Room Pool] Bundle generation failed for {biome}: {str(e)}")
+                    return
+
+                if not self.add(biome, bundle):
+                    return
+                self.metrics['bundles_generated'] += 1
+                self._refill_times.append(time.time())
+                logger.info(f"⏱️ [TIMING] [Room Pool] Generated bundle for {biome} in {time.time() - generation_start:.2f}s")
+        finally:
+            self._refilling.discard(biome)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Pool depth per biome, claim hit rate and latency, and refill rate"""
+        now = time.time()
+        while self._refill_times and now - self._refill_times[0] > REFILL_RATE_WINDOW:
+            self._refill_times.popleft()
+
+        claims = self.metrics['claims']
+        return {
+            'enabled': self.enabled,
+            'target_depth': self.depth,
+            'depth': {biome: self.get_depth(biome) for biome in sorted(self._known_biomes)},
+            'refilling': sorted(self._refilling),
+            'claims': claims,
+            'hits': self.metrics['hits'],
+            'misses': self.metrics['misses'],
+            'hit_rate': round(self.metrics['hits'] / claims, 3) if claims else 0.0,
+            'avg_claim_latency_ms': round(self.metrics['total_claim_latency'] / claims * 1000, 2) if claims else 0.0,
+            'bundles_generated': self.metrics['bundles_generated'],
+            'generation_failures': self.metrics['generation_failures'],
+            'refills_per_minute': round(len(self._refill_times) / (REFILL_RATE_WINDOW / 60.0), 3)
+        }
+
+
+# Global pool instance shared by room preloading and movement in this process
+room_content_pool = RoomContentPool(
+    settings.ROOM_POOL_ENABLED,
+    settings.ROOM_POOL_DEPTH,
+    settings.ROOM_POOL_IDLE_POLL_SECONDS
+)
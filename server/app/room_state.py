@@ -0,0 +1,206 @@
+"""
+Versioned room state sync.
+Every room_update broadcast commits the room document to Redis under a monotonically
+increasing version, alongside a short history of JSON patches (RFC 6902 add/remove/
+replace) between consecutive versions. Clients that connect with the version they
+already hold (?room_version=N) get a patch instead of the full room, both on
+(re)connect and for later updates; other clients keep receiving full snapshots.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from redis.exceptions import WatchError
+
+from .config import settings
+from .logger import setup_logging
+from .outbound_queue import OutboundConnection, encode_message
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "room_state:"
+COMMIT_RETRIES = 5
+
+Patch = List[Dict[str, Any]]
+
+
+def _pointer(path: str, key: str) -> str:
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def diff(old: Any, new: Any, path: str = "") -> Patch:
+    """JSON patch turning `old` into `new`; objects are diffed per key, lists and values replaced whole"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: Patch = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({'op': 'add', 'path': _pointer(path, key), 'value': value})
+            elif old[key] != value:
+                ops.extend(diff(old[key], value, _pointer(path, key)))
+        return ops
+    if old == new and type(old) is type(new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply_patch(document: Any, patch: Patch) -> Any:
+    """Apply a patch made by diff(); the document is modified in place where possible"""
+    for op in patch:
+        if op['path'] == "":
+            document = op['value']
+            continue
+        keys = [key.replace('~1', '/').replace('~0', '~') for key in op['path'].split('/')[1:]]
+        target = document
+        for key in keys[:-1]:
+            target = target[key]
+        if op['op'] == 'remove':
+            del target[keys[-1]]
+        else:
+            target[keys[-1]] = op['value']
+    return document
+
+
+class RoomStateStore:
+    """Room versions, latest snapshots and recent patches in Redis"""
+
+    def __init__(self, history: int, ttl: int):
+        self.history = max(1, history)
+        self.ttl = max(60, ttl)
+        self.metrics: Dict[str, int] = {
+            'commits': 0,
+            'unchanged': 0,
+            'patches_sent': 0,
+            'snapshots_sent': 0,
+            'stale_skipped': 0,
+            'patch_bytes': 0,
+            'snapshot_bytes': 0
+        }
+
+    @staticmethod
+    def _redis():
+        from .database import redis_client
+        return redis_client
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    @staticmethod
+    def _keys(room_id: str) -> Tuple[str, str, str]:
+        # The version counter never expires, so versions keep increasing after the snapshot does
+        return f"{KEY_PREFIX}{room_id}:version", f"{KEY_PREFIX}{room_id}:snapshot", f"{KEY_PREFIX}{room_id}:patches"
+
+    def commit(self, room_id: str, room: Dict[str, Any]) -> Tuple[int, Optional[Patch]]:
+        """
+        Record the room's current state. Returns its version and the patch from the previous
+        version (None if unchanged, or if there was no previous snapshot to diff against).
+        """
+        state = orjson.loads(encode_message(room))  # Exactly what clients are sent
+        version_key, snapshot_key, patches_key = self._keys(room_id)
+        with self._redis().pipeline() as pipe:
+            for _ in range(COMMIT_RETRIES):
+                try:
+                    pipe.watch(version_key)
+                    version = int(pipe.get(version_key) or 0)
+                    raw = pipe.get(snapshot_key)
+                    previous = json.loads(self._decode(raw)) if raw else None
+                    if previous is not None and previous.get('version') == version:
+                        if previous['room'] == state:
+                            pipe.unwatch()
+                            self.metrics['unchanged'] += 1
+                            return version, None
+                        patch = diff(previous['room'], state)
+                    else:
+                        patch = None
+
+                    pipe.multi()
+                    pipe.set(version_key, version + 1)
+                    pipe.set(snapshot_key, json.dumps({'version': version + 1, 'room': state}), ex=self.ttl)
+                    if patch is None:
+                        pipe.delete(patches_key)
+                    else:
+                        pipe.rpush(patches_key, json.dumps({'version': version + 1, 'patch': patch}))
+                        pipe.ltrim(patches_key, -self.history, -1)
+                        pipe.expire(patches_key, self.ttl)
+                    pipe.execute()
+                    self.metrics['commits'] += 1
+                    return version + 1, patch
+                except WatchError:
+                    continue
+
+        # Still contended: bump the version without a patch so clients resync from the snapshot
+        logger.warning(f"[Room State] Commit contention on room {room_id}, storing snapshot only")
+        redis_client = self._redis()
+        version = int(redis_client.incr(version_key))
+        redis_client.set(snapshot_key, json.dumps({'version': version, 'room': state}), ex=self.ttl)
+        redis_client.delete(patches_key)
+        self.metrics['commits'] += 1
+        return version, None
+
+    def version(self, room_id: str) -> int:
+        """The room's current version, 0 if it was never committed"""
+        return int(self._redis().get(self._keys(room_id)[0]) or 0)
+
+    def patch_since(self, room_id: str, known_version: int) -> Optional[Tuple[int, Patch]]:
+        """(current version, patch from `known_version`), or None if the history doesn't reach back that far"""
+        _, _, patches_key = self._keys(room_id)
+        redis_client = self._redis()
+        version = self.version(room_id)
+        if known_version == version:
+            return version, []
+        if known_version <= 0 or known_version > version:
+            return None
+        entries = [json.loads(self._decode(raw)) for raw in redis_client.lrange(patches_key, 0, -1)]
+        entries = [entry for entry in entries if entry['version'] > known_version]
+        if not entries or entries[0]['version'] != known_version + 1:
+            return None
+        patch: Patch = []
+        for entry in entries:
+            patch.extend(entry['patch'])
+        return entries[-1]['version'], patch
+
+    @staticmethod
+    def patch_message(room_id: str, base_version: int, version: int, patch: Patch) -> Dict[str, Any]:
+        return {'type': 'room_patch', 'room_id': room_id, 'base_version': base_version, 'version': version, 'patch': patch}
+
+    def select(
+        self,
+        connection: OutboundConnection,
+        snapshot: Dict[str, Any],
+        patch: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Choose what a connection is sent for a versioned room_update: the patch if it holds
+        the base version, else the snapshot; nothing if it already has this version or newer
+        """
+        version = snapshot['version']
+        if connection.room_version is not None and version <= connection.room_version:
+            self.metrics['stale_skipped'] += 1
+            return None
+        use_patch = patch is not None and connection.accepts_patches and connection.room_version == patch['base_version']
+        connection.room_version = version
+        self.metrics['patches_sent' if use_patch else 'snapshots_sent'] += 1
+        return patch if use_patch else snapshot
+
+    def split(self, message: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """A broadcast room_update ({room, version, patch}) as the snapshot and patch messages"""
+        snapshot = {key: value for key, value in message.items() if key != 'patch'}
+        patch = None
+        # Only a commit that moved the version carries a patch; base_version is the one before it
+        if message.get('patch') is not None:
+            patch = self.patch_message(message['room']['id'], message['version'] - 1, message['version'], message['patch'])
+            self.metrics['patch_bytes'] += len(encode_message(patch))
+            self.metrics['snapshot_bytes'] += len(encode_message(snapshot))
+        return snapshot, patch
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, 'history': self.history}
+
+
+# Global store; versions and patches live in Redis and are shared by every process
+room_state = RoomStateStore(settings.ROOM_STATE_PATCH_HISTORY, settings.ROOM_STATE_TTL)
@@ -0,0 +1,217 @@
+"""
+Room-affinity router (run with `uvicorn app.router:app` when ROOM_AFFINITY_ENABLED).
+Clients talk to the router instead of the API workers. It follows the same hash ring
+as the workers (from their Redis heartbeats) and forwards each request to the worker
+that owns the room it is about: WebSockets by the room in their path, actions and
+other requests by a `room_id` in their JSON body or query string. Requests without a
+room go to a worker chosen by hashing their path. Responses, including SSE streams,
+are relayed as they arrive.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+import aiohttp
+import redis
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .config import settings
+from .logger import setup_logging
+from .room_affinity import RoomAffinity
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Connection-level headers that must not be forwarded between hops
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailers',
+    'transfer-encoding', 'upgrade', 'host', 'content-length'
+}
+
+
+def route_room(path: str, query: Mapping[str, str], body: bytes, content_type: Optional[str]) -> Optional[str]:
+    """The room a request should be routed by, if it names one"""
+    parts = path.strip('/').split('/')
+    if len(parts) >= 3 and parts[0] == 'ws':
+        return parts[1]
+    if body and content_type and 'json' in content_type:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and payload.get('room_id'):
+            return str(payload['room_id'])
+    return query.get('room_id') or None
+
+
+def forward_headers(headers: Mapping[str, str]) -> Dict[str, str]:
+    return {name: value for name, value in headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+
+
+class AffinityRouter:
+    """Picks the owning worker and relays HTTP and WebSocket traffic to it"""
+
+    def __init__(self, affinity: RoomAffinity):
+        self.affinity = affinity
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.metrics: Dict[str, int] = {
+            'http_forwarded': 0,
+            'websockets_forwarded': 0,
+            'no_worker': 0,
+            'upstream_errors': 0
+        }
+
+    def target(self, room_id: Optional[str], path: str) -> Optional[str]:
+        """Base URL of the room's owner, or of the worker a room-less path hashes to"""
+        owner = self.affinity.owner(room_id or f"path:{path}")
+        return self.affinity.urls.get(owner) if owner else None
+
+    async def start(self) -> None:
+        # No total timeout: SSE action streams stay open for as long as the action runs
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10),
+            auto_decompress=False  # Bodies are relayed with the worker's Content-Encoding untouched
+        )
+        await self.affinity.refresh()
+
+    async def stop(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+    async def run(self, interval: float) -> None:
+        """Follow workers joining and leaving until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.affinity.refresh()
+            except Exception as e:
+                logger.error(f"[Router] Ring refresh failed: {str(e)}")
+
+    async def forward_http(self, path: str, request: Request):
+        body = await request.body()
+        room_id = route_room(path, request.query_params, body, request.headers.get('content-type'))
+        base = self.target(room_id, path)
+        if base is None:
+            self.metrics['no_worker'] += 1
+            return JSONResponse(status_code=503, content={"detail": "No game server available"})
+
+        try:
+            upstream = await self.session.request(
+                request.method,
+                f"{base}/{path}",
+                params=list(request.query_params.multi_items()),
+                headers=forward_headers(request.headers),
+                data=body,
+                allow_redirects=False
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"[Router] {request.method} /{path} to {base} failed: {str(e)}")
+            self.metrics['upstream_errors'] += 1
+            return JSONResponse(status_code=502, content={"detail": "Game server unavailable"})
+        self.metrics['http_forwarded'] += 1
+
+        async def relay():
+            try:
+                async for chunk in upstream.content.iter_any():
+                    yield chunk
+            finally:
+                upstream.release()
+
+        return StreamingResponse(relay(), status_code=upstream.status, headers=forward_headers(upstream.headers))
+
+    async def forward_websocket(self, websocket: WebSocket, room_id: str, path: str) -> None:
+        base = self.target(room_id, path)
+        query = websocket.url.query
+        url = f"{base.replace('http', 'ws', 1)}/{path}{'?' + query if query else ''}" if base else None
+        try:
+            if url is None:
+                raise aiohttp.ClientError("no worker owns this room")
+            upstream = await self.session.ws_connect(url, autoping=True)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"[Router] WebSocket for room {room_id} not forwarded: {str(e)}")
+            self.metrics['no_worker' if url is None else 'upstream_errors'] += 1
+            # Accept first so the client gets the close code rather than a failed handshake
+            await websocket.accept()
+            await websocket.close(code=1013)
+            return
+
+        await websocket.accept()
+        self.metrics['websockets_forwarded'] += 1
+
+        async def client_to_worker():
+            while True:
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    return
+                if message.get('text') is not None:
+                    await upstream.send_str(message['text'])
+                elif message.get('bytes') is not None:
+                    await upstream.send_bytes(message['bytes'])
+
+        async def worker_to_client():
+            async for message in upstream:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    await websocket.send_text(message.data)
+                elif message.type == aiohttp.WSMsgType.BINARY:
+                    await websocket.send_bytes(message.data)
+                else:
+                    break
+
+        tasks = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Pass the worker's close code on (e.g. ROOM_MOVED_CLOSE_CODE) so the client knows to reconnect
+            code = upstream.close_code or 1000
+            await upstream.close()
+            try:
+                await websocket.close(code=code)
+            except Exception:
+                pass  # Client already gone
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, 'workers': dict(self.affinity.urls), 'ring_size': len(self.affinity.ring)}
+
+
+# The router only reads the ring; it holds no rooms and does not need the game database
+router = AffinityRouter(RoomAffinity(
+    worker_id=None,
+    url=None,
+    worker_ttl=settings.ROOM_AFFINITY_WORKER_TTL,
+    replicas=settings.ROOM_AFFINITY_REPLICAS,
+    redis_client=redis.from_url(settings.REDIS_URL)
+))
+
+app = FastAPI(title="AI MUD Game Router")
+
+
+@app.on_event("startup")
+async def startup_event():
+    await router.start()
+    asyncio.create_task(router.run(settings.ROOM_AFFINITY_HEARTBEAT))
+    logger.info(f"[Router] Routing rooms over {len(router.affinity.ring)} workers")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await router.stop()
+
+
+@app.get("/router/status")
+async def router_status():
+    """Live workers and forwarding counters"""
+    return router.get_metrics()
+
+
+@app.websocket("/ws/{room_id}/{player_id}")
+async def forward_websocket(websocket: WebSocket, room_id: str, player_id: str):
+    await router.forward_websocket(websocket, room_id, f"ws/{room_id}/{player_id}")
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"])
+async def forward_http(path: str, request: Request):
+    return await router.forward_http(path, request)
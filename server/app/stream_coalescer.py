@@ -0,0 +1,201 @@
+"""
+Coalescing of narrative text deltas between the AI stream and the transport.
+The model streams a few characters per delta, and each delta used to become its
+own SSE/WebSocket event with its own JSON encoding, framing and INFO log lines.
+Deltas are now buffered and flushed as one text event every N ms, every M bytes
+or at the end of a sentence, whichever comes first; non-text items (room_data,
+final payloads) flush the buffer and pass through unchanged. Per-action timing is
+only taken for a sample of actions, and logged as one line per sampled action.
+"""
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Union
+
+from .config import settings
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+StreamItem = Union[str, Dict[str, Any]]
+
+# Sentence end: terminal punctuation, optionally closed by quotes/brackets, or a line break
+SENTENCE_END = re.compile(r'(?:[.!?…]["\'”’)\]]*|\n)\s*$')
+
+
+class StreamTrace:
+    """Counters for one action's narrative stream; timings only when sampled"""
+
+    __slots__ = ('sampled', 'started', 'deltas', 'events', 'bytes', 'first_event_ms', 'max_gap_ms', '_last_event')
+
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.started = time.perf_counter() if sampled else 0.0
+        self.deltas = 0
+        self.events = 0
+        self.bytes = 0
+        self.first_event_ms: Optional[float] = None
+        self.max_gap_ms = 0.0
+        self._last_event: Optional[float] = None
+
+    def event(self, size: int) -> None:
+        self.events += 1
+        self.bytes += size
+        if self.sampled:
+            now = time.perf_counter()
+            if self._last_event is None:
+                self.first_event_ms = (now - self.started) * 1000
+            else:
+                self.max_gap_ms = max(self.max_gap_ms, (now - self._last_event) * 1000)
+            self._last_event = now
+
+
+class StreamMetrics:
+    """Aggregate narrative stream counters, with timing sampled per action"""
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.metrics: Dict[str, Any] = {
+            'actions': 0,
+            'deltas': 0,
+            'events': 0,
+            'bytes': 0,
+            'sampled_actions': 0,
+            'sampled_first_event_ms': 0.0,
+            'sampled_max_gap_ms': 0.0
+        }
+
+    def trace(self) -> StreamTrace:
+        return StreamTrace(random.random() < self.sample_rate)
+
+    def finish(self, trace: StreamTrace) -> None:
+        self.metrics['actions'] += 1
+        self.metrics['deltas'] += trace.deltas
+        self.metrics['events'] += trace.events
+        self.metrics['bytes'] += trace.bytes
+        if trace.sampled and trace.first_event_ms is not None:
+            self.metrics['sampled_actions'] += 1
+            self.metrics['sampled_first_event_ms'] += trace.first_event_ms
+            self.metrics['sampled_max_gap_ms'] = max(self.metrics['sampled_max_gap_ms'], trace.max_gap_ms)
+            logger.info(
+                f"⏱️ [TIMING] Narrative stream: {trace.deltas} deltas -> {trace.events} events, "
+                f"first event {trace.first_event_ms:.2f}ms, max gap {trace.max_gap_ms:.2f}ms"
+            )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        actions = self.metrics['actions'] or 1
+        sampled = self.metrics['sampled_actions'] or 1
+        return {
+            **self.metrics,
+            'events_per_action': round(self.metrics['events'] / actions, 2),
+            'deltas_per_event': round(self.metrics['deltas'] / (self.metrics['events'] or 1), 2),
+            'avg_first_event_ms': round(self.metrics['sampled_first_event_ms'] / sampled, 2),
+            'sample_rate': self.sample_rate
+        }
+
+
+async def coalesce_narrative(
+    stream: AsyncIterator[StreamItem],
+    flush_ms: float,
+    flush_bytes: int,
+    on_sentence: bool = True,
+    metrics: Optional[StreamMetrics] = None
+) -> AsyncIterator[StreamItem]:
+    """
+    Re-yield `stream` with consecutive text deltas merged. A buffer is flushed once it
+    is `flush_ms` old (even if the model stalls), reaches `flush_bytes`, or ends a
+    sentence. flush_ms <= 0 passes every delta straight through.
+    """
+    trace = metrics.trace() if metrics else StreamTrace(False)
+    if flush_ms <= 0:
+        try:
+            async for item in stream:
+                if isinstance(item, str):
+                    trace.deltas += 1
+                    trace.event(len(item.encode('utf-8')))
+                yield item
+        finally:
+            if metrics:
+                metrics.finish(trace)
+        return
+
+    # A pump task reads the model stream into `buffer`; flushes move merged text to `ready`,
+    # and a timer flushes text the model has stopped adding to
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    ready: Deque[StreamItem] = deque()
+    wake = asyncio.Event()
+    state: Dict[str, Any] = {'size': 0, 'timer': None, 'done': False, 'error': None}
+
+    def flush() -> None:
+        if state['timer'] is not None:
+            state['timer'].cancel()
+            state['timer'] = None
+        if buffer:
+            ready.append("".join(buffer))
+            trace.event(state['size'])
+            buffer.clear()
+            state['size'] = 0
+        wake.set()
+
+    async def pump() -> None:
+        try:
+            async for item in stream:
+                if isinstance(item, str):
+                    if not item:
+                        continue
+                    trace.deltas += 1
+                    if not buffer:
+                        state['timer'] = loop.call_later(flush_ms / 1000, flush)
+                    buffer.append(item)
+                    state['size'] += len(item.encode('utf-8'))
+                    if state['size'] >= flush_bytes or (on_sentence and SENTENCE_END.search(item)):
+                        flush()
+                else:
+                    flush()
+                    ready.append(item)
+        except Exception as e:
+            state['error'] = e
+        finally:
+            state['done'] = True
+            flush()
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            await wake.wait()
+            wake.clear()
+            while ready:
+                yield ready.popleft()
+            if state['done'] and not ready:
+                break
+        if state['error'] is not None:
+            raise state['error']
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if metrics:
+            metrics.finish(trace)
+
+
+def coalesce_action_stream(stream: AsyncIterator[StreamItem]) -> AsyncIterator[StreamItem]:
+    """coalesce_narrative with the configured flush thresholds and the global metrics"""
+    return coalesce_narrative(
+        stream,
+        flush_ms=settings.STREAM_COALESCE_MS,
+        flush_bytes=settings.STREAM_COALESCE_BYTES,
+        on_sentence=settings.STREAM_COALESCE_ON_SENTENCE,
+        metrics=stream_metrics
+    )
+
+
+# Global narrative stream metrics, exposed at /debug/narrative-stream
+stream_metrics = StreamMetrics(settings.STREAM_TIMING_SAMPLE_RATE)
@@ -0,0 +1,168 @@
+"""
+Structured output helpers for JSON-producing LLM calls.
+Builds provider response_format JSON schemas from our Pydantic output models,
+repairs near-miss JSON without another round trip, and counts repairs and
+re-generations per call site.
+"""
+import json
+import logging
+import re
+from copy import deepcopy
+from functools import lru_cache
+from typing import Any, Dict, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from .logger import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Keywords the provider's strict schema mode does not accept
+UNSUPPORTED_SCHEMA_KEYS = ("default", "title", "examples")
+
+
+class StructuredOutputError(Exception):
+    """Raised when no valid structured response could be produced"""
+    pass
+
+
+def _strictify(schema: Dict[str, Any]) -> bool:
+    """Close every object schema in place; returns False if a free-form map makes strict mode impossible"""
+    strict = True
+    for key in UNSUPPORTED_SCHEMA_KEYS:
+        schema.pop(key, None)
+
+    properties = schema.get("properties")
+    if isinstance(properties, dict):
+        for field_schema in properties.values():
+            strict = _strictify(field_schema) and strict
+        schema["required"] = list(properties.keys())
+        schema["additionalProperties"] = False
+    elif isinstance(schema.get("additionalProperties"), dict):
+        # Dict[str, X] fields have no fixed keys, which strict mode cannot express
+        _strictify(schema["additionalProperties"])
+        strict = False
+
+    if isinstance(schema.get("items"), dict):
+        strict = _strictify(schema["items"]) and strict
+    for option in schema.get("anyOf", []):
+        strict = _strictify(option) and strict
+    for def_schema in schema.get("$defs", {}).values():
+        strict = _strictify(def_schema) and strict
+    return strict
+
+
+@lru_cache(maxsize=None)
+def response_format_for(output_model: Type[BaseModel]) -> Dict[str, Any]:
+    """OpenAI response_format payload for an output model (built once per model)"""
+    schema = deepcopy(output_model.model_json_schema())
+    strict = _strictify(schema)
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": output_model.__name__,
+            "schema": schema,
+            "strict": strict
+        }
+    }
+
+
+def repair_json(text: str) -> Tuple[Any, bool]:
+    """Parse JSON, fixing the usual LLM mistakes; returns (data, repaired)"""
+    if not text or not text.strip():
+        raise ValueError("Empty response")
+
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    cleaned = text.strip()
+    # Markdown code fences
+    cleaned = re.sub(r'^```(?:json)?\s*|\s*```$', '', cleaned)
+    # Prose before/after the JSON value
+    starts = [idx for idx in (cleaned.find('{'), cleaned.find('[')) if idx >= 0]
+    if not starts:
+        raise ValueError("No JSON object found in response")
+    cleaned = cleaned[min(starts):]
+    last = max(cleaned.rfind('}'), cleaned.rfind(']'))
+    if last >= 0:
+        try:
+            # strict=False accepts raw control characters (e.g. newlines) inside strings
+            return json.loads(cleaned[:last + 1], strict=False), True
+        except json.JSONDecodeError:
+            pass
+
+    # Trailing commas and Python literals
+    cleaned = re.sub(r',\s*([}\]])', r'\1', cleaned)
+    cleaned = re.sub(r'\bTrue\b', 'true', cleaned)
+    cleaned = re.sub(r'\bFalse\b', 'false', cleaned)
+    cleaned = re.sub(r'\bNone\b', 'null', cleaned)
+
+    # Truncated output: close whatever is still open
+    stack = []
+    in_string = False
+    escaped = False
+    for char in cleaned:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    if in_string:
+        cleaned += '"'
+    cleaned = re.sub(r',\s*$', '', cleaned) + ''.join(reversed(stack))
+
+    try:
+        return json.loads(cleaned, strict=False), True
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Unrepairable JSON: {str(e)}")
+
+
+def parse_structured(text: str, output_model: Type[BaseModel]) -> Tuple[Dict[str, Any], bool]:
+    """Repair and validate a response against an output model; raises ValueError if invalid"""
+    data, repaired = repair_json(text)
+    try:
+        return output_model.model_validate(data).model_dump(), repaired
+    except ValidationError as e:
+        raise ValueError(f"Response does not match {output_model.__name__}: {str(e)}")
+
+
+class StructuredOutputMetrics:
+    """Per call site counters for first-try successes, repairs, re-generations and failures"""
+
+    def __init__(self):
+        self.call_sites: Dict[str, Dict[str, int]] = {}
+
+    def record(self, call_site: str, attempts: int, success: bool, repaired: bool = False) -> None:
+        stats = self.call_sites.setdefault(call_site, {
+            'calls': 0,
+            'first_try': 0,
+            'repaired': 0,
+            'regenerations': 0,
+            'failures': 0
+        })
+        stats['calls'] += 1
+        stats['regenerations'] += max(0, attempts - 1)
+        if not success:
+            stats['failures'] += 1
+        elif repaired:
+            stats['repaired'] += 1
+        elif attempts == 1:
+            stats['first_try'] += 1
+
+    def get_report(self) -> Dict[str, Dict[str, int]]:
+        return {call_site: dict(stats) for call_site, stats in self.call_sites.items()}
+
+
+# Global metrics instance shared by every structured LLM call in this process
+structured_output_metrics = StructuredOutputMetrics()
@@ -2,16 +2,23 @@
 AI-driven item generation
 """
 from typing import Dict, Any
-import json
-import re
 import random
+import logging
 from .base import ItemTemplate
 from ..ai_handler import WORLD_CONFIG
+from ..models import ItemOutput
+from ..structured_output import repair_json
+
+# Get logger for this module
+logger = logging.getLogger(__name__)
 
 
 class AIItemGenerator(ItemTemplate):
     """Fully AI-driven item generator"""
     
+    # Structured output schema for generation
+    output_model = ItemOutput
+    
     def __init__(self):
         super().__init__("ai_item")
         
@@ -267,79 +274,41 @@ ITEMS TO COMBINE:
     
     async def parse_response(self, response: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Parse the AI response into structured data"""
-        if context is None:
-            context = {}
+        data, repaired = repair_json(response)
+        if repaired:
+            logger.info("[Item Generation] Repaired malformed item JSON")
+        return self.normalize_output(data)
+    
+    def normalize_output(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Clean parsed item data; raises ValueError if required fields are missing"""
+        if not isinstance(data, dict):
+            raise ValueError("Item response is not a JSON object")
         
-        # Retry mechanism for JSON parsing
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Try to extract JSON from the response
-                json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                if json_match:
-                    data = json.loads(json_match.group())
-                else:
-                    # Fallback: try to parse the entire response as JSON
-                    data = json.loads(response)
-                
-                # Ensure required fields exist
-                required_fields = ['name', 'rarity', 'description', 'capabilities']
-                for field in required_fields:
-                    if field not in data:
-                        raise ValueError(f"Missing required field: {field}")
-                
-                # Validate rarity is in correct range
-                rarity = data['rarity']
-                if not isinstance(rarity, int) or rarity < 1 or rarity > 4:
-                    rarity = 2  # Default to common if invalid
-                
-                # Ensure capabilities is a list
-                capabilities = data['capabilities']
-                if isinstance(capabilities, str):
-                    # If it's a string, split it into a list
-                    capabilities = [cap.strip() for cap in capabilities.split(',')]
-                elif not isinstance(capabilities, list):
-                    capabilities = ["unknown capability"]
-                
-                # Build clean item data
-                item_data = {
-                    'name': data['name'].strip(),
-                    'rarity': rarity,
-                    'description': data['description'].strip(),
-                    'capabilities': capabilities
-                }
-                
-                return item_data
-                
-            except json.JSONDecodeError as e:
-                logger.warning(f"[Item Generation] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries - 1:
-                    # Final attempt failed, raise the error
-                    logger.error(f"[Item Generation] All {max_retries} attempts failed, raising error")
-                    raise
-                else:
-                    # Wait a bit before retrying
-                    await asyncio.sleep(0.5)
-                    continue
-                    
-            except Exception as e:
-                logger.error(f"[Item Generation] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries - 1:
-                    # Final attempt failed, raise the error
-                    logger.error(f"[Item Generation] All {max_retries} attempts failed due to unexpected error, raising error")
-                    raise
-                else:
-                    # Wait a bit before retrying
-                    await asyncio.sleep(0.5)
-                    continue
+        # Ensure required fields exist
+        required_fields = ['name', 'rarity', 'description', 'capabilities']
+        for field in required_fields:
+            if field not in data:
+                raise ValueError(f"Missing required field: {field}")
+        
+        # Validate rarity is in correct range
+        rarity = data['rarity']
+        if not isinstance(rarity, int) or rarity < 1 or rarity > 4:
+            rarity = 2  # Default to common if invalid
+        
+        # Ensure capabilities is a list
+        capabilities = data['capabilities']
+        if isinstance(capabilities, str):
+            # If it's a string, split it into a list
+            capabilities = [cap.strip() for cap in capabilities.split(',')]
+        elif not isinstance(capabilities, list):
+            capabilities = ["unknown capability"]
         
-        # If we get here, all retries failed - return fallback item
-        logger.error(f"[Item Generation] All retry attempts failed, returning fallback item")
+        # Build clean item data
         return {
-            'name': 'Mysterious Item',
-            'rarity': 1,
-            'description': 'An unknown object that appeared from the void.',
-            'capabilities': ['unknown capability']
+            'name': data['name'].strip(),
+            'rarity': rarity,
+            'description': data['description'].strip(),
+            'capabilities': capabilities
         }
     
     def validate_output(self, output: Dict[str, Any]) -> bool:
@@ -366,8 +335,8 @@ ITEMS TO COMBINE:
         
         return True
     
-    async def generate_item(self, ai_handler, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Generate a complete item using AI"""
+    async def generate_item(self, ai_handler, context: Dict[str, Any] = None, background: bool = False) -> Dict[str, Any]:
+        """Generate a complete item using AI; `background` items (room population) use the background LLM lane"""
         if context is None:
             context = {}
         
@@ -375,8 +344,10 @@ ITEMS TO COMBINE:
         
         try:
             # Generate item using AI
-            ai_response = await ai_handler.generate_text(prompt)
-            item_data = await self.parse_response(ai_response, context)
+            generated = await ai_handler.generate_structured(
+                prompt, self.output_model, call_site="item_generation", background=background
+            )
+            item_data = self.normalize_output(generated)
             
             # Validate the output
             if self.validate_output(item_data):
@@ -1,13 +1,12 @@
 """
 Monster templates for AI generation - Simplified Direct Generation
 """
-from typing import Dict, Any
-import json
-import re
+from typing import Dict, Any, List, Optional, Tuple, Union
 import random
-import asyncio
 import logging
 from .base import MonsterTemplate
+from ..models import MonsterOutput, MonsterBatchOutput
+from ..structured_output import repair_json
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -16,6 +15,10 @@ logger = logging.getLogger(__name__)
 class GenericMonsterTemplate(MonsterTemplate):
     """Template for generating monsters directly without types"""
     
+    # Structured output schemas for single and batched generation
+    output_model = MonsterOutput
+    batch_output_model = MonsterBatchOutput
+    
     def __init__(self):
         super().__init__("generic_monster")
         
@@ -59,6 +62,33 @@ Example response:
 
     def generate_prompt(self, context: Dict[str, Any]) -> str:
         """Generate the prompt for the AI with varied naming styles"""
+        naming_guidance, environment_info, attributes_info = self._build_prompt_sections(context)
+        
+        prompt = f"{self.system_prompt}\n\n{naming_guidance}\n\n{environment_info}{attributes_info}\nGenerate a monster that fits this context:"
+        
+        return prompt
+
+    def generate_batch_prompt(self, contexts: List[Dict[str, Any]]) -> str:
+        """Generate one prompt that asks for several monsters sharing the same room"""
+        _, environment_info, _ = self._build_prompt_sections(contexts[0])
+        
+        slots = []
+        for index, context in enumerate(contexts, start=1):
+            naming_guidance, _, attributes_info = self._build_prompt_sections(context)
+            slots.append(f"MONSTER {index}:\n{naming_guidance}\n{attributes_info}")
+        
+        prompt = (
+            f"{self.system_prompt}\n\n"
+            f"Generate {len(contexts)} DIFFERENT monsters for the same location. Each one must have a distinct name and appearance.\n"
+            f"Respond with a JSON object of the form {{\"monsters\": [...]}} containing exactly {len(contexts)} monsters in the order listed below, "
+            f"each with the fields \"slot\" (the number of the MONSTER it is for), \"name\", \"description\" and \"special_effects\".\n\n"
+            f"{environment_info}\n" + "\n".join(slots) + "\nGenerate the monsters:"
+        )
+        
+        return prompt
+
+    def _build_prompt_sections(self, context: Dict[str, Any]) -> Tuple[str, str, str]:
+        """Build the naming, environment and attribute sections of a monster prompt"""
         # Choose a random naming style for variety
         naming_style = random.choice(self.naming_styles)
         
@@ -101,9 +131,7 @@ Example response:
         # Add naming style guidance
         naming_guidance = self._get_naming_guidance(naming_style, context.get('biome', 'unknown'))
         
-        prompt = f"{self.system_prompt}\n\n{naming_guidance}\n\n{environment_info}{attributes_info}\nGenerate a monster that fits this context:"
-        
-        return prompt
+        return naming_guidance, environment_info, attributes_info
     
     def _get_naming_guidance(self, style: str, biome: str) -> str:
         """Get specific naming guidance based on the chosen style"""
@@ -121,81 +149,74 @@ Example response:
         
         return guidance_map.get(style, guidance_map["descriptive"])
 
+    def fallback_output(self) -> Dict[str, Any]:
+        """Monster used when generation produced nothing usable"""
+        return {
+            "name": "Mysterious Creature",
+            "description": "A strange being that appeared from the shadows.",
+            "special_effects": "",
+            "size": "human",
+            "aggressiveness": "neutral",
+            "intelligence": "animal"
+        }
+
     async def parse_response(self, response: str) -> Dict[str, Any]:
         """Parse the AI response into structured data"""
         try:
-            # Clean up the response
-            response = response.strip()
-            
-            # Try to extract JSON from the response with retry mechanism
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group()
-                        data = json.loads(json_str)
-                        
-                        # Ensure required fields exist
-                        if "name" not in data:
-                            data["name"] = "Unknown Monster"
-                        if "description" not in data:
-                            data["description"] = "A mysterious creature."
-                        if "special_effects" not in data:
-                            data["special_effects"] = ""
-                        
-                        return data
-                    else:
-                        if attempt == max_retries - 1:
-                            raise ValueError("No JSON found in response")
-                        else:
-                            # Wait a bit before retrying
-                            await asyncio.sleep(0.5)
-                            continue
-                            
-                except json.JSONDecodeError as e:
-                    logger.warning(f"[Monster Generation] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        # Final attempt failed, return fallback monster
-                        logger.error(f"[Monster Generation] All {max_retries} attempts failed, using fallback monster")
-                        return {
-                            "name": "Mysterious Creature",
-                            "description": "A strange being that appeared from the shadows.",
-                            "special_effects": "",
-                            "size": "human",
-                            "aggressiveness": "neutral",
-                            "intelligence": "animal"
-                        }
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
-                        
-                except Exception as e:
-                    logger.error(f"[Monster Generation] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        # Final attempt failed, return fallback monster
-                        logger.error(f"[Monster Generation] All {max_retries} attempts failed due to unexpected error, using fallback monster")
-                        return {
-                            "name": "Mysterious Creature",
-                            "description": "A strange being that appeared from the shadows.",
-                            "special_effects": "",
-                            "size": "human",
-                            "aggressiveness": "neutral",
-                            "intelligence": "animal"
-                        }
-                    else:
-                        # Wait a bit before retrying
-                        await asyncio.sleep(0.5)
-                        continue
-                
-        except (json.JSONDecodeError, ValueError) as e:
-            # Fallback parsing
-            return {
-                "name": "Generated Monster",
-                "description": "A mysterious creature that appeared in the world.",
-                "special_effects": ""
-            }
+            data, repaired = repair_json(response)
+            if repaired:
+                logger.info("[Monster Generation] Repaired malformed monster JSON")
+            if not isinstance(data, dict):
+                raise ValueError("Monster response is not a JSON object")
+        except ValueError as e:
+            logger.error(f"[Monster Generation] Could not parse monster response, using fallback monster: {str(e)}")
+            return self.fallback_output()
+
+        # Ensure required fields exist
+        if "name" not in data:
+            data["name"] = "Unknown Monster"
+        if "description" not in data:
+            data["description"] = "A mysterious creature."
+        if "special_effects" not in data:
+            data["special_effects"] = ""
+
+        return data
+
+    def parse_batch_response(self, response: Union[str, Dict[str, Any]], expected_count: int) -> List[Optional[Dict[str, Any]]]:
+        """Parse a batched monster response into one entry per requested monster.
+
+        Accepts the raw response text or already-parsed structured output.
+        Entries are placed by their "slot" number (by position if they have
+        none); slots with no valid entry are None, so the caller can generate
+        exactly those individually.
+        """
+        monsters: List[Optional[Dict[str, Any]]] = [None] * expected_count
+        data = response
+        if isinstance(response, str):
+            try:
+                data, _ = repair_json(response)
+            except ValueError as e:
+                logger.warning(f"[Monster Generation] Batch JSON parsing failed: {str(e)}")
+                return monsters
+        
+        if isinstance(data, dict):
+            data = data.get("monsters", [])
+        if not isinstance(data, list):
+            return monsters
+        
+        for position, entry in enumerate(data):
+            if not isinstance(entry, dict):
+                continue
+            slot = entry.pop("slot", None)
+            index = slot - 1 if isinstance(slot, int) else position
+            if not 0 <= index < expected_count or monsters[index] is not None:
+                continue
+            if not str(entry.get("name", "")).strip() or not str(entry.get("description", "")).strip():
+                continue
+            entry.setdefault("special_effects", "")
+            monsters[index] = entry
+        
+        return monsters
 
     def validate_output(self, output: Dict[str, Any]) -> bool:
         """Validate that the output meets template requirements"""
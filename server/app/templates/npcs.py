@@ -2,12 +2,11 @@
 NPC templates for AI generation
 """
 from typing import Dict, Any
-import json
-import re
 import random
-import asyncio
 import logging
 from .base import BaseTemplate
+from ..models import NPCOutput
+from ..structured_output import repair_json
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -23,6 +22,9 @@ class NPCTemplate(BaseTemplate):
 class GenericNPCTemplate(NPCTemplate):
     """Template for generating NPCs with personalities and backstories"""
 
+    # Structured output schema for generation
+    output_model = NPCOutput
+
     def __init__(self):
         super().__init__("generic_npc")
 
@@ -109,86 +111,44 @@ Example response:
 
         return guidance_map.get(archetype, guidance_map["local"])
 
+    def fallback_output(self) -> Dict[str, Any]:
+        """NPC used when generation produced nothing usable"""
+        return {
+            "name": "Mysterious Stranger",
+            "description": "A figure stands here, shrouded in shadow.",
+            "backstory": "This person's origins are unknown.",
+            "dialogue_style": "speaks softly and carefully",
+            "knowledge": "unknown",
+            "quest_hint": ""
+        }
+
     async def parse_response(self, response: str) -> Dict[str, Any]:
         """Parse the AI response into structured data"""
         try:
-            # Clean up the response
-            response = response.strip()
-
-            # Try to extract JSON from the response with retry mechanism
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group()
-                        data = json.loads(json_str)
-
-                        # Ensure required fields exist with fallbacks
-                        if "name" not in data:
-                            data["name"] = "Mysterious Stranger"
-                        if "description" not in data:
-                            data["description"] = "A person stands here, watching you curiously."
-                        if "backstory" not in data:
-                            data["backstory"] = "Little is known about this person's past."
-                        if "dialogue_style" not in data:
-                            data["dialogue_style"] = "speaks plainly and directly"
-                        if "knowledge" not in data:
-                            data["knowledge"] = "local area and recent events"
-                        if "quest_hint" not in data:
-                            data["quest_hint"] = ""
-
-                        return data
-                    else:
-                        if attempt == max_retries - 1:
-                            raise ValueError("No JSON found in response")
-                        else:
-                            await asyncio.sleep(0.5)
-                            continue
-
-                except json.JSONDecodeError as e:
-                    logger.warning(f"[NPC Generation] JSON parsing failed on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        # Final attempt failed, return fallback NPC
-                        logger.error(f"[NPC Generation] All {max_retries} attempts failed, using fallback NPC")
-                        return {
-                            "name": "Mysterious Stranger",
-                            "description": "A figure stands here, shrouded in shadow.",
-                            "backstory": "This person's origins are unknown.",
-                            "dialogue_style": "speaks softly and carefully",
-                            "knowledge": "unknown",
-                            "quest_hint": ""
-                        }
-                    else:
-                        await asyncio.sleep(0.5)
-                        continue
-
-                except Exception as e:
-                    logger.error(f"[NPC Generation] Unexpected error on attempt {attempt + 1}: {str(e)}")
-                    if attempt == max_retries - 1:
-                        logger.error(f"[NPC Generation] All {max_retries} attempts failed due to unexpected error, using fallback NPC")
-                        return {
-                            "name": "Mysterious Stranger",
-                            "description": "A figure stands here, shrouded in shadow.",
-                            "backstory": "This person's origins are unknown.",
-                            "dialogue_style": "speaks softly and carefully",
-                            "knowledge": "unknown",
-                            "quest_hint": ""
-                        }
-                    else:
-                        await asyncio.sleep(0.5)
-                        continue
-
-        except (json.JSONDecodeError, ValueError) as e:
-            # Final fallback parsing
-            return {
-                "name": "Generated NPC",
-                "description": "A person stands here.",
-                "backstory": "Their past is a mystery.",
-                "dialogue_style": "speaks plainly",
-                "knowledge": "local area",
-                "quest_hint": ""
-            }
+            data, repaired = repair_json(response)
+            if repaired:
+                logger.info("[NPC Generation] Repaired malformed NPC JSON")
+            if not isinstance(data, dict):
+                raise ValueError("NPC response is not a JSON object")
+        except ValueError as e:
+            logger.error(f"[NPC Generation] Could not parse NPC response, using fallback NPC: {str(e)}")
+            return self.fallback_output()
+
+        # Ensure required fields exist with fallbacks
+        if "name" not in data:
+            data["name"] = "Mysterious Stranger"
+        if "description" not in data:
+            data["description"] = "A person stands here, watching you curiously."
+        if "backstory" not in data:
+            data["backstory"] = "Little is known about this person's past."
+        if "dialogue_style" not in data:
+            data["dialogue_style"] = "speaks plainly and directly"
+        if "knowledge" not in data:
+            data["knowledge"] = "local area and recent events"
+        if "quest_hint" not in data:
+            data["quest_hint"] = ""
+
+        return data
 
     def validate_output(self, output: Dict[str, Any]) -> bool:
         """Validate that the output meets template requirements"""
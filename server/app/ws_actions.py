@@ -0,0 +1,166 @@
+"""
+Player actions over the room WebSocket.
+A socket authenticates once with an `auth` message (the same ownership check as
+POST /action/stream). Its `action` messages then run the shared action pipeline, and
+every event is queued on the player's socket as an `action_event` in between the
+room's other messages, followed by `action_done`. A move reconnects the player to
+another room mid-action, so events follow whichever socket the player holds.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from .config import settings
+from .logger import setup_logging
+from .models import ActionRequest
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+ACTION_MESSAGE_TYPES = ("auth", "action")
+
+ActionRunner = Callable[[ActionRequest, float], AsyncIterator[str]]  # (request, start time) -> JSON events
+UserLookup = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]  # bearer token -> user
+PlayerLookup = Callable[[str], Awaitable[Any]]  # player id -> player with a user_id
+LocalSender = Callable[[str, str, Dict[str, Any]], bool]  # (room id, player id, message) -> queued
+PlayerSender = Callable[[str, Dict[str, Any]], bool]  # (player id, message) -> queued on a local socket
+RemoteSender = Callable[[Dict[str, Any], str], Awaitable[None]]  # (message, player id) through the bus
+
+
+class WebSocketActions:
+    """Runs actions sent over authenticated sockets and streams their events back"""
+
+    def __init__(self, enabled: bool, reconnect_grace: float):
+        self.enabled = enabled
+        self.reconnect_grace = reconnect_grace
+        self._run_action: Optional[ActionRunner] = None
+        self._current_user: Optional[UserLookup] = None
+        self._get_player: Optional[PlayerLookup] = None
+        self._send_local: Optional[LocalSender] = None
+        self._send_to_player: Optional[PlayerSender] = None
+        self._send_remote: Optional[RemoteSender] = None
+        # Running actions; held here so they aren't garbage collected mid-stream
+        self._tasks: Set[asyncio.Task] = set()
+        self.metrics: Dict[str, int] = {
+            'authenticated': 0,
+            'auth_failed': 0,
+            'actions': 0,
+            'rejected': 0,
+            'events': 0,
+            'sent_remote': 0
+        }
+
+    def set_pipeline(self, run_action: ActionRunner, current_user: UserLookup, get_player: PlayerLookup) -> None:
+        self._run_action = run_action
+        self._current_user = current_user
+        self._get_player = get_player
+
+    def set_delivery(self, send_local: LocalSender, send_to_player: PlayerSender, send_remote: RemoteSender) -> None:
+        self._send_local = send_local
+        self._send_to_player = send_to_player
+        self._send_remote = send_remote
+
+    async def authenticate(self, player_id: str, token: Optional[str]) -> bool:
+        """Whether a socket's bearer token belongs to the user who owns its player"""
+        authenticated = False
+        if token:
+            current_user = await self._current_user(token)
+            player = await self._get_player(player_id)
+            authenticated = bool(player and current_user and player.user_id == current_user['id'])
+        self.metrics['authenticated' if authenticated else 'auth_failed'] += 1
+        return authenticated
+
+    def session(self, room_id: str, player_id: str) -> "ActionSession":
+        return ActionSession(self, room_id, player_id)
+
+    def submit(self, player_id: str, request_id: str, action_request: ActionRequest) -> asyncio.Task:
+        """Start streaming an action in the background"""
+        self.metrics['actions'] += 1
+        task = asyncio.create_task(self.stream(player_id, request_id, action_request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def stream(self, player_id: str, request_id: str, action_request: ActionRequest) -> None:
+        """Run an action, queueing its events on the player's socket as they are produced"""
+        request_start = time.time()
+        pending: List[Dict[str, Any]] = []
+
+        def flush():
+            # Whichever socket the player holds now: a move reconnects them to the new room mid-action
+            while pending and self._send_to_player(player_id, pending[0]):
+                pending.pop(0)
+
+        async for event in self._run_action(action_request, request_start):
+            self.metrics['events'] += 1
+            pending.append({"type": "action_event", "request_id": request_id, "event": json.loads(event)})
+            flush()
+        pending.append({"type": "action_done", "request_id": request_id})
+        flush()
+
+        deadline = time.time() + self.reconnect_grace
+        while pending and time.time() < deadline:
+            await asyncio.sleep(0.1)
+            flush()
+        # Not back on this worker: the bus reaches them if they reconnected to another one
+        for message in pending:
+            self.metrics['sent_remote'] += 1
+            await self._send_remote(message, player_id)
+        logger.info(f"⏱️ [TIMING] WebSocket action {request_id} finished in {(time.time() - request_start)*1000:.2f}ms")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, 'enabled': self.enabled, 'running': len(self._tasks)}
+
+
+class ActionSession:
+    """One socket's side of WebSocket actions: authenticated once, then every action it sends runs"""
+
+    def __init__(self, actions: WebSocketActions, room_id: str, player_id: str):
+        self.actions = actions
+        self.room_id = room_id
+        self.player_id = player_id
+        self.authenticated = False
+
+    def _reply(self, message: Dict[str, Any]) -> None:
+        self.actions._send_local(self.room_id, self.player_id, message)
+
+    async def handle(self, message: Dict[str, Any]) -> None:
+        """Handle an `auth` or `action` message received on the socket"""
+        if message.get('type') == 'auth':
+            # Checked once per connection, instead of on every action request
+            self.authenticated = await self.actions.authenticate(self.player_id, message.get('token'))
+            logger.info(f"[WebSocket] Player {self.player_id} authenticated: {self.authenticated}")
+            self._reply({
+                "type": "auth_ok" if self.authenticated else "auth_error",
+                "actions": self.authenticated and self.actions.enabled
+            })
+            return
+
+        logger.info(f"[WebSocket] Received action from player {self.player_id}: {message.get('action')}")
+        request_id = str(message.get('request_id') or uuid.uuid4())
+        if not self.authenticated or not self.actions.enabled or not message.get('action'):
+            self.actions.metrics['rejected'] += 1
+            self._reply({
+                "type": "action_event",
+                "request_id": request_id,
+                "event": {"error": "Actions on this connection need an authenticated socket; use /action/stream"}
+            })
+            self._reply({"type": "action_done", "request_id": request_id})
+            return
+        action_request = ActionRequest(
+            player_id=self.player_id,
+            action=message['action'],
+            room_id=message.get('room_id') or self.room_id,
+            target=message.get('target')
+        )
+        self.actions.submit(self.player_id, request_id, action_request)
+
+
+# Global handler; wired to the action pipeline and the connection manager in main.py
+ws_actions = WebSocketActions(
+    settings.WS_ACTIONS_ENABLED,
+    settings.WS_ACTION_RECONNECT_GRACE
+)
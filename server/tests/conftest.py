@@ -0,0 +1,12 @@
+"""
+Shared pytest fixtures. Script-style runs (`python tests/test_x.py`) pass the same
+objects in from their `__main__` block.
+"""
+import fakeredis
+import pytest
+
+
+@pytest.fixture
+def fake_redis():
+    """Empty in-memory Redis, with Lua scripting, for services that take a redis client"""
+    return fakeredis.FakeRedis()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test the token-budgeted action context builder used by stream_action
+"""
+
+import asyncio
+import sys
+import os
+import json
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.context_builder import ActionContextBuilder, count_tokens
+from app.models import Player, Room, GameState, NPC
+
+
+def make_veteran_player() -> Player:
+    """A long-lived player with large unbounded history fields"""
+    return Player(
+        id="context_test_player",
+        user_id="context_test_user",
+        name="Veteran",
+        current_room="room_ctx",
+        inventory=["item_a", "item_b"],
+        memory_log=[f"Memory entry number {i} about a long journey" for i in range(500)],
+        visited_coordinates=[f"{i},{i}" for i in range(500)],
+        visited_biomes={f"{i},{i}": "forest" for i in range(500)}
+    )
+
+
+def make_room() -> Room:
+    return Room(
+        id="room_ctx",
+        title="Context Test Clearing",
+        description="A quiet clearing used for context tests.",
+        x=4,
+        y=2,
+        biome="forest",
+        image_url="https://example.com/very/long/image/url.webp",
+        image_prompt="A very long image prompt " * 20,
+        npcs=["npc_ctx"],
+        items=["item_room"],
+        players=["context_test_player"]
+    )
+
+
+def test_projection_drops_unneeded_fields():
+    """Visited coordinates, image fields and old memory never reach the prompt"""
+    print("📦 Testing context projection")
+    builder = ActionContextBuilder(token_budget=100000, fragment_ttl=30)
+    npc = NPC(id="npc_ctx", name="Old Hermit", description="A hermit.", location="room_ctx",
+              dialogue_history=[{"player": "hi", "npc": "hello"}] * 50)
+    context, tokens = builder.build(
+        action="look around",
+        player=make_veteran_player(),
+        room=make_room(),
+        game_state=GameState(world_seed="seed", main_quest_summary="Find the relic."),
+        npcs=[npc],
+        monsters=[],
+        room_items=[{"id": "item_room", "name": "Rusty Key", "rarity": 2, "description": "A key.", "capabilities": ["unlock"]}],
+        item_availability={},
+        chat_history=None
+    )
+    print(f"  Context tokens: {tokens}")
+    assert "visited_coordinates" not in context["player"]
+    assert "visited_biomes" not in context["player"]
+    assert "image_prompt" not in context["room"]
+    assert len(context["player"]["memory_log"]) == 10
+    assert len(context["npcs"][0]["dialogue_history"]) == 4
+    assert tokens == count_tokens(json.dumps(context))
+    print("  ✅ Only game-master fields were projected")
+
+
+def test_budget_truncates_low_priority_sections():
+    """Chat is trimmed before the player's memory when over budget"""
+    print("✂️  Testing token budget truncation")
+    builder = ActionContextBuilder(token_budget=600, fragment_ttl=30)
+    chat = [{"player_id": "p", "message_type": "chat", "message": "chatter " * 40, "timestamp": "t"} for _ in range(20)]
+    context, tokens = builder.build(
+        action="look around",
+        player=make_veteran_player(),
+        room=make_room(),
+        game_state=GameState(world_seed="seed", main_quest_summary="Find the relic."),
+        npcs=[],
+        monsters=[],
+        room_items=[],
+        item_availability={},
+        chat_history=chat
+    )
+    print(f"  Context tokens after truncation: {tokens}")
+    assert tokens <= 600
+    assert len(context.get("recent_chat", [])) < 20
+    assert builder.get_metrics()["truncated_actions"] == 1
+    print("  ✅ Context fits within budget")
+
+
+def test_room_fragment_cache():
+    """Repeated actions in an unchanged room reuse the cached fragment"""
+    print("🗄️  Testing room fragment cache")
+    builder = ActionContextBuilder(token_budget=100000, fragment_ttl=30)
+    for _ in range(3):
+        builder.build("wait", make_veteran_player(), make_room(), GameState(world_seed="s", main_quest_summary="q"),
+                      [], [], [], {}, None)
+    metrics = builder.get_metrics()
+    print(f"  Fragment hits: {metrics['fragment_hits']}, misses: {metrics['fragment_misses']}")
+    assert metrics["fragment_misses"] == 1
+    assert metrics["fragment_hits"] == 2
+    print("  ✅ Room fragment reused")
+
+
+async def test_room_items_cache():
+    """Room items are loaded once while the room's item list is unchanged"""
+    print("🗄️  Testing room item cache")
+
+    class CountingDatabase:
+        def __init__(self):
+            self.calls = 0
+
+        async def get_item(self, item_id):
+            self.calls += 1
+            return {"id": item_id, "name": "Rusty Key", "rarity": 2}
+
+    builder = ActionContextBuilder(token_budget=100000, fragment_ttl=30)
+    db = CountingDatabase()
+    room = make_room()
+    await builder.load_room_items(room, db)
+    await builder.load_room_items(room, db)
+    assert db.calls == 1
+    room.items.append("item_new")
+    await builder.load_room_items(room, db)
+    assert db.calls == 3
+    print("  ✅ Item loads cached until the room changes")
+
+
+async def test_room_caches_are_bounded():
+    """Rooms past max_rooms evict the least recently used ones"""
+    print("📦 Testing bounded room caches")
+
+    class Database:
+        async def get_item(self, item_id):
+            return {"id": item_id, "name": "Rusty Key", "rarity": 2}
+
+    builder = ActionContextBuilder(token_budget=100000, fragment_ttl=30, max_rooms=3)
+    rooms = []
+    for i in range(5):
+        room = make_room()
+        room.id = f"room_{i}"
+        rooms.append(room)
+        await builder.load_room_items(room, Database())
+        builder._room_fragment(room, [], [])
+        # Keep room_0 in use so it survives the later rooms
+        builder._room_fragment(rooms[0], [], [])
+        await builder.load_room_items(rooms[0], Database())
+
+    assert list(builder._room_fragments) == ["room_3", "room_4", "room_0"]
+    assert list(builder._room_items) == ["room_3", "room_4", "room_0"]
+    print(f"  cached rooms after 5 visits: {list(builder._room_fragments)}")
+    print("  ✅ Caches stay within max_rooms")
+
+
+if __name__ == "__main__":
+    test_projection_drops_unneeded_fields()
+    test_budget_truncates_low_priority_sections()
+    test_room_fragment_cache()
+    asyncio.run(test_room_items_cache())
+    asyncio.run(test_room_caches_are_bounded())
+    print("🎉 Action context budget tests completed!")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Test streaming image/model transfers against local source and storage servers
+"""
+
+import sys
+import os
+import asyncio
+import hashlib
+import io
+import tracemalloc
+import zipfile
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from aiohttp import web
+from app.asset_transfer import AssetTransferService, AssetTransferError
+
+MODEL_SIZE = 8 * 1024 * 1024
+
+
+def build_model_archive():
+    """An incompressible GLB plus a texture, stored in a ZIP like FAL's world files"""
+    glb = os.urandom(MODEL_SIZE)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr("world/texture.png", b"png" * 1000)
+        archive.writestr("world/scene.glb", glb)
+    return buffer.getvalue(), hashlib.sha256(glb).hexdigest()
+
+
+class LocalServers:
+    """Source (provider temporary URLs) and storage endpoints on one local aiohttp app"""
+
+    def __init__(self, files):
+        self.files = files  # path -> (bytes, content type)
+        self.stored = {}  # "bucket/path" -> {"sha256", "size", "content_type", "upsert"}
+        self.runner = None
+        self.base_url = None
+
+    async def serve_source(self, request):
+        name = request.match_info['name']
+        if name not in self.files:
+            return web.Response(status=404)
+        data, content_type = self.files[name]
+        response = web.StreamResponse(headers={'Content-Type': content_type, 'Content-Length': str(len(data))})
+        await response.prepare(request)
+        view = memoryview(data)
+        for offset in range(0, len(data), 65536):
+            await response.write(view[offset:offset + 65536])
+        await response.write_eof()
+        return response
+
+    async def store_object(self, request):
+        if request.headers.get('Authorization') != "Bearer service-key":
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        digest = hashlib.sha256()
+        size = 0
+        async for chunk in request.content.iter_chunked(65536):
+            digest.update(chunk)
+            size += len(chunk)
+        self.stored[f"{request.match_info['bucket']}/{request.match_info['path']}"] = {
+            'sha256': digest.hexdigest(),
+            'size': size,
+            'content_type': request.headers.get('Content-Type'),
+            'upsert': request.headers.get('x-upsert')
+        }
+        return web.json_response({'Key': request.match_info['path']})
+
+    async def copy_object(self, request):
+        if request.headers.get('Authorization') != "Bearer service-key":
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        body = await request.json()
+        source = self.stored.get(f"{body['bucketId']}/{body['sourceKey']}")
+        if source is None:
+            return web.json_response({'error': 'not_found'}, status=404)
+        self.stored[f"{body['bucketId']}/{body['destinationKey']}"] = dict(source, upsert=request.headers.get('x-upsert'))
+        return web.json_response({'Key': body['destinationKey']})
+
+    async def __aenter__(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get('/files/{name}', self.serve_source)
+        app.router.add_post('/storage/v1/object/copy', self.copy_object)
+        app.router.add_post('/storage/v1/object/{bucket}/{path:.+}', self.store_object)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def test_image_streamed_with_content_type():
+    """Images keep their bytes and content type and land at rooms/{room_id}.{ext}"""
+    print("🖼️ Testing image transfer")
+    image = os.urandom(300000)
+
+    async def run():
+        async with LocalServers({"img": (image, "image/png")}) as servers:
+            service = AssetTransferService(2, 65536, servers.base_url, "service-key")
+            try:
+                url = await service.transfer_image(f"{servers.base_url}/files/img", "room-images", "room_1")
+                try:
+                    await service.transfer_image(f"{servers.base_url}/files/expired", "room-images", "room_2")
+                    missing_error = None
+                except AssetTransferError as e:
+                    missing_error = e
+            finally:
+                await service.close()
+            return url, missing_error, servers.stored, service.get_metrics()
+
+    url, missing_error, stored, metrics = asyncio.run(run())
+    print(f"  url: {url}")
+    assert "/storage/v1/object/public/room-images/rooms/room_1.png?v=" in url
+    entry = stored["room-images/rooms/room_1.png"]
+    assert entry['sha256'] == hashlib.sha256(image).hexdigest()
+    assert entry['content_type'] == "image/png" and entry['upsert'] == "true"
+    assert missing_error is not None and not missing_error.retryable
+    assert metrics['transfers'] == 1 and metrics['failed'] == 1
+    assert metrics['bytes_in'] == metrics['bytes_out'] == len(image)
+    print("  ✅ Image streamed intact; expired URL not retried")
+
+
+def test_stored_image_copied_in_place():
+    """A stored image is copied to another room's path inside the storage, without a download"""
+    print("📑 Testing server-side copy")
+    image = os.urandom(200000)
+
+    async def run():
+        async with LocalServers({"img": (image, "image/webp")}) as servers:
+            service = AssetTransferService(2, 65536, servers.base_url, "service-key")
+            try:
+                url = await service.transfer_image(f"{servers.base_url}/files/img", "room-images", "room 1")
+                source_path = service.storage_path("room-images", url)
+                copy_url = await service.copy_object("room-images", source_path, "rooms/room_2.webp")
+                try:
+                    await service.copy_object("room-images", "rooms/missing.webp", "rooms/room_3.webp")
+                    missing_error = None
+                except AssetTransferError as e:
+                    missing_error = e
+            finally:
+                await service.close()
+            return source_path, copy_url, missing_error, servers.stored, service.get_metrics(), servers.base_url
+
+    source_path, copy_url, missing_error, stored, metrics, base_url = asyncio.run(run())
+    print(f"  copy url: {copy_url}")
+    assert source_path == "rooms/room 1.webp"
+    assert "/storage/v1/object/public/room-images/rooms/room_2.webp?v=" in copy_url
+    assert stored["room-images/rooms/room_2.webp"]['sha256'] == hashlib.sha256(image).hexdigest()
+    assert missing_error is not None and not missing_error.retryable
+    # Only the original transfer moved bytes
+    assert metrics['bytes_in'] == len(image)
+    assert AssetTransferService(2, 65536, base_url, "service-key").storage_path("room-images", "https://replicate.delivery/x.webp") is None
+    print("  ✅ Image copied without downloading it")
+
+
+def test_concurrent_model_uploads_stay_flat():
+    """The GLB is streamed out of the FAL archive; memory does not grow with file size or concurrency"""
+    print("🧊 Testing concurrent 3D model transfers")
+    archive, glb_digest = build_model_archive()
+
+    async def run():
+        async with LocalServers({"world.zip": (archive, "application/zip")}) as servers:
+            service = AssetTransferService(2, 65536, servers.base_url, "service-key")
+            try:
+                tracemalloc.start()
+                urls = await asyncio.gather(*(
+                    service.transfer_model(f"{servers.base_url}/files/world.zip", "room-models", f"room_{i}")
+                    for i in range(4)
+                ))
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            finally:
+                await service.close()
+            return urls, peak, servers.stored, service.get_metrics()
+
+    urls, peak, stored, metrics = asyncio.run(run())
+    print(f"  peak traced memory: {peak / 1024 / 1024:.2f} MB for 4 x {MODEL_SIZE / 1024 / 1024:.0f} MB models")
+    print(f"  throughput: {metrics['avg_mb_per_second']} MB/s, peak active: {metrics['peak_active']}")
+    assert len(urls) == 4
+    for i in range(4):
+        entry = stored[f"room-models/models/room_{i}.glb"]
+        assert entry['sha256'] == glb_digest and entry['size'] == MODEL_SIZE
+        assert entry['content_type'] == "model/gltf-binary"
+    assert metrics['peak_active'] == 2, "concurrency bound not applied"
+    assert metrics['bytes_out'] == 4 * MODEL_SIZE
+    # Whole-file buffering of even one model would exceed this
+    assert peak < MODEL_SIZE / 2
+    print("  ✅ Models streamed with bounded memory and concurrency")
+
+
+if __name__ == "__main__":
+    test_image_streamed_with_content_type()
+    test_stored_image_copied_in_place()
+    test_concurrent_model_uploads_stay_flat()
+    print("🎉 Asset transfer tests completed!")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Multi-worker integration test for the Redis broadcast bus.
+Two buses stand in for two uvicorn workers, each with its own Redis connections and
+sockets, plus a socketless job worker. Needs a local Redis (TEST_REDIS_URL, default
+redis://localhost:6379); skipped otherwise.
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+import redis
+from app.broadcast_bus import RedisBroadcastBus, ROOM_CHANNEL_PREFIX
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379")
+
+
+class FakeSocket:
+    def __init__(self):
+        self.received = []
+        self.arrivals = []
+
+    async def send_json(self, message):
+        self.received.append(message)
+        self.arrivals.append(time.time())
+
+
+class Worker:
+    """The part of ConnectionManager that matters here: local sockets behind one bus"""
+
+    def __init__(self, name):
+        self.name = name
+        self.bus = RedisBroadcastBus(0.02)
+        client = redis.from_url(REDIS_URL)
+        self.bus._redis = lambda: client
+        self.bus.set_delivery(self.deliver)
+        self.rooms = {}  # room_id -> {player_id: FakeSocket}
+
+    def connect(self, room_id, player_id):
+        socket = FakeSocket()
+        if player_id not in self.rooms.setdefault(room_id, {}):
+            self.bus.join(room_id, player_id)
+        self.rooms[room_id][player_id] = socket
+        return socket
+
+    def disconnect(self, room_id, player_id):
+        if self.rooms.get(room_id, {}).pop(player_id, None) is not None:
+            self.bus.leave(room_id, player_id)
+
+    async def deliver(self, room_id, message, exclude_player, target_player):
+        rooms = [rid for rid, sockets in self.rooms.items() if target_player in sockets] if room_id is None else [room_id]
+        delivered = 0
+        for rid in rooms:
+            for player_id, socket in self.rooms.get(rid, {}).items():
+                if player_id == exclude_player or (target_player and player_id != target_player):
+                    continue
+                await socket.send_json(message)
+                delivered += 1
+        return delivered
+
+
+def redis_available():
+    try:
+        return redis.from_url(REDIS_URL).ping()
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not redis_available(), reason=f"No Redis at {REDIS_URL}")
+
+
+async def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def subscribers(room_id):
+    return dict(redis.from_url(REDIS_URL).pubsub_numsub(f"{ROOM_CHANNEL_PREFIX}{room_id}"))[f"{ROOM_CHANNEL_PREFIX}{room_id}".encode()]
+
+
+def test_fan_out_across_workers():
+    """Presence, targeted and personal messages reach players on the other worker exactly once"""
+    print("📡 Testing cross-worker fan-out")
+    room = f"bus_test_{os.getpid()}"
+
+    async def run():
+        worker_a, worker_b = Worker("a"), Worker("b")
+        job_worker = RedisBroadcastBus(0.02)
+        job_client = redis.from_url(REDIS_URL)
+        job_worker._redis = lambda: job_client
+        tasks = [asyncio.create_task(worker_a.bus.run()), asyncio.create_task(worker_b.bus.run())]
+        try:
+            alice = worker_a.connect(room, "alice")
+            carol = worker_a.connect(room, "carol")
+            bob = worker_b.connect(room, "bob")
+            dave = worker_b.connect(f"{room}_other", "dave")
+            # One subscription per worker per room, however many sockets it holds there
+            assert await wait_for(lambda: subscribers(room) == 2), "workers did not subscribe"
+
+            await worker_a.bus.publish(room, {"type": "presence", "player_id": "alice", "status": "joined"}, exclude_player="alice")
+            assert await wait_for(lambda: len(bob.received) == 1)
+            assert alice.received == [] and len(carol.received) == 1 and dave.received == []
+
+            await worker_b.bus.publish(room, {"type": "duel_round", "round": 1}, target_player="alice")
+            await worker_a.bus.publish(None, {"type": "quest_update"}, target_player="dave")
+            await job_worker.publish(room, {"type": "room_update", "room": {"id": room}})
+            assert await wait_for(lambda: len(dave.received) == 1 and len(alice.received) == 2 and len(bob.received) == 2)
+            await asyncio.sleep(0.1)  # Give any duplicate time to show up
+
+            print(f"  alice: {[m['type'] for m in alice.received]}, bob: {[m['type'] for m in bob.received]}")
+            assert [m['type'] for m in alice.received] == ["duel_round", "room_update"]
+            assert [m['type'] for m in bob.received] == ["presence", "room_update"]
+            assert [m['type'] for m in carol.received] == ["presence", "room_update"]
+            assert [m['type'] for m in dave.received] == ["quest_update"]
+
+            # The last socket in a room on a worker drops that worker's subscription
+            worker_b.disconnect(room, "bob")
+            assert await wait_for(lambda: subscribers(room) == 1), "worker b kept its subscription"
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(run())
+    print("  ✅ Delivered once per player across workers")
+
+
+def test_cross_worker_latency():
+    """Benchmark: delivery latency of room broadcasts to a player on another worker"""
+    print("⏱️ Benchmarking cross-worker delivery")
+    room = f"bus_bench_{os.getpid()}"
+    count = 500
+
+    async def run():
+        worker_a, worker_b = Worker("a"), Worker("b")
+        tasks = [asyncio.create_task(worker_a.bus.run()), asyncio.create_task(worker_b.bus.run())]
+        try:
+            worker_a.connect(room, "alice")
+            bob = worker_b.connect(room, "bob")
+            assert await wait_for(lambda: subscribers(room) == 2)
+            start = time.time()
+            for i in range(count):
+                await worker_a.bus.publish(room, {"type": "chat", "sent": time.time(), "n": i})
+            assert await wait_for(lambda: len(bob.received) == count, timeout=10.0)
+            elapsed = time.time() - start
+            latencies = [arrived - m['sent'] for m, arrived in zip(bob.received, bob.arrivals)]
+            return elapsed, latencies, [m['n'] for m in bob.received]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    elapsed, latencies, order = asyncio.run(run())
+    latencies.sort()
+    print(f"  {count} messages in {elapsed * 1000:.0f}ms ({count / elapsed:.0f} msg/s)")
+    print(f"  latency p50 {latencies[count // 2] * 1000:.1f}ms, p99 {latencies[int(count * 0.99)] * 1000:.1f}ms")
+    assert order == list(range(count)), "messages arrived out of order"
+    print("  ✅ Benchmark completed")
+
+
+if __name__ == "__main__":
+    if not redis_available():
+        print(f"⚠️ No Redis at {REDIS_URL}, skipping broadcast bus integration tests")
+        sys.exit(0)
+    test_fan_out_across_workers()
+    test_cross_worker_latency()
+    print("🎉 Broadcast bus tests completed!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the player-indexed WebSocket connection registry: lookups, reconnect-safe
+removal and heap-based inactivity expiry, at 10k connections
+"""
+
+import sys
+import os
+import time
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.connection_registry import ConnectionRegistry
+from app.outbound_queue import OutboundConnection, DISCONNECT
+
+
+class FakeSocket:
+    pass
+
+
+def make_connection(player_id):
+    return OutboundConnection(FakeSocket(), player_id, 16, 10.0, {}, DISCONNECT)
+
+
+def test_indexes_follow_connects_and_moves():
+    """Connections are found by room and by player, including mid-move and after a reconnect"""
+    print("🗂️ Testing registry indexes")
+    registry = ConnectionRegistry(inactivity_timeout=120)
+    first = make_connection("alice")
+    assert registry.add("room_1", "alice", first) is None
+    registry.add("room_1", "bob", make_connection("bob"))
+
+    # Moving: the new room's socket opens before the old one closes
+    moved = make_connection("alice")
+    registry.add("room_2", "alice", moved)
+    assert set(registry.for_player("alice")) == {"room_1", "room_2"}
+    assert registry.remove("room_1", "alice") is first
+    assert registry.for_player("alice") == {"room_2": moved}
+
+    # A reconnect replaces the socket; the old socket's disconnect must not remove the new one
+    replacement = make_connection("alice")
+    assert registry.add("room_2", "alice", replacement) is moved
+    assert registry.remove("room_2", "alice", moved.websocket) is None
+    assert registry.get("room_2", "alice") is replacement
+    assert registry.remove("room_2", "alice", replacement.websocket) is replacement
+    assert registry.for_player("alice") == {} and registry.summary() == {"room_1": 1}
+    print("  ✅ Indexes consistent")
+
+
+def test_expiry_only_returns_idle_players():
+    """Active players are rescheduled, idle ones are returned once and forgotten"""
+    print("⏰ Testing inactivity expiry")
+    registry = ConnectionRegistry(inactivity_timeout=120)
+    for player_id in ("alice", "bob", "carol"):
+        registry.add("room_1", player_id, make_connection(player_id))
+        registry.touch(player_id, now=1000)
+    registry.touch("ghost", now=1000)  # Disconnected without being cleaned up
+    registry.touch("alice", now=1100)
+    for _ in range(50):
+        registry.touch("bob", now=1090)  # Heartbeats don't grow the heap
+    assert len(registry._expiry) == 4
+
+    assert registry.expire(now=1119) == []
+    assert sorted(registry.expire(now=1200)) == [("room_1", "carol")]
+    assert "ghost" not in registry.last_seen
+    assert registry.expire(now=1200) == []
+    assert registry.expire(now=1215) == [("room_1", "bob")]
+    assert registry.is_active("alice", 120, now=1215) and not registry.is_active("carol", 120, now=1215)
+    print("  ✅ Idle players expired once")
+
+
+def test_ten_thousand_connections():
+    """Benchmark: personal lookups and cleanup with 10k sockets in one worker"""
+    print("📈 Benchmarking 10k connections")
+    registry = ConnectionRegistry(inactivity_timeout=120)
+    count = 10000
+    start = time.perf_counter()
+    for i in range(count):
+        player_id = f"player_{i}"
+        registry.add(f"room_{i % 2000}", player_id, make_connection(player_id))
+        registry.touch(player_id, now=1000 if i % 100 else 900)
+    registered = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(count):
+        assert registry.for_player(f"player_{i}")
+    lookups = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expired = registry.expire(now=1100)
+    expiry = time.perf_counter() - start
+
+    print(f"  registered {count} in {registered * 1000:.0f}ms")
+    print(f"  {count} personal lookups in {lookups * 1000:.1f}ms ({lookups / count * 1e6:.2f}µs each)")
+    print(f"  expired {len(expired)} idle players in {expiry * 1000:.2f}ms")
+    assert len(registry) == count
+    assert len(expired) == count // 100
+    print("  ✅ Benchmark completed")
+
+
+if __name__ == "__main__":
+    test_indexes_follow_connects_and_moves()
+    test_expiry_only_returns_idle_players()
+    test_ten_thousand_connections()
+    print("🎉 Connection registry tests completed!")
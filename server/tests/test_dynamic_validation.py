@@ -163,6 +163,10 @@ class MockAIHandler:
             })
         else:
             return json.dumps({"valid": True, "reason": "Default AI response"})
+    
+    async def generate_structured(self, prompt: str, output_model, call_site: str, **kwargs):
+        """Mock structured generation: validate the mock text against the requested schema"""
+        return output_model.model_validate_json(await self.generate_text(prompt)).model_dump()
 
 async def test_dynamic_validation_basic():
     """Test basic dynamic validation functionality"""
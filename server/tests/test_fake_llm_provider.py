@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test the local fake LLM provider used for offline load and latency testing
+"""
+
+import sys
+import os
+import asyncio
+import json
+import time
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.llm_provider import FakeLLMClient, create_llm_client
+
+MONSTER_PROMPT = '''Respond in JSON format with exactly these fields: "name", "description", and "special_effects".
+
+Example response:
+{
+    "name": "Flame Wraith",
+    "description": "A ghostly figure wreathed in flames.",
+    "special_effects": "can breathe fire"
+}'''
+
+
+async def complete(client, system: str, user: str) -> str:
+    response = await client.chat.completions.create(
+        model="fake",
+        messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+        temperature=0.7
+    )
+    return response.choices[0].message.content
+
+
+def test_schema_valid_json_responses():
+    """Template-driven prompts get JSON with the template's fields"""
+    print("🧩 Testing fake JSON responses")
+    client = FakeLLMClient(tokens_per_second=10000, ttft_ms=0, ttft_jitter_ms=0, seed=1)
+
+    async def run():
+        monster = json.loads(await complete(client, "", MONSTER_PROMPT))
+        assert set(monster) == {"name", "description", "special_effects"}
+
+        batch_prompt = MONSTER_PROMPT + '\nRespond with a JSON object of the form {"monsters": [...]} containing exactly 3 monsters'
+        batch = json.loads(await complete(client, "", batch_prompt))
+        assert len(batch["monsters"]) == 3
+
+        validation = json.loads(await complete(client, "", 'Return JSON: {"can_perform": true/false, "reason": "brief explanation"}'))
+        assert validation["can_perform"] is True
+
+        attack = json.loads(await complete(client, "", "Return ONLY strict JSON with keys: is_attack (boolean) and target_monster_id"))
+        assert attack == {"is_attack": False, "target_monster_id": None}
+
+        text = await complete(client, "You are a fantasy duel referee.", "Player 1 attacks")
+        assert text and not text.startswith("{")
+
+    asyncio.run(run())
+    print("  ✅ Monster, batch, validation, intent and text prompts answered")
+
+
+def test_game_master_stream():
+    """The streamed game master reply is narrative followed by the JSON block"""
+    print("🎬 Testing fake game master stream")
+    client = FakeLLMClient(tokens_per_second=10000, ttft_ms=0, ttft_jitter_ms=0, seed=2)
+
+    async def run():
+        stream = await client.chat.completions.create(
+            model="fake",
+            messages=[
+                {"role": "system", "content": "You are the game master of a multiplayer world."},
+                {"role": "user", "content": 'Process this player action.\nContext: {"action": "walk north"}'}
+            ],
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        text, usage = "", None
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices:
+                text += chunk.choices[0].delta.content
+        return text, usage
+
+    text, usage = asyncio.run(run())
+    narrative, payload = text.split("\n\n", 1)
+    parsed = json.loads(payload)
+    assert narrative and "response" not in parsed
+    assert parsed["updates"]["player"]["direction"] == "north"
+    assert usage is not None and usage.completion_tokens > 0
+    print(f"  narrative: {narrative}")
+    print("  ✅ Stream parses like a real game master response")
+
+
+def test_ttft_and_concurrency():
+    """1000 concurrent streams finish in about one TTFT plus generation time"""
+    print("⏱️ Testing fake latency under concurrency")
+    client = FakeLLMClient(tokens_per_second=2000, ttft_ms=50, ttft_jitter_ms=10, seed=3)
+
+    async def one_stream():
+        start = time.time()
+        stream = await client.chat.completions.create(
+            model="fake",
+            messages=[{"role": "system", "content": "You are the game master of a multiplayer world."},
+                      {"role": "user", "content": 'Context: {"action": "look around"}'}],
+            stream=True
+        )
+        ttft = None
+        async for chunk in stream:
+            if ttft is None:
+                ttft = time.time() - start
+        return ttft
+
+    async def run():
+        start = time.time()
+        ttfts = await asyncio.gather(*[one_stream() for _ in range(1000)])
+        return ttfts, time.time() - start
+
+    ttfts, elapsed = asyncio.run(run())
+    avg_ttft = sum(ttfts) / len(ttfts)
+    print(f"  1000 streams in {elapsed:.2f}s, avg TTFT {avg_ttft*1000:.0f}ms")
+    assert 0.02 < avg_ttft < 0.5
+    assert elapsed < 5.0
+    print("  ✅ Latency follows the configured distribution")
+
+
+def test_unknown_provider_rejected():
+    """Misconfigured providers fail loudly"""
+    try:
+        create_llm_client("nope")
+    except ValueError:
+        print("  ✅ Unknown provider rejected")
+        return
+    raise AssertionError("Unknown provider should raise")
+
+
+if __name__ == "__main__":
+    test_schema_valid_json_responses()
+    test_game_master_stream()
+    test_ttft_and_concurrency()
+    test_unknown_provider_rejected()
+    print("🎉 Fake LLM provider tests completed!")
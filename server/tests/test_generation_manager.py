@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test the bounded, deduplicating background generation work manager
+"""
+
+import sys
+import os
+import asyncio
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.generation_manager import GenerationWorkManager, GenerationShedError
+
+
+def test_bounded_workers_and_dedup():
+    """No more than max_workers jobs run at once and duplicate keys share one run"""
+    print("🧱 Testing worker bound and deduplication")
+    manager = GenerationWorkManager(2, 50, 50, 0)
+    state = {'running': 0, 'peak': 0, 'runs': 0}
+
+    async def job():
+        state['running'] += 1
+        state['runs'] += 1
+        state['peak'] = max(state['peak'], state['running'])
+        await asyncio.sleep(0.02)
+        state['running'] -= 1
+        return "done"
+
+    async def run():
+        futures = [manager.submit(f"room:{i % 5},0", "room_preload", job, priority=1, owner="p1") for i in range(10)]
+        snapshot = manager.get_snapshot()
+        results = await asyncio.gather(*futures)
+        return snapshot, results
+
+    snapshot, results = asyncio.run(run())
+    print(f"  peak concurrency: {state['peak']}, runs: {state['runs']}")
+    assert state['peak'] == 2
+    assert state['runs'] == 5
+    assert results == ["done"] * 10
+    assert snapshot['queued_count'] == 5
+    assert manager.metrics['deduplicated'] == 5
+    print("  ✅ Bounded pool and one run per key")
+
+
+def test_fairness_between_players():
+    """A player with a burst of work does not starve another player's first job"""
+    print("⚖️ Testing per-player fairness")
+    manager = GenerationWorkManager(1, 50, 50, 0)
+    order = []
+
+    def make_job(name):
+        async def job():
+            order.append(name)
+            await asyncio.sleep(0)
+        return job
+
+    async def run():
+        futures = [manager.submit(f"a{i}", "room_preload", make_job(f"a{i}"), priority=1, owner="alice") for i in range(4)]
+        futures.append(manager.submit("b0", "room_preload", make_job("b0"), priority=1, owner="bob"))
+        await asyncio.gather(*futures)
+
+    asyncio.run(run())
+    print(f"  order: {order}")
+    assert order.index("b0") <= 1, "bob waited behind alice's whole burst"
+    print("  ✅ Owners are served round-robin")
+
+
+def test_shedding_and_cancellation():
+    """Full queues shed the least urgent speculative job and cancelled waiters drop queued jobs"""
+    print("🪓 Testing shedding and cancellation")
+    manager = GenerationWorkManager(1, 2, 10, 0)
+    canceller = GenerationWorkManager(1, 10, 10, 0)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def blocker():
+            await release.wait()
+
+        async def quick():
+            return "ok"
+
+        manager.submit("busy", "room_preload", blocker, priority=1)
+        await asyncio.sleep(0)  # let the worker start the blocker
+        far = manager.submit("far", "room_preload", quick, priority=3)
+        near = manager.submit("near", "room_preload", quick, priority=1)
+        urgent = manager.submit("image:r1", "room_image", quick, priority=2, sheddable=False)
+
+        # Cancelling the only waiter removes its queued job
+        waiter = asyncio.create_task(canceller.run("cancel-me", "room_preload", quick, priority=2))
+        canceller.submit("busy", "room_preload", blocker, priority=1)
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        snapshot = canceller.get_snapshot()
+
+        release.set()
+        results = await asyncio.gather(far, near, urgent, return_exceptions=True)
+        return results, snapshot
+
+    (far, near, urgent), snapshot = asyncio.run(run())
+    print(f"  snapshot: running={snapshot['running_count']} queued={[job['key'] for job in snapshot['queued']]}")
+    assert isinstance(far, GenerationShedError)
+    assert near == "ok" and urgent == "ok"
+    assert "cancel-me" not in [job['key'] for job in snapshot['queued']]
+    assert manager.metrics['shed'] >= 1
+    assert canceller.metrics['cancelled'] == 1
+    print("  ✅ Lowest priority work shed, cancelled job removed")
+
+
+if __name__ == "__main__":
+    test_bounded_workers_and_dedup()
+    test_fairness_between_players()
+    test_shedding_and_cancellation()
+    print("🎉 Generation manager tests completed!")
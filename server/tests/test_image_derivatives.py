@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test and benchmark room image derivatives: resizing, deterministic keys,
+process-pool throughput and bytes saved per room view
+"""
+
+import sys
+import os
+import asyncio
+import io
+import time
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from aiohttp import web
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.asset_transfer import AssetTransferService
+from app.image_derivatives import ImageDerivativePipeline, render_derivatives, DERIVATIVE_WIDTHS
+import app.asset_transfer as asset_transfer_module
+
+
+def make_room_art(seed=0, width=1024, height=576):
+    """Painterly stand-in for generated room art, encoded like a provider image"""
+    image = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        draw.line([(0, y), (width, y)], fill=(40 + y * 120 // height, 90 + seed * 7 % 60, 160 - y * 100 // height))
+    for i in range(40):
+        x, y = (i * 97 + seed * 31) % width, (i * 53 + seed * 17) % height
+        draw.ellipse([x, y, x + 60 + i * 3, y + 40 + i * 2], fill=((i * 40) % 255, (i * 70 + seed) % 255, (i * 20) % 255))
+    image = image.filter(ImageFilter.GaussianBlur(1.5))
+    buffer = io.BytesIO()
+    image.save(buffer, "WEBP", quality=95)
+    return buffer.getvalue()
+
+
+def test_render_sizes_and_formats():
+    """Each variant is scaled to its width with the source aspect ratio; small sources are not upscaled"""
+    print("📐 Testing derivative sizes")
+    rendered = render_derivatives(make_room_art(), DERIVATIVE_WIDTHS, ["webp", "avif"], 70)
+    sizes = {(d['variant'], d['format']): (d['width'], d['height'], len(d['data'])) for d in rendered}
+    print(f"  {sizes}")
+    assert sizes[("thumb", "webp")][:2] == (256, 144)
+    assert sizes[("mobile", "avif")][:2] == (768, 432)
+    # The desktop variant is capped at the 1024px source width
+    assert sizes[("desktop", "webp")][:2] == (1024, 576)
+    assert Image.open(io.BytesIO(next(d['data'] for d in rendered if d['format'] == 'avif'))).format == "AVIF"
+    print("  ✅ Sizes and formats correct")
+
+
+def test_pipeline_stores_deterministic_keys():
+    """Derivatives of the same source land on the same keys and are listed per variant"""
+    print("🔑 Testing derivative upload")
+    art = make_room_art(seed=3)
+    stored = {}
+
+    async def source(request):
+        return web.Response(body=art, content_type="image/webp")
+
+    async def store(request):
+        stored[request.match_info['path']] = (await request.read(), request.headers.get('Content-Type'), request.headers.get('Cache-Control'))
+        return web.json_response({})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/art.webp', source)
+        app.router.add_post('/storage/v1/object/{bucket}/{path:.+}', store)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+        service = AssetTransferService(4, 65536, base_url, "service-key")
+        original = asset_transfer_module.asset_transfer
+        asset_transfer_module.asset_transfer = service
+        pipeline = ImageDerivativePipeline(True, 2, ["webp", "avif"], 70)
+        try:
+            first = await pipeline.create_for_room("room_9", f"{base_url}/art.webp")
+            second = await pipeline.create_for_room("room_9", f"{base_url}/art.webp")
+        finally:
+            asset_transfer_module.asset_transfer = original
+            pipeline.shutdown()
+            await service.close()
+            await runner.cleanup()
+        return first, second, pipeline.get_metrics()
+
+    first, second, metrics = asyncio.run(run())
+    print(f"  thumb: {first['thumb']}")
+    assert first == second, "keys are not deterministic"
+    assert set(first) == {"thumb", "mobile", "desktop"}
+    assert first['mobile']['width'] == 768 and first['mobile']['webp'].endswith("/mobile.webp")
+    assert "?v=" not in first['thumb']['avif']
+    assert len(stored) == 6
+    path = next(p for p in stored if p.endswith("thumb.avif"))
+    assert path.startswith("rooms/derived/room_9/")
+    assert stored[path][1] == "image/avif" and "immutable" in stored[path][2]
+    assert metrics['rooms'] == 2 and metrics['avg_saved_per_view']['thumb.webp'] > 0
+    print("  ✅ Derivatives stored under content-addressed keys")
+
+
+def test_benchmark_throughput_and_savings():
+    """Benchmark: process-pool derivation throughput and bytes saved per room view"""
+    print("⏱️ Benchmarking derivation")
+    sources = [make_room_art(seed=i) for i in range(12)]
+    pipeline = ImageDerivativePipeline(True, 4, ["webp", "avif"], 70)
+
+    start = time.time()
+    for data in sources[:4]:
+        render_derivatives(data, DERIVATIVE_WIDTHS, ["webp", "avif"], 70)
+    serial_rate = 4 / (time.time() - start)
+
+    async def run():
+        await pipeline.render(sources[0])  # warm up the worker processes
+        start = time.time()
+        results = await asyncio.gather(*(pipeline.render(data) for data in sources))
+        return results, time.time() - start
+
+    try:
+        results, elapsed = asyncio.run(run())
+    finally:
+        pipeline.shutdown()
+    for data, rendered in zip(sources, results):
+        pipeline._record(len(data), rendered)
+    metrics = pipeline.get_metrics()
+
+    avg_source = metrics['avg_source_bytes']
+    print(f"  serial: {serial_rate:.1f} images/s, pool of 4: {len(sources) / elapsed:.1f} images/s")
+    print(f"  full-size source: {avg_source / 1024:.1f} KB per view")
+    for key in sorted(metrics['avg_bytes']):
+        print(f"  {key:<14} {metrics['avg_bytes'][key] / 1024:7.1f} KB  saves {metrics['avg_saved_per_view'][key] / 1024:7.1f} KB per view")
+    assert all(len(rendered) == 6 for rendered in results)
+    assert metrics['avg_bytes']['thumb.webp'] < avg_source / 4
+    assert metrics['avg_bytes']['mobile.avif'] < avg_source
+    print("  ✅ Benchmark completed")
+
+
+def test_server_shutdown_stops_worker_processes():
+    """Derivatives are off unless enabled, and the server's shutdown hook stops the process pool"""
+    print("🛑 Testing shutdown hook")
+    from app.config import settings
+    from app.image_derivatives import image_derivatives
+    from app.main import shutdown_event
+
+    assert settings.IMAGE_DERIVATIVES_ENABLED is False
+    asyncio.run(image_derivatives.render(make_room_art()))
+    processes = list(image_derivatives._executor._processes.values())
+    assert processes
+
+    asyncio.run(shutdown_event())
+    assert image_derivatives._executor is None
+    for process in processes:
+        process.join(timeout=5)
+    assert not any(process.is_alive() for process in processes)
+    print("  ✅ Worker processes stopped on shutdown")
+
+
+if __name__ == "__main__":
+    test_render_sizes_and_formats()
+    test_pipeline_stores_deterministic_keys()
+    test_benchmark_throughput_and_savings()
+    test_server_shutdown_stops_worker_processes()
+    print("🎉 Image derivative tests completed!")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test the temporary image URL regeneration queue: deduplication, the shared rate
+limit, the index and the background sweeper
+"""
+
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+
+import fakeredis
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.image_regeneration import (
+    ImageRegenerationQueue, INDEX_KEY, MARKER_PREFIX, RATE_PREFIX, SWEEP_LOCK_KEY, QUEUED, IN_PROGRESS, RATE_LIMITED, RESOLVED
+)
+
+TEMP_URL = "https://replicate.delivery/xezq/abc/out.png"
+STORED_URL = "https://project.supabase.co/storage/v1/object/public/room-images/rooms/room_1.png?v=1"
+
+
+def make_queue(redis, per_minute=10):
+    queue = ImageRegenerationQueue(per_minute, 600, 30.0, 20)
+    queue._redis = lambda: redis
+    return queue
+
+
+def test_movement_storm_is_deduplicated(fake_redis):
+    """Many players discovering the same expired rooms start one regeneration per room"""
+    print("🌩️ Testing regeneration storm")
+    redis = fake_redis
+    queue = make_queue(redis, per_minute=100)
+    outcomes = [queue.request(f"room_{i % 5}") for i in range(200)]
+    print(f"  {outcomes.count(QUEUED)} queued, {outcomes.count(IN_PROGRESS)} deduplicated")
+    assert outcomes.count(QUEUED) == 5
+    assert outcomes.count(IN_PROGRESS) == 195
+    assert redis.zcard(INDEX_KEY) == 5
+    print("  ✅ One regeneration per room")
+
+
+def test_rate_limit_leaves_rooms_for_the_sweeper(fake_redis):
+    """Requests over the per-minute budget are refused without holding the in-progress marker"""
+    print("🚦 Testing rate limit")
+    redis = fake_redis
+    queue = make_queue(redis, per_minute=3)
+    outcomes = [queue.request(f"room_{i}") for i in range(5)]
+    assert outcomes == [QUEUED] * 3 + [RATE_LIMITED] * 2
+    assert not redis.exists(f"{MARKER_PREFIX}room_4")
+    assert redis.zcard(INDEX_KEY) == 5
+    assert queue.get_metrics()['used_this_minute'] == 5
+    print("  ✅ Budget enforced; refused rooms stay indexed")
+
+
+def test_note_updates_index_and_marker(fake_redis):
+    """Storing a permanent URL clears the room; a kept temporary URL indexes it"""
+    print("📝 Testing index updates")
+    redis = fake_redis
+    queue = make_queue(redis)
+    assert queue.request("room_1") == QUEUED
+    queue.note("room_1", STORED_URL)
+    assert redis.zcard(INDEX_KEY) == 0 and not redis.exists(f"{MARKER_PREFIX}room_1")
+    assert queue.request("room_1") == QUEUED, "a later expiry could not be regenerated"
+
+    queue.note("room_2", TEMP_URL)
+    assert redis.zscore(INDEX_KEY, "room_2") is not None
+    assert queue.get_metrics()['completed'] == 1
+    print("  ✅ Index follows stored image URLs")
+
+
+def test_sweeper_regenerates_ahead_of_players(fake_redis):
+    """The sweeper indexes cached rooms and queues them within the rate limit, one sweeper at a time"""
+    print("🧹 Testing sweeper")
+    redis = fake_redis
+    queue = make_queue(redis, per_minute=4)
+    rooms = {}
+    for i in range(6):
+        rooms[f"room_{i}"] = {"id": f"room_{i}", "image_url": TEMP_URL if i < 5 else STORED_URL}
+        redis.set(f"room:room_{i}", json.dumps(rooms[f"room_{i}"]))
+    redis.set("room:room_0:players", "[]")
+    submitted = []
+
+    async def handler(room_id):
+        # Mirrors GameManager._sweep_temporary_image
+        if rooms[room_id]['image_url'] != TEMP_URL:
+            queue.note(room_id, rooms[room_id]['image_url'])
+            return RESOLVED
+        outcome = queue.request(room_id)
+        if outcome == QUEUED:
+            submitted.append(room_id)
+        return outcome
+
+    assert queue.index_cached_rooms() == 5
+    queue.request("room_0")  # A player got there first
+    redis.zadd(INDEX_KEY, {"room_0": time.time() - 100})
+
+    queued = asyncio.run(queue.sweep_once(handler))
+    assert asyncio.run(queue.sweep_once(handler)) == 0, "a second sweeper ran during the same interval"
+    print(f"  sweep queued {queued}: {submitted}")
+    assert queued == 3 and len(submitted) == 3 and "room_0" not in submitted
+    # The room already being regenerated was moved behind the others
+    assert redis.zrange(INDEX_KEY, -1, -1) == [b"room_0"]
+
+    # Regenerations finish; the next sweep picks up what the budget skipped
+    for room_id in submitted:
+        rooms[room_id]['image_url'] = STORED_URL
+        queue.note(room_id, STORED_URL)
+    redis.delete(SWEEP_LOCK_KEY, *redis.keys(f"{RATE_PREFIX}*"))
+    assert asyncio.run(queue.sweep_once(handler)) == 1
+    assert redis.zcard(INDEX_KEY) == 2
+    print("  ✅ Sweeper drains the index within the budget")
+
+
+def test_startup_index_scan_off_the_event_loop(fake_redis):
+    """The sweeper's startup scan of cached rooms runs in a worker thread, not on the event loop"""
+    print("🧵 Testing startup scan thread")
+    redis = fake_redis
+    queue = make_queue(redis)
+    redis.set("room:room_1", json.dumps({"id": "room_1", "image_url": TEMP_URL}))
+    scan_threads = []
+    index_cached_rooms = queue.index_cached_rooms
+
+    def recording_index():
+        scan_threads.append(threading.current_thread())
+        return index_cached_rooms()
+
+    queue.index_cached_rooms = recording_index
+
+    async def run():
+        loop_thread = threading.current_thread()
+        sweeper = asyncio.create_task(queue.run(lambda room_id: asyncio.sleep(0, result=IN_PROGRESS)))
+        while not scan_threads or not redis.zcard(INDEX_KEY):
+            await asyncio.sleep(0.01)
+        sweeper.cancel()
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert scan_threads and scan_threads[0] is not loop_thread
+    assert redis.zscore(INDEX_KEY, "room_1") is not None
+    print("  ✅ Cached rooms indexed from a worker thread")
+
+
+if __name__ == "__main__":
+    test_movement_storm_is_deduplicated(fakeredis.FakeRedis())
+    test_rate_limit_leaves_rooms_for_the_sweeper(fakeredis.FakeRedis())
+    test_note_updates_index_and_marker(fakeredis.FakeRedis())
+    test_sweeper_regenerates_ahead_of_players(fakeredis.FakeRedis())
+    test_startup_index_scan_off_the_event_loop(fakeredis.FakeRedis())
+    print("🎉 Image regeneration tests completed!")
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Test the room image prompt similarity index: MinHash matching per biome,
+the reuse ratio, sharing through Redis and the reported savings
+"""
+
+import sys
+import os
+import asyncio
+import random
+
+import fakeredis
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app.image_reuse as image_reuse
+from app.image_reuse import PromptImageIndex, prompt_shingles, minhash_signature, estimate_similarity
+from app.image_reuse import CHANGES_KEY_PREFIX, SEQUENCE_KEY_PREFIX
+
+
+def make_index(redis, mode="reuse", threshold=0.6, ratio=1.0):
+    index = PromptImageIndex(mode, threshold, ratio)
+    index._redis = lambda: redis
+    return index
+
+
+FOREST = "A misty pine forest clearing with a mossy stone well and glowing mushrooms at dusk"
+
+
+def test_similarity_estimates():
+    """Reworded prompts score high, unrelated scenes score low"""
+    print("🔎 Testing MinHash similarity")
+    base = minhash_signature(prompt_shingles(FOREST))
+    close = minhash_signature(prompt_shingles("A misty pine forest clearing with a mossy stone well and glowing mushrooms at night"))
+    far = minhash_signature(prompt_shingles("A bustling desert bazaar with silk tents and brass lanterns under a red sun"))
+    print(f"  close: {estimate_similarity(base, close):.2f}, far: {estimate_similarity(base, far):.2f}")
+    assert estimate_similarity(base, base) == 1.0
+    assert estimate_similarity(base, close) >= 0.6
+    assert estimate_similarity(base, far) < 0.2
+    print("  ✅ Similarity tracks prompt overlap")
+
+
+def test_matches_stay_within_biome(fake_redis):
+    """Only rooms of the same biome are reuse candidates, and a room never matches itself"""
+    print("🌲 Testing per-biome matching")
+    redis = fake_redis
+    index = make_index(redis)
+    index.add("forest", "room_1", FOREST, "https://storage/rooms/room_1.png", 12.0)
+
+    match = index.find_reusable("Forest", FOREST + " with fireflies", "room_2")
+    assert match and match['room_id'] == "room_1" and match['image_url'].endswith("room_1.png")
+    assert index.find_reusable("swamp", FOREST, "room_3") is None
+    assert index.find_reusable("forest", FOREST, "room_1") is None
+    assert index.find_reusable("forest", "A frozen lake under the northern lights", "room_4") is None
+    print("  ✅ Matches limited to the biome")
+
+
+def test_reuse_ratio_and_off_mode(fake_redis):
+    """A reuse ratio of 0.5 reuses about half the matches; mode off only counts them"""
+    print("🎲 Testing reuse ratio")
+    random.seed(7)
+    redis = fake_redis
+    index = make_index(redis, ratio=0.5)
+    index.add("forest", "room_1", FOREST, "https://storage/rooms/room_1.png", 10.0)
+    reused = sum(1 for i in range(400) if index.find_reusable("forest", FOREST, f"room_x{i}"))
+    print(f"  reused {reused}/400 matches")
+    assert 160 <= reused <= 240
+
+    off = make_index(redis, mode="off")
+    assert off.find_reusable("forest", FOREST, "room_y") is None
+    assert off.get_metrics()['matches'] == 1
+    print("  ✅ Ratio applied; off mode reports matches only")
+
+
+def test_index_shared_through_redis(fake_redis):
+    """An entry added by one process is found by another"""
+    print("🔗 Testing shared index")
+    redis = fake_redis
+    worker = make_index(redis)
+    api = make_index(redis)
+    assert api.find_reusable("forest", FOREST, "room_2") is None
+    worker.add("forest", "room_1", FOREST, "https://storage/rooms/room_1.png", 10.0)
+    assert api.find_reusable("forest", FOREST, "room_2")['room_id'] == "room_1"
+    assert api.get_metrics()['indexed'] == {"forest": 1}
+
+    # Replacing an entry keeps the entry count the same; the other process still picks it up
+    worker.add("forest", "room_1", FOREST, "https://storage/rooms/room_1.webp", 10.0)
+    assert api.find_reusable("forest", FOREST, "room_2")['image_url'].endswith("room_1.webp")
+    # Only changes made since the last lookup are read; the hash keeps one entry per room
+    assert api._biomes["forest"].log_position == int(redis.get(api._key("forest", SEQUENCE_KEY_PREFIX))) == 2
+    assert redis.hlen(api._key("forest")) == 1
+    print("  ✅ Index caught up from the shared log")
+
+
+def test_change_log_bounded(fake_redis):
+    """Regenerating images keeps the Redis state bounded; processes that fall behind reload the hash"""
+    print("✂️ Testing bounded change log")
+    redis = fake_redis
+    original = image_reuse.CHANGES_KEPT
+    image_reuse.CHANGES_KEPT = 5
+    try:
+        worker = make_index(redis)
+        api = make_index(redis)
+        worker.add("forest", "room_1", FOREST, "https://storage/rooms/room_1.png", 10.0)
+        assert api.find_reusable("forest", FOREST, "room_9")['image_url'].endswith("room_1.png")
+
+        # Many regenerations of the same rooms while the api process is idle
+        for i in range(40):
+            worker.add("forest", f"room_{i % 3}", FOREST + f" variant {i % 3}", f"https://storage/rooms/room_{i % 3}_{i}.png", 10.0)
+        assert redis.llen(worker._key("forest", CHANGES_KEY_PREFIX)) == 5
+        assert redis.hlen(worker._key("forest")) == 3
+
+        # Further behind than the kept changes: reloaded from the hash with the latest images
+        api.find_reusable("forest", FOREST, "room_9")
+        latest = {room_id: entry[1] for room_id, entry in api._biomes["forest"].entries.items()}
+        assert latest == {
+            "room_0": "https://storage/rooms/room_0_39.png",
+            "room_1": "https://storage/rooms/room_1_37.png",
+            "room_2": "https://storage/rooms/room_2_38.png"
+        }
+        assert api._biomes["forest"].log_position == 41
+
+        # A few changes later it catches up from the log again
+        worker.add("forest", "room_3", FOREST, "https://storage/rooms/room_3.png", 10.0)
+        api.find_reusable("forest", FOREST, "room_9")
+        assert api._biomes["forest"].entries["room_3"][1].endswith("room_3.png")
+        assert api._biomes["forest"].log_position == 42
+    finally:
+        image_reuse.CHANGES_KEPT = original
+    print("  ✅ Log trimmed; lagging process reloaded the latest entries")
+
+
+def test_reused_image_copied_for_room(fake_redis):
+    """A reusing room stores its own copy of the matched image, not the source room's URL"""
+    print("📑 Testing reused image copy")
+    import app.game_manager as game_manager_module
+    from app.game_manager import GameManager
+
+    source_url = "https://storage/rooms/room_1.webp"
+    index = make_index(fake_redis)
+    index.add("forest", "room_1", FOREST, source_url, 10.0)
+    copies = []
+
+    async def copy_room_image(image_url, room_id):
+        copies.append((image_url, room_id))
+        return f"https://storage/rooms/{room_id}.webp"
+
+    class Database:
+        async def get_room(self, room_id):
+            return {'id': room_id, 'image_url': source_url, 'image_variants': {'thumb.webp': "https://storage/derivatives/thumb.webp"}}
+
+    manager = GameManager.__new__(GameManager)
+    manager.db = Database()
+    originals = game_manager_module.prompt_image_index, game_manager_module.copy_room_image
+    game_manager_module.prompt_image_index, game_manager_module.copy_room_image = index, copy_room_image
+    try:
+        image_url, variants = asyncio.run(manager._room_image_for_prompt("room_2", FOREST, "forest"))
+    finally:
+        game_manager_module.prompt_image_index, game_manager_module.copy_room_image = originals
+    assert copies == [(source_url, "room_2")]
+    assert image_url == "https://storage/rooms/room_2.webp"
+    assert variants == {'thumb.webp': "https://storage/derivatives/thumb.webp"}
+    assert index.get_metrics()['reused'] == 1
+    print("  ✅ Room stores its own copy")
+
+
+def test_benchmark_reuse_rate_and_time_saved(fake_redis):
+    """Benchmark: a stream of templated room prompts across biomes"""
+    print("⏱️ Simulating room image prompts")
+    random.seed(3)
+    redis = fake_redis
+    index = make_index(redis, ratio=0.5)
+    scenes = {
+        "forest": ["pine forest clearing", "ancient oak grove", "fern-choked ravine", "mossy ruined shrine"],
+        "desert": ["wind-carved sandstone arch", "dry oasis", "half-buried temple", "salt flat"],
+        "tundra": ["frozen lake", "ice cave", "snowbound watchtower", "pine ridge in a blizzard"]
+    }
+    details = ["with glowing mushrooms", "under a pale moon", "at golden hour", "shrouded in mist", "with a broken cart"]
+    reused = generated = 0
+    for i in range(300):
+        biome = random.choice(list(scenes))
+        prompt = f"A {random.choice(scenes[biome])} {random.choice(details)}, {biome} landscape"
+        room_id = f"room_{i}"
+        match = index.find_reusable(biome, prompt, room_id)
+        if match:
+            index.record_reuse(room_id, match)
+            reused += 1
+        else:
+            index.add(biome, room_id, prompt, f"https://storage/rooms/{room_id}.png", random.uniform(8, 14))
+            generated += 1
+
+    metrics = index.get_metrics()
+    print(f"  reuse rate: {metrics['reuse_rate']:.0%} ({reused} reused, {generated} generated)")
+    print(f"  generation time saved: {metrics['saved_seconds']:.0f}s at {metrics['avg_generation_seconds']}s per image")
+    assert metrics['reused'] == reused and metrics['generated'] == generated
+    assert 0.2 <= metrics['reuse_rate'] <= 0.5
+    assert metrics['saved_seconds'] > reused * 8
+    print("  ✅ Benchmark completed")
+
+
+if __name__ == "__main__":
+    test_similarity_estimates()
+    test_matches_stay_within_biome(fakeredis.FakeRedis())
+    test_reuse_ratio_and_off_mode(fakeredis.FakeRedis())
+    test_index_shared_through_redis(fakeredis.FakeRedis())
+    test_change_log_bounded(fakeredis.FakeRedis())
+    test_reused_image_copied_for_room(fakeredis.FakeRedis())
+    test_benchmark_reuse_rate_and_time_saved(fakeredis.FakeRedis())
+    print("🎉 Image reuse tests completed!")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Test the durable Redis job queue: idempotency, atomic claims, retries, visibility
+timeout and requeue
+"""
+
+import sys
+import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.job_queue import JobQueue, JobDeferred, job_queue, READY_KEY, PROCESSING_KEY, DEAD_KEY
+from app import job_worker
+from app.model_3d_poller import model_3d_poller
+
+
+def make_queue(redis, max_attempts=3):
+    queue = JobQueue(60.0, max_attempts, 5.0, 300.0)
+    queue._redis = lambda: redis
+    return queue
+
+
+def make_due(redis, job_id):
+    redis.zadd(READY_KEY, {job_id: time.time() - 1})
+
+
+def test_idempotency_key_dedups_active_jobs(fake_redis):
+    """A second enqueue for the same room returns the active job instead of adding another"""
+    print("🔑 Testing idempotency keys")
+    redis = fake_redis
+    queue = make_queue(redis)
+    first = queue.enqueue("room_image", {"room_id": "room_1"}, idempotency_key="image:room_1")
+    second = queue.enqueue("room_image", {"room_id": "room_1"}, idempotency_key="image:room_1")
+    other = queue.enqueue("room_image", {"room_id": "room_2"}, idempotency_key="image:room_2")
+    assert first == second
+    assert other != first
+    assert queue.get_stats()['ready'] == 2
+
+    # Once the job finishes the key is free again
+    job = queue.claim("w1")
+    queue.complete(job)
+    third = queue.enqueue("room_image", {"room_id": "room_1"}, idempotency_key="image:room_1")
+    assert third != first
+    assert queue.get_status(first)['status'] == 'succeeded'
+    print("  ✅ One active job per idempotency key")
+
+
+def test_retry_backoff_until_dead(fake_redis):
+    """Failures are retried later with growing delays and the job dies after max_attempts"""
+    print("🔁 Testing retries and backoff")
+    redis = fake_redis
+    queue = make_queue(redis, max_attempts=3)
+    job_id = queue.enqueue("model_3d", {"room_id": "room_1"}, idempotency_key="model_3d:room_1")
+
+    delays = []
+    for attempt in range(3):
+        job = queue.claim("w1")
+        assert job and job['attempts'] == attempt + 1
+        assert queue.claim("w1") is None, "a running job was handed out twice"
+        dead = queue.fail(job, "FAL timeout")
+        if not dead:
+            delays.append(redis.zscore(READY_KEY, job_id) - time.time())
+            assert queue.claim("w1") is None, "retry ran before its backoff"
+            make_due(redis, job_id)
+
+    status = queue.get_status(job_id)
+    print(f"  retry delays: {[round(d, 1) for d in delays]}")
+    assert dead and status['status'] == 'dead' and status['last_error'] == "FAL timeout"
+    assert 2.5 <= delays[0] <= 5.0 and 5.0 <= delays[1] <= 10.0
+    assert redis.zscore(DEAD_KEY, job_id) is not None
+    assert not queue.has_active_job("model_3d:room_1")
+    print("  ✅ Backed off exponentially and marked dead")
+
+
+def test_visibility_timeout_requeues_abandoned_jobs(fake_redis):
+    """A job whose worker stops heartbeating is handed back to the queue"""
+    print("⏰ Testing visibility timeout")
+    redis = fake_redis
+    queue = make_queue(redis)
+    job_id = queue.enqueue("room_image", {"room_id": "room_1"})
+    queue.claim("crashed-worker")
+    assert queue.requeue_expired() == []
+    assert queue.get_stats()['processing'] == 1
+
+    # Heartbeats push the deadline out; a missed deadline hands the job back
+    queue.heartbeat(job_id)
+    assert redis.zscore(PROCESSING_KEY, job_id) > time.time() + 30
+    redis.zadd(PROCESSING_KEY, {job_id: time.time() - 1})
+    assert queue.requeue_expired() == []
+    status = queue.get_status(job_id)
+    assert status['status'] == 'retrying'
+    assert "crashed-worker" in status['last_error']
+    assert queue.get_stats()['processing'] == 0 and queue.get_stats()['ready'] == 1
+    print("  ✅ Expired job put back for another worker")
+
+
+def test_claim_is_atomic(fake_redis):
+    """Concurrent workers never share a job, jobs that aren't due stay put, and a crash mid-claim loses nothing"""
+    print("⚛️ Testing atomic claims")
+    redis = fake_redis
+    queue = make_queue(redis)
+    job_ids = [queue.enqueue("room_image", {"room_id": f"room_{i}"}) for i in range(20)]
+    later = queue.enqueue("room_image", {"room_id": "room_later"}, delay=60)
+    later_score = redis.zscore(READY_KEY, later)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        claimed = list(pool.map(lambda i: queue.claim(f"w{i % 8}"), range(30)))
+    claimed_ids = [job['id'] for job in claimed if job]
+    assert sorted(claimed_ids) == sorted(job_ids), "a job was claimed twice or not at all"
+    assert redis.zscore(READY_KEY, later) == later_score, "a job that wasn't due was moved"
+    assert redis.zcard(PROCESSING_KEY) == 20
+
+    # A worker that dies between taking the job and writing its record leaves it in processing
+    crashed = queue.enqueue("model_3d", {"room_id": "room_crash"}, idempotency_key="model_3d:room_crash")
+    assert queue._take_due(time.time()) == crashed
+    assert queue.has_active_job("model_3d:room_crash")
+    redis.zadd(PROCESSING_KEY, {crashed: time.time() - 1})
+    queue.requeue_expired()
+    assert queue.get_status(crashed)['status'] == 'retrying'
+    assert redis.zscore(READY_KEY, crashed) is not None
+    print(f"  {len(claimed_ids)} jobs claimed once each by 8 concurrent workers")
+    print("  ✅ Claims are atomic")
+
+
+def test_admin_requeue_of_dead_job(fake_redis):
+    """Requeueing a dead job resets its attempts and makes it claimable immediately"""
+    print("🛠️ Testing admin requeue")
+    redis = fake_redis
+    queue = make_queue(redis, max_attempts=1)
+    job_id = queue.enqueue("room_image", {"room_id": "room_1"}, idempotency_key="image:room_1")
+    assert queue.fail(queue.claim("w1"), "boom")
+    assert queue.requeue(job_id)
+    assert redis.zscore(DEAD_KEY, job_id) is None
+    assert queue.has_active_job("image:room_1")
+    job = queue.claim("w1")
+    assert job['id'] == job_id and job['attempts'] == 1
+    assert not queue.requeue("job_missing")
+    print("  ✅ Dead job back on the queue")
+
+
+def test_worker_runs_defers_and_marks_dead(fake_redis):
+    """The worker completes jobs, defers polls without using attempts and runs dead-job hooks"""
+    print("👷 Testing job worker")
+    redis = fake_redis
+    original_redis = job_queue._redis
+    original_max = job_queue.max_attempts
+    job_queue._redis = lambda: redis
+    job_queue.max_attempts = 1
+    calls = []
+
+    async def ok(game_manager, payload):
+        calls.append(("ok", payload['room_id']))
+
+    async def poll(game_manager, payload):
+        raise JobDeferred(10, {"polls": payload.get('polls', 0) + 1})
+
+    async def broken(game_manager, payload):
+        raise RuntimeError("image provider down")
+
+    async def dead(game_manager, payload):
+        calls.append(("dead", payload['room_id']))
+
+    handlers = {"ok": ok, "poll": poll, "broken": broken}
+    original_handlers = dict(job_worker.JOB_HANDLERS)
+    original_dead = dict(job_worker.DEAD_JOB_HANDLERS)
+    job_worker.JOB_HANDLERS.update(handlers)
+    job_worker.DEAD_JOB_HANDLERS["broken"] = dead
+    try:
+        worker = job_worker.JobWorker(None, 1, 0.01)
+        ok_id = job_queue.enqueue("ok", {"room_id": "r1"})
+        poll_id = job_queue.enqueue("poll", {"room_id": "r2"})
+        broken_id = job_queue.enqueue("broken", {"room_id": "r3"})
+
+        async def run():
+            for _ in range(3):
+                await worker.run_job(job_queue.claim(worker.worker_id))
+
+        asyncio.run(run())
+        poll_job = job_queue.get_status(poll_id)
+        assert job_queue.get_status(ok_id)['status'] == 'succeeded'
+        assert poll_job['status'] == 'queued' and poll_job['attempts'] == 0
+        assert poll_job['payload']['polls'] == 1
+        assert job_queue.get_status(broken_id)['status'] == 'dead'
+        assert calls == [("ok", "r1"), ("dead", "r3")]
+    finally:
+        job_worker.JOB_HANDLERS.clear()
+        job_worker.JOB_HANDLERS.update(original_handlers)
+        job_worker.DEAD_JOB_HANDLERS.clear()
+        job_worker.DEAD_JOB_HANDLERS.update(original_dead)
+        job_queue._redis = original_redis
+        job_queue.max_attempts = original_max
+    print("  ✅ Completed, deferred and dead jobs handled")
+
+
+def test_room_image_handler_paths():
+    """mark_generating jobs take the generating path; the others the background path"""
+    print("🖼️ Testing room image job routing")
+    calls = []
+
+    class GameManager:
+        async def _generate_room_image(self, room_id, image_prompt, raise_errors=False):
+            calls.append(("generating", room_id))
+
+        async def _generate_room_image_background(self, room_id, image_prompt, raise_errors=False):
+            calls.append(("background", room_id))
+
+    async def run():
+        await job_worker.handle_room_image(GameManager(), {"room_id": "r1", "image_prompt": "p", "mark_generating": True})
+        await job_worker.handle_room_image(GameManager(), {"room_id": "r2", "image_prompt": "p"})
+
+    asyncio.run(run())
+    assert calls == [("generating", "r1"), ("background", "r2")]
+    print("  ✅ Each image job takes its own path")
+
+
+def test_find_stuck_rooms(fake_redis):
+    """Rooms left generating without a job are found and requeued once"""
+    print("🧹 Testing stuck room requeue")
+    redis = fake_redis
+    original_redis = job_queue._redis
+    original_poller_redis = model_3d_poller._redis
+    job_queue._redis = lambda: redis
+    model_3d_poller._redis = lambda: redis
+    try:
+        redis.set("room:a", '{"id": "a", "image_status": "generating", "model_3d_status": "none"}')
+        redis.set("room:b", '{"id": "b", "image_status": "ready", "model_3d_status": "generating"}')
+        redis.set("room:c", '{"id": "c", "image_status": "ready", "model_3d_status": "ready"}')
+        redis.set("room:a:players", "[]")
+
+        assert len(job_worker.requeue_stuck_rooms(redis, dry_run=True)) == 2
+        assert job_queue.get_stats()['ready'] == 0
+        requeued = job_worker.requeue_stuck_rooms(redis)
+        assert {(entry['room_id'], entry['kind']) for entry in requeued} == {("a", "room_image_regenerate"), ("b", "model_3d")}
+        assert job_worker.find_stuck_rooms(redis) == [], "rooms with active jobs reported as stuck"
+
+        # A room whose FAL job is already being polled is not stuck
+        redis.set("room:d", '{"id": "d", "image_status": "ready", "model_3d_status": "generating"}')
+        redis.zadd("model_3d:polls", {"d": time.time() + 5})
+        assert job_worker.find_stuck_rooms(redis) == []
+    finally:
+        job_queue._redis = original_redis
+        model_3d_poller._redis = original_poller_redis
+    print("  ✅ Stuck rooms requeued")
+
+
+if __name__ == "__main__":
+    test_idempotency_key_dedups_active_jobs(fakeredis.FakeRedis())
+    test_retry_backoff_until_dead(fakeredis.FakeRedis())
+    test_visibility_timeout_requeues_abandoned_jobs(fakeredis.FakeRedis())
+    test_claim_is_atomic(fakeredis.FakeRedis())
+    test_admin_requeue_of_dead_job(fakeredis.FakeRedis())
+    test_worker_runs_defers_and_marks_dead(fakeredis.FakeRedis())
+    test_room_image_handler_paths()
+    test_find_stuck_rooms(fakeredis.FakeRedis())
+    print("🎉 Job queue tests completed!")
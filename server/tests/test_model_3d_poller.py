@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Test the centralized FAL 3D job poller against a stand-in FAL queue API served over
+HTTP, which the real fal_client (through FALService) polls
+"""
+
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fakeredis
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import fal_client.client
+from app.config import settings
+from app.fal_service import FALService
+from app.model_3d_poller import Model3DPoller, POLL_SET_KEY, POLL_STATE_KEY
+
+
+class StandInFAL:
+    """
+    Stand-in for the FAL queue API: GET .../requests/{id}/status and GET .../requests/{id}.
+    Each job is queued for its first status check, then in progress, and completes after
+    a set number of checks; failing jobs complete with an error result.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.status_requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    def submit(self, request_id, polls_to_finish, fail=False):
+        self.jobs[request_id] = {'remaining': polls_to_finish, 'checks': 0, 'fail': fail}
+        return request_id
+
+    def status(self, request_id):
+        with self.lock:
+            self.status_requests += 1
+            job = self.jobs[request_id]
+            job['remaining'] -= 1
+            job['checks'] += 1
+            if job['remaining'] >= 0 and job['checks'] == 1 and job['remaining'] > 0:
+                return 200, {"status": "IN_QUEUE", "queue_position": 3, "request_id": request_id}
+            if job['remaining'] > 0:
+                return 200, {"status": "IN_PROGRESS", "logs": None, "request_id": request_id}
+            return 200, {"status": "COMPLETED", "logs": None, "metrics": {}, "request_id": request_id}
+
+    def result(self, request_id):
+        if self.jobs[request_id]['fail']:
+            return 422, {"detail": "world generation failed"}
+        return 200, {"world_file": {"url": f"https://fal.example/{request_id}.zip", "file_size": 1024}}
+
+    def make_handler(self):
+        fal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fal.lock:
+                    fal.in_flight += 1
+                    fal.peak_in_flight = max(fal.peak_in_flight, fal.in_flight)
+                try:
+                    path = self.path.split('?')[0].rstrip('/').split('/')
+                    if path[-1] == 'status':
+                        code, body = fal.status(path[-2])
+                    else:
+                        code, body = fal.result(path[-1])
+                    # Let concurrent status checks overlap like real network calls
+                    time.sleep(0.005)
+                    payload = json.dumps(body).encode('utf-8')
+                    self.send_response(code)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with fal.lock:
+                        fal.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@contextmanager
+def stand_in_fal():
+    """Serve a StandInFAL on localhost and point fal_client's queue URL at it"""
+    fal = StandInFAL()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), fal.make_handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    original_url, original_key = fal_client.client.QUEUE_URL_FORMAT, settings.FAL_KEY
+    fal_client.client.QUEUE_URL_FORMAT = f"http://127.0.0.1:{server.server_address[1]}/"
+    settings.FAL_KEY = "stand-in-key"
+    try:
+        yield fal
+    finally:
+        fal_client.client.QUEUE_URL_FORMAT, settings.FAL_KEY = original_url, original_key
+        server.shutdown()
+        server.server_close()
+
+
+def make_poller(redis, timeout=60.0, upload_concurrency=2, batch_size=50):
+    poller = Model3DPoller(batch_size, 0.02, 0.08, 2.0, timeout, 10, upload_concurrency)
+    poller._redis = lambda: redis
+    return poller
+
+
+async def run_until(poller, handler, condition, limit=5.0):
+    task = asyncio.create_task(poller.run(handler))
+    deadline = time.time() + limit
+    while not condition() and time.time() < deadline:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def test_adaptive_interval():
+    """Poll intervals start fast and back off up to the cap"""
+    print("📈 Testing adaptive poll interval")
+    poller = Model3DPoller(50, 5.0, 60.0, 1.5, 1200.0, 10, 2)
+    intervals = [poller.interval_for(polls) for polls in range(10)]
+    print(f"  intervals: {[round(i, 1) for i in intervals]}")
+    assert intervals[0] == 5.0
+    assert all(later >= earlier for earlier, later in zip(intervals, intervals[1:]))
+    assert intervals[-1] == 60.0
+    # 20 minutes of polling takes a fraction of the 120 fixed 10s polls
+    elapsed, polls = 0.0, 0
+    while elapsed < 1200:
+        elapsed += poller.interval_for(polls)
+        polls += 1
+    print(f"  polls over 20 minutes: {polls}")
+    assert polls < 40
+    print("  ✅ Intervals back off and cap")
+
+
+def test_fal_status_mapping():
+    """FALService maps the queue API's statuses and results onto the poller's statuses"""
+    print("🗺️ Testing FAL status mapping")
+    with stand_in_fal() as fal:
+        fal.submit("req_queued", polls_to_finish=5)
+        fal.submit("req_running", polls_to_finish=5)
+        fal.submit("req_done", polls_to_finish=1)
+        fal.submit("req_broken", polls_to_finish=1, fail=True)
+        fal.status("req_running")  # Past its queued check
+
+        statuses = asyncio.run(FALService.poll_job_statuses(["req_queued", "req_running", "req_done", "req_broken"], 4))
+    print(f"  statuses: { {request_id: result['status'] for request_id, result in statuses.items()} }")
+    assert statuses["req_queued"] == {"status": "queued", "position": 3}
+    assert statuses["req_running"] == {"status": "in_progress"}
+    assert statuses["req_done"] == {"status": "completed", "result_url": "https://fal.example/req_done.zip", "file_size": 1024}
+    assert statuses["req_broken"]["status"] == "failed" and "world generation failed" in statuses["req_broken"]["error"]
+    print("  ✅ Queued, in progress, completed and failed mapped")
+
+
+def test_batched_polling_and_upload_fan_out(fake_redis):
+    """Many jobs are polled in shared batches and finished jobs fan out to bounded upload workers"""
+    print("📦 Testing batched polling")
+    redis = fake_redis
+    poller = make_poller(redis, upload_concurrency=3)
+    handled = {}
+    state = {'uploading': 0, 'peak': 0}
+
+    async def handler(room_id, result):
+        state['uploading'] += 1
+        state['peak'] = max(state['peak'], state['uploading'])
+        await asyncio.sleep(0.02)
+        state['uploading'] -= 1
+        handled[room_id] = result['status']
+
+    with stand_in_fal() as fal:
+        for i in range(30):
+            request_id = fal.submit(f"req_{i}", polls_to_finish=1 + i % 4, fail=(i == 7))
+            poller.track(f"room_{i}", request_id)
+
+        asyncio.run(run_until(poller, handler, lambda: len(handled) == 30))
+    metrics = poller.get_metrics()
+    print(f"  {metrics['polls']} polls in {metrics['batches']} batches, {fal.status_requests} status requests "
+          f"({fal.peak_in_flight} in flight at peak), upload peak: {state['peak']}")
+    assert len(handled) == 30
+    assert handled["room_7"] == "failed"
+    assert sum(1 for status in handled.values() if status == "completed") == 29
+    assert metrics['batches'] < metrics['polls'], "jobs were polled one at a time"
+    assert fal.peak_in_flight > 1, "status checks in a batch ran one after another"
+    # fal_client checks the status once more before fetching each finished job's result
+    assert fal.status_requests == sum(1 + i % 4 for i in range(30)) + 30
+    assert state['peak'] <= 3
+    assert metrics['pending'] == 0 and redis.hlen(POLL_STATE_KEY) == 0
+    assert metrics['completed'] == 29 and metrics['failed'] == 1
+    print("  ✅ Shared batches, one handler call per job")
+
+
+def test_resume_after_restart(fake_redis):
+    """Jobs tracked by a process that went away are picked up by a new poller"""
+    print("🔄 Testing resume after restart")
+    redis = fake_redis
+    handled = []
+
+    async def handler(room_id, result):
+        handled.append(room_id)
+
+    with stand_in_fal() as fal:
+        crashed = make_poller(redis)
+        for i in range(5):
+            crashed.track(f"room_{i}", fal.submit(f"req_{i}", polls_to_finish=2))
+        # The first process never ran its loop; a fresh process shares the same Redis
+        restarted = make_poller(redis)
+        asyncio.run(run_until(restarted, handler, lambda: len(handled) == 5))
+    assert sorted(handled) == [f"room_{i}" for i in range(5)]
+    assert redis.zcard(POLL_SET_KEY) == 0
+    print("  ✅ Restarted poller finished every job")
+
+
+def test_failed_upload_kept_and_timeout_reported(fake_redis):
+    """A handler error leaves the job tracked for a retry; overdue jobs are reported as failed"""
+    print("⏱️ Testing upload failure and timeout")
+    redis = fake_redis
+    poller = make_poller(redis, timeout=0.1)
+    results = {}
+
+    async def handler(room_id, result):
+        if room_id == "room_upload":
+            raise RuntimeError("storage unavailable")
+        results[room_id] = result
+
+    with stand_in_fal() as fal:
+        poller.track("room_upload", fal.submit("req_upload", polls_to_finish=1))
+        poller.track("room_slow", fal.submit("req_slow", polls_to_finish=1000))
+        asyncio.run(run_until(poller, handler, lambda: "room_slow" in results and poller.metrics['handler_errors']))
+    print(f"  slow job result: {results.get('room_slow')}")
+    assert results["room_slow"]["status"] == "failed" and "timed out" in results["room_slow"]["error"]
+    assert poller.is_tracking("room_upload"), "job dropped after its upload failed"
+    assert not poller.is_tracking("room_slow")
+    assert redis.zscore(POLL_SET_KEY, "room_upload") > time.time() + 60
+    print("  ✅ Failed upload retried later, overdue job reported")
+
+
+def test_retracked_room_not_untracked(fake_redis):
+    """A room re-tracked with a new FAL job while the old result is handled keeps the new job"""
+    print("🔁 Testing re-track during upload")
+    redis = fake_redis
+    poller = make_poller(redis)
+    handled = []
+
+    async def handler(room_id, result):
+        if not handled:
+            # A new 3D job is submitted for the room while the first one's result is uploading
+            poller.track(room_id, fal.submit("req_second", polls_to_finish=1000))
+        handled.append(result['result_url'])
+
+    with stand_in_fal() as fal:
+        poller.track("room_1", fal.submit("req_first", polls_to_finish=1))
+        asyncio.run(run_until(poller, handler, lambda: len(handled) == 1 and poller.metrics['completed'] == 1))
+    assert poller.is_tracking("room_1"), "the new job was untracked with the old one"
+    assert json.loads(redis.hget(POLL_STATE_KEY, "room_1"))['request_id'] == "req_second"
+    assert poller.untrack("room_1", "req_first") is False
+    assert poller.untrack("room_1", "req_second") is True and not poller.is_tracking("room_1")
+    print("  ✅ Only the finished job was untracked")
+
+
+if __name__ == "__main__":
+    test_adaptive_interval()
+    test_fal_status_mapping()
+    test_batched_polling_and_upload_fan_out(fakeredis.FakeRedis())
+    test_resume_after_restart(fakeredis.FakeRedis())
+    test_failed_upload_kept_and_timeout_reported(fakeredis.FakeRedis())
+    test_retracked_room_not_untracked(fakeredis.FakeRedis())
+    print("🎉 3D poller tests completed!")
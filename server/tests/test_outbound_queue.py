@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Test per-connection outbound queues: a stalled client doesn't hold up the rest of
+the room, full queues drop presence or disconnect on critical messages, a
+broadcast is encoded once for all recipients, and scheduled typewriter messages
+don't hold up the receive loop and can be fast-forwarded
+"""
+
+import sys
+import os
+import asyncio
+import json
+import time
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.outbound_queue import OutboundConnection, DROP_OLDEST, DISCONNECT, OVERFLOW_CLOSE_CODE, encode_message
+
+POLICIES = {"presence": DROP_OLDEST, "chat": DROP_OLDEST}
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.received = []
+        self.closed_with = None
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def queued(connection):
+    return [json.loads(payload)['n'] for _, payload in connection._queue]
+
+
+def make_connection(socket, max_depth=256, send_timeout=10.0):
+    return OutboundConnection(socket, "player", max_depth, send_timeout, POLICIES, DISCONNECT)
+
+
+def test_stalled_client_does_not_block_room():
+    """Benchmark: broadcast to 50 sockets when one of them takes seconds per message"""
+    print("🐢 Testing broadcast with a stalled client")
+
+    async def run():
+        sockets = [FakeSocket() for _ in range(49)] + [FakeSocket(delay=5.0)]
+        connections = [make_connection(socket) for socket in sockets]
+        for connection in connections:
+            connection.start()
+
+        start = time.perf_counter()
+        for i in range(20):
+            for connection in connections:
+                connection.enqueue({"type": "room_update", "n": i})
+        enqueue_seconds = time.perf_counter() - start
+
+        while any(len(socket.received) < 20 for socket in sockets[:-1]):
+            await asyncio.sleep(0.001)
+        delivered_seconds = time.perf_counter() - start
+        stalled = connections[-1].get_metrics()
+        for connection in connections:
+            connection.stop()
+        return enqueue_seconds, delivered_seconds, stalled, sockets
+
+    enqueue_seconds, delivered_seconds, stalled, sockets = asyncio.run(run())
+    print(f"  1000 broadcasts enqueued in {enqueue_seconds * 1000:.1f}ms, healthy clients done in {delivered_seconds * 1000:.1f}ms")
+    print(f"  stalled client queue depth {stalled['depth']}")
+    assert delivered_seconds < 1.0, "healthy clients waited on the stalled one"
+    assert [m['n'] for m in sockets[0].received] == list(range(20))
+    assert stalled['depth'] >= 19
+    print("  ✅ Healthy clients unaffected")
+
+
+def test_presence_drops_oldest():
+    """A full queue evicts the oldest presence message and keeps critical ones"""
+    print("👥 Testing drop-oldest overflow")
+
+    async def run():
+        connection = make_connection(FakeSocket(), max_depth=3)  # Writer not started: nothing drains
+        assert connection.enqueue({"type": "presence", "n": 1})
+        assert connection.enqueue({"type": "room_update", "n": 2})
+        assert connection.enqueue({"type": "presence", "n": 3})
+        assert connection.enqueue({"type": "presence", "n": 4})
+        assert queued(connection) == [2, 3, 4]
+        assert connection.enqueue({"type": "duel_round", "n": 5})
+        assert queued(connection) == [2, 4, 5]
+        return connection.get_metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics['dropped'] == 2 and metrics['depth'] == 3 and not metrics['closed']
+    print("  ✅ Oldest presence dropped")
+
+
+def test_critical_overflow_disconnects():
+    """A critical message that can't be queued closes the socket so the client resyncs"""
+    print("🔌 Testing disconnect overflow")
+
+    async def run():
+        socket = FakeSocket()
+        connection = make_connection(socket, max_depth=2)
+        connection.enqueue({"type": "room_update", "n": 1})
+        connection.enqueue({"type": "duel_round", "n": 2})
+        # Presence is simply dropped when nothing is evictable
+        assert not connection.enqueue({"type": "presence"})
+        assert not connection.closed
+        assert not connection.enqueue({"type": "room_update", "n": 3})
+        await asyncio.sleep(0)
+        assert not connection.enqueue({"type": "chat"}), "closed connection accepted a message"
+        return connection, socket
+
+    connection, socket = asyncio.run(run())
+    assert connection.closed and socket.closed_with == OVERFLOW_CLOSE_CODE
+    print("  ✅ Slow client disconnected")
+
+
+def test_send_timeout_closes_connection():
+    """A send that never completes stops the writer and closes the socket"""
+    print("⏳ Testing send timeout")
+
+    async def run():
+        socket = FakeSocket(delay=60.0)
+        connection = make_connection(socket, send_timeout=0.05)
+        connection.start()
+        connection.enqueue({"type": "room_update"})
+        await asyncio.sleep(0.2)
+        return connection, socket
+
+    connection, socket = asyncio.run(run())
+    assert connection.closed and socket.closed_with is not None
+    print("  ✅ Dead client closed")
+
+
+def test_encode_once_benchmark():
+    """Benchmark: a room_update broadcast to 50 players, encoded per recipient vs once"""
+    print("📦 Benchmarking room_update broadcast to 50 players")
+    players = [f"player_{i}" for i in range(50)]
+    message = {
+        "type": "room_update",
+        "room": {
+            "id": "room_1",
+            "title": "The Sunken Archive",
+            "description": "Shelves of drowned books lean over black water. " * 20,
+            "biome": "ruins",
+            "image_url": "https://project.supabase.co/storage/v1/object/public/room-images/rooms/room_1.png",
+            "image_variants": {f"{w}.{f}": f"https://cdn/rooms/room_1_{w}.{f}" for w in (256, 512, 1024) for f in ("webp", "avif")},
+            "players": players,
+            "items": [{"id": f"item_{i}", "name": "Waterlogged tome", "rarity": i % 4 + 1} for i in range(20)],
+            "connections": {"north": "room_2", "south": "room_3", "east": None, "west": "room_4"},
+        }
+    }
+    rounds = 200
+
+    async def run():
+        connections = [make_connection(FakeSocket(), max_depth=rounds * 2) for _ in players]
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # What send_json did for every recipient
+            for connection in connections:
+                connection.enqueue(message, json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+        per_recipient = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            payload = encode_message(message)
+            for connection in connections:
+                connection.enqueue(message, payload)
+        once = time.perf_counter() - start
+        return per_recipient, once, connections
+
+    per_recipient, once, connections = asyncio.run(run())
+    print(f"  payload {len(encode_message(message))} bytes")
+    print(f"  per recipient: {per_recipient / rounds * 1000:.2f}ms per broadcast")
+    print(f"  encode once:   {once / rounds * 1000:.2f}ms per broadcast ({per_recipient / once:.1f}x)")
+    assert json.loads(connections[0]._queue[-1][1]) == message
+    assert once < per_recipient
+    print("  ✅ Benchmark completed")
+
+
+def test_scheduled_storyline_fast_forward():
+    """A paced storyline leaves the caller free at once; fast-forward queues the rest together"""
+    print("⌨️ Testing scheduled delivery")
+
+    async def run():
+        socket = FakeSocket()
+        connection = make_connection(socket)
+        connection.start()
+        completed = []
+
+        async def on_complete():
+            completed.append(time.perf_counter())
+
+        start = time.perf_counter()
+        chunks = [{"type": "quest_storyline", "n": i} for i in range(10)]
+        connection.schedule("quest_storyline", chunks, interval=0.3, on_complete=on_complete)
+        returned = time.perf_counter() - start
+        await asyncio.sleep(0.35)
+        assert [m['n'] for m in socket.received] == [0, 1], "chunks not paced"
+        assert connection.schedules == ("quest_storyline",)
+
+        # A ping handled meanwhile is answered straight away, ahead of the remaining chunks
+        connection.enqueue({"type": "pong", "n": "pong"})
+        assert connection.fast_forward("quest_storyline") == 1
+        await asyncio.sleep(0.05)
+        fast_forwarded = time.perf_counter() - start
+        received = [m['n'] for m in socket.received]
+
+        # Closing the connection cancels a pending schedule without completing it
+        connection.schedule("notice", [{"type": "system", "n": "late"}], interval=0, delay=1.0, on_complete=on_complete)
+        connection.stop()
+        await asyncio.sleep(0)
+        return returned, fast_forwarded, received, completed, connection
+
+    returned, fast_forwarded, received, completed, connection = asyncio.run(run())
+    print(f"  schedule() returned in {returned * 1000:.2f}ms; 10 chunks delivered in {fast_forwarded * 1000:.0f}ms instead of 2700ms")
+    assert returned < 0.01
+    assert received == [0, 1, "pong", 2, 3, 4, 5, 6, 7, 8, 9]
+    assert len(completed) == 1 and connection.schedules == ()
+    print("  ✅ Storyline delivered without blocking")
+
+
+if __name__ == "__main__":
+    test_stalled_client_does_not_block_room()
+    test_presence_drops_oldest()
+    test_critical_overflow_disconnects()
+    test_send_timeout_closes_connection()
+    test_encode_once_benchmark()
+    test_scheduled_storyline_fast_forward()
+    print("🎉 Outbound queue tests completed!")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test concurrent room population: LLM scheduler limits and batched monster generation
+"""
+
+import asyncio
+import sys
+import os
+import time
+import json
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.llm_scheduler import LLMScheduler
+from app.templates.monsters import GenericMonsterTemplate
+
+
+async def test_scheduler_limits_background_calls():
+    """Background calls never exceed their share of slots and run concurrently"""
+    print("🚦 Testing LLM scheduler limits")
+    scheduler = LLMScheduler(max_concurrency=4, background_max_concurrency=2)
+    peak = {'background': 0}
+    active = {'background': 0}
+
+    async def fake_call():
+        async with scheduler.slot("test_background", background=True):
+            active['background'] += 1
+            peak['background'] = max(peak['background'], active['background'])
+            await asyncio.sleep(0.05)
+            active['background'] -= 1
+
+    start = time.time()
+    await asyncio.gather(*(fake_call() for _ in range(6)))
+    elapsed = time.time() - start
+
+    stats = scheduler.get_stats()
+    print(f"  Peak background concurrency: {peak['background']}, elapsed: {elapsed:.2f}s")
+    assert peak['background'] == 2
+    assert stats['call_sites']['test_background']['calls'] == 6
+    assert stats['in_flight'] == 0 and stats['waiting'] == 0
+    # 6 calls, 2 at a time, 50ms each -> ~150ms rather than 300ms serial
+    assert elapsed < 0.3
+    print("  ✅ Scheduler bounded background work")
+
+
+async def test_interactive_calls_not_blocked_by_background():
+    """Interactive calls get a slot while background work holds its full share"""
+    print("🚦 Testing interactive priority")
+    scheduler = LLMScheduler(max_concurrency=3, background_max_concurrency=2)
+    release = asyncio.Event()
+
+    async def background_call():
+        async with scheduler.slot("background", background=True):
+            await release.wait()
+
+    tasks = [asyncio.create_task(background_call()) for _ in range(4)]
+    await asyncio.sleep(0.01)
+
+    start = time.time()
+    async with scheduler.slot("interactive"):
+        waited = time.time() - start
+
+    release.set()
+    await asyncio.gather(*tasks)
+    print(f"  Interactive call waited {waited:.3f}s")
+    assert waited < 0.05
+    print("  ✅ Interactive call was not starved")
+
+
+def test_batch_monster_prompt_and_parse():
+    """One prompt covers several monsters and the response splits back into entries"""
+    print("👾 Testing batched monster generation")
+    template = GenericMonsterTemplate()
+    contexts = []
+    for _ in range(3):
+        context = {'room_title': 'Misty Hollow', 'room_description': 'Fog curls between roots.', 'biome': 'swamp', 'x': 3, 'y': 4}
+        template.generate_monster_data(context)
+        contexts.append(context)
+
+    prompt = template.generate_batch_prompt(contexts)
+    assert "MONSTER 3:" in prompt
+    assert prompt.count("LOCATION: Misty Hollow") == 1
+
+    response = json.dumps({"monsters": [
+        {"name": "Bog Lurker", "description": "A moss-covered shape.", "special_effects": "no special effects"},
+        {"name": "", "description": "Missing a name"},
+        {"name": "Fen Wisp", "description": "A drifting light."}
+    ]})
+    monsters = template.parse_batch_response(response, 3)
+    print(f"  Parsed by position: {[m and m['name'] for m in monsters]}")
+    assert [m and m['name'] for m in monsters] == ["Bog Lurker", None, "Fen Wisp"]
+    assert monsters[2]['special_effects'] == ""
+
+    # Slot numbers win over order: a dropped or reordered entry never shifts the others
+    response = {"monsters": [
+        {"slot": 3, "name": "Fen Wisp", "description": "A drifting light.", "special_effects": ""},
+        {"slot": 1, "name": "Bog Lurker", "description": "A moss-covered shape.", "special_effects": ""},
+        {"slot": 1, "name": "Duplicate", "description": "Second entry for slot 1.", "special_effects": ""},
+        {"slot": 7, "name": "Stray", "description": "No such slot.", "special_effects": ""}
+    ]}
+    monsters = template.parse_batch_response(response, 3)
+    print(f"  Parsed by slot: {[m and m['name'] for m in monsters]}")
+    assert [m and m['name'] for m in monsters] == ["Bog Lurker", None, "Fen Wisp"]
+    assert "slot" not in monsters[0]
+    assert template.parse_batch_response("not json", 3) == [None, None, None]
+    print("  ✅ Batch entries keep their slots")
+
+
+async def test_room_items_use_background_lane():
+    """Room population generates items on the background lane; crafting stays interactive"""
+    print("🎒 Testing item generation lanes")
+    from app.game_manager import GameManager
+    from app.templates.items import AIItemGenerator
+
+    calls = []
+
+    class RecordingHandler:
+        async def generate_structured(self, prompt, output_model, call_site, background=False, **kwargs):
+            calls.append((call_site, background))
+            return {"name": "Lantern of Reeds", "rarity": 2, "description": "A reed lantern.", "capabilities": ["lights the way"]}
+
+    class Database:
+        async def get_recent_high_rarity_items(self, min_rarity, limit):
+            return []
+
+    manager = GameManager.__new__(GameManager)
+    manager.ai_handler = RecordingHandler()
+    manager.db = Database()
+    item = await manager._generate_room_item_data(AIItemGenerator(), 2, "swamp", "Misty Hollow", "Fog curls between roots.")
+    await AIItemGenerator().generate_item(manager.ai_handler, {'database': manager.db, 'desired_rarity': 2})
+    print(f"  calls: {calls}")
+    assert item['name'] == "Lantern of Reeds"
+    assert calls == [("item_generation", True), ("item_generation", False)]
+    print("  ✅ Room items on the background lane")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_scheduler_limits_background_calls())
+    asyncio.run(test_interactive_calls_not_blocked_by_background())
+    test_batch_monster_prompt_and_parse()
+    asyncio.run(test_room_items_use_background_lane())
+    print("🎉 Parallel room population tests completed!")
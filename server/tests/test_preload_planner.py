@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test direction-aware preload planning, cancellation and hit-rate tracking, and that
+a cancelled preload holds its locks until the room it was committing exists
+"""
+
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.preload_planner import PreloadPlanner
+
+
+def make_planner(depth=3, budget=7):
+    return PreloadPlanner(depth, budget, 0.05, 6)
+
+
+def test_straight_line_preloads_ahead():
+    """A player walking north gets rooms further north, not behind them"""
+    print("🧭 Testing heading prediction")
+    planner = make_planner()
+    targets = planner.plan("p1", 0, 3, ["0,0", "0,1", "0,2"])
+    coordinates = [target.coordinate for target in targets]
+    print(f"  targets: {[(t.coordinate, t.ring, round(t.probability, 2)) for t in targets]}")
+
+    assert len(targets) == 7
+    # The four neighbours are always included and come first
+    assert set(coordinates[:4]) == {(0, 4), (0, 2), (1, 3), (-1, 3)}
+    assert (0, 5) in coordinates and (0, 6) in coordinates
+    assert (0, 1) not in coordinates, "planner preloaded back along the trail"
+    ahead = next(t for t in targets if t.coordinate == (0, 5))
+    assert ahead.parent == (0, 4) and ahead.direction == "north" and ahead.ring == 2
+
+    probabilities = planner.heading_probabilities(planner._trails["p1"])
+    assert probabilities["north"] > 0.5
+    print("  ✅ Deeper rings follow the player's heading")
+
+
+def test_new_player_gets_neighbours_only_budget():
+    """Without history every direction is equally likely and ring one is always planned"""
+    print("🆕 Testing plan without history")
+    planner = make_planner(depth=2, budget=4)
+    targets = planner.plan("p2", 5, 5)
+    assert {target.coordinate for target in targets} == {(5, 6), (5, 4), (6, 5), (4, 5)}
+    assert all(target.ring == 1 for target in targets)
+    print("  ✅ Only the four neighbours within a budget of four")
+
+
+def test_stale_preloads_cancelled_and_hits_counted():
+    """Moving elsewhere cancels preloads nobody needs; entered rooms count as hits"""
+    print("✂️ Testing cancellation and hit rate")
+    planner = make_planner(depth=1, budget=4)
+    started = {}
+
+    async def slow_preload(target):
+        started[target.coordinate] = True
+        if target.coordinate == (1, 0):
+            return "room_1_0"
+        await asyncio.sleep(10)
+        return f"room_{target.x}_{target.y}"
+
+    async def run():
+        first = asyncio.create_task(planner.run("p3", planner.plan("p3", 0, 0), slow_preload))
+        await asyncio.sleep(0.05)
+        # Player steps east: (0, 1), (0, -1) and (-1, 0) are no longer neighbours
+        planner.record_entry(1, 0)
+        second = asyncio.create_task(planner.run("p3", planner.plan("p3", 1, 0), slow_preload))
+        await asyncio.sleep(0.05)
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+
+    asyncio.run(run())
+    metrics = planner.get_metrics()
+    print(f"  metrics: {metrics}")
+    assert metrics["cancelled"] == 3
+    assert metrics["generated"] == 1
+    assert metrics["entered"] == 1
+    assert metrics["hit_rate"] == 1.0
+    assert metrics["by_ring"][1]["entered"] == 1
+    assert metrics["planning_players"] == 0, "finished plans are still tracked"
+    print("  ✅ Stale preloads cancelled and the entered room counted")
+
+
+class LockingDatabase:
+    """Records lock and status changes for one coordinate"""
+
+    def __init__(self):
+        self.events = []
+        self.status = None
+
+    async def get_room_by_coordinates(self, x, y):
+        return None
+
+    async def is_coordinate_discovered(self, x, y):
+        return False
+
+    async def is_coordinate_locked(self, x, y):
+        return False
+
+    async def set_coordinate_lock(self, x, y):
+        return True
+
+    async def is_room_generation_locked(self, room_id):
+        return False
+
+    async def set_room_generation_lock(self, room_id):
+        return True
+
+    async def set_room_generation_status(self, room_id, status):
+        self.status = status
+        self.events.append(f"status:{status}")
+
+    async def release_room_generation_lock(self, room_id):
+        self.events.append("release_generation_lock")
+
+    async def release_coordinate_lock(self, x, y):
+        self.events.append("release_coordinate_lock")
+
+
+def test_cancel_during_commit_keeps_locks():
+    """A preload cancelled while committing its room releases nothing until the room exists"""
+    print("🔒 Testing cancellation during the room commit")
+    from app.game_manager import GameManager
+
+    game_manager = GameManager.__new__(GameManager)
+    db = LockingDatabase()
+    game_manager.db = db
+    game_manager.biome_manager = SimpleNamespace(get_biome_for_coordinates=lambda x, y: asyncio.sleep(0, {"name": "Forest", "description": "Tall pines."}))
+    game_manager.ai_handler = SimpleNamespace(generate_room_description=lambda context: asyncio.sleep(0, ("Pine Walk", "Needles underfoot.", "pines")))
+    game_manager._build_room_generation_context = lambda **kwargs: {}
+    game_manager._submit_image_job = lambda *args, **kwargs: None
+
+    async def run():
+        committing = asyncio.Event()
+        finish_commit = asyncio.Event()
+
+        async def create_room_with_coordinates(**kwargs):
+            committing.set()
+            await finish_commit.wait()
+            db.events.append("room_created")
+
+        game_manager.create_room_with_coordinates = create_room_with_coordinates
+        preload = asyncio.create_task(game_manager._preload_single_room(0, 1, "north", None, SimpleNamespace(id="p1")))
+        await committing.wait()
+        preload.cancel()
+        await asyncio.sleep(0.05)
+        preload.cancel()  # A second cancel must not release the locks either
+        await asyncio.sleep(0.05)
+        assert "release_generation_lock" not in db.events, f"locks released mid-commit: {db.events}"
+        assert db.status == "generating"
+        finish_commit.set()
+        try:
+            await preload
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("cancelled preload did not re-raise")
+
+    asyncio.run(run())
+    print(f"  events: {db.events}")
+    assert db.events == [
+        "status:generating", "room_created", "status:content_ready",
+        "release_generation_lock", "release_coordinate_lock"
+    ]
+    print("  ✅ Locks released only after the room was created")
+
+
+if __name__ == "__main__":
+    test_straight_line_preloads_ahead()
+    test_new_player_gets_neighbours_only_budget()
+    test_stale_preloads_cancelled_and_hits_counted()
+    test_cancel_during_commit_keeps_locks()
+    print("🎉 Preload planner tests completed!")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test Redis-backed presence: joins and moves, heartbeats from stale sockets, and
+players dropping out of rooms once their heartbeats stop, as seen from two
+workers. Needs a local Redis (TEST_REDIS_URL, default redis://localhost:6379)
+and is skipped otherwise.
+"""
+
+import sys
+import os
+import time
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+import redis
+from app.presence import PresenceService
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379")
+PREFIX = f"presence_test_{os.getpid()}"
+
+
+def make_worker(ttl=90):
+    """A presence service with its own Redis connection, like a separate API worker"""
+    service = PresenceService(ttl=ttl)
+    client = redis.from_url(REDIS_URL)
+    service._redis = lambda: client
+    return service, client
+
+
+def cleanup(client):
+    for pattern in (f"presence:{PREFIX}*", f"room:{PREFIX}*"):
+        for key in client.scan_iter(match=pattern):
+            client.delete(key)
+
+
+def redis_available():
+    try:
+        return redis.from_url(REDIS_URL).ping()
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not redis_available(), reason=f"No Redis at {REDIS_URL}")
+
+
+def test_join_move_and_leave():
+    """A player is listed in one room at a time, and stale sockets can't pull them back"""
+    print("🚪 Testing joins, moves and leaves")
+    worker_a, client = make_worker()
+    worker_b, _ = make_worker()
+    cleanup(client)
+    hall, cellar = f"{PREFIX}_hall", f"{PREFIX}_cellar"
+    alice, bob = f"{PREFIX}_alice", f"{PREFIX}_bob"
+
+    assert worker_a.join(hall, alice, now=1000)
+    assert not worker_a.join(hall, alice, now=1001), "rejoining reported as new"
+    worker_a.join(hall, bob, now=1000)
+    assert sorted(worker_b.room_players(hall, now=1010)) == [alice, bob]
+
+    # Moving on worker B takes alice out of the hall for worker A too
+    worker_b.join(cellar, alice, now=1020)
+    assert worker_a.room_players(hall, now=1020) == [bob]
+    assert worker_a.room_of(alice) == cellar
+    assert not worker_a.heartbeat(hall, alice, now=1025), "old room's socket re-added the player"
+    assert worker_a.room_players(hall, now=1025) == [bob]
+
+    # Leaving a room the player already left doesn't clear their current presence
+    worker_a.leave(hall, alice)
+    assert worker_b.room_of(alice) == cellar
+    assert worker_b.leave(cellar, alice) and worker_b.room_of(alice) is None
+
+    assert not worker_a.join(hall, "None") and not worker_a.join(hall, "")
+    assert worker_a.room_players(hall, now=1030) == [bob]
+    cleanup(client)
+    print("  ✅ Presence consistent across workers")
+
+
+def test_expiry_without_sweep():
+    """Players whose heartbeats stop are trimmed on read, and their presence key expires"""
+    print("⌛ Testing heartbeat expiry")
+    worker, client = make_worker(ttl=2)
+    cleanup(client)
+    room = f"{PREFIX}_crypt"
+    players = [f"{PREFIX}_p{i}" for i in range(5)]
+    now = time.time()
+    for player_id in players:
+        worker.join(room, player_id, now=now)
+    for player_id in players[:2]:
+        worker.heartbeat(room, player_id, now=now + 1.5)
+
+    assert len(worker.room_players(room, now=now + 1.9)) == 5
+    assert sorted(worker.room_players(room, now=now + 2.5)) == sorted(players[:2])
+    assert worker.get_metrics()['expired'] == 3
+    assert client.zcard(f"room:{room}:presence") == 2, "expired entries not trimmed"
+
+    time.sleep(2.2)
+    assert worker.room_of(players[4]) is None, "presence key outlived its TTL"
+    cleanup(client)
+    print("  ✅ Dead connections dropped out on their own")
+
+
+def test_read_cost_with_many_players():
+    """Benchmark: reading a 2000-player room with and without expired entries to trim"""
+    print("📊 Benchmarking room reads")
+    worker, client = make_worker()
+    cleanup(client)
+    room = f"{PREFIX}_plaza"
+    pipe = client.pipeline()
+    for i in range(2000):
+        pipe.zadd(f"room:{room}:presence", {f"{PREFIX}_p{i}": 1000 if i % 4 else 500})
+    pipe.execute()
+
+    start = time.perf_counter()
+    first = worker.room_players(room, now=1000)
+    trimmed = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(20):
+        again = worker.room_players(room, now=1000)
+    steady = (time.perf_counter() - start) / 20
+
+    print(f"  first read trimmed {2000 - len(first)} expired players in {trimmed * 1000:.2f}ms")
+    print(f"  steady read of {len(again)} players in {steady * 1000:.2f}ms")
+    assert len(first) == 1500 and len(again) == 1500
+    cleanup(client)
+    print("  ✅ Benchmark completed")
+
+
+if __name__ == "__main__":
+    if not redis_available():
+        print(f"⚠️ No Redis at {REDIS_URL}, skipping presence tests")
+        sys.exit(0)
+    test_join_move_and_leave()
+    test_expiry_without_sweep()
+    test_read_cost_with_many_players()
+    print("🎉 Presence tests completed!")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed LLM response cache
+"""
+
+import sys
+import os
+import asyncio
+
+import fakeredis
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.response_cache import ResponseCache
+
+
+def make_cache(redis=None, lru_size=8):
+    cache = ResponseCache(True, lru_size, {"validate_action": 60, "analyze_duel": 0})
+    cache._redis = lambda: redis
+    return cache
+
+
+def test_key_normalization():
+    """Whitespace-only differences share a key; model and temperature do not"""
+    print("🔑 Testing cache key normalization")
+    base = ResponseCache.make_key("Can I  cast\n  fireball?", "model-a", 0.7)
+    assert base == ResponseCache.make_key("Can I cast fireball?", "model-a", 0.7)
+    assert base != ResponseCache.make_key("Can I cast fireball?", "model-b", 0.7)
+    assert base != ResponseCache.make_key("Can I cast fireball?", "model-a", 0.8)
+    print("  ✅ Keys are content addressed")
+
+
+def test_opt_in_per_call_site():
+    """Only call sites with a positive TTL are cached"""
+    print("🚦 Testing per call site opt-in")
+    cache = make_cache()
+    assert cache.ttl_for("validate_action") == 60
+    assert cache.ttl_for("analyze_duel") == 0
+    assert cache.ttl_for("stream_action") == 0
+
+    async def run():
+        key = ResponseCache.make_key("duel", "model-a", 0.8)
+        await cache.set("analyze_duel", key, "draw")
+        return await cache.get("analyze_duel", key)
+
+    assert asyncio.run(run()) is None
+    disabled = ResponseCache(False, 8, {"validate_action": 60})
+    assert disabled.ttl_for("validate_action") == 0
+    print("  ✅ Unlisted and disabled call sites bypass the cache")
+
+
+def test_lru_and_redis_hits(fake_redis):
+    """LRU serves repeats, Redis serves other processes, metrics track both"""
+    print("🧠 Testing LRU and Redis tiers")
+    writer = make_cache(fake_redis)
+    reader = make_cache(fake_redis)
+    key = ResponseCache.make_key("swing sword", "model-a", 0.7)
+
+    async def run():
+        assert await writer.get("validate_action", key) is None
+        await writer.set("validate_action", key, '{"valid": true}', latency=0.8)
+        assert await writer.get("validate_action", key) == '{"valid": true}'
+        assert await reader.get("validate_action", key) == '{"valid": true}'
+        assert await reader.get("validate_action", key) == '{"valid": true}'
+
+    asyncio.run(run())
+    writer_stats = writer.get_metrics()["call_sites"]["validate_action"]
+    reader_stats = reader.get_metrics()["call_sites"]["validate_action"]
+    print(f"  writer: {writer_stats}")
+    print(f"  reader: {reader_stats}")
+    assert writer_stats["lru_hits"] == 1 and writer_stats["misses"] == 1
+    assert writer_stats["hit_rate"] == 0.5
+    assert writer_stats["saved_seconds"] == 0.8
+    assert reader_stats["redis_hits"] == 1 and reader_stats["lru_hits"] == 1
+    print("  ✅ Hits are served from both tiers")
+
+
+def test_lru_eviction():
+    """The in-process tier is bounded"""
+    print("♻️ Testing LRU eviction")
+    cache = make_cache(lru_size=2)
+
+    async def run():
+        for i in range(3):
+            await cache.set("validate_action", f"k{i}", f"v{i}")
+        return await cache.get("validate_action", "k0"), await cache.get("validate_action", "k2")
+
+    oldest, newest = asyncio.run(run())
+    assert oldest is None and newest == "v2"
+    assert cache.get_metrics()["lru_entries"] == 2
+    print("  ✅ Oldest entry evicted")
+
+
+if __name__ == "__main__":
+    test_key_normalization()
+    test_opt_in_per_call_site()
+    test_lru_and_redis_hits(fakeredis.FakeRedis())
+    test_lru_eviction()
+    print("🎉 Response cache tests completed!")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Test room-affinity routing: consistent hashing only moves the rooms of a worker
+that joins or leaves, workers release rooms they stop owning, and the router
+forwards HTTP and WebSocket traffic to the owning worker. The Redis parts need a
+local Redis (TEST_REDIS_URL, default redis://localhost:6379) and are skipped
+otherwise; the router test also needs uvicorn.
+"""
+
+import sys
+import os
+import asyncio
+import json
+import socket
+import time
+from collections import Counter
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+import redis
+from app.config import settings
+from app.room_affinity import HashRing, RoomAffinity, WORKERS_KEY, WORKER_URLS_KEY, ROOM_MOVED_CLOSE_CODE, create_room_affinity
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379")
+ROOMS = [f"room_{i}" for i in range(10000)]
+
+
+def make_affinity(worker_id, url=None, ttl=15.0):
+    return RoomAffinity(worker_id, url, worker_ttl=ttl, replicas=64, redis_client=redis.from_url(REDIS_URL))
+
+
+def reset_workers():
+    client = redis.from_url(REDIS_URL)
+    client.delete(WORKERS_KEY, WORKER_URLS_KEY)
+
+
+def redis_available():
+    try:
+        return redis.from_url(REDIS_URL).ping()
+    except Exception:
+        return False
+
+
+# Tests that talk to Redis; the rest run without it
+needs_redis = pytest.mark.skipif(not redis_available(), reason=f"No Redis at {REDIS_URL}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_ring_moves_only_affected_rooms():
+    """Benchmark: share of 10k rooms that change owner when a 5th worker joins or one leaves"""
+    print("💍 Testing consistent hashing")
+    ring = HashRing([f"worker_{i}" for i in range(4)])
+    before = {room_id: ring.owner(room_id) for room_id in ROOMS}
+    load = Counter(before.values())
+    print(f"  4 workers: rooms per worker {min(load.values())}-{max(load.values())}")
+    assert max(load.values()) < 1.5 * len(ROOMS) / 4
+
+    start = time.perf_counter()
+    ring.add("worker_4")
+    after = {room_id: ring.owner(room_id) for room_id in ROOMS}
+    lookups = time.perf_counter() - start
+    moved = [room_id for room_id in ROOMS if before[room_id] != after[room_id]]
+    print(f"  worker joined: {len(moved) / len(ROOMS):.1%} of rooms moved (ideal 20%), {lookups / len(ROOMS) * 1e6:.2f}µs per lookup")
+    assert all(after[room_id] == "worker_4" for room_id in moved), "a room moved between existing workers"
+    assert 0.1 < len(moved) / len(ROOMS) < 0.3
+
+    ring.remove("worker_1")
+    final = {room_id: ring.owner(room_id) for room_id in ROOMS}
+    moved = [room_id for room_id in ROOMS if after[room_id] != final[room_id]]
+    assert all(after[room_id] == "worker_1" for room_id in moved), "a room moved that worker_1 didn't own"
+    print(f"  worker left: {len(moved) / len(ROOMS):.1%} of rooms moved")
+    assert HashRing([]).owner("room_1") is None
+    print("  ✅ Only the affected rooms moved")
+
+
+def test_worker_url_required():
+    """A worker doesn't start without its own URL: a hostname:PORT default is shared by `--workers N` processes"""
+    print("🔗 Testing worker URL requirement")
+    original = settings.ROOM_AFFINITY_WORKER_URL
+    try:
+        settings.ROOM_AFFINITY_WORKER_URL = ""
+        try:
+            create_room_affinity()
+            refused = False
+        except ValueError:
+            refused = True
+        assert refused, "a worker started without ROOM_AFFINITY_WORKER_URL"
+        settings.ROOM_AFFINITY_WORKER_URL = "http://10.0.0.5:8001/"
+        assert create_room_affinity().url == "http://10.0.0.5:8001"
+    finally:
+        settings.ROOM_AFFINITY_WORKER_URL = original
+    print("  ✅ Refused without a worker URL")
+
+
+@needs_redis
+def test_rebalance_releases_rooms():
+    """A worker joining takes its rooms from the others; one that stops heartbeating gives them back"""
+    print("⚖️ Testing rebalance on join and leave")
+    reset_workers()
+    rooms = ROOMS[:300]
+    alpha = make_affinity("alpha", "http://alpha:8000")
+    beta = make_affinity("beta", "http://beta:8000")
+    router = make_affinity(None)
+    released = []
+
+    async def release(room_id):
+        released.append(room_id)
+
+    alpha.on_release(release)
+    alpha.track_rooms(lambda: rooms)
+
+    async def run():
+        now = 1000.0
+        alpha.heartbeat(now)
+        assert await alpha.refresh(now) == ({"alpha"}, set())
+        assert all(alpha.owns(room_id) for room_id in rooms) and released == []
+
+        beta.heartbeat(now + 1)
+        await alpha.refresh(now + 1)
+        await router.refresh(now + 1)
+        expected = [room_id for room_id in rooms if router.owner(room_id) == "beta"]
+        assert released == expected and expected, "released rooms don't match the new owner"
+        assert all(router.owner(room_id) == alpha.owner(room_id) for room_id in rooms)
+        assert router.owner_url(expected[0]) == "http://beta:8000"
+
+        # beta stops heartbeating: after the TTL it is trimmed and alpha owns everything again
+        alpha.heartbeat(now + 20)
+        joined, left = await alpha.refresh(now + 20)
+        assert left == {"beta"} and all(alpha.owns(room_id) for room_id in rooms)
+        assert len(released) == len(expected), "rooms released again after beta left"
+        assert redis.from_url(REDIS_URL).hget(WORKER_URLS_KEY, "beta") is None
+
+    asyncio.run(run())
+    reset_workers()
+    print(f"  beta took {len(released)} of {len(rooms)} rooms; alpha released exactly those")
+    print("  ✅ Rebalance consistent")
+
+
+@needs_redis
+def test_router_forwards_to_owner():
+    """HTTP and WebSocket traffic through the router reaches the room's owner, close codes included"""
+    print("🔀 Testing router forwarding")
+    try:
+        import uvicorn
+    except ImportError:
+        print("  ⚠️ uvicorn not installed, skipping")
+        return
+    from aiohttp import web, ClientSession, WSMsgType
+    from app import router as router_module
+
+    reset_workers()
+
+    def make_worker(name):
+        async def handle_http(request):
+            body = await request.text()
+            return web.json_response({"worker": name, "path": request.path, "body": body})
+
+        async def handle_ws(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            async for message in ws:
+                if message.data == "move":
+                    await ws.close(code=ROOM_MOVED_CLOSE_CODE)
+                    break
+                await ws.send_str(f"{name}:{message.data}")
+            return ws
+
+        app = web.Application()
+        app.router.add_get("/ws/{room_id}/{player_id}", handle_ws)
+        app.router.add_route("*", "/{path:.*}", handle_http)
+        return app
+
+    async def run():
+        runners = []
+        for name in ("alpha", "beta"):
+            port = free_port()
+            runner = web.AppRunner(make_worker(name))
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+            runners.append(runner)
+            make_affinity(name, f"http://127.0.0.1:{port}").heartbeat()
+
+        router_module.router.affinity._client = redis.from_url(REDIS_URL)
+        router_port = free_port()
+        server = uvicorn.Server(uvicorn.Config(router_module.app, host="127.0.0.1", port=router_port, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        ring = router_module.router.affinity
+        base = f"http://127.0.0.1:{router_port}"
+        try:
+            async with ClientSession() as session:
+                owners = Counter()
+                for room_id in ROOMS[:20]:
+                    payload = {"player_id": "p1", "room_id": room_id, "action": "look"}
+                    async with session.post(f"{base}/action/stream", json=payload) as response:
+                        reply = await response.json()
+                    assert reply["worker"] == ring.owner(room_id) and json.loads(reply["body"]) == payload
+                    owners[reply["worker"]] += 1
+                print(f"  20 actions routed by room: {dict(owners)}")
+                assert set(owners) == {"alpha", "beta"}
+
+                room_id = ROOMS[0]
+                async with session.ws_connect(f"ws://127.0.0.1:{router_port}/ws/{room_id}/p1?room_version=0") as ws:
+                    await ws.send_str("ping")
+                    reply = await ws.receive()
+                    assert reply.data == f"{ring.owner(room_id)}:ping"
+                    await ws.send_str("move")
+                    closing = await ws.receive()
+                    assert closing.type in (WSMsgType.CLOSE, WSMsgType.CLOSED)
+                    assert ws.close_code == ROOM_MOVED_CLOSE_CODE, f"close code {ws.close_code} not passed on"
+                print(f"  WebSocket for {room_id} relayed to {ring.owner(room_id)}, close code {ROOM_MOVED_CLOSE_CODE} passed on")
+        finally:
+            server.should_exit = True
+            await serving
+            for runner in runners:
+                await runner.cleanup()
+
+    asyncio.run(run())
+    reset_workers()
+    print("  ✅ Router forwards to the owner")
+
+
+if __name__ == "__main__":
+    test_ring_moves_only_affected_rooms()
+    test_worker_url_required()
+    if not redis_available():
+        print(f"⚠️ No Redis at {REDIS_URL}, skipping room affinity Redis tests")
+        sys.exit(0)
+    test_rebalance_releases_rooms()
+    test_router_forwards_to_owner()
+    print("🎉 Room affinity tests completed!")
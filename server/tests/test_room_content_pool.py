@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test the per-biome room content pool
+"""
+
+import sys
+import os
+import asyncio
+
+import fakeredis
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.room_pool import RoomContentPool
+from app.llm_scheduler import llm_scheduler
+
+
+def make_pool(redis, depth=2):
+    pool = RoomContentPool(True, depth, 0.1)
+    pool._redis = lambda: redis
+    return pool
+
+
+def test_claim_is_fifo_per_biome(fake_redis):
+    """Bundles are claimed oldest first and biomes do not share bundles"""
+    print("📦 Testing bundle claims")
+    pool = make_pool(fake_redis)
+    pool.add("forest", {"title": "Old Grove", "monster_count": 0})
+    pool.add("forest", {"title": "Fern Hollow", "monster_count": 1})
+
+    async def run():
+        return (
+            await pool.claim("Forest"),
+            await pool.claim("desert"),
+            await pool.claim("forest"),
+            await pool.claim("forest")
+        )
+
+    first, desert, second, empty = asyncio.run(run())
+    assert first["title"] == "Old Grove"
+    assert second["title"] == "Fern Hollow"
+    assert desert is None and empty is None
+
+    metrics = pool.get_metrics()
+    print(f"  metrics: {metrics}")
+    assert metrics["claims"] == 4
+    assert metrics["hits"] == 2
+    assert metrics["hit_rate"] == 0.5
+    assert metrics["depth"] == {"desert": 0, "forest": 0}
+    print("  ✅ Claims are atomic pops per biome")
+
+
+def test_refill_tops_up_to_depth_once(fake_redis):
+    """A refill fills the pool to its target depth and concurrent requests are deduplicated"""
+    print("🔄 Testing pool refill")
+    pool = make_pool(fake_redis, depth=3)
+    calls = []
+
+    async def generator(biome, description, x, y):
+        calls.append((biome, x, y))
+        await asyncio.sleep(0)
+        return {"title": f"Room {len(calls)}", "monster_count": 0}
+
+    async def run():
+        pool.request_refill("Swamp", "Murky", 4, 5, generator)
+        pool.request_refill("swamp", "Murky", 4, 5, generator)
+        assert len(pool._tasks) == 1, "refill task not tracked"
+        await asyncio.gather(*pool._tasks)
+        assert not pool._tasks and not pool._refilling
+
+    asyncio.run(run())
+    assert len(calls) == 3, f"expected 3 generations, got {len(calls)}"
+    assert pool.get_depth("swamp") == 3
+    metrics = pool.get_metrics()
+    assert metrics["bundles_generated"] == 3
+    assert metrics["refills_per_minute"] > 0
+    print(f"  ✅ Generated {len(calls)} bundles with one refill task")
+
+
+def test_refill_waits_for_idle_scheduler(fake_redis):
+    """Refills do not start while interactive LLM calls are queued"""
+    print("⏳ Testing idle-time refill")
+    pool = make_pool(fake_redis, depth=1)
+    calls = []
+
+    async def generator(biome, description, x, y):
+        calls.append(biome)
+        return {"title": "Quiet Room", "monster_count": 0}
+
+    async def run():
+        llm_scheduler.waiting += 1
+        try:
+            pool.request_refill("tundra", "Cold", 0, 0, generator)
+            await asyncio.sleep(0.25)
+            assert calls == [], "refill ran while the scheduler was busy"
+        finally:
+            llm_scheduler.waiting -= 1
+        while pool._refilling:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert calls == ["tundra"]
+    print("  ✅ Refill deferred until the scheduler was idle")
+
+
+if __name__ == "__main__":
+    test_claim_is_fifo_per_biome(fakeredis.FakeRedis())
+    test_refill_tops_up_to_depth_once(fakeredis.FakeRedis())
+    test_refill_waits_for_idle_scheduler(fakeredis.FakeRedis())
+    print("🎉 Room content pool tests completed!")
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Test versioned room state sync: JSON patch diffing, versions and patch history in
+Redis, and choosing a patch or snapshot per connection. The Redis parts need a
+local Redis (TEST_REDIS_URL, default redis://localhost:6379) and are skipped otherwise.
+"""
+
+import sys
+import os
+import asyncio
+import copy
+import json
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+import redis
+from app.room_state import RoomStateStore, diff, apply_patch
+from app.outbound_queue import OutboundConnection, DISCONNECT, encode_message
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379")
+
+
+def make_room(room_id):
+    return {
+        "id": room_id,
+        "title": "The Sunken Archive",
+        "description": "Shelves of drowned books lean over black water. " * 20,
+        "x": 3,
+        "y": -2,
+        "biome": "ruins",
+        "image_url": "https://replicate.delivery/xezq/abc/out.png",
+        "image_status": "generating",
+        "image_prompt": "A flooded library lit by drifting lanterns, " * 5,
+        "image_variants": {},
+        "connections": {"north": "room_2", "south": "room_3"},
+        "npcs": ["npc_1"],
+        "items": [f"item_{i}" for i in range(8)],
+        "monsters": ["monster_1"],
+        "players": ["alice"],
+        "visited": True,
+        "properties": {"weather": "mist", "a/b~c": 1},
+        "model_3d_url": None,
+        "model_3d_status": "none",
+        "model_3d_job_id": None
+    }
+
+
+def make_store():
+    store = RoomStateStore(history=3, ttl=600)
+    client = redis.from_url(REDIS_URL)
+    store._redis = lambda: client
+    return store, client
+
+
+def make_connection(room_version=None):
+    connection = OutboundConnection(object(), "player", 16, 10.0, {}, DISCONNECT)
+    if room_version is not None:
+        connection.accepts_patches = True
+        connection.room_version = room_version
+    return connection
+
+
+def redis_available():
+    try:
+        return redis.from_url(REDIS_URL).ping()
+    except Exception:
+        return False
+
+
+# Tests that talk to Redis; the rest run without it
+needs_redis = pytest.mark.skipif(not redis_available(), reason=f"No Redis at {REDIS_URL}")
+
+
+def test_diff_round_trip():
+    """Patches rebuild the new document from the old one, with escaped keys and removals"""
+    print("🧩 Testing JSON patch diff")
+    old = make_room("room_1")
+    new = copy.deepcopy(old)
+    new["players"].append("bob")
+    new["image_status"] = "ready"
+    new["image_variants"] = {"thumb": {"width": 256, "webp": "https://cdn/thumb.webp"}}
+    new["properties"]["a/b~c"] = 2
+    del new["properties"]["weather"]
+    new["model_3d_status"] = "pending"
+
+    patch = diff(old, new)
+    print(f"  {len(patch)} operations: {[op['path'] for op in patch]}")
+    assert apply_patch(copy.deepcopy(old), patch) == new
+    assert {"op": "remove", "path": "/properties/weather"} in patch
+    assert any(op["path"] == "/properties/a~1b~0c" for op in patch)
+    assert diff(new, new) == []
+    print("  ✅ Patch applies cleanly")
+
+
+@needs_redis
+def test_versions_and_history():
+    """Versions only move on real changes; reconnects get a combined patch while history lasts"""
+    print("🔢 Testing versions and patch history")
+    store, client = make_store()
+    room_id = f"room_state_test_{os.getpid()}"
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+
+    room = make_room(room_id)
+    states = [copy.deepcopy(room)]
+    assert store.commit(room_id, room) == (1, None), "first commit has nothing to diff against"
+    assert store.commit(room_id, room) == (1, None), "an unchanged room got a new version or a patch"
+    for i in range(4):
+        room["players"].append(f"player_{i}")
+        version, patch = store.commit(room_id, room)
+        states.append(copy.deepcopy(room))
+        assert version == i + 2 and patch == diff(states[-2], states[-1])
+
+    # History holds the last 3 patches: versions 2 -> 5 are reachable from 2 onwards
+    current, patch = store.patch_since(room_id, 3)
+    assert current == 5 and apply_patch(copy.deepcopy(states[2]), patch) == room
+    assert store.patch_since(room_id, 5) == (5, [])
+    assert store.patch_since(room_id, 1) is None, "patch built from trimmed history"
+    assert store.patch_since(room_id, 9) is None
+
+    # An expired snapshot restarts the diff chain without reusing versions
+    client.delete(f"room_state:{room_id}:snapshot")
+    assert store.commit(room_id, room) == (6, None)
+    assert store.patch_since(room_id, 5) is None
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+    print("  ✅ Versions and history consistent")
+
+
+@needs_redis
+def test_patch_or_snapshot_per_connection():
+    """Benchmark: bytes sent for a player joining a room, as a patch vs the full room"""
+    print("📶 Testing patch selection per connection")
+    store, client = make_store()
+    room_id = f"room_state_select_{os.getpid()}"
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+
+    room = make_room(room_id)
+    version, _ = store.commit(room_id, room)
+    room["players"].append("bob")
+    new_version, patch = store.commit(room_id, room)
+    snapshot_message, patch_message = store.split(
+        {"type": "room_update", "room": room, "version": new_version, "patch": patch}
+    )
+
+    synced = make_connection(room_version=version)
+    behind = make_connection(room_version=version - 1 if version > 1 else 0)
+    legacy = make_connection()
+    assert store.select(synced, snapshot_message, patch_message) is patch_message
+    assert store.select(behind, snapshot_message, patch_message) is snapshot_message
+    assert store.select(legacy, snapshot_message, patch_message) is snapshot_message
+    # Every connection is now at the new version; a duplicate or older update is skipped
+    assert store.select(synced, snapshot_message, patch_message) is None
+    assert all(c.room_version == new_version for c in (synced, behind, legacy))
+
+    patch_bytes = len(encode_message(patch_message))
+    snapshot_bytes = len(encode_message(snapshot_message))
+    print(f"  player join: patch {patch_bytes} bytes vs snapshot {snapshot_bytes} bytes ({snapshot_bytes / patch_bytes:.0f}x smaller)")
+    assert patch_bytes * 5 < snapshot_bytes
+    assert apply_patch(json.loads(encode_message(make_room(room_id))), patch_message["patch"]) == json.loads(encode_message(room))
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+    print("  ✅ Patch-capable clients get the patch")
+
+
+@needs_redis
+def test_unchanged_commit_sends_no_patch():
+    """A client that missed a version is resynced by a snapshot, not moved on by an empty patch"""
+    print("🪞 Testing unchanged commit")
+    store, client = make_store()
+    room_id = f"room_state_unchanged_{os.getpid()}"
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+
+    room = make_room(room_id)
+    store.commit(room_id, room)
+    room["players"].append("bob")
+    version, _ = store.commit(room_id, room)
+    behind = make_connection(room_version=version - 1)  # Never received the change to `version`
+
+    assert store.commit(room_id, room) == (version, None)
+    snapshot_message, patch_message = store.split({"type": "room_update", "room": room, "version": version, "patch": None})
+    assert patch_message is None
+    assert store.select(behind, snapshot_message, patch_message) is snapshot_message
+    assert behind.room_version == version
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+    print("  ✅ Snapshot sent instead of an empty patch")
+
+
+@needs_redis
+def test_join_commit_reaches_other_connections():
+    """The version committed for a joining socket is broadcast to the room's other sockets"""
+    print("👋 Testing join fan-out")
+    import app.main as main_module
+    from app.broadcast_bus import LocalBroadcastBus
+
+    store, client = make_store()
+    room_id = f"room_state_join_{os.getpid()}"
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+    room = make_room(room_id)
+    version, _ = store.commit(room_id, room)
+
+    manager = main_module.ConnectionManager(LocalBroadcastBus())
+    alice = make_connection(room_version=version)
+    bob = make_connection(room_version=version)
+    manager.connections.add(room_id, "alice", alice)
+    manager.connections.add(room_id, "bob", bob)
+    original_store = main_module.room_state
+    main_module.room_state = store
+    try:
+        room["players"].append("bob")
+        asyncio.run(manager.send_room_state(room_id, "bob", room))
+        # Reconnecting to an unchanged room commits nothing new and broadcasts nothing
+        asyncio.run(manager.send_room_state(room_id, "bob", room))
+    finally:
+        main_module.room_state = original_store
+
+    sent = [json.loads(payload) for _, payload in list(alice._queue)]
+    assert [m["type"] for m in sent] == ["room_patch"]
+    assert sent[0]["base_version"] == version and sent[0]["version"] == version + 1
+    assert alice.room_version == bob.room_version == version + 1
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+    print("  ✅ Other sockets moved to the joined version")
+
+
+@needs_redis
+def test_reconnect_ahead_of_server_gets_snapshot():
+    """A client claiming a newer version than the server's gets a snapshot and is then kept in sync"""
+    print("⏩ Testing reconnect with a version ahead of the server")
+    import app.main as main_module
+    from app.broadcast_bus import LocalBroadcastBus
+
+    store, client = make_store()
+    room_id = f"room_state_ahead_{os.getpid()}"
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+    room = make_room(room_id)
+    version, _ = store.commit(room_id, room)
+
+    manager = main_module.ConnectionManager(LocalBroadcastBus())
+    # e.g. the server's room state expired and restarted its version numbers
+    connection = make_connection(room_version=version + 5)
+    manager.connections.add(room_id, "alice", connection)
+    original_store = main_module.room_state
+    main_module.room_state = store
+    try:
+        assert asyncio.run(manager.send_room_state(room_id, "alice", room))
+    finally:
+        main_module.room_state = original_store
+    sent = json.loads(connection._queue[-1][1])
+    assert sent["type"] == "room_update" and sent["version"] == version
+    assert connection.room_version == version
+
+    # The next change reaches the client as a patch instead of being skipped as stale
+    room["players"].append("bob")
+    new_version, patch = store.commit(room_id, room)
+    snapshot_message, patch_message = store.split({"type": "room_update", "room": room, "version": new_version, "patch": patch})
+    assert store.select(connection, snapshot_message, patch_message) is patch_message
+    for key in client.scan_iter(match=f"room_state:{room_id}:*"):
+        client.delete(key)
+    print("  ✅ Client resynced from the snapshot")
+
+
+if __name__ == "__main__":
+    test_diff_round_trip()
+    if not redis_available():
+        print(f"⚠️ No Redis at {REDIS_URL}, skipping room state Redis tests")
+        sys.exit(0)
+    test_versions_and_history()
+    test_patch_or_snapshot_per_connection()
+    test_unchanged_commit_sends_no_patch()
+    test_join_commit_reaches_other_connections()
+    test_reconnect_ahead_of_server_gets_snapshot()
+    print("🎉 Room state tests completed!")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test narrative delta coalescing between the AI stream and the SSE/WebSocket
+transport: flushing on size, sentence end and age, pass-through of payload
+dicts, and CPU and events per action before and after coalescing
+"""
+
+import sys
+import os
+import asyncio
+import io
+import json
+import logging
+import time
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.stream_coalescer import coalesce_narrative, StreamMetrics
+
+NARRATIVE = (
+    "You push the rusted door open. Cold air spills out of the vault, carrying the smell of wet stone "
+    "and old iron! Somewhere below, water drips onto metal in a slow, patient rhythm. The lantern "
+    "light catches a row of sealed urns along the far wall, each marked with a sigil you almost "
+    "recognise. \"Who goes there?\" a voice rasps from the dark. "
+) * 3
+
+
+def deltas(text=NARRATIVE):
+    """Split text the way the model streams it: a few characters per delta"""
+    sizes = [3, 5, 2, 6, 4]
+    i = 0
+    n = 0
+    while i < len(text):
+        yield text[i:i + sizes[n % len(sizes)]]
+        i += sizes[n % len(sizes)]
+        n += 1
+
+
+async def model_stream(delay=0.0, stall_after=None, stall=0.0):
+    for n, delta in enumerate(deltas()):
+        if delay:
+            await asyncio.sleep(delay)
+        if stall_after is not None and n == stall_after:
+            await asyncio.sleep(stall)
+        yield delta
+    yield {"type": "final", "content": NARRATIVE.strip(), "updates": {}}
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def test_coalesced_text_matches_stream():
+    """Merged text is identical, payloads stay last, and size/sentence flushes hold"""
+    print("🧵 Testing coalesced output")
+    metrics = StreamMetrics(sample_rate=1.0)
+    items = asyncio.run(collect(coalesce_narrative(model_stream(), flush_ms=1000, flush_bytes=64, metrics=metrics)))
+    texts = [item for item in items if isinstance(item, str)]
+    assert "".join(texts) == NARRATIVE
+    assert items[-1]["type"] == "final"
+    assert all(len(text.encode('utf-8')) < 64 + 6 for text in texts)
+    assert texts[0].endswith("open."), "sentence end didn't flush"
+
+    snapshot = metrics.get_metrics()
+    assert snapshot['actions'] == 1 and snapshot['events'] == len(texts)
+    assert snapshot['deltas'] == len(list(deltas())) and snapshot['sampled_actions'] == 1
+    print(f"  {snapshot['deltas']} deltas -> {snapshot['events']} events")
+    print("  ✅ Text preserved")
+
+
+def test_stalled_model_flushes_on_age():
+    """Buffered text goes out after flush_ms even while the model is silent"""
+    print("⏲️ Testing age-based flush")
+
+    async def run():
+        received = []
+        start = time.perf_counter()
+        async for item in coalesce_narrative(model_stream(stall_after=2, stall=0.3), flush_ms=20, flush_bytes=4096, on_sentence=False):
+            received.append((time.perf_counter() - start, item))
+        return received
+
+    received = asyncio.run(run())
+    first_at, first = received[0]
+    assert first == "You push", f"unexpected first flush {first!r}"
+    assert first_at < 0.15, f"buffered text held {first_at * 1000:.0f}ms behind a stalled model"
+    assert "".join(item for _, item in received if isinstance(item, str)) == NARRATIVE
+    print(f"  first text sent after {first_at * 1000:.0f}ms of a 300ms stall")
+    print("  ✅ Stall doesn't hold back text")
+
+
+def test_cpu_and_events_per_action():
+    """Benchmark: CPU and events per action, per-delta events with INFO timing logs vs coalesced"""
+    print("📉 Benchmarking narrative streaming per action")
+    logger = logging.getLogger("stream_benchmark")
+    logger.handlers = [logging.StreamHandler(io.StringIO())]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    actions = 50
+
+    async def before():
+        events = 0
+        start = time.time()
+        last = None
+        count = 0
+        async for chunk in model_stream():
+            now = time.time()
+            count += 1
+            if last is None:
+                logger.info(f"⏱️ [TIMING] First AI chunk received: {(now - start)*1000:.2f}ms")
+            else:
+                logger.info(f"⏱️ [TIMING] Time between chunks {count-1} and {count}: {(now - last)*1000:.2f}ms")
+            last = now
+            if isinstance(chunk, str):
+                logger.info(f"⏱️ [TIMING] About to yield text chunk {count} at {(time.time() - start)*1000:.2f}ms")
+                frame = f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\r\n\r\n"
+                logger.info(f"⏱️ [TIMING] Chunk {count} yielded, took {(time.time() - now)*1000:.2f}ms")
+            else:
+                frame = f"data: {json.dumps(chunk)}\r\n\r\n"
+            events += bool(frame)
+        return events
+
+    async def after(metrics):
+        events = 0
+        async for chunk in coalesce_narrative(model_stream(), flush_ms=50, flush_bytes=256, metrics=metrics):
+            if isinstance(chunk, str):
+                frame = f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\r\n\r\n"
+            else:
+                frame = f"data: {json.dumps(chunk)}\r\n\r\n"
+            events += bool(frame)
+        return events
+
+    def measure(make_run):
+        async def run():
+            return [await make_run() for _ in range(actions)]
+        start = time.process_time()
+        counts = asyncio.run(run())
+        return (time.process_time() - start) / actions * 1000, sum(counts) / actions
+
+    metrics = StreamMetrics(sample_rate=0.05)
+    before_cpu, before_events = measure(before)
+    after_cpu, after_events = measure(lambda: after(metrics))
+    print(f"  {len(list(deltas()))} deltas per action")
+    print(f"  before: {before_events:.0f} events, {before_cpu:.2f}ms CPU per action")
+    print(f"  after:  {after_events:.0f} events, {after_cpu:.2f}ms CPU per action ({before_cpu / after_cpu:.1f}x)")
+    assert after_events * 5 < before_events
+    assert after_cpu < before_cpu
+    assert metrics.get_metrics()['actions'] == actions
+    print("  ✅ Benchmark completed")
+
+
+if __name__ == "__main__":
+    test_coalesced_text_matches_stream()
+    test_stalled_model_flushes_on_age()
+    test_cpu_and_events_per_action()
+    print("🎉 Stream coalescer tests completed!")
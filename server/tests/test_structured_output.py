@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test structured output schemas, JSON repair and per call site counters
+"""
+
+import sys
+import os
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models import ItemOutput, MonsterBatchOutput, ValidationRulesOutput, ActionValidationOutput
+from app.structured_output import (
+    StructuredOutputMetrics,
+    parse_structured,
+    repair_json,
+    response_format_for
+)
+
+
+def test_repair_common_mistakes():
+    """Near-miss JSON is repaired locally instead of regenerated"""
+    print("🔧 Testing JSON repair")
+    cases = [
+        ('{"valid": true, "reason": "ok"}', False),
+        ('```json\n{"valid": true, "reason": "ok"}\n```', True),
+        ('Sure! Here you go: {"valid": true, "reason": "ok"} Hope that helps.', True),
+        ('{"valid": true, "reason": "ok",}', True),
+        ('{"valid": True, "reason": "ok", "suggestion": None}', True),
+        ('{"valid": true, "reason": "line one\nline two"}', True),
+        ('{"valid": true, "reason": "cut off mid', True),
+    ]
+    for text, expect_repaired in cases:
+        data, repaired = repair_json(text)
+        assert data["valid"] is True, text
+        assert repaired == expect_repaired, text
+        print(f"  ✅ {text[:40]!r}")
+
+    for text in ("", "no json here"):
+        try:
+            repair_json(text)
+        except ValueError:
+            continue
+        raise AssertionError(f"Expected failure for {text!r}")
+    print("  ✅ Unrepairable responses raise ValueError")
+
+
+def test_parse_validates_against_model():
+    """Parsed data must match the output model"""
+    print("🧾 Testing schema validation")
+    result, _ = parse_structured('{"name": "Rope", "rarity": 1, "description": "Coiled.", "capabilities": ["climb"]}', ItemOutput)
+    assert result["capabilities"] == ["climb"]
+
+    try:
+        parse_structured('{"name": "Rope"}', ItemOutput)
+    except ValueError:
+        print("  ✅ Missing fields rejected")
+    else:
+        raise AssertionError("Missing fields should fail validation")
+
+    result, _ = parse_structured('{"valid": false, "reason": "no bow"}', ActionValidationOutput)
+    assert result["suggestion"] is None
+    print("  ✅ Optional fields default")
+
+
+def test_response_format_schemas():
+    """Schemas are closed and strict unless a free-form map prevents it"""
+    print("📐 Testing response_format schemas")
+    item_format = response_format_for(ItemOutput)
+    schema = item_format["json_schema"]["schema"]
+    assert item_format["type"] == "json_schema"
+    assert item_format["json_schema"]["strict"] is True
+    assert schema["additionalProperties"] is False
+    assert set(schema["required"]) == {"name", "rarity", "description", "capabilities"}
+
+    batch_schema = response_format_for(MonsterBatchOutput)["json_schema"]
+    assert batch_schema["strict"] is True
+    monster_def = next(iter(batch_schema["schema"]["$defs"].values()))
+    assert monster_def["additionalProperties"] is False
+
+    rules_format = response_format_for(ValidationRulesOutput)["json_schema"]
+    assert rules_format["strict"] is False
+    print("  ✅ Strict where possible, relaxed for Dict fields")
+
+
+def test_metrics_count_regenerations():
+    """First-try, repaired, regenerated and failed calls are counted per call site"""
+    print("📊 Testing structured output metrics")
+    metrics = StructuredOutputMetrics()
+    metrics.record("room_npc", 1, True)
+    metrics.record("room_npc", 1, True, repaired=True)
+    metrics.record("room_npc", 2, True)
+    metrics.record("room_npc", 2, False)
+
+    stats = metrics.get_report()["room_npc"]
+    print(f"  room_npc: {stats}")
+    assert stats == {'calls': 4, 'first_try': 1, 'repaired': 1, 'regenerations': 2, 'failures': 1}
+    print("  ✅ Counters match")
+
+
+if __name__ == "__main__":
+    test_repair_common_mistakes()
+    test_parse_validates_against_model()
+    test_response_format_schemas()
+    test_metrics_count_regenerations()
+    print("🎉 Structured output tests completed!")
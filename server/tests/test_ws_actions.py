@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Test actions over the room WebSocket: the socket authenticates once per connection,
+actions on unauthenticated sockets are refused without running, and action events
+reach the player in between the room's other messages
+"""
+
+import sys
+import os
+import asyncio
+import json
+from types import SimpleNamespace
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.ws_actions import WebSocketActions
+from app.outbound_queue import OutboundConnection, DISCONNECT
+
+TOKENS = {"alice-token": {"id": "user_alice"}, "bob-token": {"id": "user_bob"}}
+PLAYERS = {"alice": SimpleNamespace(user_id="user_alice")}
+
+
+class FakeSocket:
+    def __init__(self):
+        self.received = []
+
+    async def send_text(self, text):
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+class Harness:
+    """Stand-ins for the auth lookups, the action pipeline and the connection manager"""
+
+    def __init__(self, enabled=True, chunks=3, chunk_delay=0.0, reconnect_grace=0.5):
+        self.actions = WebSocketActions(enabled, reconnect_grace)
+        self.actions.set_pipeline(self.run_action, self.current_user, self.get_player)
+        self.actions.set_delivery(self.send_local, self.send_to_player, self.send_remote)
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.token_checks = 0
+        self.ran = []
+        self.replies = []  # Messages sent straight back on the socket that received the request
+        self.connection = None  # The player's current socket, None while they reconnect
+        self.remote = []
+
+    async def current_user(self, token):
+        self.token_checks += 1
+        return TOKENS.get(token)
+
+    async def get_player(self, player_id):
+        return PLAYERS.get(player_id)
+
+    async def run_action(self, action_request, request_start):
+        self.ran.append(action_request.action)
+        for i in range(self.chunks):
+            await asyncio.sleep(self.chunk_delay)
+            yield json.dumps({"type": "chunk", "content": f"{action_request.action} {i}"})
+        yield json.dumps({"type": "final", "content": action_request.action})
+
+    def send_local(self, room_id, player_id, message):
+        self.replies.append(message)
+        return True
+
+    def send_to_player(self, player_id, message):
+        return self.connection is not None and self.connection.enqueue(message)
+
+    async def send_remote(self, message, player_id):
+        self.remote.append(message)
+
+
+def make_connection(socket):
+    connection = OutboundConnection(socket, "alice", 256, 10.0, {}, DISCONNECT)
+    connection.start()
+    return connection
+
+
+def test_authenticated_once_per_connection():
+    """One auth message covers every action on the socket; a token for another user is refused"""
+    print("🔐 Testing auth once per connection")
+    harness = Harness()
+
+    async def run():
+        harness.connection = make_connection(FakeSocket())
+        session = harness.actions.session("room_1", "alice")
+        await session.handle({"type": "auth", "token": "alice-token"})
+        for i in range(3):
+            await session.handle({"type": "action", "action": f"look {i}", "request_id": f"req_{i}"})
+        await asyncio.gather(*harness.actions._tasks)
+        await asyncio.sleep(0.05)
+        harness.connection.stop()
+
+        other = harness.actions.session("room_1", "alice")
+        await other.handle({"type": "auth", "token": "bob-token"})
+        return session, other
+
+    session, other = asyncio.run(run())
+    assert harness.replies[0] == {"type": "auth_ok", "actions": True}
+    assert harness.replies[1] == {"type": "auth_error", "actions": False}
+    assert session.authenticated and not other.authenticated
+    assert harness.token_checks == 2, "the token was checked again for an action"
+    assert harness.ran == ["look 0", "look 1", "look 2"]
+    metrics = harness.actions.get_metrics()
+    assert metrics['authenticated'] == 1 and metrics['auth_failed'] == 1 and metrics['actions'] == 3
+    print("  ✅ Token checked once; three actions ran")
+
+
+def test_unauthenticated_actions_rejected():
+    """Actions before auth, after failed auth or with actions disabled get an error and action_done"""
+    print("🚫 Testing unauthenticated actions")
+    harness = Harness()
+    disabled = Harness(enabled=False)
+
+    async def run():
+        session = harness.actions.session("room_1", "alice")
+        await session.handle({"type": "action", "action": "look", "request_id": "before_auth"})
+        await session.handle({"type": "auth"})
+        await session.handle({"type": "action", "action": "look", "request_id": "no_token"})
+        await session.handle({"type": "auth", "token": "bob-token"})
+        await session.handle({"type": "action", "action": "look", "request_id": "wrong_user"})
+
+        off = disabled.actions.session("room_1", "alice")
+        await off.handle({"type": "auth", "token": "alice-token"})
+        await off.handle({"type": "action", "action": "look", "request_id": "disabled"})
+
+    asyncio.run(run())
+    assert harness.ran == [] and disabled.ran == []
+    assert not harness.actions._tasks
+    rejections = [message for message in harness.replies if message['type'].startswith('action')]
+    assert [message['request_id'] for message in rejections] == [
+        "before_auth", "before_auth", "no_token", "no_token", "wrong_user", "wrong_user"
+    ]
+    assert all("error" in message['event'] for message in rejections if message['type'] == "action_event")
+    assert rejections[-1] == {"type": "action_done", "request_id": "wrong_user"}
+    assert harness.token_checks == 1, "an empty token was looked up"
+    assert disabled.replies[0] == {"type": "auth_ok", "actions": False}
+    assert disabled.replies[-1] == {"type": "action_done", "request_id": "disabled"}
+    assert harness.actions.get_metrics()['rejected'] == 3
+    print("  ✅ Refused without running the action")
+
+
+def test_action_chunks_interleave_with_room_events():
+    """Action events share the socket's queue with room messages instead of holding them back"""
+    print("🔀 Testing interleaving with room events")
+    harness = Harness(chunks=6, chunk_delay=0.01)
+    socket = FakeSocket()
+
+    async def run():
+        harness.connection = make_connection(socket)
+        session = harness.actions.session("room_1", "alice")
+        await session.handle({"type": "auth", "token": "alice-token"})
+        await session.handle({"type": "action", "action": "search the shelves", "request_id": "req_1"})
+        # Room broadcasts (another player's chat, presence) keep arriving while the action streams
+        for i in range(5):
+            await asyncio.sleep(0.012)
+            harness.connection.enqueue({"type": "chat", "n": i})
+        await asyncio.gather(*harness.actions._tasks)
+        await asyncio.sleep(0.05)
+        harness.connection.stop()
+
+    asyncio.run(run())
+    order = [message['type'] for message in socket.received]
+    print(f"  socket order: {' '.join('A' if t == 'action_event' else 'R' if t == 'chat' else 'D' for t in order)}")
+    action_positions = [i for i, t in enumerate(order) if t == "action_event"]
+    room_positions = [i for i, t in enumerate(order) if t == "chat"]
+    assert len(action_positions) == 7 and len(room_positions) == 5
+    assert any(action_positions[0] < i < action_positions[-1] for i in room_positions), "room events waited for the action"
+    assert order.index("action_done") > action_positions[-1]
+    chunks = [m['event']['content'] for m in socket.received if m['type'] == "action_event"]
+    assert chunks == [f"search the shelves {i}" for i in range(6)] + ["search the shelves"]
+    print("  ✅ Room events delivered mid-action, action events in order")
+
+
+def test_events_follow_reconnect_or_go_through_bus():
+    """Events produced while the player reconnects wait for the new socket, or go through the bus"""
+    print("🚪 Testing events across a reconnect")
+    moved = Harness(chunks=2)
+    gone = Harness(chunks=2, reconnect_grace=0.2)
+    socket = FakeSocket()
+
+    async def run():
+        # A move closed the old socket; the new one arrives while the action is finishing
+        session = moved.actions.session("room_1", "alice")
+        await session.handle({"type": "auth", "token": "alice-token"})
+        await session.handle({"type": "action", "action": "go north", "request_id": "req_move"})
+        await asyncio.sleep(0.15)
+        moved.connection = make_connection(socket)
+        await asyncio.gather(*moved.actions._tasks)
+        await asyncio.sleep(0.05)
+        moved.connection.stop()
+
+        # Never back on this worker
+        session = gone.actions.session("room_1", "alice")
+        await session.handle({"type": "auth", "token": "alice-token"})
+        await session.handle({"type": "action", "action": "go south", "request_id": "req_gone"})
+        await asyncio.gather(*gone.actions._tasks)
+
+    asyncio.run(run())
+    assert [m['type'] for m in socket.received] == ["action_event"] * 3 + ["action_done"]
+    assert moved.remote == []
+    assert [m['type'] for m in gone.remote] == ["action_event"] * 3 + ["action_done"]
+    assert gone.actions.get_metrics()['sent_remote'] == 4
+    print("  ✅ Events delivered after the reconnect; otherwise sent through the bus")
+
+
+if __name__ == "__main__":
+    test_authenticated_once_per_connection()
+    test_unauthenticated_actions_rejected()
+    test_action_chunks_interleave_with_room_events()
+    test_events_follow_reconnect_or_go_through_bus()
+    print("🎉 WebSocket action tests completed!")